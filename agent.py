@@ -0,0 +1,416 @@
+"""Agent host StreamHib untuk mode cluster.
+
+Agent berjalan di setiap VPS yang menjalankan stream dan hanya menjalankan operasi unit stream yang
+sebelumnya dilakukan panel langsung (tulis file unit, systemctl start/stop/restart/show, journalctl).
+Panel (app.py dengan STREAMHIB_CLUSTER_AGENTS) menjadi controller yang memilih agent, memantau
+kesehatannya, dan memindahkan stream saat agent mati. Hanya butuh library standar Python.
+
+    python agent.py --id vps1 --port 5100 --token RAHASIA
+    python agent.py --id lokal1 --port 5101 --simulate --unit-dir /tmp/agent1   # uji di localhost
+
+--simulate menyimpan status unit di memori (tanpa systemd/ffmpeg) sehingga beberapa agent bisa
+dijalankan bersamaan di satu mesin untuk menguji penempatan dan failover.
+
+Fencing: setiap request controller memperpanjang lease (lamanya dikirim controller, lebih pendek dari
+batas agent dianggap mati). Lease yang habis saja tidak mematikan stream: panel yang restart atau mati
+tidak boleh menghentikan semua siaran. Agent lalu memeriksa agent lain (daftar peer dikirim controller):
+- semua peer terjangkau: hanya controller yang hilang, unit tetap berjalan. Jika controller masih bisa
+  menjangkau agent lain dan memindahkan unit ke sana, agent tujuan lebih dulu meminta agent ini
+  mematikan unit itu (POST /units/<unit>/fence dengan epoch penempatan yang lebih baru) sebelum start.
+- ada peer yang tidak terjangkau: agent ini kemungkinan terisolasi dan mematikan semua unit stream-nya
+  sendiri sebelum controller menjalankannya di agent lain.
+Dengan begitu satu stream key tidak pernah dipublikasikan dua proses, dengan asumsi keterjangkauan
+antar agent simetris (A menjangkau B berarti B menjangkau A).
+"""
+import argparse
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+UNIT_NAME_RE = re.compile(r'^(stream-[A-Za-z0-9_-]+\.service|streamhib\.slice)$')
+SHOW_PROPERTY_RE = re.compile(r'^[A-Za-z]+$')
+COMMAND_TIMEOUT_SECONDS = 30
+CPU_SAMPLE_SECONDS = 5
+INGEST_WAIT_MAX_SECONDS = 120
+DEFAULT_LEASE_SECONDS = 12 # Dipakai sampai controller pertama kali mengirim lease-nya
+PEER_TIMEOUT_SECONDS = 3 # Batas waktu request ke agent lain (cek keterjangkauan dan fence saat serah terima)
+
+
+def process_has_established_connection(pid, remote_port):
+    # Sama dengan app.py: socket TCP milik proses yang ESTABLISHED ke port ingest
+    try:
+        inodes = set()
+        for fd_name in os.listdir(f"/proc/{pid}/fd"):
+            try:
+                target = os.readlink(f"/proc/{pid}/fd/{fd_name}")
+            except OSError:
+                continue
+            if target.startswith('socket:['): inodes.add(target[8:-1])
+        if not inodes: return False
+        for table in ('/proc/net/tcp', '/proc/net/tcp6'):
+            if not os.path.exists(table): continue
+            with open(table, 'r') as f:
+                next(f, None)
+                for line in f:
+                    fields = line.split()
+                    if len(fields) > 9 and fields[3] == '01' and fields[9] in inodes and int(fields[2].rsplit(':', 1)[1], 16) == remote_port:
+                        return True
+    except (OSError, ValueError):
+        pass
+    return False
+
+
+def read_proc_stat_cpu():
+    with open('/proc/stat') as f:
+        values = [int(v) for v in f.readline().split()[1:9]]
+    return sum(values), values[3] + values[4] # (total, idle + iowait)
+
+
+def read_mem_available_mb():
+    with open('/proc/meminfo') as f:
+        for line in f:
+            if line.startswith('MemAvailable:'): return int(line.split()[1]) / 1024
+    return None
+
+
+class SystemdBackend:
+    """Unit dijalankan systemd host ini (produksi)."""
+    name = 'systemd'
+
+    def __init__(self, unit_dir):
+        self.unit_dir = unit_dir
+
+    def run(self, cmd, timeout=COMMAND_TIMEOUT_SECONDS):
+        return subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+
+    def write_unit(self, unit, content):
+        tmp_path = os.path.join(self.unit_dir, f".{unit}.tmp")
+        with open(tmp_path, 'w') as f: f.write(content)
+        os.replace(tmp_path, os.path.join(self.unit_dir, unit))
+
+    def remove_unit(self, unit):
+        path = os.path.join(self.unit_dir, unit)
+        if os.path.exists(path): os.remove(path)
+
+    def reload(self):
+        return self.run(['systemctl', 'daemon-reload'])
+
+    def action(self, action, unit):
+        return self.run(['systemctl', action, unit])
+
+    def kill(self, unit):
+        # SIGKILL langsung: stop biasa bisa menunggu TimeoutStopSec sementara controller sudah memindahkan stream
+        self.run(['systemctl', 'kill', '--signal=SIGKILL', unit], timeout=10)
+        return self.action('stop', unit)
+
+    def running_units(self):
+        out = self.run(['systemctl', 'list-units', '--type=service', '--state=running', '--no-legend', '--plain']).stdout
+        return sorted(line.split()[0] for line in out.splitlines() if line.startswith('stream-'))
+
+    def show(self, units, properties):
+        return self.run(['systemctl', 'show', *units, '-p', ','.join(['Id'] + properties)]).stdout
+
+    def journal(self, unit, lines, since=None):
+        cmd = ['journalctl', '-u', unit, '-o', 'cat', '--no-pager', '-n', str(lines)]
+        if since: cmd += ['--since', since]
+        return self.run(cmd).stdout
+
+    def ingest_connected(self, unit, remote_port):
+        try: pid = int(self.run(['systemctl', 'show', '-p', 'MainPID', '--value', unit], timeout=5).stdout.strip() or 0)
+        except (subprocess.SubprocessError, ValueError): pid = 0
+        return bool(pid) and process_has_established_connection(pid, remote_port)
+
+
+class SimulatedBackend(SystemdBackend):
+    """Status unit di memori untuk menjalankan beberapa agent di localhost tanpa systemd maupun ffmpeg."""
+    name = 'simulate'
+
+    def __init__(self, unit_dir):
+        super().__init__(unit_dir)
+        self.running, self.lock = {}, threading.Lock() # unit -> monotonic saat start
+
+    def result(self, returncode=0, stdout='', stderr=''):
+        return subprocess.CompletedProcess([], returncode, stdout, stderr)
+
+    def reload(self):
+        return self.result()
+
+    def action(self, action, unit):
+        with self.lock:
+            if action == 'stop':
+                self.running.pop(unit, None)
+            elif not os.path.exists(os.path.join(self.unit_dir, unit)):
+                return self.result(5, '', f"Unit {unit} not found.")
+            else:
+                self.running[unit] = time.monotonic()
+        return self.result()
+
+    def running_units(self):
+        with self.lock: return sorted(self.running)
+
+    def show(self, units, properties):
+        blocks = []
+        with self.lock:
+            for unit in units:
+                props = {'Id': unit, 'ActiveState': 'active' if unit in self.running else 'inactive', 'SubState': 'running' if unit in self.running else 'dead',
+                         'ExecMainExitTimestampMonotonic': '0', 'ExecMainStatus': '0', 'MainPID': '0'}
+                blocks.append('\n'.join(f"{key}={props.get(key, '')}" for key in ['Id'] + properties))
+        return '\n\n'.join(blocks) + '\n'
+
+    def journal(self, unit, lines, since=None):
+        return ''
+
+    def kill(self, unit):
+        return self.action('stop', unit)
+
+    def ingest_connected(self, unit, remote_port):
+        with self.lock: return unit in self.running
+
+
+class Agent:
+    def __init__(self, agent_id, backend, token='', cpu_cores=None, max_streams=0, allow_anonymous=False, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.agent_id, self.backend, self.token = agent_id, backend, token
+        self.allow_anonymous = allow_anonymous # Tanpa token hanya untuk --simulate / agent yang hanya mendengarkan loopback
+        self.cpu_cores, self.max_streams = cpu_cores or os.cpu_count() or 1, max_streams
+        self.cpu_idle_fraction = None
+        self.started_at = time.time()
+        self.lease_seconds, self.last_contact = lease_seconds, time.monotonic() # Agent yang baru start juga ber-lease
+        self.fenced, self.fence_lock = set(), threading.Lock() # Unit yang dimatikan karena fencing
+        self.peers, self.unit_epochs = {}, {} # agent_id -> URL agent lain; unit -> epoch penempatan dari controller
+        self.controller_lost = False
+
+    def renew_lease(self, lease_seconds):
+        with self.fence_lock:
+            self.last_contact = time.monotonic()
+            if lease_seconds: self.lease_seconds = float(lease_seconds)
+            if self.controller_lost: logging.info("AGENT: Kontak controller pulih.")
+            self.controller_lost = False
+
+    def unfence(self, unit):
+        with self.fence_lock: self.fenced.discard(unit)
+
+    def set_unit_epoch(self, unit, epoch):
+        with self.fence_lock: self.unit_epochs[unit] = max(int(epoch), self.unit_epochs.get(unit, 0))
+
+    def peer_request(self, peer_id, method, path):
+        req = urllib.request.Request(self.peers[peer_id].rstrip('/') + path, method=method, data=b'' if method == 'POST' else None,
+                                     headers={'X-StreamHib-Agent-Token': self.token, 'X-StreamHib-Peer': self.agent_id})
+        with urllib.request.urlopen(req, timeout=PEER_TIMEOUT_SECONDS) as response: return json.load(response)
+
+    def unreachable_peers(self):
+        unreachable = []
+        for peer_id in list(self.peers):
+            try: self.peer_request(peer_id, 'GET', '/ping')
+            except urllib.error.HTTPError: pass # Menjawab (meski menolak) = terjangkau
+            except (urllib.error.URLError, OSError, ValueError): unreachable.append(peer_id)
+        return unreachable
+
+    def fence(self, unit, reason):
+        self.backend.kill(unit)
+        with self.fence_lock: self.fenced.add(unit)
+        logging.error(f"AGENT: {unit} dimatikan: {reason}")
+
+    def check_lease(self):
+        with self.fence_lock:
+            expired = self.lease_seconds and time.monotonic() - self.last_contact > self.lease_seconds
+        if not expired: return
+        unreachable = self.unreachable_peers()
+        if not unreachable:
+            # Hanya controller yang hilang (misal panel restart); pemindahan unit akan didahului fence dari agent tujuan
+            if not self.controller_lost: logging.warning(f"AGENT: Lease controller habis ({self.lease_seconds:.0f} detik), semua peer terjangkau; stream tetap berjalan.")
+            self.controller_lost = True
+            return
+        for unit in self.backend.running_units():
+            self.fence(unit, f"lease controller habis dan peer {', '.join(unreachable)} tidak terjangkau (agent terisolasi).")
+
+    def fence_watchdog(self):
+        while True:
+            time.sleep(1)
+            try: self.check_lease()
+            except Exception as e:
+                logging.error(f"AGENT: Gagal fencing unit: {e}", exc_info=True)
+
+    def take_over(self, unit, epoch, previous):
+        """Sebelum menjalankan unit yang dipindah: minta agent lama mematikannya. Mengembalikan pesan error bila agent lama
+        menjawab tetapi menolak; agent lama yang tidak terjangkau sudah mematikan unitnya sendiri (terisolasi)."""
+        if not previous or previous not in self.peers: return None
+        try:
+            self.peer_request(previous, 'POST', f"/units/{urllib.parse.quote(unit)}/fence?epoch={epoch}")
+        except urllib.error.HTTPError as e:
+            return f"agent lama '{previous}' menolak fence {unit}: {e}"
+        except (urllib.error.URLError, OSError) as e:
+            logging.warning(f"AGENT: Agent lama '{previous}' tidak terjangkau saat mengambil alih {unit} ({e}); agent itu mem-fence sendiri.")
+        return None
+
+    def cpu_sampler(self):
+        previous = read_proc_stat_cpu()
+        while True:
+            time.sleep(CPU_SAMPLE_SECONDS)
+            try:
+                current = read_proc_stat_cpu()
+                if current[0] > previous[0]: self.cpu_idle_fraction = (current[1] - previous[1]) / (current[0] - previous[0])
+                previous = current
+            except (OSError, ValueError) as e:
+                logging.warning(f"AGENT: Gagal membaca /proc/stat: {e}")
+
+    def status(self):
+        try: mem_available_mb = read_mem_available_mb()
+        except OSError: mem_available_mb = None
+        return {'agent_id': self.agent_id, 'backend': self.backend.name, 'cpu_cores': self.cpu_cores, 'cpu_idle_fraction': self.cpu_idle_fraction,
+                'mem_available_mb': mem_available_mb, 'max_streams': self.max_streams, 'uptime_seconds': int(time.time() - self.started_at),
+                'units': self.backend.running_units(), 'fenced': sorted(self.fenced), 'lease_seconds': self.lease_seconds,
+                'peers': sorted(self.peers), 'controller_lost': self.controller_lost}
+
+    def wait_ingest(self, unit, remote_port, wait_seconds):
+        # Controller cukup satu request; agent yang memeriksa /proc berulang sampai koneksi terbentuk
+        deadline = time.monotonic() + min(max(wait_seconds, 0), INGEST_WAIT_MAX_SECONDS)
+        while True:
+            if self.backend.ingest_connected(unit, remote_port): return True
+            if time.monotonic() >= deadline: return False
+            time.sleep(0.05)
+
+
+class AgentHandler(BaseHTTPRequestHandler):
+    agent = None # Diisi serve()
+
+    def log_message(self, format, *args):
+        logging.debug("AGENT: %s - %s", self.address_string(), format % args)
+
+    def reply(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def reply_result(self, result):
+        if result.returncode == 0: return self.reply(200, {'status': 'success', 'output': result.stdout})
+        self.reply(500, {'status': 'error', 'message': (result.stderr or result.stdout or '').strip(), 'returncode': result.returncode})
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}') if length else {}
+
+    def route(self, method):
+        # Fail closed: unit yang ditulis lewat agent dijalankan sebagai root
+        if not (self.agent.token and hmac.compare_digest(self.headers.get('X-StreamHib-Agent-Token', ''), self.agent.token)) and \
+                not (self.agent.allow_anonymous and not self.agent.token):
+            return self.reply(401, {'status': 'error', 'message': 'Token agent tidak valid.'})
+        if not self.headers.get('X-StreamHib-Peer'): # Hanya request controller yang memperpanjang lease
+            self.agent.renew_lease(self.headers.get('X-StreamHib-Lease-Seconds'))
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        parts = [urllib.parse.unquote(part) for part in url.path.strip('/').split('/')]
+        backend = self.agent.backend
+        try:
+            if method == 'GET' and parts == ['status']:
+                return self.reply(200, self.agent.status())
+            if method == 'GET' and parts == ['ping']:
+                return self.reply(200, {'status': 'success', 'agent_id': self.agent.agent_id})
+            if method == 'PUT' and parts == ['peers']:
+                self.agent.peers = {peer_id: url for peer_id, url in (self.read_json().get('peers') or {}).items() if peer_id != self.agent.agent_id}
+                return self.reply(200, {'status': 'success', 'peers': sorted(self.agent.peers)})
+            if method == 'POST' and parts == ['reload']:
+                return self.reply_result(backend.reload())
+            if method == 'POST' and parts == ['show']:
+                data = self.read_json()
+                units, properties = data.get('units') or [], data.get('properties') or []
+                if not all(UNIT_NAME_RE.match(unit) for unit in units) or not all(SHOW_PROPERTY_RE.match(prop) for prop in properties):
+                    return self.reply(400, {'status': 'error', 'message': 'Nama unit atau properti tidak valid.'})
+                return self.reply(200, {'status': 'success', 'output': backend.show(units, properties) if units else ''})
+            if len(parts) < 2 or parts[0] != 'units' or not UNIT_NAME_RE.match(parts[1]):
+                return self.reply(404, {'status': 'error', 'message': 'Endpoint tidak ditemukan.'})
+            unit = parts[1]
+            if method == 'PUT' and len(parts) == 2:
+                backend.write_unit(unit, self.read_json()['content'])
+                if 'epoch' in query: self.agent.set_unit_epoch(unit, query['epoch'][0])
+                logging.info(f"AGENT: Unit {unit} ditulis.")
+                return self.reply_result(backend.reload()) if query.get('reload', ['1'])[0] == '1' else self.reply(200, {'status': 'success'})
+            if method == 'DELETE' and len(parts) == 2:
+                backend.action('stop', unit)
+                backend.remove_unit(unit)
+                self.agent.unfence(unit)
+                logging.info(f"AGENT: Unit {unit} dihentikan dan dihapus.")
+                return self.reply_result(backend.reload())
+            if method == 'POST' and parts[2:] == ['fence']:
+                epoch = int(query['epoch'][0])
+                with self.agent.fence_lock: stale = self.agent.unit_epochs.get(unit, 0) < epoch
+                if stale and unit in backend.running_units(): self.agent.fence(unit, f"dipindah ke agent lain (epoch {epoch}).")
+                return self.reply(200, {'status': 'success', 'fenced': stale})
+            if method == 'POST' and len(parts) == 3 and parts[2] in ('start', 'stop', 'restart'):
+                logging.info(f"AGENT: {parts[2]} {unit}")
+                if parts[2] != 'stop' and 'epoch' in query:
+                    self.agent.set_unit_epoch(unit, query['epoch'][0])
+                    refused = self.agent.take_over(unit, query['epoch'][0], query.get('previous', [None])[0])
+                    if refused: return self.reply(409, {'status': 'error', 'message': refused})
+                if parts[2] != 'stop': self.agent.unfence(unit)
+                return self.reply_result(backend.action(parts[2], unit))
+            if method == 'GET' and parts[2:] == ['journal']:
+                return self.reply(200, {'status': 'success', 'output': backend.journal(unit, int(query.get('lines', ['80'])[0]), query.get('since', [None])[0])})
+            if method == 'GET' and parts[2:] == ['ingest']:
+                connected = self.agent.wait_ingest(unit, int(query['port'][0]), float(query.get('wait', ['0'])[0]))
+                return self.reply(200, {'status': 'success', 'connected': connected})
+            return self.reply(404, {'status': 'error', 'message': 'Endpoint tidak ditemukan.'})
+        except (KeyError, ValueError) as e:
+            return self.reply(400, {'status': 'error', 'message': f'Request tidak valid: {e}'})
+        except Exception as e:
+            logging.error(f"AGENT: Error {method} {url.path}: {e}", exc_info=True)
+            return self.reply(500, {'status': 'error', 'message': str(e)})
+
+    def do_GET(self): self.route('GET')
+    def do_POST(self): self.route('POST')
+    def do_PUT(self): self.route('PUT')
+    def do_DELETE(self): self.route('DELETE')
+
+
+def serve(agent, host, port):
+    AgentHandler.agent = agent
+    threading.Thread(target=agent.cpu_sampler, name="agent-cpu-sampler", daemon=True).start()
+    threading.Thread(target=agent.fence_watchdog, name="agent-fence", daemon=True).start()
+    server = ThreadingHTTPServer((host, port), AgentHandler)
+    server.daemon_threads = True
+    logging.info(f"AGENT: '{agent.agent_id}' ({agent.backend.name}) mendengarkan di {host}:{port}")
+    server.serve_forever()
+
+
+def is_loopback_host(host):
+    if host == 'localhost': return True
+    try: return ipaddress.ip_address(host).is_loopback
+    except ValueError: return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Agent host StreamHib untuk mode cluster.')
+    parser.add_argument('--id', default=os.environ.get('STREAMHIB_AGENT_ID') or os.uname().nodename)
+    parser.add_argument('--host', default=os.environ.get('STREAMHIB_AGENT_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('STREAMHIB_AGENT_PORT', '5100')))
+    parser.add_argument('--token', default=os.environ.get('STREAMHIB_AGENT_TOKEN', ''), help='Harus sama dengan STREAMHIB_AGENT_TOKEN panel')
+    parser.add_argument('--unit-dir', default=os.environ.get('STREAMHIB_SERVICE_DIR', '/etc/systemd/system'))
+    parser.add_argument('--simulate', action='store_true', help='Unit disimulasikan di memori (uji beberapa agent di localhost)')
+    parser.add_argument('--cpu-cores', type=float, help='Kapasitas CPU yang diumumkan ke controller (default: jumlah core host)')
+    parser.add_argument('--max-streams', type=int, default=0, help='Batas jumlah stream di agent ini (0 = hanya dibatasi CPU/memori)')
+    parser.add_argument('--lease-seconds', type=float, default=DEFAULT_LEASE_SECONDS,
+                        help='Lease awal sebelum kontak pertama controller (selanjutnya mengikuti controller)')
+    args = parser.parse_args()
+    logging.basicConfig(level=os.environ.get('STREAMHIB_LOG_LEVEL', 'INFO').upper(), format='%(asctime)s [%(levelname)s] %(message)s')
+    allow_anonymous = args.simulate or is_loopback_host(args.host)
+    if not args.token and not allow_anonymous:
+        parser.error('--token (atau STREAMHIB_AGENT_TOKEN) wajib jika agent mendengarkan selain loopback dan tidak --simulate')
+    os.makedirs(args.unit_dir, exist_ok=True)
+    backend = (SimulatedBackend if args.simulate else SystemdBackend)(args.unit_dir)
+    serve(Agent(args.id, backend, args.token, args.cpu_cores, args.max_streams, allow_anonymous, args.lease_seconds), args.host, args.port)
+
+
+if __name__ == '__main__':
+    main()
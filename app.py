@@ -1,9 +1,18 @@
-from flask import Flask, request, render_template, jsonify, redirect, url_for, session
+import os
+# Mode multi-worker (STREAMHIB_MESSAGE_QUEUE diisi): client message queue Socket.IO memakai socket blocking,
+# jadi eventlet harus di-patch sebelum modul lain di-import agar listener antrean tidak membekukan hub.
+if os.environ.get('STREAMHIB_MESSAGE_QUEUE'):
+    import eventlet
+    eventlet.monkey_patch()
+from flask import Flask, request, render_template, jsonify, redirect, url_for, session, g, Response
 from flask_socketio import SocketIO
-import shlex
 import subprocess
-import os
 import logging
+import logging.handlers
+import sys
+import contextvars
+import itertools
+from contextlib import contextmanager, closing
 from functools import wraps
 import re
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -12,50 +21,455 @@ import json
 from flask_cors import CORS
 from filelock import FileLock
 from pytz import timezone # Pastikan pytz terinstal: pip install pytz
-from threading import Lock
+from threading import Lock, RLock
 import shutil
 from flask import send_from_directory
 from apscheduler.jobstores.base import JobLookupError # Tambahkan import ini
-
-# Konfigurasi logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s [%(levelname)s] %(message)s')
-
-# Path Konfigurasi
-SESSION_FILE = '/root/StreamHibV2/sessions.json'
+from apscheduler.jobstores.memory import MemoryJobStore
+import hashlib
+import struct
+import mmap
+import zlib
+import fcntl
+import atexit
+import sqlite3
+import threading
+import queue
+from collections import deque
+import time
+import uuid
+import http.cookiejar
+import urllib.request
+import urllib.parse
+import urllib.error
+import http.client
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from eventlet import tpool # Thread pool OS eventlet untuk panggilan blocking dari greenlet
+except ImportError:
+    tpool = None
+
+# Path Konfigurasi (bisa diganti lewat environment STREAMHIB_*, misal untuk pengujian/tools)
+DATA_DIR = os.environ.get('STREAMHIB_DATA_DIR', '/root/StreamHibV2')
+SESSION_FILE = os.environ.get('STREAMHIB_SESSION_FILE', os.path.join(DATA_DIR, 'sessions.json'))
 LOCK_FILE = SESSION_FILE + '.lock'
-VIDEO_DIR = "videos"
-SERVICE_DIR = "/etc/systemd/system"
-USERS_FILE = '/root/StreamHibV2/users.json'
-os.makedirs(os.path.dirname(SESSION_FILE), exist_ok=True)
-os.makedirs(VIDEO_DIR, exist_ok=True)
+VIDEO_DIR = os.environ.get('STREAMHIB_VIDEO_DIR', "videos")
+SERVICE_DIR = os.environ.get('STREAMHIB_SERVICE_DIR', "/etc/systemd/system")
+USERS_FILE = os.environ.get('STREAMHIB_USERS_FILE', os.path.join(DATA_DIR, 'users.json'))
+STATE_SNAPSHOT_FILE = os.path.join(DATA_DIR, 'state_snapshot.json') # Cache hangat (bitrate ffprobe, latensi start) untuk restart cepat
+STATE_SNAPSHOT_INTERVAL_MINUTES = 5
+LEADER_STATE_FILE = os.path.join(DATA_DIR, 'leader_state.json') # State yang hanya dihitung leader scheduler, dibaca worker follower
+SESSION_EVENTS_DB = os.path.join(DATA_DIR, 'session_events.sqlite') # Riwayat transisi sesi + rollup uptime per hari
+PLAYLIST_DIR = os.path.join(DATA_DIR, 'playlists') # Daftar ffconcat + symlink media per sesi playlist
+PLAYLIST_MAX_ITEMS = 200
+PLAYLIST_FEEDER = os.environ.get('STREAMHIB_PLAYLIST_FEEDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'playlist_feeder.py'))
+
+# ---- KONFIGURASI LOGGING ----
+# Semua log dikirim lewat QueueHandler ke thread QueueListener, sehingga hot path tidak pernah menunggu
+# disk/journal. Level per subsistem lewat STREAMHIB_LOG_LEVELS, misal "scheduler=DEBUG,systemd=WARNING".
+LOG_LEVEL = os.environ.get('STREAMHIB_LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = dict(item.strip().split('=', 1) for item in os.environ.get('STREAMHIB_LOG_LEVELS', '').split(',') if '=' in item)
+LOG_FILE = os.environ.get('STREAMHIB_LOG_FILE', os.path.join(DATA_DIR, 'logs', 'streamhib.log')) # Kosong = hanya stderr
+LOG_ROTATE_WHEN = os.environ.get('STREAMHIB_LOG_ROTATE_WHEN', '') # '' = rotasi per ukuran, 'midnight'/'H' = per waktu
+LOG_MAX_BYTES = int(os.environ.get('STREAMHIB_LOG_MAX_BYTES', 20 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('STREAMHIB_LOG_BACKUP_COUNT', 7))
+LOG_JSON = os.environ.get('STREAMHIB_LOG_JSON') == '1' # Satu objek JSON per baris (untuk Loki/ELK)
+LOG_CONSOLE_LEVEL = os.environ.get('STREAMHIB_LOG_CONSOLE_LEVEL', LOG_LEVEL).upper()
+# Subsistem -> logger yang diatur levelnya (termasuk logger library pihak ketiga yang bising)
+LOG_SUBSYSTEMS = {
+    'scheduler': ('streamhib.scheduler', 'apscheduler'),
+    'systemd': ('streamhib.systemd',),
+    'api': ('streamhib.api', 'werkzeug'),
+    'socket': ('streamhib.socket', 'socketio', 'engineio'),
+    'download': ('streamhib.download',),
+    'sync': ('streamhib.sync',),
+    'state': ('streamhib.state',), # File sesi/pengguna, snapshot, riwayat, trace, boot
+}
+LOG_SUBSYSTEM_DEFAULTS = {'apscheduler': 'WARNING', 'socketio': 'WARNING', 'engineio': 'WARNING'} # Log per eksekusi job/paket
+
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {'ts': datetime.fromtimestamp(record.created).astimezone().isoformat(timespec='milliseconds'),
+                 'level': record.levelname, 'logger': record.name, 'thread': record.threadName, 'msg': record.getMessage()}
+        if record.exc_info: entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+logging_listener = None
+logging_setup_lock = Lock()
+
+def setup_logging():
+    """Dipanggil dari create_app()/CLI, bukan saat import; pemanggilan berikutnya tidak melakukan apa-apa."""
+    global logging_listener
+    with logging_setup_lock:
+        if logging_listener is None: logging_listener = start_logging_listener()
+
+def start_logging_listener():
+    formatter = JsonLogFormatter() if LOG_JSON else logging.Formatter('%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+    console = logging.StreamHandler()
+    console.setLevel(LOG_CONSOLE_LEVEL)
+    handlers = [console]
+    if LOG_FILE:
+        os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+        if LOG_ROTATE_WHEN:
+            handlers.append(logging.handlers.TimedRotatingFileHandler(LOG_FILE, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'))
+        else:
+            handlers.append(logging.handlers.RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'))
+    for handler in handlers: handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(LOG_LEVEL)
+    for subsystem, logger_names in LOG_SUBSYSTEMS.items():
+        for name in logger_names:
+            level = LOG_LEVELS.get(subsystem) or LOG_SUBSYSTEM_DEFAULTS.get(name)
+            if level: logging.getLogger(name).setLevel(level.upper())
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop) # Kuras antrean sebelum proses keluar
+    return listener
+
+log_scheduler = logging.getLogger('streamhib.scheduler')
+log_systemd = logging.getLogger('streamhib.systemd')
+log_api = logging.getLogger('streamhib.api')
+log_socket = logging.getLogger('streamhib.socket')
+log_download = logging.getLogger('streamhib.download')
+log_sync = logging.getLogger('streamhib.sync')
+log_state = logging.getLogger('streamhib.state')
 
 # ---- TAMBAHKAN KONFIGURASI MODE TRIAL DI SINI ----
 TRIAL_MODE_ENABLED = False  # Ganti menjadi False/true untuk mengubah
 TRIAL_RESET_HOURS = 2    # Atur interval reset (dalam jam)
 
+# ---- KONFIGURASI I/O BLOCKING ----
+# Server eventlet berjalan tanpa monkey-patching: subprocess dan FileLock yang dipanggil dari greenlet
+# request/websocket dialihkan ke tpool eventlet (ukuran pool: env EVENTLET_THREADPOOL_SIZE, default 20).
+COMMAND_TIMEOUT_SECONDS = 30 # Batas waktu default setiap pemanggilan systemctl/journalctl/ffprobe
+
+# ---- KONFIGURASI INSTRUMENTASI ----
+EMIT_STATS_ENABLED = os.environ.get('STREAMHIB_EMIT_STATS') == '1' # Catat biaya fan-out setiap socketio.emit (untuk load test)
+# STREAMHIB_TRACE=1: span per request HTTP/Socket.IO dan per job scheduler, dengan child span untuk subprocess,
+# tunggu FileLock, encode/decode JSON, create_service_file dan emit. Format Chrome Trace Event (ui.perfetto.dev).
+TRACE_ENABLED = os.environ.get('STREAMHIB_TRACE') == '1'
+TRACE_FILE = os.environ.get('STREAMHIB_TRACE_FILE', os.path.join(DATA_DIR, 'traces', 'trace.json'))
+TRACE_SLOW_MS = float(os.environ.get('STREAMHIB_TRACE_SLOW_MS', '0')) # >0: hanya trace yang root span-nya minimal selama ini
+TRACE_MAX_BYTES = 20 * 1024 * 1024 # Ukuran file trace sebelum dirotasi (trace.json.1, .2, ...)
+TRACE_BACKUP_COUNT = 5
+
+# ---- KONFIGURASI RECONCILER ----
+RECONCILE_INTERVAL_SECONDS = 30 # Interval penyelarasan sessions.json/jadwal dengan unit stream yang berjalan
+STREAM_UNIT_DEAD_STATES = ('inactive', 'failed') # ActiveState lain (active, activating/auto-restart, reloading, deactivating) = unit masih hidup
+
+# ---- KONFIGURASI SCHEDULER ----
+SCHEDULER_JOBSTORE_FILE = os.path.join(DATA_DIR, 'jobs.sqlite') # Job store persisten APScheduler (butuh SQLAlchemy)
+SCHEDULE_MISFIRE_GRACE_SECONDS = 3600 # Job yang terlewat (misal panel sedang restart) tetap dijalankan dalam batas ini
+SCHEDULE_JOBS_VERSION = 6 # Naikkan jika fungsi/argumen job jadwal berubah agar job store dibangun ulang
+SCHEDULE_PREWARM_SECONDS = 30 # Persiapan (unit file, page cache, validasi) dilakukan sekian detik sebelum jadwal mulai
+PREWARM_READ_BYTES = 64 * 1024 * 1024 # Jumlah byte awal video yang dimuat ke page cache saat pre-warm
+FIRST_PACKET_TIMEOUT_SECONDS = 30 # Batas waktu menunggu koneksi ingest pertama saat mengukur latensi start
+START_LATENCY_HISTORY = 200 # Jumlah catatan latensi start terjadwal yang disimpan di memori
+SCHEDULE_BATCH_WINDOW_SECONDS = 0.5 # Job start/stop yang jalan dalam jendela ini digabung menjadi satu batch
+SCHEDULE_BATCH_WORKERS = 8 # Jumlah systemctl start/stop paralel dalam satu batch
+SCHEDULE_BATCH_STAGGER_SECONDS = 0 # Jeda antar start dalam satu batch untuk meratakan lonjakan CPU (0 = tanpa jeda)
+
+# ---- KONFIGURASI SIMULCAST ----
+PLATFORM_URLS = {
+    "YouTube": "rtmp://a.rtmp.youtube.com/live2",
+    "Facebook": "rtmps://live-api-s.facebook.com:443/rtmp",
+}
+PLATFORM_BACKUP_URLS = { # Ingest cadangan untuk failover otomatis
+    "YouTube": "rtmp://b.rtmp.youtube.com/live2?backup=1",
+}
+SIMULCAST_MAX_DESTINATIONS = 5 # Tujuan per sesi; semua dilayani satu proses ffmpeg (tee muxer)
+DESTINATION_HEALTH_JOURNAL_LINES = 2000 # Baris journal terakhir yang diperiksa untuk status per tujuan
+
+# ---- KONFIGURASI RESTART & FAILOVER ----
+# systemd me-restart ffmpeg dengan backoff eksponensial dari STREAM_RESTART_SEC sampai
+# STREAM_RESTART_MAX_DELAY_SEC dalam STREAM_RESTART_STEPS langkah (RestartSteps butuh systemd >= 254;
+# versi lama memakai RestartSec tetap). monitor_stream_health mendeteksi kegagalan permanen dan failover.
+STREAM_RESTART_SEC = 2
+STREAM_RESTART_MAX_DELAY_SEC = 120
+STREAM_RESTART_STEPS = 6
+STREAM_START_LIMIT_INTERVAL_SEC = 1800 # Lebih dari STREAM_START_LIMIT_BURST start dalam interval ini = unit failed
+STREAM_START_LIMIT_BURST = 30
+STREAM_HEALTH_INTERVAL_SECONDS = 15
+PERMANENT_FAILURE_PATTERNS = [ # Error yang tidak akan hilang dengan restart (key/auth ditolak, input hilang/rusak)
+    r'Server error: [^\n]*(?:auth|key|denied|reject|invalid)',
+    r'NetStream\.Publish\.(?:BadName|Denied|Rejected)',
+    r'401 Unauthorized', r'403 Forbidden',
+    r'No such file or directory',
+    r'Invalid data found when processing input',
+]
+PERMANENT_FAILURE_CONFIRMATIONS = 2  # Error permanen harus terlihat di sekian kegagalan berturut-turut
+FAILOVER_AFTER_FAILURES = 3          # Kegagalan berturut-turut sebelum pindah ke ingest cadangan
+STREAM_RECOVERY_TIMEOUT_SECONDS = 1800
+STREAM_INCIDENT_HISTORY = 20         # Insiden terakhir yang disimpan per sesi
+
+# ---- KONFIGURASI LOG LIVE ----
+# Satu proses "journalctl -f" per unit stream, dibagi ke semua dashboard yang menonton sesi tersebut.
+LOG_TAIL_BUFFER_LINES = 500       # Ring buffer per unit, dikirim ke penonton yang baru bergabung
+LOG_TAIL_CLIENT_QUEUE_LINES = 1000 # Antrean per penonton; jika penuh, baris tertua dibuang (klien lambat)
+LOG_TAIL_BATCH_SECONDS = 0.25     # Baris dikumpulkan lalu dikirim sebagai satu event per interval
+LOG_TAIL_ACK_TIMEOUT_SECONDS = 10 # Batch tanpa ack dalam waktu ini dianggap hilang
+LOG_TAIL_IDLE_SECONDS = 15        # Reader dihentikan setelah sekian detik tanpa penonton
+LOG_TAIL_MAX_LINE_CHARS = 2000
+
+# ---- KONFIGURASI ENCODING ----
+# 'copy' meneruskan stream apa adanya. Profil transcode: bitrate target, GOP (detik) dan tinggi resolusi
+# (None = resolusi asli). 'preset' adalah preset x264 terbaik yang boleh dipakai; dengan 'adaptive'
+# preset diturunkan saat ffmpeg tidak sanggup real-time dan dinaikkan lagi saat server longgar.
+# 'cpu_cores' dan 'memory_mb' adalah perkiraan beban untuk capacity planner dan admission control.
+ENCODING_PROFILES = {
+    'copy':  {'mode': 'copy'},
+    '1080p': {'mode': 'transcode', 'video_bitrate_kbps': 4500, 'audio_bitrate_kbps': 128, 'gop_seconds': 2, 'height': 1080, 'preset': 'veryfast', 'adaptive': True, 'cpu_cores': 2.0, 'memory_mb': 400},
+    '720p':  {'mode': 'transcode', 'video_bitrate_kbps': 3000, 'audio_bitrate_kbps': 128, 'gop_seconds': 2, 'height': 720, 'preset': 'veryfast', 'adaptive': True, 'cpu_cores': 1.0, 'memory_mb': 300},
+    '480p':  {'mode': 'transcode', 'video_bitrate_kbps': 1500, 'audio_bitrate_kbps': 96, 'gop_seconds': 2, 'height': 480, 'preset': 'veryfast', 'adaptive': True, 'cpu_cores': 0.5, 'memory_mb': 200},
+}
+DEFAULT_ENCODING_PROFILE = 'copy'
+X264_PRESETS = ['ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow'] # Urut dari paling ringan
+ADAPTIVE_PRESET_INTERVAL_SECONDS = 30   # Interval pemeriksaan speed ffmpeg
+ADAPTIVE_PRESET_COOLDOWN_SECONDS = 120  # Jeda minimal setelah start/ganti preset sebelum dinilai lagi
+ADAPTIVE_SPEED_LOW = 0.98               # Rata-rata speed di bawah ini = encoder tertinggal, preset diturunkan
+ADAPTIVE_HEADROOM_LOAD = 0.6            # Load average per core di bawah ini (dan speed >= 1.0x) = ada ruang
+ADAPTIVE_STEP_UP_CHECKS = 4             # Jumlah pemeriksaan longgar berturut-turut sebelum preset dinaikkan
+
+# ---- KONFIGURASI RESOURCE & ADMISSION ----
+# Semua unit stream masuk STREAM_SLICE; slice dibatasi agar selalu ada sisa CPU/memori untuk panel.
+STREAM_SLICE = 'streamhib.slice'
+STREAM_SLICE_RESERVED_CORES = 0.5     # Core yang tidak boleh dipakai slice stream (untuk panel & sistem)
+STREAM_SLICE_MEMORY_MAX = '90%'       # Batas memori total semua stream
+STREAM_COPY_LIMITS = {'CPUQuota': '50%', 'MemoryMax': '256M', 'IOWeight': 50, 'Nice': 5} # Per unit -c copy
+STREAM_TRANSCODE_CPU_QUOTA_FACTOR = 1.5 # CPUQuota transcode = cpu_cores profil x faktor ini; MemoryMax = 2x memory_mb
+STREAM_COPY_MEMORY_MB = 64            # Perkiraan memori satu stream -c copy
+ADMISSION_ENABLED = True
+ADMISSION_MIN_CPU_HEADROOM = 0.15     # Fraksi CPU host yang harus tetap idle setelah stream baru berjalan
+ADMISSION_MIN_MEM_AVAILABLE_MB = 300  # MemAvailable minimal setelah stream baru berjalan
+ADMISSION_RETRY_SECONDS = 15          # Start terjadwal yang ditolak dicoba lagi setiap sekian detik...
+ADMISSION_QUEUE_TIMEOUT_SECONDS = 600 # ...sampai batas ini, lalu dibatalkan
+HOST_CPU_SAMPLE_SECONDS = 5           # Interval sampling /proc/stat
+
+# ---- KONFIGURASI SAMPLING RESOURCE STREAM ----
+# CPU, memori dan baca disk tiap unit dibaca langsung dari cgroup v2 slice stream (tanpa fork per stream);
+# byte jaringan dari IPAccounting systemd lewat satu "systemctl show" untuk semua unit per interval.
+CGROUP_ROOT = os.environ.get('STREAMHIB_CGROUP_ROOT', '/sys/fs/cgroup')
+STREAM_SAMPLE_INTERVAL_SECONDS = 10
+STREAM_SAMPLE_HISTORY = 90 # Sampel per sesi (90 x 10 detik = 15 menit)
+
+# ---- KONFIGURASI CAPACITY PLANNER ----
+HOST_EGRESS_MBPS = 100                # Kapasitas upload VPS yang boleh dipakai stream (Mbps)
+HOST_CPU_BUDGET_CORES = os.cpu_count() or 1 # Jumlah core yang boleh dipakai stream
+STREAM_COPY_CPU_CORES = 0.05          # Perkiraan beban CPU satu stream -c copy
+STREAM_DEFAULT_BITRATE_KBPS = 4500    # Dipakai jika bitrate video tidak bisa dibaca ffprobe
+STREAM_PROTOCOL_OVERHEAD = 1.05       # Overhead RTMP/FLV di atas bitrate video
+CAPACITY_POLICY = 'warn'              # 'warn' = jadwal tetap disimpan dengan peringatan, 'reject' = jadwal ditolak
+CAPACITY_HORIZON_DAYS = 7             # Rentang timeline yang dihitung (resolusi per menit)
+
+# ---- KONFIGURASI MULTI-WORKER ----
+# Beberapa proses app.py (STREAMHIB_PORT berbeda, STREAMHIB_WORKER_ID unik) di belakang nginx dengan ip_hash
+# (Socket.IO butuh sticky session). STREAMHIB_MESSAGE_QUEUE menunjuk broker lokal, misal redis/valkey di
+# redis://127.0.0.1:6379/0, agar broadcast dari worker mana pun sampai ke klien semua worker.
+# Hanya satu worker (pemegang lease file) yang menjalankan scheduler dan poller systemd.
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('STREAMHIB_MESSAGE_QUEUE') or None
+WORKER_ID = os.environ.get('STREAMHIB_WORKER_ID', '')
+SCHEDULER_LEASE_FILE = os.path.join(DATA_DIR, 'scheduler.lease') # flock dilepas kernel saat proses leader mati
+SCHEDULER_LEASE_RETRY_SECONDS = 5 # Interval follower mencoba mengambil alih lease
+SHARED_JOBSTORE_POLL_SECONDS = 5  # Leader memeriksa job store tiap sekian detik untuk job yang ditambah follower
+
+# ---- KONFIGURASI CLUSTER ----
+# Mode cluster: panel menjadi controller, unit stream dijalankan agent.py di host lain. Format:
+# STREAMHIB_CLUSTER_AGENTS="vps1=http://10.0.0.2:5100,vps2=http://10.0.0.3:5100" (kosong = mode satu host).
+# Agent harus melihat VIDEO_DIR dan PLAYLIST_DIR di path yang sama (mount bersama atau "app.py sync pull").
+CLUSTER_AGENTS = dict(item.strip().split('=', 1) for item in os.environ.get('STREAMHIB_CLUSTER_AGENTS', '').split(',') if '=' in item)
+CLUSTER_AGENT_TOKEN = os.environ.get('STREAMHIB_AGENT_TOKEN', '') # Sama dengan --token setiap agent
+CLUSTER_HEALTH_INTERVAL_SECONDS = 5
+CLUSTER_AGENT_DEAD_SECONDS = 20 # Agent yang tidak merespons selama ini dianggap mati dan stream-nya dipindah
+# Agent tanpa kontak controller selama ini memeriksa agent lain; unit hanya dimatikan jika ada peer yang juga tidak
+# terjangkau (agent terisolasi). Panel yang restart/mati lebih lama dari lease tidak menghentikan stream.
+CLUSTER_AGENT_LEASE_SECONDS = 12
+CLUSTER_FENCE_MARGIN_SECONDS = 5 # Jeda tambahan setelah lease habis (termasuk cek peer agent) sebelum stream dijalankan di agent lain
+CLUSTER_HTTP_TIMEOUT = 10
+CLUSTER_PLACEMENTS_FILE = os.path.join(DATA_DIR, 'cluster_placements.json') # service -> agent, dibagi antar worker
+if CLUSTER_AGENTS and 'STREAMHIB_SERVICE_DIR' not in os.environ:
+    SERVICE_DIR = os.path.join(DATA_DIR, 'cluster-units') # Salinan isi unit yang diinginkan; systemd lokal tidak dipakai
+
+# ---- KONFIGURASI DOWNLOAD MANAGER ----
+# Antrean job + cache Drive ID -> nama file (per worker, karena antrean download ada di memori proses)
+DOWNLOAD_JOBS_FILE = os.path.join(DATA_DIR, f'downloads-{WORKER_ID}.json' if WORKER_ID else 'downloads.json')
+DOWNLOAD_TMP_DIR = os.path.join(VIDEO_DIR, '.downloads') # Folder kerja per job (dipakai untuk resume)
+DOWNLOAD_MAX_CONCURRENT = 2       # Jumlah download yang boleh berjalan bersamaan
+DOWNLOAD_TIMEOUT_SECONDS = 1800   # Batas waktu per job download
+DOWNLOAD_PROGRESS_INTERVAL = 1.0  # Interval (detik) pengiriman progres lewat Socket.IO
+DOWNLOAD_HISTORY_LIMIT = 50       # Jumlah job selesai yang tetap disimpan di downloads.json
+GDRIVE_DOWNLOAD_URL = 'https://drive.google.com/uc' # Bisa diarahkan ke server HTTP lokal untuk pengujian
+DOWNLOAD_SEGMENTS = 8                        # Jumlah koneksi paralel (byte-range) per file
+DOWNLOAD_MIN_SEGMENT_BYTES = 8 * 1024 * 1024 # File lebih kecil dari ini tidak dipecah lebih jauh
+DOWNLOAD_SEGMENT_RETRIES = 5                 # Percobaan ulang per segmen sebelum job dianggap gagal
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024           # Ukuran baca per iterasi
+DOWNLOAD_HTTP_TIMEOUT = 30                   # Timeout socket per request (detik)
+
+# ---- KONFIGURASI PREFLIGHT VIDEO ----
+# Video MP4/MOV dengan moov atom di akhir file atau interleaving audio/video yang buruk di-remux tanpa
+# re-encode (-c copy -movflags +faststart) di background setelah download atau atas permintaan.
+VIDEO_PREFLIGHT_FILE = os.path.join(DATA_DIR, 'video_preflight.json')
+VIDEO_PREFLIGHT_LOCK_DIR = os.path.join(DATA_DIR, 'preflight-locks') # FileLock per video, dipakai bersama semua worker
+VIDEO_PREFLIGHT_EXTENSIONS = ('.mp4', '.m4v', '.mov')
+VIDEO_PREFLIGHT_PROBE_SECONDS = 10      # Rentang awal video yang paketnya diperiksa
+VIDEO_INTERLEAVE_MAX_RATIO = 2.0        # Rentang byte paket / total byte paket di atas ini = interleaving buruk
+VIDEO_INTERLEAVE_MIN_SPAN_BYTES = 4 * 1024 * 1024 # File kecil tidak dianggap bermasalah
+VIDEO_REMUX_TIMEOUT_SECONDS = 1800
+
+# ---- KONFIGURASI SINKRONISASI DELTA ----
+# Ekspor/impor library video + sessions.json/users.json antar panel: file yang sha256-nya sama dilewati,
+# file yang berbeda dikirim sebagai delta blok (checksum bergulir adler32 + blake2b) terhadap salinan lama.
+SYNC_BLOCK_SIZE = 256 * 1024
+SYNC_HASH_CACHE_FILE = os.path.join(DATA_DIR, 'sync_hash_cache.json') # sha256 per (ukuran, mtime, inode)
+SYNC_SEARCH_WINDOW_BYTES = 64 * 1024 * 1024 # Jangkauan pencarian anchor saat data bergeser (misal moov dipindah ke depan)
+SYNC_ROLL_MAX_MISSES = 4      # Pencarian bergulir per byte (lambat) berhenti setelah sekian blok beruntun tidak cocok
+SYNC_CHUNK_BYTES = 1024 * 1024
+SYNC_HTTP_TIMEOUT = 60
+SYNC_MAX_RETRIES = 5          # Transfer yang terputus dilanjutkan dari file .syncpart
+
+# Objek app/socketio dibuat tanpa efek samping; direktori, scheduler, pemulihan jadwal, download dan
+# snapshot baru diinisialisasi di create_app() (dipanggil entry point, atau "app:create_app()" untuk WSGI).
+BOOT_STARTED_MONOTONIC = time.monotonic()
 app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "http://localhost:5000", "supports_credentials": True}})
 app.secret_key = "emuhib"
-socketio = SocketIO(app, async_mode='eventlet')
+socketio = SocketIO()
+# Payload (read_sessions/run_cmd lewat tpool) dibangun SEBELUM mengambil lock; di dalam blok hanya socketio.emit,
+# karena greenlet yang menunggu tpool sambil memegang Lock akan membuat greenlet lain memblokir hub.
 socketio_lock = Lock()
 app.permanent_session_lifetime = timedelta(hours=12)
 jakarta_tz = timezone('Asia/Jakarta')
 
+# ---- TRACING ----
+# Trace aktif disimpan di contextvar (per greenlet/thread) dan ikut dibawa ke tpool lewat offload().
+# Span ditulis sebagai event "X" (complete); setiap trace mendapat tid sendiri agar tampil sebagai satu jalur.
+current_trace = contextvars.ContextVar('current_trace', default=None)
+trace_tids = itertools.count(1)
+trace_queue = queue.Queue()
+trace_writer_started = False
+trace_writer_lock = Lock()
+
+def trace_event(trace, name, started_ns, ended_ns, args):
+    trace['events'].append({'name': name, 'cat': trace['cat'], 'ph': 'X', 'ts': started_ns // 1000, 'dur': (ended_ns - started_ns) // 1000,
+                            'pid': os.getpid(), 'tid': trace['tid'], 'args': args})
+
+@contextmanager
+def trace_span(name, **args):
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.monotonic_ns()
+    try:
+        yield
+    finally:
+        trace_event(trace, name, started, time.monotonic_ns(), args)
+
+def traced(fn):
+    """Child span untuk fungsi ini bila sedang di dalam trace."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with trace_span(fn.__name__): return fn(*args, **kwargs)
+    return wrapper
+
+def begin_trace(name, cat, **args):
+    trace = {'name': name, 'cat': cat, 'tid': next(trace_tids), 'events': [], 'args': args, 'started_ns': time.monotonic_ns()}
+    return trace, current_trace.set(trace)
+
+def end_trace(trace, token):
+    current_trace.reset(token)
+    ended = time.monotonic_ns()
+    if (ended - trace['started_ns']) / 1e6 < TRACE_SLOW_MS: return # Sampling: hanya yang lambat
+    trace_event(trace, trace['name'], trace['started_ns'], ended, trace['args'])
+    trace['events'].append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': trace['tid'], 'args': {'name': trace['name']}})
+    ensure_trace_writer()
+    trace_queue.put(trace['events'])
+
+@contextmanager
+def root_trace(name, cat, **args):
+    if not TRACE_ENABLED or current_trace.get() is not None:
+        with trace_span(name, **args): yield
+        return
+    trace, token = begin_trace(name, cat, **args)
+    try:
+        yield
+    finally:
+        end_trace(trace, token)
+
+def traced_job(fn):
+    """Root trace untuk job scheduler/batch (child span bila dipanggil dari dalam trace lain)."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with root_trace(fn.__name__, 'job'): return fn(*args, **kwargs)
+    return wrapper
+
+def trace_lane(fn):
+    """Untuk ThreadPoolExecutor: span dari thread pool masuk trace pemanggil di jalur (tid) tersendiri."""
+    trace = current_trace.get()
+    if trace is None: return fn
+    def run_in_lane(*args, **kwargs):
+        token = current_trace.set(dict(trace, tid=next(trace_tids)))
+        try: return fn(*args, **kwargs)
+        finally: current_trace.reset(token)
+    return run_in_lane
+
+def ensure_trace_writer():
+    global trace_writer_started
+    with trace_writer_lock:
+        if trace_writer_started: return
+        trace_writer_started = True
+    threading.Thread(target=trace_writer, name="trace-writer", daemon=True).start()
+
+def trace_writer():
+    # JSON Array Format tanpa penutup "]" (diperbolehkan format Trace Event), satu event per baris
+    os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+    while True:
+        events = trace_queue.get()
+        try:
+            if os.path.exists(TRACE_FILE) and os.path.getsize(TRACE_FILE) >= TRACE_MAX_BYTES:
+                for index in range(TRACE_BACKUP_COUNT - 1, 0, -1):
+                    if os.path.exists(f"{TRACE_FILE}.{index}"): os.replace(f"{TRACE_FILE}.{index}", f"{TRACE_FILE}.{index + 1}")
+                os.replace(TRACE_FILE, f"{TRACE_FILE}.1")
+            is_new = not os.path.exists(TRACE_FILE)
+            with open(TRACE_FILE, 'a') as f:
+                if is_new: f.write('[\n')
+                f.writelines(json.dumps(event, default=str) + ',\n' for event in events)
+        except Exception as e:
+            log_state.warning(f"TRACE: Gagal menulis {TRACE_FILE}: {e}")
+
+@app.before_request
+def begin_request_trace():
+    if TRACE_ENABLED:
+        g.trace, g.trace_token = begin_trace(f"{request.method} {request.path}", 'request', method=request.method, path=request.path)
+
+@app.after_request
+def record_trace_status(response):
+    if TRACE_ENABLED and 'trace' in g: g.trace['args']['status'] = response.status_code
+    return response
+
+@app.teardown_request
+def end_request_trace(exc):
+    if TRACE_ENABLED and 'trace' in g:
+        if exc is not None: g.trace['args']['error'] = repr(exc)
+        end_trace(g.pop('trace'), g.pop('trace_token'))
 
 # Fungsi Helper
 # Tambahkan fungsi ini di bagian fungsi helper di app.py
 # ... (fungsi helper lain seperti sanitize_for_service_name, read_sessions, dll.) ...
+@traced_job
 def trial_reset():
     if not TRIAL_MODE_ENABLED:
-        logging.info("Mode trial tidak aktif, proses reset dilewati.")
+        log_scheduler.info("Mode trial tidak aktif, proses reset dilewati.")
         return
 
-    logging.info("MODE TRIAL: Memulai proses reset aplikasi...")
+    log_scheduler.info("MODE TRIAL: Memulai proses reset aplikasi...")
     try:
         s_data = read_sessions()
         active_sessions_copy = list(s_data.get('active_sessions', []))
         
-        logging.info(f"MODE TRIAL: Menghentikan dan menghapus {len(active_sessions_copy)} sesi aktif...")
+        log_scheduler.info(f"MODE TRIAL: Menghentikan dan menghapus {len(active_sessions_copy)} sesi aktif...")
         for item in active_sessions_copy:
             # Gunakan sanitized_service_id yang sudah ada jika ada, jika tidak, buat dari ID (nama sesi asli)
             sanitized_id_service = item.get('sanitized_service_id')
@@ -64,11 +478,11 @@ def trial_reset():
             
             service_name_to_stop = f"stream-{sanitized_id_service}.service"
             try:
-                subprocess.run(["systemctl", "stop", service_name_to_stop], check=False, timeout=15)
+                run_cmd(["systemctl", "stop", service_name_to_stop], check=False, timeout=15)
                 service_path_to_stop = os.path.join(SERVICE_DIR, service_name_to_stop)
                 if os.path.exists(service_path_to_stop):
                     os.remove(service_path_to_stop)
-                logging.info(f"MODE TRIAL: Service {service_name_to_stop} dihentikan dan dihapus.")
+                log_scheduler.debug("MODE TRIAL: Service %s dihentikan dan dihapus.", service_name_to_stop)
                 
                 # Pindahkan sesi ke inactive
                 item['status'] = 'inactive'
@@ -78,56 +492,51 @@ def trial_reset():
                 s_data['inactive_sessions'] = add_or_update_session_in_list(
                     s_data.get('inactive_sessions', []), item
                 )
+                record_session_event(item.get('id'), 'stop', 'trial_reset')
             except Exception as e_stop:
-                logging.error(f"MODE TRIAL: Gagal menghentikan/menghapus service {service_name_to_stop}: {e_stop}")
+                log_scheduler.error(f"MODE TRIAL: Gagal menghentikan/menghapus service {service_name_to_stop}: {e_stop}")
         s_data['active_sessions'] = [] # Kosongkan sesi aktif setelah diproses
 
         try:
-            subprocess.run(["systemctl", "daemon-reload"], check=False, timeout=10)
+            run_cmd(["systemctl", "daemon-reload"], check=False, timeout=10)
         except Exception as e_reload:
-            logging.error(f"MODE TRIAL: Gagal daemon-reload: {e_reload}")
+            log_scheduler.error(f"MODE TRIAL: Gagal daemon-reload: {e_reload}")
 
-        logging.info(f"MODE TRIAL: Menghapus semua ({len(s_data.get('scheduled_sessions', []))}) jadwal...")
+        log_scheduler.info(f"MODE TRIAL: Menghapus semua ({len(s_data.get('scheduled_sessions', []))}) jadwal...")
         scheduled_sessions_copy = list(s_data.get('scheduled_sessions', []))
         for sched_item in scheduled_sessions_copy:
             sanitized_id = sched_item.get('sanitized_service_id')
             schedule_def_id = sched_item.get('id') # Ini adalah ID definisi jadwal seperti 'daily-XYZ' atau 'onetime-XYZ'
-            recurrence = sched_item.get('recurrence_type')
 
             if not sanitized_id or not schedule_def_id:
-                logging.warning(f"MODE TRIAL: Melewati item jadwal karena sanitized_id atau schedule_def_id kurang: {sched_item}")
+                log_scheduler.warning(f"MODE TRIAL: Melewati item jadwal karena sanitized_id atau schedule_def_id kurang: {sched_item}")
                 continue
 
-            if recurrence == 'daily':
-                try: scheduler.remove_job(f"daily-start-{sanitized_id}")
-                except JobLookupError: logging.info(f"MODE TRIAL: Job daily-start-{sanitized_id} tidak ditemukan untuk dihapus.")
-                try: scheduler.remove_job(f"daily-stop-{sanitized_id}")
-                except JobLookupError: logging.info(f"MODE TRIAL: Job daily-stop-{sanitized_id} tidak ditemukan untuk dihapus.")
-            elif recurrence == 'one_time':
-                try: scheduler.remove_job(schedule_def_id) # schedule_def_id adalah ID job start untuk one-time
-                except JobLookupError: logging.info(f"MODE TRIAL: Job {schedule_def_id} (one-time start) tidak ditemukan untuk dihapus.")
-                if not sched_item.get('is_manual_stop', sched_item.get('duration_minutes', 0) == 0):
-                    try: scheduler.remove_job(f"onetime-stop-{sanitized_id}")
-                    except JobLookupError: logging.info(f"MODE TRIAL: Job onetime-stop-{sanitized_id} tidak ditemukan untuk dihapus.")
+            remove_schedule_jobs(sched_item)
         s_data['scheduled_sessions'] = []
+        mark_schedule_jobs_synced(s_data)
 
-        logging.info(f"MODE TRIAL: Menghapus semua file video...")
+        log_scheduler.info(f"MODE TRIAL: Menghapus semua file video...")
         videos_to_delete = get_videos_list_data() # Dapatkan daftar video sebelum menghapus
         for video_file in videos_to_delete:
             try:
                 os.remove(os.path.join(VIDEO_DIR, video_file))
-                logging.info(f"MODE TRIAL: File video {video_file} dihapus.")
+                log_scheduler.debug("MODE TRIAL: File video %s dihapus.", video_file)
             except Exception as e_vid_del:
-                logging.error(f"MODE TRIAL: Gagal menghapus file video {video_file}: {e_vid_del}")
+                log_scheduler.error(f"MODE TRIAL: Gagal menghapus file video {video_file}: {e_vid_del}")
         
         write_sessions(s_data) # Simpan perubahan pada sessions.json
         
         # Kirim pembaruan ke semua klien melalui SocketIO
+        sessions_data = get_active_sessions_data()
+        inactive_data = {"inactive_sessions": get_inactive_sessions_data()}
+        schedules_data = get_schedules_list_data()
+        videos_data = get_videos_list_data() # Daftar video akan kosong
         with socketio_lock:
-            socketio.emit('sessions_update', get_active_sessions_data())
-            socketio.emit('inactive_sessions_update', {"inactive_sessions": get_inactive_sessions_data()})
-            socketio.emit('schedules_update', get_schedules_list_data())
-            socketio.emit('videos_update', get_videos_list_data()) # Daftar video akan kosong
+            socketio.emit('sessions_update', sessions_data)
+            socketio.emit('inactive_sessions_update', inactive_data)
+            socketio.emit('schedules_update', schedules_data)
+            socketio.emit('videos_update', videos_data)
             socketio.emit('trial_reset_notification', { # Kirim notifikasi reset
                 'message': 'Aplikasi telah direset karena mode trial. Semua sesi dan video telah dihapus.'
             })
@@ -137,15 +546,15 @@ def trial_reset():
                 'message': 'Mode Trial Aktif - Reset setiap {} jam.'.format(TRIAL_RESET_HOURS) if TRIAL_MODE_ENABLED else ''
             })
 
-        logging.info("MODE TRIAL: Proses reset aplikasi selesai.")
+        log_scheduler.info("MODE TRIAL: Proses reset aplikasi selesai.")
 
     except Exception as e:
-        logging.error(f"MODE TRIAL: Error besar selama proses reset: {e}", exc_info=True)
+        log_scheduler.error(f"MODE TRIAL: Error besar selama proses reset: {e}", exc_info=True)
 
 def add_or_update_session_in_list(session_list, new_session_item):
     session_id = new_session_item.get('id')
     if not session_id:
-        logging.warning("Sesi tidak memiliki ID, tidak dapat ditambahkan/diperbarui dalam daftar.")
+        log_state.warning("Sesi tidak memiliki ID, tidak dapat ditambahkan/diperbarui dalam daftar.")
         # Kembalikan list asli jika tidak ada ID, atau handle error sesuai kebutuhan
         return session_list 
 
@@ -163,64 +572,344 @@ def sanitize_for_service_name(session_name_original):
     sanitized = sanitized.strip('-') # Hapus strip di awal/akhir
     return sanitized[:50] # Batasi panjang untuk keamanan nama file
 
-def create_service_file(session_name_original, video_path, platform_url, stream_key):
-    # Gunakan session_name_original untuk deskripsi, tapi nama service disanitasi
-    sanitized_service_part = sanitize_for_service_name(session_name_original)
-    service_name = f"stream-{sanitized_service_part}.service"
-    # Pastikan service_name unik jika sanitasi menghasilkan nama yang sama untuk session_name_original yang berbeda
-    # Ini bisa diatasi dengan menambahkan hash pendek atau timestamp jika diperlukan, tapi untuk sekarang kita jaga sederhana.
-    # Jika ada potensi konflik nama service yang tinggi, pertimbangkan untuk menggunakan UUID atau hash dari session_name_original.
+def get_platform_url(platform, backup=False):
+    if backup and platform in PLATFORM_BACKUP_URLS: return PLATFORM_BACKUP_URLS[platform]
+    return PLATFORM_URLS["YouTube"] if platform == "YouTube" else PLATFORM_URLS["Facebook"]
+
+def destination_url(dest):
+    base_url = get_platform_url(dest['platform'], backup=dest.get('ingest') == 'backup')
+    # URL cadangan YouTube membawa query (?backup=1); stream key disisipkan sebelum query
+    path, _, query = base_url.partition('?')
+    return f"{path}/{dest['stream_key']}" + (f"?{query}" if query else '')
+
+def parse_destinations(data, default_platform=None):
+    """Tujuan stream dari request: 'destinations' [{platform, stream_key}, ...] untuk simulcast,
+    atau 'platform' + 'stream_key' tunggal. Raise ValueError jika tidak valid."""
+    raw = data.get('destinations')
+    if not raw:
+        raw = [{'platform': data.get('platform', default_platform), 'stream_key': data.get('stream_key')}]
+    if not isinstance(raw, list) or len(raw) > SIMULCAST_MAX_DESTINATIONS:
+        raise ValueError(f"destinations harus berupa daftar berisi maksimal {SIMULCAST_MAX_DESTINATIONS} tujuan")
+    destinations, seen = [], set()
+    for dest in raw:
+        platform = (dest or {}).get('platform')
+        stream_key = ((dest or {}).get('stream_key') or '').strip()
+        if platform not in PLATFORM_URLS: raise ValueError(f"Platform '{platform}' tidak valid. Pilih YouTube atau Facebook.")
+        if not stream_key: raise ValueError(f"Stream key untuk {platform} wajib diisi.")
+        if (platform, stream_key) in seen: raise ValueError(f"Tujuan {platform} dengan stream key yang sama didaftarkan dua kali.")
+        seen.add((platform, stream_key))
+        destinations.append({'platform': platform, 'stream_key': stream_key})
+    return destinations
+
+def session_destinations(entry):
+    """Tujuan sesi/jadwal; entri lama (tanpa 'destinations') punya satu tujuan dari platform + stream_key."""
+    return entry.get('destinations') or [{'platform': entry.get('platform'), 'stream_key': entry.get('stream_key')}]
+
+def destination_fields(destinations):
+    # platform/stream_key tetap diisi tujuan pertama agar frontend dan data lama tetap kompatibel
+    fields = {'platform': destinations[0]['platform'], 'stream_key': destinations[0]['stream_key']}
+    if len(destinations) > 1 or any(dest.get('ingest') for dest in destinations): fields['destinations'] = destinations
+    return fields
+
+def get_encoding_profile(name):
+    return ENCODING_PROFILES.get(name or DEFAULT_ENCODING_PROFILE, ENCODING_PROFILES[DEFAULT_ENCODING_PROFILE])
+
+def parse_encoding_profile(data, default=DEFAULT_ENCODING_PROFILE):
+    name = data.get('encoding_profile') or default
+    if name not in ENCODING_PROFILES:
+        raise ValueError(f"Profil encoding '{name}' tidak dikenal. Pilihan: {', '.join(ENCODING_PROFILES)}.")
+    return name
+
+def build_codec_args(encoding_profile, x264_preset=None):
+    profile = get_encoding_profile(encoding_profile)
+    if profile['mode'] == 'copy':
+        return '-c:v copy -c:a copy'
+    video_kbps = profile['video_bitrate_kbps']
+    args = [f"-c:v libx264 -preset {x264_preset or profile['preset']} -b:v {video_kbps}k -maxrate {video_kbps}k -bufsize {video_kbps * 2}k",
+            f"-pix_fmt yuv420p -force_key_frames \"expr:gte(t,n_forced*{profile['gop_seconds']})\" -sc_threshold 0"]
+    if profile.get('height'): args.append(f"-vf scale=-2:{profile['height']}")
+    args.append(f"-c:a aac -b:a {profile['audio_bitrate_kbps']}k -ar 44100")
+    return ' '.join(args)
+
+def tee_escape(value):
+    return re.sub(r'([\\|\[\]])', r'\\\1', value)
+
+# ---- PLAYLIST ----
+# Sesi playlist memakai satu daftar datar PLAYLIST_DIR/<sanitized_id>/playlist.ffconcat berisi semua item.
+# Unit-nya menjalankan playlist_feeder.py: ffmpeg pengirim yang terhubung terus ke ingest membaca MPEG-TS
+# dari pipe, diisi pengumpan yang memutar satu item sekaligus dan membaca ulang daftar di setiap batas item.
+# Mengganti playlist sesi aktif cukup menulis ulang daftar (isi unit tidak berubah, tanpa restart); ffmpeg
+# pengirim tidak pernah berhenti sehingga koneksi RTMP tetap tersambung. Dalam mode cluster PLAYLIST_DIR
+# harus tersedia di agent pada path yang sama, seperti VIDEO_DIR.
+# Media diakses lewat symlink bernama aman (item-i.ext) agar nama file tidak perlu di-escape.
+def parse_playlist(data, encoding_profile=DEFAULT_ENCODING_PROFILE):
+    """Daftar video dari field 'playlist' (None jika tidak ada). Raise ValueError jika tidak valid."""
+    playlist = data.get('playlist')
+    if not playlist: return None
+    if not isinstance(playlist, list) or len(playlist) > PLAYLIST_MAX_ITEMS:
+        raise ValueError(f"playlist harus berupa daftar berisi maksimal {PLAYLIST_MAX_ITEMS} video")
+    for video_file in playlist:
+        if not isinstance(video_file, str) or not os.path.isfile(os.path.join(VIDEO_DIR, video_file)):
+            raise ValueError(f"File video '{video_file}' di playlist tidak ditemukan.")
+    if get_encoding_profile(encoding_profile)['mode'] == 'copy' and len(set(playlist)) > 1:
+        # -c copy tidak bisa berpindah codec/resolusi di tengah stream
+        signatures = {video_file: probe_video_signature(video_file) for video_file in set(playlist)}
+        if len(set(signatures.values())) > 1:
+            raise ValueError("Video di playlist punya codec/resolusi berbeda; samakan dulu atau pakai profil encoding transcode. "
+                             + '; '.join(f"{name}: {sig}" for name, sig in signatures.items()))
+    return playlist
+
+def probe_video_signature(video_file):
+    out = run_cmd(["ffprobe", "-v", "error", "-show_entries", "stream=codec_type,codec_name,width,height,sample_rate,channels",
+                          "-of", "csv=p=0", os.path.join(VIDEO_DIR, video_file)], capture_output=True, text=True, timeout=20)
+    return ' '.join(sorted(line.strip() for line in out.stdout.splitlines() if line.strip()))
+
+def session_playlist(entry):
+    """Daftar video sesi/jadwal; sesi biasa = satu video."""
+    return entry.get('playlist') or [entry.get('video_name') or entry.get('video_file')]
+
+def playlist_fields(playlist):
+    # video_name/video_file tetap diisi item pertama oleh pemanggil agar frontend dan data lama tetap kompatibel
+    return {'playlist': playlist} if playlist and len(playlist) > 1 else {}
+
+def write_atomic(path, content):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f: f.write(content)
+    os.replace(tmp_path, path)
+
+def write_playlist_file(sanitized_service_id, playlist):
+    playlist_dir = os.path.join(PLAYLIST_DIR, sanitized_service_id)
+    os.makedirs(playlist_dir, exist_ok=True)
+    media_names = []
+    for index, video_file in enumerate(playlist):
+        media_name = f"item-{index}{os.path.splitext(video_file)[1].lower()}"
+        link_tmp = os.path.join(playlist_dir, media_name + '.tmp')
+        if os.path.lexists(link_tmp): os.remove(link_tmp)
+        os.symlink(os.path.abspath(os.path.join(VIDEO_DIR, video_file)), link_tmp)
+        os.replace(link_tmp, os.path.join(playlist_dir, media_name))
+        media_names.append(media_name)
+    # Sisa item (dan file rantai lama item-i.ffconcat) dari playlist sebelumnya dibuang
+    for name in os.listdir(playlist_dir):
+        if name.startswith('item-') and name not in media_names: os.remove(os.path.join(playlist_dir, name))
+    playlist_path = os.path.join(playlist_dir, "playlist.ffconcat")
+    write_atomic(playlist_path, "ffconcat version 1.0\n" + ''.join(f"file '{name}'\n" for name in media_names))
+    return playlist_path
+
+def remove_playlist_file(sanitized_service_id):
+    if sanitized_service_id:
+        shutil.rmtree(os.path.join(PLAYLIST_DIR, sanitized_service_id), ignore_errors=True)
+
+def prepare_stream_input(session_name_original, video_file, playlist=None):
+    """Path input ffmpeg: file video, atau playlist.ffconcat untuk sesi playlist. Raise ValueError jika video tidak ada."""
+    if playlist and len(playlist) > 1:
+        missing = [name for name in playlist if not os.path.isfile(os.path.join(VIDEO_DIR, name))]
+        if missing: raise ValueError(f"video {', '.join(missing)} di playlist tidak ada")
+        return write_playlist_file(sanitize_for_service_name(session_name_original), playlist)
+    video_path = os.path.abspath(os.path.join(VIDEO_DIR, (playlist or [video_file])[0]))
+    if not os.path.isfile(video_path): raise ValueError(f"video {video_file} tidak ada")
+    return video_path
+
+def build_ffmpeg_command(video_path, destinations, encoding_profile=None, x264_preset=None):
+    """Satu tujuan: output flv biasa. Beberapa tujuan: satu proses (satu kali baca/demux file) yang
+    disebar lewat tee muxer; onfail=ignore agar ingest yang gagal tidak menghentikan tujuan lain."""
+    ffmpeg_bin = '/usr/bin/ffmpeg'
+    if get_encoding_profile(encoding_profile)['mode'] == 'transcode':
+        # Progres (speed=...) ke stdout -> journal, dibaca adjust_adaptive_presets
+        ffmpeg_bin += ' -nostats -progress pipe:1 -stats_period 5'
+    if video_path.endswith('.ffconcat'):
+        # Sesi playlist: pengumpan memutar item (sudah -re) ke stdin ffmpeg pengirim (lihat bagian PLAYLIST)
+        input_args = f'/usr/bin/python3 {PLAYLIST_FEEDER} "{video_path}" {ffmpeg_bin} -f mpegts -i pipe:0'
+    else:
+        input_args = f'{ffmpeg_bin} -stream_loop -1 -re -i "{video_path}"'
+    codec_args = build_codec_args(encoding_profile, x264_preset)
+    if len(destinations) == 1:
+        return f"{input_args} -f flv {codec_args} {destination_url(destinations[0])}"
+    slaves = '|'.join(f"[f=flv:onfail=ignore]{tee_escape(destination_url(dest))}" for dest in destinations)
+    if get_encoding_profile(encoding_profile)['mode'] == 'transcode':
+        # Tee bukan muxer global-header, jadi x264/aac tidak otomatis menaruh SPS/PPS/ASC di extradata yang dibutuhkan FLV
+        codec_args += ' -flags +global_header'
+    # Backslash digandakan karena systemd juga memproses escape di dalam tanda kutip ExecStart
+    return f'{input_args} -map 0:v -map 0:a? {codec_args} -f tee "{slaves.replace(chr(92), chr(92) * 2)}"'
+
+def stream_resource_estimate(encoding_profile):
+    """(cpu_cores, memory_mb) perkiraan satu stream dengan profil ini."""
+    profile = get_encoding_profile(encoding_profile)
+    if profile['mode'] == 'copy': return STREAM_COPY_CPU_CORES, STREAM_COPY_MEMORY_MB
+    return profile['cpu_cores'], profile['memory_mb']
+
+def stream_unit_limits(encoding_profile):
+    if get_encoding_profile(encoding_profile)['mode'] == 'copy': return dict(STREAM_COPY_LIMITS)
+    cpu_cores, memory_mb = stream_resource_estimate(encoding_profile)
+    return dict(STREAM_COPY_LIMITS, CPUQuota=f"{int(cpu_cores * STREAM_TRANSCODE_CPU_QUOTA_FACTOR * 100)}%", MemoryMax=f"{memory_mb * 2}M")
+
+def build_slice_content(cpu_cores=None):
+    cpu_quota = max(0.5, (cpu_cores or os.cpu_count() or 1) - STREAM_SLICE_RESERVED_CORES)
+    return f"""[Unit]
+Description=StreamHib stream units
+Before=slices.target
+
+[Slice]
+CPUQuota={int(cpu_quota * 100)}%
+MemoryMax={STREAM_SLICE_MEMORY_MAX}
+"""
 
-    service_path = os.path.join(SERVICE_DIR, service_name)
-    service_content = f"""[Unit]
+def ensure_stream_slice():
+    slice_path = os.path.join(SERVICE_DIR, STREAM_SLICE)
+    content = build_slice_content()
+    try:
+        if os.path.exists(slice_path):
+            with open(slice_path) as f:
+                if f.read() == content: return
+        with open(slice_path, 'w') as f: f.write(content)
+        run_cmd(["systemctl", "daemon-reload"], check=True, timeout=30)
+        log_systemd.info(f"Slice {STREAM_SLICE} ditulis ulang.")
+    except Exception as e:
+        log_systemd.error(f"Gagal menulis slice {STREAM_SLICE}: {e}")
+
+def build_service_content(session_name_original, video_path, destinations, encoding_profile=None, x264_preset=None):
+    limits = '\n'.join(f"{key}={value}" for key, value in stream_unit_limits(encoding_profile).items())
+    return f"""[Unit]
 Description=Streaming service for {session_name_original}
 After=network.target
+StartLimitIntervalSec={STREAM_START_LIMIT_INTERVAL_SEC}
+StartLimitBurst={STREAM_START_LIMIT_BURST}
 
 [Service]
-ExecStart=/usr/bin/ffmpeg -stream_loop -1 -re -i "{video_path}" -f flv -c:v copy -c:a copy {platform_url}/{stream_key}
+ExecStart={build_ffmpeg_command(video_path, destinations, encoding_profile, x264_preset)}
+Slice={STREAM_SLICE}
+{limits}
+IPAccounting=yes
 Restart=always
+RestartSec={STREAM_RESTART_SEC}
+RestartSteps={STREAM_RESTART_STEPS}
+RestartMaxDelaySec={STREAM_RESTART_MAX_DELAY_SEC}
 User=root
 TimeoutStopSec=30
 
 [Install]
 WantedBy=multi-user.target
 """
+
+@traced
+def create_service_file(session_name_original, video_path, destinations, encoding_profile=None, x264_preset=None, reload=True):
+    # Gunakan session_name_original untuk deskripsi, tapi nama service disanitasi
+    sanitized_service_part = sanitize_for_service_name(session_name_original)
+    service_name = f"stream-{sanitized_service_part}.service"
+    # Pastikan service_name unik jika sanitasi menghasilkan nama yang sama untuk session_name_original yang berbeda
+    # Ini bisa diatasi dengan menambahkan hash pendek atau timestamp jika diperlukan, tapi untuk sekarang kita jaga sederhana.
+    # Jika ada potensi konflik nama service yang tinggi, pertimbangkan untuk menggunakan UUID atau hash dari session_name_original.
+
+    service_path = os.path.join(SERVICE_DIR, service_name)
+    service_content = build_service_content(session_name_original, video_path, destinations, encoding_profile, x264_preset)
     try:
         with open(service_path, 'w') as f: f.write(service_content)
-        subprocess.run(["systemctl", "daemon-reload"], check=True)
-        logging.info(f"Service file created: {service_name} (from original: '{session_name_original}')")
+        if CLUSTER_AGENTS: place_stream_unit(service_name, session_name_original, service_content, encoding_profile, reload)
+        elif reload: run_cmd(["systemctl", "daemon-reload"], check=True)
+        log_systemd.info(f"Service file created: {service_name} (from original: '{session_name_original}')")
         return service_name, sanitized_service_part # Kembalikan juga bagian yang disanitasi untuk ID
     except Exception as e:
-        logging.error(f"Error creating service file {service_name} (from original: '{session_name_original}'): {e}")
+        log_systemd.error(f"Error creating service file {service_name} (from original: '{session_name_original}'): {e}")
         raise
 
+TEE_SLAVE_FAILED_RE = re.compile(r"Slave muxer #(\d+) failed: (.*?)(?:, continuing with \d+/\d+ slaves\.)?$")
+
+def failed_tee_slaves(journal_lines, runs=1):
+    """{indeks tujuan: error} dari baris 'Slave muxer #N failed' milik `runs` proses ffmpeg terakhir di journal."""
+    process_starts = [i for i, line in enumerate(journal_lines) if line.startswith('ffmpeg version')]
+    failed = {}
+    for line in journal_lines[process_starts[-runs] if len(process_starts) >= runs else 0:]:
+        match = TEE_SLAVE_FAILED_RE.search(line)
+        if match: failed[int(match.group(1))] = match.group(2)
+    return failed
+
+def get_destination_health(session_entry, running_units):
+    """Status per tujuan dari journal unit: 'ok', 'failed' (output tee berhenti, tujuan lain tetap
+    jalan sampai proses di-restart) atau 'down' (proses ffmpeg tidak berjalan)."""
+    destinations = session_destinations(session_entry)
+    service_name = f"stream-{session_entry.get('sanitized_service_id')}.service"
+    is_active = service_name in running_units
+    failed = {}
+    if is_active and len(destinations) > 1:
+        journal = run_cmd(["journalctl", "-u", service_name, "-o", "cat", "--no-pager", "-n", str(DESTINATION_HEALTH_JOURNAL_LINES)],
+                                 capture_output=True, text=True, timeout=15).stdout.splitlines()
+        failed = failed_tee_slaves(journal) # Restart memulai ulang semua tujuan
+    health = []
+    for index, dest in enumerate(destinations):
+        status = 'down' if not is_active else 'failed' if index in failed else 'ok'
+        health.append({'platform': dest['platform'], 'stream_key': dest['stream_key'], 'status': status, 'error': failed.get(index)})
+    return health
+
+# ---- I/O BLOCKING ----
+def offload(fn, *args, **kwargs):
+    """Jalankan fungsi blocking di tpool bila dipanggil dari hub eventlet, langsung bila dari thread biasa."""
+    # Tanpa monkey-patching semua greenlet berjalan di main thread; thread scheduler/worker boleh blocking
+    if tpool is not None and getattr(socketio, 'async_mode', None) == 'eventlet' and threading.current_thread() is threading.main_thread():
+        return tpool.execute(contextvars.copy_context().run, fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+def run_cmd(cmd, timeout=COMMAND_TIMEOUT_SECONDS, **kwargs):
+    """subprocess.run yang tidak membekukan event loop dan selalu punya timeout."""
+    with trace_span(' '.join(cmd[:2]), cmd=' '.join(cmd)):
+        if CLUSTER_AGENTS and cmd[0] in ('systemctl', 'journalctl'): return offload(run_cluster_unit_command, cmd, kwargs.get('check', False))
+        return offload(subprocess.run, cmd, timeout=timeout, **kwargs)
+
+@contextmanager
+def session_file_lock():
+    # Satu instance per path dan per thread reentrant: read_sessions_file/write_sessions_file boleh dipanggil di dalam modify_sessions
+    lock = FileLock(LOCK_FILE, timeout=10, is_singleton=True)
+    with trace_span('filelock.wait', file=LOCK_FILE): lock.acquire()
+    try:
+        yield
+    finally:
+        lock.release()
+
 def read_sessions():
+    return offload(read_sessions_file)
+
+def write_sessions(data):
+    return offload(write_sessions_file, data)
+
+def modify_sessions(apply):
+    """Baca-ubah-tulis sessions.json dalam satu session_file_lock, sehingga perubahan penulis lain di antaranya
+    tidak tertimpa. apply(s_data) mengembalikan False untuk batal menulis; hasilnya s_data yang ditulis atau None."""
+    def locked():
+        with session_file_lock():
+            s_data = read_sessions_file()
+            if apply(s_data) is False: return None
+            write_sessions_file(s_data)
+            return s_data
+    return offload(locked)
+
+def read_sessions_file():
     if not os.path.exists(SESSION_FILE):
         write_sessions({"active_sessions": [], "inactive_sessions": [], "scheduled_sessions": []})
         return {"active_sessions": [], "inactive_sessions": [], "scheduled_sessions": []}
     try:
-        with FileLock(LOCK_FILE, timeout=10):
+        with session_file_lock():
             with open(SESSION_FILE, 'r') as f:
-                content = json.load(f)
+                with trace_span('json.decode'): content = json.load(f)
                 content.setdefault('active_sessions', [])
                 content.setdefault('inactive_sessions', [])
                 content.setdefault('scheduled_sessions', [])
                 return content
     except json.JSONDecodeError:
-        logging.error(f"Error decoding JSON from {SESSION_FILE}. Re-initializing.")
+        log_state.error(f"Error decoding JSON from {SESSION_FILE}. Re-initializing.")
         write_sessions({"active_sessions": [], "inactive_sessions": [], "scheduled_sessions": []})
         return {"active_sessions": [], "inactive_sessions": [], "scheduled_sessions": []}
     except Exception as e:
-        logging.error(f"Error reading {SESSION_FILE}: {e}")
+        log_state.error(f"Error reading {SESSION_FILE}: {e}")
         return {"active_sessions": [], "inactive_sessions": [], "scheduled_sessions": []}
 
 
-def write_sessions(data):
+def write_sessions_file(data):
+    global sessions_write_seq
     try:
-        with FileLock(LOCK_FILE, timeout=10):
-            with open(SESSION_FILE, 'w') as f: json.dump(data, f, indent=4)
+        with session_file_lock():
+            with trace_span('json.encode'): payload = json.dumps(data, indent=4)
+            with open(SESSION_FILE, 'w') as f: f.write(payload)
+            sessions_write_seq = next(sessions_write_counter)
     except Exception as e:
-        logging.error(f"Error writing to {SESSION_FILE}: {e}")
+        log_state.error(f"Error writing to {SESSION_FILE}: {e}")
         raise
 
 def read_users():
@@ -230,14 +919,14 @@ def read_users():
     try:
         with open(USERS_FILE, 'r') as f: return json.load(f)
     except Exception as e:
-        logging.error(f"Error reading {USERS_FILE}: {e}")
+        log_state.error(f"Error reading {USERS_FILE}: {e}")
         return {}
 
 def write_users(data):
     try:
         with open(USERS_FILE, 'w') as f: json.dump(data, f, indent=4)
     except Exception as e:
-        logging.error(f"Error writing to {USERS_FILE}: {e}")
+        log_state.error(f"Error writing to {USERS_FILE}: {e}")
         raise
 
 def get_videos_list_data():
@@ -245,150 +934,176 @@ def get_videos_list_data():
         return sorted([f for f in os.listdir(VIDEO_DIR) if f.endswith(('.mp4', '.mkv', '.flv', '.avi', '.mov', '.webm'))])
     except Exception: return []
 
-def get_active_sessions_data():
+# ---- RECONCILER & MATERIALIZED VIEW ----
+# Jalur baca (GET dan emit) hanya membaca state_view: proyeksi sessions.json yang dibangun ulang bila file
+# berubah (ditulis proses ini atau worker lain), tanpa fork systemctl maupun write. Selisih antara state yang
+# diinginkan (sessions.json + jadwal) dan state aktual (unit stream yang berjalan) hanya diperbaiki oleh
+# reconcile_sessions() setiap RECONCILE_INTERVAL_SECONDS.
+state_view = {'key': None, 'active': [], 'inactive': [], 'schedules': []}
+destination_health_view = {} # session_id -> status per tujuan, dari pemeriksaan reconciler terakhir
+sessions_write_counter = itertools.count(1)
+sessions_write_seq = 0 # Naik setiap write_sessions di proses ini (mtime saja bisa sama untuk dua write beruntun)
+
+def sessions_view_key():
+    try: st = os.stat(SESSION_FILE)
+    except OSError: return None
+    return (sessions_write_seq, st.st_mtime_ns, st.st_size, st.st_ino)
+
+def get_state_view():
+    global state_view
+    key = sessions_view_key()
+    view = state_view
+    if key is None or key == view['key']: return view
+    s_data = read_sessions()
+    view = {'key': key, 'active': build_active_sessions_view(s_data), 'inactive': build_inactive_sessions_view(s_data),
+            'schedules': build_schedules_view(s_data)}
+    state_view = view
+    return view
+
+def format_stop_time_display(stop_time_iso):
+    if not stop_time_iso: return None
+    try: return datetime.fromisoformat(stop_time_iso).astimezone(jakarta_tz).strftime('%d-%m-%Y Pukul %H:%M:%S')
+    except ValueError: return None
+
+def build_active_sessions_view(s_data):
     try:
-        output = subprocess.check_output(["systemctl", "list-units", "--type=service", "--state=running"], text=True)
-        all_sessions_data = read_sessions() 
         active_sessions_list = []
-        active_services_systemd = {line.split()[0] for line in output.strip().split('\n') if "stream-" in line}
-        json_active_sessions = all_sessions_data.get('active_sessions', [])
-        needs_json_update = False
-
-        for service_name_systemd in active_services_systemd:
-            sanitized_id_from_systemd_service = service_name_systemd.replace("stream-", "").replace(".service", "")
-            
-            session_json = next((s for s in json_active_sessions if s.get('sanitized_service_id') == sanitized_id_from_systemd_service), None)
-
-            if session_json: # Ketika sesi ditemukan di sessions.json
-                actual_schedule_type = session_json.get('scheduleType', 'manual')
-                actual_stop_time_iso = session_json.get('stopTime') 
-                formatted_display_stop_time = None
-                if actual_stop_time_iso: 
-                    try:
-                        stop_time_dt = datetime.fromisoformat(actual_stop_time_iso)
-                        formatted_display_stop_time = stop_time_dt.astimezone(jakarta_tz).strftime('%d-%m-%Y Pukul %H:%M:%S')
-                    except ValueError: pass
-                
-                active_sessions_list.append({
-                    'id': session_json.get('id'), 
-                    'name': session_json.get('id'), 
-                    'startTime': session_json.get('start_time', 'unknown'),
-                    'platform': session_json.get('platform', 'unknown'),
-                    'video_name': session_json.get('video_name', 'unknown'),
-                    'stream_key': session_json.get('stream_key', 'unknown'), # <<< TAMBAHKAN BARIS INI
-                    'stopTime': formatted_display_stop_time, 
-                    'scheduleType': actual_schedule_type,
-                    'sanitized_service_id': session_json.get('sanitized_service_id')
-                })
-            
-            else: # Ketika service aktif di systemd tapi tidak ada di all_sessions_data['active_sessions']
-                logging.warning(f"Service {service_name_systemd} (ID sanitasi: {sanitized_id_from_systemd_service}) aktif tapi tidak di JSON active_sessions. Mencoba memulihkan...")
-                
-                scheduled_definition = next((
-                    sched for sched in all_sessions_data.get('scheduled_sessions', []) 
-                    if sched.get('sanitized_service_id') == sanitized_id_from_systemd_service
-                ), None)
-
-                session_id_original = f"recovered-{sanitized_id_from_systemd_service}" # Fallback
-                video_name_to_use = "unknown (recovered)"
-                stream_key_to_use = "unknown"
-                platform_to_use = "unknown"
-                schedule_type_to_use = "manual_recovered" 
-                recovered_stop_time_iso = None
-                recovered_duration_minutes = 0
-                
-                current_recovery_time_iso = datetime.now(jakarta_tz).isoformat()
-                current_recovery_dt = datetime.fromisoformat(current_recovery_time_iso)
-                formatted_display_stop_time_frontend = None
-
-                if scheduled_definition:
-                    logging.info(f"Definisi jadwal ditemukan untuk service {service_name_systemd}: {scheduled_definition.get('session_name_original')}")
-                    session_id_original = scheduled_definition.get('session_name_original', session_id_original)
-                    video_name_to_use = scheduled_definition.get('video_file', video_name_to_use)
-                    stream_key_to_use = scheduled_definition.get('stream_key', stream_key_to_use)
-                    platform_to_use = scheduled_definition.get('platform', platform_to_use)
-                    
-                    recurrence = scheduled_definition.get('recurrence_type')
-                    if recurrence == 'daily':
-                        schedule_type_to_use = "daily_recurring_instance_recovered"
-                        daily_start_time_str = scheduled_definition.get('start_time_of_day')
-                        daily_stop_time_str = scheduled_definition.get('stop_time_of_day')
-                        if daily_start_time_str and daily_stop_time_str:
-                            start_h, start_m = map(int, daily_start_time_str.split(':'))
-                            stop_h, stop_m = map(int, daily_stop_time_str.split(':'))
-                            
-                            duration_daily_minutes = (stop_h * 60 + stop_m) - (start_h * 60 + start_m)
-                            if duration_daily_minutes <= 0: 
-                                duration_daily_minutes += 24 * 60 
-                            recovered_duration_minutes = duration_daily_minutes
-                            # Waktu berhenti untuk JSON (mungkin tidak secara aktif digunakan untuk stop harian, tapi untuk data)
-                            recovered_stop_time_iso = (current_recovery_dt + timedelta(minutes=recovered_duration_minutes)).isoformat()
-                            
-                            # Waktu berhenti untuk tampilan frontend (berdasarkan jadwal aktual)
-                            intended_stop_today_dt = current_recovery_dt.replace(hour=stop_h, minute=stop_m, second=0, microsecond=0)
-                            actual_scheduled_stop_dt = intended_stop_today_dt if current_recovery_dt <= intended_stop_today_dt else (intended_stop_today_dt + timedelta(days=1))
-                            formatted_display_stop_time_frontend = actual_scheduled_stop_dt.astimezone(jakarta_tz).strftime('%d-%m-%Y Pukul %H:%M:%S')
-                        else:
-                            schedule_type_to_use = "manual_recovered_daily_data_missing"
-                            
-                    elif recurrence == 'one_time':
-                        schedule_type_to_use = "scheduled_recovered"
-                        original_start_iso = scheduled_definition.get('start_time_iso')
-                        duration_mins_sched = scheduled_definition.get('duration_minutes', 0)
-                        is_manual_stop_sched = scheduled_definition.get('is_manual_stop', duration_mins_sched == 0)
-
-                        if not is_manual_stop_sched and duration_mins_sched > 0 and original_start_iso:
-                            original_start_dt = datetime.fromisoformat(original_start_iso)
-                            intended_stop_dt = original_start_dt + timedelta(minutes=duration_mins_sched)
-                            recovered_stop_time_iso = intended_stop_dt.isoformat() # Ini akan dipakai check_systemd_sessions
-                            recovered_duration_minutes = duration_mins_sched
-                            if current_recovery_dt >= intended_stop_dt:
-                                schedule_type_to_use = "scheduled_recovered_overdue"
-                            formatted_display_stop_time_frontend = intended_stop_dt.astimezone(jakarta_tz).strftime('%d-%m-%Y Pukul %H:%M:%S')
-                        elif is_manual_stop_sched:
-                             recovered_stop_time_iso = None # Akan tampil "Stop Manual"
-                             recovered_duration_minutes = 0
-                        else:
-                             schedule_type_to_use = "manual_recovered_onetime_data_missing"
-                # else: (jika tidak ada scheduled_definition, variabel tetap default "unknown")
-
-                recovered_session_entry_for_json = {
-                    "id": session_id_original,
-                    "sanitized_service_id": sanitized_id_from_systemd_service, 
-                    "video_name": video_name_to_use, "stream_key": stream_key_to_use, "platform": platform_to_use,
-                    "status": "active", "start_time": current_recovery_time_iso,
-                    "scheduleType": schedule_type_to_use,
-                    "stopTime": recovered_stop_time_iso, # Ini adalah ISO string atau None
-                    "duration_minutes": recovered_duration_minutes
-                }
-                
-                all_sessions_data['active_sessions'] = add_or_update_session_in_list(
-                    all_sessions_data.get('active_sessions', []), 
-                    recovered_session_entry_for_json
-                )
-                needs_json_update = True
-                
-                active_sessions_list.append({
-                    'id': recovered_session_entry_for_json['id'], 
-                    'name': recovered_session_entry_for_json['id'], 
-                    'startTime': recovered_session_entry_for_json['start_time'],
-                    'platform': recovered_session_entry_for_json['platform'],
-                    'video_name': recovered_session_entry_for_json['video_name'],
-                    'stream_key': recovered_session_entry_for_json['stream_key'],
-                    'stopTime': formatted_display_stop_time_frontend, # Ini adalah string yang sudah diformat atau None
-                    'scheduleType': recovered_session_entry_for_json['scheduleType'],
-                    'sanitized_service_id': recovered_session_entry_for_json['sanitized_service_id']
-                })
-        
-        if needs_json_update: write_sessions(all_sessions_data)
+        for session_json in s_data.get('active_sessions', []):
+            if not session_json.get('sanitized_service_id'): continue
+            active_sessions_list.append({
+                'id': session_json.get('id'), 
+                'name': session_json.get('id'), 
+                'startTime': session_json.get('start_time', 'unknown'),
+                'platform': session_json.get('platform', 'unknown'),
+                'video_name': session_json.get('video_name', 'unknown'),
+                'stream_key': session_json.get('stream_key', 'unknown'),
+                'destinations': session_destinations(session_json),
+                'encoding_profile': session_json.get('encoding_profile', DEFAULT_ENCODING_PROFILE),
+                'playlist': session_playlist(session_json),
+                'x264_preset': session_json.get('x264_preset'),
+                'stopTime': format_stop_time_display(session_json.get('stopTime')), 
+                'scheduleType': session_json.get('scheduleType', 'manual'),
+                'sanitized_service_id': session_json.get('sanitized_service_id')
+            })
         return sorted(active_sessions_list, key=lambda x: x.get('startTime', ''))
     except Exception as e: 
-        logging.error(f"Error get_active_sessions_data: {e}", exc_info=True)
+        log_state.error(f"Error build_active_sessions_view: {e}", exc_info=True)
         return []
 
+def get_active_sessions_data():
+    return attach_stream_resources(get_state_view())
+
+def stream_unit_states(s_data):
+    """{unit: ActiveState} untuk unit stream yang dimuat systemd plus unit setiap sesi aktif (dari systemctl show).
+    Unit yang sedang backoff RestartSec berstatus 'activating' (SubState auto-restart) dan tetap dihitung hidup."""
+    output = run_cmd(["systemctl", "list-units", "--type=service", "--all", "--no-legend", "--plain"], capture_output=True, text=True, check=True).stdout
+    states = {}
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) >= 3 and fields[0].startswith('stream-'): states[fields[0]] = fields[2]
+    tracked_units = [f"stream-{sess['sanitized_service_id']}.service" for sess in s_data.get('active_sessions', []) if sess.get('sanitized_service_id')]
+    # Unit yang tidak dimuat (dihapus) tetap dilaporkan show sebagai 'inactive'; unit yang tidak terjawab (agent cluster tidak terjangkau) tidak masuk
+    states.update({unit: props.get('ActiveState') for unit, props in systemctl_show(tracked_units, ['ActiveState', 'SubState']).items()})
+    return states
+
+def alive_stream_units(unit_states):
+    return {unit for unit, state in unit_states.items() if state and state not in STREAM_UNIT_DEAD_STATES}
+
+def adopt_untracked_unit(all_sessions_data, service_name_systemd, now_jakarta_dt):
+    """Catat unit stream yang berjalan tanpa entri di active_sessions (misal sessions.json dipulihkan dari backup)."""
+    sanitized_id_from_systemd_service = service_name_systemd.replace("stream-", "").replace(".service", "")
+    log_systemd.warning(f"RECONCILE: Service {service_name_systemd} (ID sanitasi: {sanitized_id_from_systemd_service}) aktif tapi tidak di JSON active_sessions. Mencoba memulihkan...")
+    
+    scheduled_definition = next((
+        sched for sched in all_sessions_data.get('scheduled_sessions', []) 
+        if sched.get('sanitized_service_id') == sanitized_id_from_systemd_service
+    ), None)
+
+    session_id_original = f"recovered-{sanitized_id_from_systemd_service}" # Fallback
+    video_name_to_use = "unknown (recovered)"
+    stream_key_to_use = "unknown"
+    platform_to_use = "unknown"
+    schedule_type_to_use = "manual_recovered" 
+    recovered_stop_time_iso = None
+    recovered_duration_minutes = 0
+
+    if scheduled_definition:
+        log_systemd.debug(f"Definisi jadwal ditemukan untuk service {service_name_systemd}: {scheduled_definition.get('session_name_original')}")
+        session_id_original = scheduled_definition.get('session_name_original', session_id_original)
+        video_name_to_use = scheduled_definition.get('video_file', video_name_to_use)
+        stream_key_to_use = scheduled_definition.get('stream_key', stream_key_to_use)
+        platform_to_use = scheduled_definition.get('platform', platform_to_use)
+        
+        recurrence = scheduled_definition.get('recurrence_type')
+        if recurrence == 'daily':
+            schedule_type_to_use = "daily_recurring_instance_recovered"
+            daily_start_time_str = scheduled_definition.get('start_time_of_day')
+            daily_stop_time_str = scheduled_definition.get('stop_time_of_day')
+            if daily_start_time_str and daily_stop_time_str:
+                start_h, start_m = map(int, daily_start_time_str.split(':'))
+                stop_h, stop_m = map(int, daily_stop_time_str.split(':'))
+                
+                duration_daily_minutes = (stop_h * 60 + stop_m) - (start_h * 60 + start_m)
+                if duration_daily_minutes <= 0: 
+                    duration_daily_minutes += 24 * 60 
+                recovered_duration_minutes = duration_daily_minutes
+                # Waktu berhenti = jadwal stop harian berikutnya
+                intended_stop_today_dt = now_jakarta_dt.replace(hour=stop_h, minute=stop_m, second=0, microsecond=0)
+                actual_scheduled_stop_dt = intended_stop_today_dt if now_jakarta_dt <= intended_stop_today_dt else (intended_stop_today_dt + timedelta(days=1))
+                recovered_stop_time_iso = actual_scheduled_stop_dt.isoformat()
+            else:
+                schedule_type_to_use = "manual_recovered_daily_data_missing"
+                
+        elif recurrence == 'one_time':
+            schedule_type_to_use = "scheduled_recovered"
+            original_start_iso = scheduled_definition.get('start_time_iso')
+            duration_mins_sched = scheduled_definition.get('duration_minutes', 0)
+            is_manual_stop_sched = scheduled_definition.get('is_manual_stop', duration_mins_sched == 0)
+
+            if not is_manual_stop_sched and duration_mins_sched > 0 and original_start_iso:
+                original_start_dt = datetime.fromisoformat(original_start_iso)
+                intended_stop_dt = original_start_dt + timedelta(minutes=duration_mins_sched)
+                recovered_stop_time_iso = intended_stop_dt.isoformat() # Dipakai reconcile_sessions untuk stop yang terlewat
+                recovered_duration_minutes = duration_mins_sched
+                if now_jakarta_dt >= intended_stop_dt:
+                    schedule_type_to_use = "scheduled_recovered_overdue"
+            elif is_manual_stop_sched:
+                 recovered_stop_time_iso = None # Akan tampil "Stop Manual"
+                 recovered_duration_minutes = 0
+            else:
+                 schedule_type_to_use = "manual_recovered_onetime_data_missing"
+    # else: (jika tidak ada scheduled_definition, variabel tetap default "unknown")
+
+    recovered_session_entry_for_json = {
+        "id": session_id_original,
+        "sanitized_service_id": sanitized_id_from_systemd_service, 
+        "video_name": video_name_to_use, "stream_key": stream_key_to_use, "platform": platform_to_use,
+        "status": "active", "start_time": now_jakarta_dt.isoformat(),
+        "scheduleType": schedule_type_to_use,
+        "stopTime": recovered_stop_time_iso, # Ini adalah ISO string atau None
+        "duration_minutes": recovered_duration_minutes
+    }
+    if scheduled_definition and scheduled_definition.get('destinations'):
+        recovered_session_entry_for_json['destinations'] = scheduled_definition['destinations']
+    if scheduled_definition and scheduled_definition.get('playlist'):
+        recovered_session_entry_for_json['playlist'] = scheduled_definition['playlist']
+    if scheduled_definition and scheduled_definition.get('encoding_profile'):
+        recovered_session_entry_for_json['encoding_profile'] = scheduled_definition['encoding_profile']
+    
+    all_sessions_data['active_sessions'] = add_or_update_session_in_list(
+        all_sessions_data.get('active_sessions', []), 
+        recovered_session_entry_for_json
+    )
+    return session_id_original
+
 def get_inactive_sessions_data():
+    return get_state_view()['inactive']
+
+def get_schedules_list_data():
+    return get_state_view()['schedules']
+
+def build_inactive_sessions_view(data_sessions):
     try:
-        data_sessions = read_sessions()
         inactive_list = []
         for item in data_sessions.get('inactive_sessions', []):
             item_details = {
@@ -397,7 +1112,11 @@ def get_inactive_sessions_data():
                 'video_name': item.get('video_name'),
                 'stream_key': item.get('stream_key'),
                 'platform': item.get('platform'),
+                'destinations': session_destinations(item),
+                'encoding_profile': item.get('encoding_profile', DEFAULT_ENCODING_PROFILE),
+                'playlist': session_playlist(item),
                 'status': item.get('status'),
+                'failure_reason': item.get('failure_reason'),
                 'start_time_original': item.get('start_time'), # Diubah dari 'start_time' menjadi 'start_time_original'
                 'stop_time': item.get('stop_time'),
                 'duration_minutes_original': item.get('duration_minutes') # Diubah dari 'duration_minutes'
@@ -407,8 +1126,7 @@ def get_inactive_sessions_data():
     except Exception: return []
 
 
-def get_schedules_list_data():
-    sessions_data = read_sessions()
+def build_schedules_view(sessions_data):
     schedule_list = []
 
     for sched_json in sessions_data.get('scheduled_sessions', []):
@@ -426,6 +1144,9 @@ def get_schedules_list_data():
                 'video_file': video_file,
                 'platform': platform,
                 'stream_key': sched_json.get('stream_key', 'N/A'),
+                'destinations': session_destinations(sched_json),
+                'encoding_profile': sched_json.get('encoding_profile', DEFAULT_ENCODING_PROFILE),
+                'playlist': session_playlist(sched_json),
                 'recurrence_type': recurrence,
                 'sanitized_service_id': sched_json.get('sanitized_service_id') # Penting untuk cancel
             }
@@ -434,7 +1155,7 @@ def get_schedules_list_data():
                 start_time_of_day = sched_json.get('start_time_of_day')
                 stop_time_of_day = sched_json.get('stop_time_of_day')
                 if not start_time_of_day or not stop_time_of_day:
-                    logging.warning(f"Data jadwal harian tidak lengkap untuk {session_name_original}")
+                    log_scheduler.warning(f"Data jadwal harian tidak lengkap untuk {session_name_original}")
                     continue
                 
                 display_entry['start_time_display'] = f"Setiap hari pukul {start_time_of_day}"
@@ -443,7 +1164,7 @@ def get_schedules_list_data():
             
             elif recurrence == 'one_time':
                 if not all(k in sched_json for k in ['start_time_iso', 'duration_minutes']):
-                    logging.warning(f"Data jadwal one-time tidak lengkap untuk {session_name_original}")
+                    log_scheduler.warning(f"Data jadwal one-time tidak lengkap untuk {session_name_original}")
                     continue
                 
                 start_dt_iso_val = sched_json['start_time_iso']
@@ -456,13 +1177,13 @@ def get_schedules_list_data():
                 display_entry['stop_time_display'] = (start_dt + timedelta(minutes=duration_mins)).strftime('%d-%m-%Y %H:%M:%S') if not is_manual_stop_val else "Stop Manual"
                 display_entry['is_manual_stop'] = is_manual_stop_val
             else:
-                logging.warning(f"Tipe recurrence tidak dikenal: {recurrence} untuk sesi {session_name_original}")
+                log_scheduler.warning(f"Tipe recurrence tidak dikenal: {recurrence} untuk sesi {session_name_original}")
                 continue
             
             schedule_list.append(display_entry)
 
         except Exception as e:
-            logging.error(f"Error memproses item jadwal {sched_json.get('session_name_original')}: {e}", exc_info=True)
+            log_scheduler.error(f"Error memproses item jadwal {sched_json.get('session_name_original')}: {e}", exc_info=True)
             
     try:
         return sorted(schedule_list, key=lambda x: (x['recurrence_type'] == 'daily', x.get('start_time_iso', x['session_name_original'])))
@@ -470,344 +1191,1915 @@ def get_schedules_list_data():
         return sorted(schedule_list, key=lambda x: x['session_name_original'])
 
 
-def check_systemd_sessions():
-    try:
-        active_sysd_services = {ln.split()[0] for ln in subprocess.check_output(["systemctl","list-units","--type=service","--state=running"],text=True).strip().split('\n') if "stream-" in ln}
-        s_data = read_sessions()
-        now_jakarta_dt = datetime.now(jakarta_tz)
-        json_changed = False
+# ---- CAPACITY PLANNER ----
+# Timeline per menit (CAPACITY_HORIZON_DAYS ke depan) berisi jumlah stream bersamaan, egress (Mbps)
+# dan perkiraan beban CPU, dibangun dari sesi aktif + scheduled_sessions. Dipakai untuk menolak /
+# memberi peringatan pada jadwal baru dan untuk endpoint /api/capacity.
+video_bitrate_cache = {} # (path, mtime, size) -> kbps
 
-        for sched_item in list(s_data.get('scheduled_sessions', [])): 
-            if sched_item.get('recurrence_type', 'one_time') == 'daily': 
+def get_video_bitrate_kbps(video_file):
+    video_path = os.path.abspath(os.path.join(VIDEO_DIR, video_file or ''))
+    try:
+        st = os.stat(video_path)
+    except OSError:
+        return STREAM_DEFAULT_BITRATE_KBPS
+    cache_key = (video_path, st.st_mtime, st.st_size)
+    if cache_key in video_bitrate_cache: return video_bitrate_cache[cache_key]
+    kbps = STREAM_DEFAULT_BITRATE_KBPS
+    try:
+        out = run_cmd(["ffprobe", "-v", "error", "-show_entries", "format=bit_rate,duration", "-of", "json", video_path],
+                             capture_output=True, text=True, timeout=15)
+        fmt = json.loads(out.stdout or '{}').get('format', {})
+        if fmt.get('bit_rate') and fmt['bit_rate'] != 'N/A':
+            kbps = int(fmt['bit_rate']) / 1000
+        elif fmt.get('duration') and float(fmt['duration']) > 0:
+            kbps = st.st_size * 8 / float(fmt['duration']) / 1000
+    except Exception as e:
+        log_systemd.warning(f"CAPACITY: Gagal membaca bitrate {video_file}, memakai default {STREAM_DEFAULT_BITRATE_KBPS} kbps: {e}")
+    video_bitrate_cache[cache_key] = kbps
+    return kbps
+
+def stream_load(entry):
+    """(egress_mbps, cpu_cores) perkiraan untuk satu sesi/jadwal."""
+    video_file = entry.get('video_name') or entry.get('video_file')
+    profile = get_encoding_profile(entry.get('encoding_profile'))
+    cpu_cores, _ = stream_resource_estimate(entry.get('encoding_profile'))
+    if profile['mode'] == 'copy':
+        kbps = max(get_video_bitrate_kbps(name) for name in (entry.get('playlist') or [video_file]))
+    else:
+        kbps = profile['video_bitrate_kbps'] + profile['audio_bitrate_kbps']
+    # Simulcast: egress dikali jumlah tujuan, tapi tetap satu proses ffmpeg (CPU tidak bertambah)
+    return kbps * STREAM_PROTOCOL_OVERHEAD * len(session_destinations(entry)) / 1000, cpu_cores
+
+def capacity_intervals(s_data, now_jkt):
+    """Daftar interval (nama_sesi, start_dt, stop_dt, entry) untuk sesi aktif + semua jadwal dalam horizon."""
+    horizon_end = now_jkt + timedelta(days=CAPACITY_HORIZON_DAYS)
+    intervals = []
+    for sess in s_data.get('active_sessions', []):
+        stop_dt = horizon_end
+        if sess.get('stopTime'):
+            try: stop_dt = min(datetime.fromisoformat(sess['stopTime']).astimezone(jakarta_tz), horizon_end)
+            except ValueError: pass
+        intervals.append((sess.get('id'), now_jkt, stop_dt, sess))
+
+    for sched in s_data.get('scheduled_sessions', []):
+        name = sched.get('session_name_original')
+        try:
+            if sched.get('recurrence_type') == 'daily':
+                start_h, start_m = map(int, sched['start_time_of_day'].split(':'))
+                stop_h, stop_m = map(int, sched['stop_time_of_day'].split(':'))
+                duration = (stop_h * 60 + stop_m) - (start_h * 60 + start_m)
+                if duration <= 0: duration += 24 * 60
+                for day in range(CAPACITY_HORIZON_DAYS + 1):
+                    start_dt = (now_jkt + timedelta(days=day)).replace(hour=start_h, minute=start_m, second=0, microsecond=0)
+                    # Instance yang sudah mulai sebelum sekarang sudah tercatat sebagai sesi aktif
+                    if now_jkt <= start_dt < horizon_end:
+                        intervals.append((name, start_dt, start_dt + timedelta(minutes=duration), sched))
+            else:
+                start_dt = datetime.fromisoformat(sched['start_time_iso']).astimezone(jakarta_tz)
+                duration = sched.get('duration_minutes', 0)
+                stop_dt = start_dt + timedelta(minutes=duration) if duration > 0 else horizon_end
+                if start_dt < horizon_end and stop_dt > now_jkt:
+                    intervals.append((name, max(start_dt, now_jkt), stop_dt, sched))
+        except (KeyError, ValueError) as e:
+            log_scheduler.warning(f"CAPACITY: Jadwal '{name}' dilewati karena data tidak lengkap: {e}")
+    return intervals
+
+def build_capacity_timeline(s_data, now_jkt=None):
+    now_jkt = (now_jkt or datetime.now(jakarta_tz)).replace(second=0, microsecond=0)
+    minutes = CAPACITY_HORIZON_DAYS * 24 * 60
+    diff_streams = [0] * (minutes + 1)
+    diff_egress = [0.0] * (minutes + 1)
+    diff_cpu = [0.0] * (minutes + 1)
+
+    # Sesi dengan nama yang sama memakai service systemd yang sama: instance berikutnya menggantikan
+    # instance sebelumnya, jadi interval yang tumpang tindih dipotong, bukan dijumlahkan
+    by_name = {}
+    for name, start_dt, stop_dt, entry in capacity_intervals(s_data, now_jkt):
+        by_name.setdefault(name, []).append((start_dt, stop_dt, entry))
+    for name_intervals in by_name.values():
+        name_intervals.sort(key=lambda item: item[0])
+        for i, (start_dt, stop_dt, entry) in enumerate(name_intervals):
+            if i + 1 < len(name_intervals): stop_dt = min(stop_dt, name_intervals[i + 1][0])
+            start_idx = max(0, int((start_dt - now_jkt).total_seconds() // 60))
+            stop_idx = min(minutes, int(-(-(stop_dt - now_jkt).total_seconds() // 60)))
+            if stop_idx <= start_idx: continue
+            egress, cpu = stream_load(entry)
+            diff_streams[start_idx] += 1; diff_streams[stop_idx] -= 1
+            diff_egress[start_idx] += egress; diff_egress[stop_idx] -= egress
+            diff_cpu[start_idx] += cpu; diff_cpu[stop_idx] -= cpu
+
+    timeline, streams, egress, cpu = [], 0, 0.0, 0.0
+    for idx in range(minutes):
+        streams += diff_streams[idx]; egress += diff_egress[idx]; cpu += diff_cpu[idx]
+        timeline.append((streams, round(egress, 3), round(cpu, 3)))
+    return now_jkt, timeline
+
+def capacity_windows(now_jkt, timeline, predicate):
+    """Gabungkan menit berurutan yang memenuhi predicate menjadi window dengan beban puncaknya."""
+    windows, current = [], None
+    for idx, (streams, egress, cpu) in enumerate(timeline):
+        if predicate(streams, egress, cpu):
+            if current is None:
+                current = {'start_idx': idx, 'peak_streams': streams, 'peak_egress_mbps': egress, 'peak_cpu_cores': cpu}
+            else:
+                current['peak_streams'] = max(current['peak_streams'], streams)
+                current['peak_egress_mbps'] = max(current['peak_egress_mbps'], egress)
+                current['peak_cpu_cores'] = max(current['peak_cpu_cores'], cpu)
+            current['end_idx'] = idx + 1
+        elif current is not None:
+            windows.append(current); current = None
+    if current is not None: windows.append(current)
+    for window in windows:
+        window['start'] = (now_jkt + timedelta(minutes=window.pop('start_idx'))).isoformat()
+        window['end'] = (now_jkt + timedelta(minutes=window.pop('end_idx'))).isoformat()
+    return windows
+
+def is_over_capacity(streams, egress, cpu):
+    return egress > HOST_EGRESS_MBPS or cpu > HOST_CPU_BUDGET_CORES
+
+def check_schedule_capacity(s_data, sched_entry):
+    """Pesan peringatan jika menambahkan sched_entry membuat host melebihi budget egress/CPU."""
+    candidate = dict(s_data)
+    candidate['scheduled_sessions'] = list(s_data.get('scheduled_sessions', [])) + [sched_entry]
+    now_jkt, timeline = build_capacity_timeline(candidate)
+    _, baseline = build_capacity_timeline(s_data, now_jkt)
+    # Hanya menit yang bebannya berubah karena jadwal ini; overload di luar jam jadwal bukan tanggung jawabnya
+    idle = (0, 0.0, 0.0)
+    timeline = [load if load != base else idle for load, base in zip(timeline, baseline)]
+    warnings = []
+    for window in capacity_windows(now_jkt, timeline, is_over_capacity)[:3]:
+        start_display = datetime.fromisoformat(window['start']).strftime('%d-%m-%Y %H:%M')
+        end_display = datetime.fromisoformat(window['end']).strftime('%d-%m-%Y %H:%M')
+        warnings.append(f"{start_display} s/d {end_display}: {window['peak_streams']} stream, "
+                        f"{window['peak_egress_mbps']:.1f}/{HOST_EGRESS_MBPS} Mbps, {window['peak_cpu_cores']:.2f}/{HOST_CPU_BUDGET_CORES} core")
+    return warnings
+
+def get_capacity_report(top_n=5):
+    now_jkt, timeline = build_capacity_timeline(read_sessions())
+    peak_idx = max(range(len(timeline)), key=lambda idx: (timeline[idx][1], timeline[idx][2])) if timeline else 0
+    peak_streams, peak_egress, peak_cpu = timeline[peak_idx] if timeline else (0, 0.0, 0.0)
+    # Window beban tertinggi: menit dengan egress >= 90% dari puncak
+    threshold = peak_egress * 0.9
+    peak_windows = capacity_windows(now_jkt, timeline, lambda streams, egress, cpu: streams > 0 and egress >= threshold)
+    peak_windows.sort(key=lambda w: (w['peak_egress_mbps'], w['peak_cpu_cores']), reverse=True)
+    return {
+        'generated_at': now_jkt.isoformat(),
+        'horizon_days': CAPACITY_HORIZON_DAYS,
+        'budget': {'egress_mbps': HOST_EGRESS_MBPS, 'cpu_cores': HOST_CPU_BUDGET_CORES, 'policy': CAPACITY_POLICY},
+        'peak': {'at': (now_jkt + timedelta(minutes=peak_idx)).isoformat(), 'streams': peak_streams,
+                 'egress_mbps': peak_egress, 'cpu_cores': peak_cpu},
+        'peak_windows': peak_windows[:top_n],
+        'overloaded_windows': capacity_windows(now_jkt, timeline, is_over_capacity)
+    }
+
+
+def overdue_session_ids(s_data, active_sysd_services, now_jakarta_dt):
+    """Sesi yang unitnya masih berjalan padahal waktu stop (jadwal one-time atau stopTime sesi aktif) sudah lewat."""
+    overdue = []
+    for sched_item in s_data.get('scheduled_sessions', []): 
+        if sched_item.get('recurrence_type', 'one_time') == 'daily': 
+            continue
+        if sched_item.get('is_manual_stop', False): continue
+        
+        try:
+            start_dt = datetime.fromisoformat(sched_item['start_time_iso'])
+            dur_mins = sched_item.get('duration_minutes', 0)
+            if dur_mins <= 0: continue 
+            stop_dt = start_dt + timedelta(minutes=dur_mins)
+            # Gunakan sanitized_service_id dari definisi jadwal
+            sanitized_service_id_from_schedule = sched_item.get('sanitized_service_id')
+            if not sanitized_service_id_from_schedule:
+                log_systemd.warning(f"RECONCILE: sanitized_service_id tidak ada di jadwal one-time {sched_item.get('session_name_original')}. Skip.")
                 continue
-            if sched_item.get('is_manual_stop', False): continue
-            
+            serv_name = f"stream-{sanitized_service_id_from_schedule}.service"
+
+            if now_jakarta_dt > stop_dt and serv_name in active_sysd_services:
+                log_systemd.info(f"RECONCILE: Menghentikan sesi terjadwal (one-time) yang terlewat waktu: {sched_item['session_name_original']}")
+                overdue.append(sched_item['session_name_original'])
+        except Exception as e_sched_check:
+             log_systemd.error(f"RECONCILE: Error memeriksa jadwal one-time {sched_item.get('session_name_original')}: {e_sched_check}")
+    
+    for active_session_check in s_data.get('active_sessions', []):
+        stop_time_iso = active_session_check.get('stopTime') # 'stopTime' dari active_sessions
+        session_id_to_check = active_session_check.get('id')
+        sanitized_id_service_check = active_session_check.get('sanitized_service_id')
+
+        if not session_id_to_check or not sanitized_id_service_check:
+           log_systemd.warning(f"RECONCILE (Fallback): Melewati sesi aktif {session_id_to_check or 'UNKNOWN'} karena ID atau sanitized_service_id kurang.")
+           continue
+
+        service_name_check = f"stream-{sanitized_id_service_check}.service"
+
+        # Hanya proses jika stopTime ada, dan service-nya memang masih terdaftar sebagai aktif di systemd
+        if stop_time_iso and service_name_check in active_sysd_services:
             try:
-                start_dt = datetime.fromisoformat(sched_item['start_time_iso'])
-                dur_mins = sched_item.get('duration_minutes', 0)
-                if dur_mins <= 0: continue 
-                stop_dt = start_dt + timedelta(minutes=dur_mins)
-                # Gunakan sanitized_service_id dari definisi jadwal
-                sanitized_service_id_from_schedule = sched_item.get('sanitized_service_id')
-                if not sanitized_service_id_from_schedule:
-                    logging.warning(f"CHECK_SYSTEMD: sanitized_service_id tidak ada di jadwal one-time {sched_item.get('session_name_original')}. Skip.")
-                    continue
-                serv_name = f"stream-{sanitized_service_id_from_schedule}.service"
-
-                if now_jakarta_dt > stop_dt and serv_name in active_sysd_services:
-                    logging.info(f"CHECK_SYSTEMD: Menghentikan sesi terjadwal (one-time) yang terlewat waktu: {sched_item['session_name_original']}")
-                    stop_scheduled_streaming(sched_item['session_name_original']) 
-                    json_changed = True 
-            except Exception as e_sched_check:
-                 logging.error(f"CHECK_SYSTEMD: Error memeriksa jadwal one-time {sched_item.get('session_name_original')}: {e_sched_check}")
-        
-        logging.debug("CHECK_SYSTEMD: Memeriksa sesi aktif yang mungkin terlewat waktu berhentinya...")
-        for active_session_check in list(s_data.get('active_sessions', [])): # Iterasi salinan list
-            stop_time_iso = active_session_check.get('stopTime') # 'stopTime' dari active_sessions
-            session_id_to_check = active_session_check.get('id')
-            sanitized_id_service_check = active_session_check.get('sanitized_service_id')
-
-            if not session_id_to_check or not sanitized_id_service_check:
-               logging.warning(f"CHECK_SYSTEMD (Fallback): Melewati sesi aktif {session_id_to_check or 'UNKNOWN'} karena ID atau sanitized_service_id kurang.")
-               continue
-
-            service_name_check = f"stream-{sanitized_id_service_check}.service"
-
-         # Hanya proses jika stopTime ada, dan service-nya memang masih terdaftar sebagai aktif di systemd
-            if stop_time_iso and service_name_check in active_sysd_services:
-             try:
-                 # Pastikan stop_time_dt dalam timezone yang sama dengan now_jakarta_dt untuk perbandingan
-                 stop_time_dt = datetime.fromisoformat(stop_time_iso)
-                 if stop_time_dt.tzinfo is None: # Jika naive, lokalkan ke Jakarta
-                     stop_time_dt = jakarta_tz.localize(stop_time_dt)
-                 else: # Jika sudah ada timezone, konversikan ke Jakarta
-                     stop_time_dt = stop_time_dt.astimezone(jakarta_tz)
-
-                 if now_jakarta_dt > stop_time_dt:
-                     logging.info(f"CHECK_SYSTEMD (Fallback): Sesi aktif '{session_id_to_check}' (service: {service_name_check}) telah melewati waktu berhenti yang tercatat ({stop_time_iso}). Menghentikan sekarang...")
-                     # Panggil fungsi stop_scheduled_streaming yang sudah ada.
-                     # Fungsi ini sudah menangani pemindahan ke inactive_sessions, penghapusan service, dan update JSON.
-                     stop_scheduled_streaming(session_id_to_check)
-                     # Karena stop_scheduled_streaming sudah melakukan write_sessions dan emit socket,
-                     # kita mungkin tidak perlu set json_changed = True di sini secara eksplisit
-                     # HANYA untuk aksi stop ini, tapi perhatikan jika ada logika lain di check_systemd_sessions.
-                     # Namun, untuk konsistensi bahwa ada perubahan, bisa saja ditambahkan.
-                     json_changed = True # Menandakan ada perubahan pada sessions.json
-             except ValueError:
-                 logging.warning(f"CHECK_SYSTEMD (Fallback): Format stopTime ('{stop_time_iso}') tidak valid untuk sesi aktif '{session_id_to_check}'. Tidak dapat memeriksa fallback stop.")
-             except Exception as e_fallback_stop:
-                 logging.error(f"CHECK_SYSTEMD (Fallback): Error saat mencoba menghentikan sesi aktif '{session_id_to_check}' yang overdue via fallback: {e_fallback_stop}", exc_info=True)
+                # Pastikan stop_time_dt dalam timezone yang sama dengan now_jakarta_dt untuk perbandingan
+                stop_time_dt = datetime.fromisoformat(stop_time_iso)
+                if stop_time_dt.tzinfo is None: # Jika naive, lokalkan ke Jakarta
+                    stop_time_dt = jakarta_tz.localize(stop_time_dt)
+                else: # Jika sudah ada timezone, konversikan ke Jakarta
+                    stop_time_dt = stop_time_dt.astimezone(jakarta_tz)
+
+                if now_jakarta_dt > stop_time_dt:
+                    log_systemd.info(f"RECONCILE (Fallback): Sesi aktif '{session_id_to_check}' (service: {service_name_check}) telah melewati waktu berhenti yang tercatat ({stop_time_iso}). Menghentikan sekarang...")
+                    overdue.append(session_id_to_check)
+            except ValueError:
+                log_systemd.warning(f"RECONCILE (Fallback): Format stopTime ('{stop_time_iso}') tidak valid untuk sesi aktif '{session_id_to_check}'. Tidak dapat memeriksa fallback stop.")
+    return list(dict.fromkeys(overdue))
 
+@traced_job
+def reconcile_sessions():
+    global destination_health_view
+    try:
+        now_jakarta_dt = datetime.now(jakarta_tz)
+        s_data = read_sessions()
+        unit_states = stream_unit_states(s_data)
+        active_sysd_services = alive_stream_units(unit_states)
+
+        overdue = overdue_session_ids(s_data, active_sysd_services, now_jakarta_dt)
+        if overdue:
+            run_schedule_batch(stops=overdue) # Menulis sessions.json dan emit sendiri
+            s_data = read_sessions()
+            unit_states = stream_unit_states(s_data)
+            active_sysd_services = alive_stream_units(unit_states)
+
+        json_changed = False
+        # Unit berjalan tanpa sesi -> catat sebagai sesi aktif
+        tracked_units = {f"stream-{sess.get('sanitized_service_id')}.service" for sess in s_data.get('active_sessions', [])}
+        transitions = []
+        for service_name_systemd in sorted(active_sysd_services - tracked_units):
+            transitions.append((adopt_untracked_unit(s_data, service_name_systemd, now_jakarta_dt), 'recovered', 'adopted'))
+            json_changed = True
+
+        # Sesi aktif yang unitnya benar-benar berhenti (inactive) -> pindah ke inactive. Unit 'failed' ditangani
+        # monitor_stream_health lewat mark_session_failed (alasan + hapus unit); unit yang sedang auto-restart dibiarkan.
         for active_json_session in list(s_data.get('active_sessions',[])): 
             # Gunakan sanitized_service_id dari sesi aktif
             san_id_active_service = active_json_session.get('sanitized_service_id')
             if not san_id_active_service : 
-                logging.warning(f"CHECK_SYSTEMD: Sesi aktif {active_json_session.get('id')} tidak memiliki sanitized_service_id. Skip.")
+                log_systemd.warning(f"RECONCILE: Sesi aktif {active_json_session.get('id')} tidak memiliki sanitized_service_id. Skip.")
                 continue 
             serv_name_active = f"stream-{san_id_active_service}.service"
 
-            if serv_name_active not in active_sysd_services:
+            if unit_states.get(serv_name_active) == 'inactive':
                 is_recently_stopped_by_scheduler = any(
                     s['id'] == active_json_session.get('id') and 
                     s.get('status') == 'inactive' and
-                    (datetime.now(jakarta_tz) - datetime.fromisoformat(s.get('stop_time')).astimezone(jakarta_tz) < timedelta(minutes=2))
+                    (now_jakarta_dt - datetime.fromisoformat(s.get('stop_time')).astimezone(jakarta_tz) < timedelta(minutes=2))
                     for s in s_data.get('inactive_sessions', [])
                 )
                 if is_recently_stopped_by_scheduler:
-                    logging.info(f"CHECK_SYSTEMD: Sesi {active_json_session.get('id')} sepertinya baru dihentikan oleh scheduler. Skip pemindahan otomatis.")
+                    log_systemd.info(f"RECONCILE: Sesi {active_json_session.get('id')} sepertinya baru dihentikan oleh scheduler. Skip pemindahan otomatis.")
                     continue
 
-                logging.info(f"CHECK_SYSTEMD: Sesi {active_json_session.get('id','N/A')} (service: {serv_name_active}) tidak aktif di systemd. Memindahkan ke inactive.")
+                log_systemd.info(f"RECONCILE: Sesi {active_json_session.get('id','N/A')} (service: {serv_name_active}) tidak aktif di systemd. Memindahkan ke inactive.")
                 active_json_session['status']='inactive'
                 active_json_session['stop_time']=now_jakarta_dt.isoformat()
                 s_data.setdefault('inactive_sessions',[]).append(active_json_session)
                 s_data['active_sessions']=[s for s in s_data['active_sessions'] if s.get('id')!=active_json_session.get('id')]
+                transitions.append((active_json_session.get('id'), 'crash', 'unit tidak berjalan'))
                 json_changed = True
         
         if json_changed: 
             write_sessions(s_data) 
+            record_session_events(transitions)
+            sessions_data = get_active_sessions_data()
+            inactive_data = {"inactive_sessions": get_inactive_sessions_data()}
             with socketio_lock:
-                socketio.emit('sessions_update', get_active_sessions_data())
-                socketio.emit('inactive_sessions_update', {"inactive_sessions": get_inactive_sessions_data()})
-    except Exception as e: logging.error(f"CHECK_SYSTEMD: Error: {e}", exc_info=True)
-
+                socketio.emit('sessions_update', sessions_data)
+                socketio.emit('inactive_sessions_update', inactive_data)
 
-def start_scheduled_streaming(platform, stream_key, video_file, session_name_original, 
-                              one_time_duration_minutes=0, recurrence_type='one_time', 
-                              daily_start_time_str=None, daily_stop_time_str=None):
-    logging.info(f"Mulai stream terjadwal: '{session_name_original}', Tipe: {recurrence_type}, Durasi One-Time: {one_time_duration_minutes} menit, Jadwal Harian: {daily_start_time_str}-{daily_stop_time_str}")
-    
-    video_path = os.path.abspath(os.path.join(VIDEO_DIR, video_file))
-    if not os.path.isfile(video_path):
-        logging.error(f"Video {video_file} tidak ada untuk jadwal '{session_name_original}'. Jadwal mungkin perlu dibatalkan.")
-        return
-
-    platform_url = "rtmp://a.rtmp.youtube.com/live2" if platform == "YouTube" else "rtmps://live-api-s.facebook.com:443/rtmp"
-    
-    try:
-        # create_service_file menggunakan session_name_original, dan mengembalikan sanitized_service_part
-        service_name_systemd, sanitized_service_id_part = create_service_file(session_name_original, video_path, platform_url, stream_key)
-        subprocess.run(["systemctl", "start", service_name_systemd], check=True, capture_output=True, text=True)
-        logging.info(f"Service {service_name_systemd} untuk jadwal '{session_name_original}' dimulai.")
-        
-        current_start_time_iso = datetime.now(jakarta_tz).isoformat()
-        s_data = read_sessions()
+        running_units = {unit for unit, state in unit_states.items() if state == 'active'}
+        destination_health_view = {sess['id']: get_destination_health(sess, running_units) for sess in s_data.get('active_sessions', [])}
+        publish_leader_state()
+    except Exception as e: log_systemd.error(f"RECONCILE: Error: {e}", exc_info=True)
 
-        active_session_stop_time_iso = None
-        active_session_duration_minutes = 0
-        active_schedule_type = "unknown"
-        current_start_dt = datetime.fromisoformat(current_start_time_iso)
-
-        if recurrence_type == 'daily' and daily_start_time_str and daily_stop_time_str:
-            active_schedule_type = "daily_recurring_instance"
-            start_h, start_m = map(int, daily_start_time_str.split(':'))
-            stop_h, stop_m = map(int, daily_stop_time_str.split(':'))
-            duration_for_this_instance = (stop_h * 60 + stop_m) - (start_h * 60 + start_m)
-            if duration_for_this_instance <= 0: 
-                duration_for_this_instance += 24 * 60
-            active_session_duration_minutes = duration_for_this_instance
-            active_session_stop_time_iso = (current_start_dt + timedelta(minutes=duration_for_this_instance)).isoformat()
-        elif recurrence_type == 'one_time':
-            active_schedule_type = "scheduled"
-            active_session_duration_minutes = one_time_duration_minutes
-            if one_time_duration_minutes > 0:
-                active_session_stop_time_iso = (current_start_dt + timedelta(minutes=one_time_duration_minutes)).isoformat()
-        else:
-             active_schedule_type = "manual_from_schedule_error"
 
-        new_active_session_entry = {
-            "id": session_name_original, # Nama sesi asli
-            "sanitized_service_id": sanitized_service_id_part, # ID untuk service systemd
-            "video_name": video_file, "stream_key": stream_key, "platform": platform,
-            "status": "active", "start_time": current_start_time_iso,
-            "scheduleType": active_schedule_type,
-            "stopTime": active_session_stop_time_iso,
-            "duration_minutes": active_session_duration_minutes
-        }
-        s_data['active_sessions'] = add_or_update_session_in_list(
-    s_data.get('active_sessions', []), new_active_session_entry
-)
+# ---- PRE-WARM JADWAL ----
+# SCHEDULE_PREWARM_SECONDS sebelum jadwal mulai, unit systemd ditulis + daemon-reload, argumen divalidasi
+# dan awal file video dimuat ke page cache. Saat jadwal jalan, start_scheduled_streaming hanya perlu
+# "systemctl start" jika isi unit masih sama dengan yang disiapkan.
+prewarmed_streams = {} # sanitized_service_id -> {'content_hash', 'prepared_at'}
+prewarmed_streams_lock = Lock()
+start_latency_records = [] # Catatan latensi start terjadwal terbaru (maks START_LATENCY_HISTORY)
 
-        if recurrence_type == 'one_time':
-            # Hapus definisi jadwal one-time dari scheduled_sessions berdasarkan session_name_original
-            s_data['scheduled_sessions'] = [s for s in s_data.get('scheduled_sessions', []) if not (s.get('session_name_original') == session_name_original and s.get('recurrence_type', 'one_time') == 'one_time')]
-        
-        write_sessions(s_data)
-        
-        with socketio_lock:
-            socketio.emit('sessions_update', get_active_sessions_data())
-            socketio.emit('schedules_update', get_schedules_list_data())
-        logging.info(f"Sesi terjadwal '{session_name_original}' (Tipe: {recurrence_type}) dimulai, update dikirim.")
+def service_content_hash(service_content):
+    return hashlib.sha256(service_content.encode()).hexdigest()
 
+def warm_video_page_cache(video_path):
+    fd = os.open(video_path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        # Baca bagian awal (header + GOP pertama) dan 8 MB terakhir (moov atom di akhir file MP4)
+        for offset, length in ((0, min(size, PREWARM_READ_BYTES)), (max(0, size - 8 * 1024 * 1024), min(size, 8 * 1024 * 1024))):
+            remaining, pos = length, offset
+            while remaining > 0:
+                chunk = os.pread(fd, min(remaining, 4 * 1024 * 1024), pos)
+                if not chunk: break
+                remaining -= len(chunk); pos += len(chunk)
+    finally:
+        os.close(fd)
+
+@traced_job
+def prewarm_scheduled_streaming(platform, stream_key, video_file, session_name_original, destinations=None, encoding_profile=None, playlist=None):
+    started = time.monotonic()
+    sanitized_service_id_part = sanitize_for_service_name(session_name_original)
+    video_path = os.path.abspath(os.path.join(VIDEO_DIR, (playlist or [video_file])[0]))
+    try:
+        destinations = parse_destinations({'destinations': destinations, 'platform': platform, 'stream_key': stream_key})
+        if not sanitized_service_id_part:
+            raise ValueError("nama sesi tidak valid")
+        input_path = prepare_stream_input(session_name_original, video_file, playlist)
+        probe = run_cmd(["ffprobe", "-v", "error", "-show_entries", "stream=codec_type", "-of", "csv=p=0", video_path],
+                               capture_output=True, text=True, timeout=20)
+        if probe.returncode != 0 or 'video' not in probe.stdout:
+            raise ValueError(f"video {video_file} tidak bisa dibaca ffprobe: {probe.stderr.strip()[:200]}")
+
+        service_name_systemd, _ = create_service_file(session_name_original, input_path, destinations, encoding_profile)
+        warm_video_page_cache(video_path)
+        with prewarmed_streams_lock:
+            prewarmed_streams[sanitized_service_id_part] = {
+                'content_hash': service_content_hash(build_service_content(session_name_original, input_path, destinations, encoding_profile)),
+                'prepared_at': datetime.now(jakarta_tz).isoformat()
+            }
+        publish_leader_state()
+        log_scheduler.info(f"PRE-WARM: '{session_name_original}' siap ({service_name_systemd}) dalam {int((time.monotonic() - started) * 1000)} ms.")
     except Exception as e:
-        logging.error(f"Error start_scheduled_streaming untuk '{session_name_original}': {e}", exc_info=True)
-
-
-def stop_scheduled_streaming(session_name_original_or_active_id):
-    logging.info(f"Menghentikan stream (terjadwal/aktif): '{session_name_original_or_active_id}'")
-    s_data = read_sessions()
-    # Cari sesi aktif berdasarkan ID (nama sesi asli)
-    session_to_stop = next((s for s in s_data.get('active_sessions', []) if s['id'] == session_name_original_or_active_id), None)
-    
-    if not session_to_stop:
-        logging.warning(f"Sesi '{session_name_original_or_active_id}' tidak ditemukan dalam daftar sesi aktif untuk dihentikan.")
+        # Jadwal tetap jalan saat waktunya; start_scheduled_streaming akan menyiapkan semuanya sendiri
+        log_scheduler.error(f"PRE-WARM: Gagal menyiapkan jadwal '{session_name_original}': {e}")
+
+def consume_prewarmed_stream(sanitized_service_id_part, service_content):
+    """True jika unit sudah disiapkan pre-warm dengan isi yang sama (tinggal systemctl start)."""
+    with prewarmed_streams_lock:
+        entry = prewarmed_streams.pop(sanitized_service_id_part, None)
+    if entry: publish_leader_state()
+    if not entry or entry['content_hash'] != service_content_hash(service_content):
+        return False
+    try:
+        with open(os.path.join(SERVICE_DIR, f"stream-{sanitized_service_id_part}.service"), 'r') as f:
+            return f.read() == service_content
+    except OSError:
+        return False
+
+def discard_prewarmed_stream(sanitized_service_id_part):
+    with prewarmed_streams_lock:
+        entry = prewarmed_streams.pop(sanitized_service_id_part, None)
+    if entry: publish_leader_state()
+
+def nominal_fire_time(recurrence_type, daily_start_time_str=None):
+    # Waktu jadwal seharusnya jalan (resolusi menit), acuan pengukuran latensi start
+    now_jkt = datetime.now(jakarta_tz)
+    if recurrence_type == 'daily' and daily_start_time_str:
+        start_h, start_m = map(int, daily_start_time_str.split(':'))
+        fire_dt = now_jkt.replace(hour=start_h, minute=start_m, second=0, microsecond=0)
+        return fire_dt if fire_dt <= now_jkt else fire_dt - timedelta(days=1)
+    return now_jkt.replace(second=0, microsecond=0)
+
+def process_has_established_connection(pid, remote_port):
+    # Cari socket TCP milik proses yang sudah ESTABLISHED ke port ingest (tanpa fork ss/lsof)
+    try:
+        inodes = set()
+        for fd_name in os.listdir(f"/proc/{pid}/fd"):
+            try:
+                target = os.readlink(f"/proc/{pid}/fd/{fd_name}")
+            except OSError:
+                continue
+            if target.startswith('socket:['): inodes.add(target[8:-1])
+        if not inodes: return False
+        for table in ('/proc/net/tcp', '/proc/net/tcp6'):
+            if not os.path.exists(table): continue
+            with open(table, 'r') as f:
+                next(f, None)
+                for line in f:
+                    fields = line.split()
+                    if len(fields) > 9 and fields[3] == '01' and fields[9] in inodes and int(fields[2].rsplit(':', 1)[1], 16) == remote_port:
+                        return True
+    except (OSError, ValueError):
+        pass
+    return False
+
+def record_first_packet_latency(session_name_original, service_name_systemd, platform_url, fire_dt, prewarmed):
+    """Ukur waktu dari jadwal seharusnya jalan sampai ffmpeg membuka koneksi ke ingest (paket handshake
+    RTMP pertama), lalu simpan di start_latency sesi aktif dan di start_latency_records."""
+    remote_port = urllib.parse.urlparse(platform_url).port or (443 if platform_url.startswith('rtmps') else 1935)
+    deadline = time.monotonic() + FIRST_PACKET_TIMEOUT_SECONDS
+    first_packet_dt, pid = None, 0
+    while time.monotonic() < deadline:
+        if CLUSTER_AGENTS: # ffmpeg berjalan di host agent; agent yang menunggu koneksinya
+            if cluster_wait_ingest(service_name_systemd, remote_port, deadline - time.monotonic()): first_packet_dt = datetime.now(jakarta_tz)
+            break
+        if not pid:
+            try:
+                pid = int(run_cmd(["systemctl", "show", "-p", "MainPID", "--value", service_name_systemd],
+                                         capture_output=True, text=True, timeout=5).stdout.strip() or 0)
+            except (subprocess.SubprocessError, ValueError):
+                pid = 0
+        if pid and process_has_established_connection(pid, remote_port):
+            first_packet_dt = datetime.now(jakarta_tz)
+            break
+        time.sleep(0.05)
+
+    latency_ms = int((first_packet_dt - fire_dt).total_seconds() * 1000) if first_packet_dt else None
+    record = {'session': session_name_original, 'fire_time': fire_dt.isoformat(), 'prewarmed': prewarmed,
+              'fire_to_first_packet_ms': latency_ms}
+    start_latency_records.append(record)
+    del start_latency_records[:-START_LATENCY_HISTORY]
+    publish_leader_state()
+    if latency_ms is None:
+        log_scheduler.warning(f"Latensi start '{session_name_original}': koneksi ingest tidak terdeteksi dalam {FIRST_PACKET_TIMEOUT_SECONDS} detik.")
         return
-
-    # Gunakan sanitized_service_id dari sesi aktif untuk menghentikan service yang benar
-    sanitized_id_service_to_stop = session_to_stop.get('sanitized_service_id')
-    if not sanitized_id_service_to_stop:
-        logging.error(f"Tidak dapat menghentikan service untuk sesi '{session_name_original_or_active_id}' karena sanitized_service_id tidak ditemukan.")
+    log_scheduler.info(f"Latensi start '{session_name_original}': {latency_ms} ms dari jadwal ke paket pertama (pre-warm: {prewarmed}).")
+    try:
+        s_data = read_sessions()
+        active_entry = next((sess for sess in s_data.get('active_sessions', []) if sess.get('id') == session_name_original), None)
+        if active_entry and active_entry.get('start_latency', {}).get('fire_time') == fire_dt.isoformat():
+            active_entry['start_latency']['fire_to_first_packet_ms'] = latency_ms
+            write_sessions(s_data)
+    except Exception as e:
+        log_scheduler.error(f"Gagal menyimpan latensi start '{session_name_original}': {e}")
+
+
+# ---- ADMISSION CONTROL ----
+# Start baru ditolak (API) atau diantrekan (jadwal) jika setelah stream baru jalan sisa CPU idle host
+# atau MemAvailable di bawah batas. CPU idle diambil dari sampel /proc/stat yang diperbarui thread
+# host-cpu-sampler agar pemeriksaan di request tidak perlu menunggu.
+host_cpu_sample = {'idle_fraction': None, 'sampled_at': None}
+admission_waiting = {} # session_name_original -> info start terjadwal yang menunggu resource
+admission_waiting_lock = Lock()
+
+def read_proc_stat_cpu():
+    with open('/proc/stat') as f:
+        values = [int(v) for v in f.readline().split()[1:9]]
+    return sum(values), values[3] + values[4] # (total, idle + iowait)
+
+def host_cpu_sampler():
+    previous = read_proc_stat_cpu()
+    while True:
+        time.sleep(HOST_CPU_SAMPLE_SECONDS)
+        try:
+            current = read_proc_stat_cpu()
+            total_delta = current[0] - previous[0]
+            if total_delta > 0:
+                host_cpu_sample.update(idle_fraction=(current[1] - previous[1]) / total_delta, sampled_at=time.monotonic())
+            previous = current
+        except Exception as e:
+            log_systemd.warning(f"ADMISSION: Gagal membaca /proc/stat: {e}")
+
+def start_host_cpu_sampler():
+    threading.Thread(target=host_cpu_sampler, name="host-cpu-sampler", daemon=True).start()
+
+def read_mem_available_mb():
+    with open('/proc/meminfo') as f:
+        for line in f:
+            if line.startswith('MemAvailable:'): return int(line.split()[1]) / 1024
+    return None
+
+def check_admission(encoding_profile, pending_cpu_cores=0, pending_memory_mb=0):
+    """None jika stream baru boleh jalan, atau alasan penolakan. pending_* = stream yang baru
+    diizinkan dalam batch yang sama (belum terlihat di sampel host)."""
+    if not ADMISSION_ENABLED: return None
+    cpu_cores, memory_mb = stream_resource_estimate(encoding_profile)
+    if CLUSTER_AGENTS: # Unit yang sudah ditempatkan ikut dihitung choose_agent, pending tidak perlu
+        return None if choose_agent(cpu_cores, memory_mb) else "tidak ada agent cluster yang sehat dengan sisa CPU/memori cukup"
+    total_cores = os.cpu_count() or 1
+    if host_cpu_sample['idle_fraction'] is not None:
+        idle_after = host_cpu_sample['idle_fraction'] * total_cores - pending_cpu_cores - cpu_cores
+        if idle_after < total_cores * ADMISSION_MIN_CPU_HEADROOM:
+            return f"CPU idle tersisa {max(idle_after, 0):.2f} dari {total_cores} core (minimal {total_cores * ADMISSION_MIN_CPU_HEADROOM:.2f})"
+    try:
+        mem_available_mb = read_mem_available_mb()
+    except OSError:
+        mem_available_mb = None
+    if mem_available_mb is not None:
+        mem_after = mem_available_mb - pending_memory_mb - memory_mb
+        if mem_after < ADMISSION_MIN_MEM_AVAILABLE_MB:
+            return f"memori tersedia {int(max(mem_after, 0))} MB (minimal {ADMISSION_MIN_MEM_AVAILABLE_MB} MB)"
+    return None
+
+def defer_scheduled_start(item, reason):
+    session_name = item['session_name_original']
+    item.setdefault('admission_queued_at', time.time())
+    waited = time.time() - item['admission_queued_at']
+    if waited > ADMISSION_QUEUE_TIMEOUT_SECONDS:
+        with admission_waiting_lock: admission_waiting.pop(session_name, None)
+        log_scheduler.error(f"ADMISSION: Start terjadwal '{session_name}' dibatalkan setelah menunggu {int(waited)} detik: {reason}")
         return
-        
-    service_name_to_stop = f"stream-{sanitized_id_service_to_stop}.service"
-    
+    with admission_waiting_lock:
+        info = admission_waiting.setdefault(session_name, {'session_name': session_name, 'attempts': 0,
+                                                           'queued_at': datetime.now(jakarta_tz).isoformat()})
+        info.update(reason=reason, attempts=info['attempts'] + 1)
+    log_scheduler.warning(f"ADMISSION: Start terjadwal '{session_name}' diantrekan ({reason}), dicoba lagi dalam {ADMISSION_RETRY_SECONDS} detik.")
+    timer = threading.Timer(ADMISSION_RETRY_SECONDS, retry_deferred_start, args=(item,))
+    timer.daemon = True
+    timer.start()
+
+def retry_deferred_start(item):
+    with admission_waiting_lock:
+        # Sudah dibatalkan (misal job stop-nya jalan duluan)
+        if item['session_name_original'] not in admission_waiting: return
+    enqueue_schedule_batch('starts', item)
+
+def get_admission_status():
+    try: mem_available_mb = read_mem_available_mb()
+    except OSError: mem_available_mb = None
+    with admission_waiting_lock: waiting = list(admission_waiting.values())
+    return {
+        'enabled': ADMISSION_ENABLED, 'cpu_cores': os.cpu_count() or 1,
+        'cpu_idle_fraction': host_cpu_sample['idle_fraction'], 'mem_available_mb': mem_available_mb,
+        'min_cpu_headroom': ADMISSION_MIN_CPU_HEADROOM, 'min_mem_available_mb': ADMISSION_MIN_MEM_AVAILABLE_MB,
+        'queued_starts': waiting
+    }
+
+# ---- SAMPLING RESOURCE STREAM ----
+# Thread stream-resource-sampler membaca counter kumulatif cgroup setiap unit di STREAM_SLICE dan
+# menyimpan selisihnya sebagai baris ringkas di deque berukuran tetap per sesi. Sampel terakhir
+# ditempelkan ke entri get_active_sessions_data(), riwayat lengkap ada di /api/sessions/resources.
+STREAM_RESOURCE_FIELDS = ('ts', 'cpu_percent', 'rss_mb', 'disk_read_kbps', 'net_out_kbps', 'net_in_kbps')
+stream_resource_counters = {} # sanitized_service_id -> (monotonic, cpu_usec, read_bytes, egress_bytes, ingress_bytes)
+stream_resource_history = {}  # sanitized_service_id -> deque(tuple STREAM_RESOURCE_FIELDS)
+stream_resources_latest = {}  # sanitized_service_id -> dict sampel terakhir (diganti utuh setiap putaran)
+stream_resource_lock = Lock()
+active_sessions_with_resources = {'view_key': None, 'resources': None, 'value': None}
+
+def read_cgroup_keyed(path, key=None):
+    with open(path) as f:
+        if key is None: return int(f.read().split()[0])
+        for line in f:
+            name, _, value = line.partition(' ')
+            if name == key: return int(value)
+    return 0
+
+def read_cgroup_io_read_bytes(path):
+    total = 0
+    with open(path) as f:
+        for line in f:
+            for field in line.split()[1:]:
+                if field.startswith('rbytes='): total += int(field[7:])
+    return total
+
+def read_unit_counters(unit_dir):
+    return (read_cgroup_keyed(os.path.join(unit_dir, 'cpu.stat'), 'usage_usec'),
+            read_cgroup_keyed(os.path.join(unit_dir, 'memory.stat'), 'anon'),
+            read_cgroup_io_read_bytes(os.path.join(unit_dir, 'io.stat')) if os.path.exists(os.path.join(unit_dir, 'io.stat')) else 0)
+
+def ip_accounting_bytes(value):
+    # "[not set]" / 2^64-1 jika IPAccounting belum aktif (unit lama sebelum ditulis ulang)
+    try: value = int(value)
+    except (TypeError, ValueError): return None
+    return None if value >= 2 ** 63 else value
+
+def sample_stream_resources():
+    global stream_resources_latest
+    slice_dir = os.path.join(CGROUP_ROOT, STREAM_SLICE)
+    now, now_epoch = time.monotonic(), int(time.time())
+    counters = {}
+    for entry in os.scandir(slice_dir) if os.path.isdir(slice_dir) else ():
+        if not (entry.name.startswith('stream-') and entry.name.endswith('.service')): continue
+        try: counters[entry.name] = read_unit_counters(entry.path)
+        except (OSError, ValueError): continue # Unit berhenti di tengah pembacaan
+    network = systemctl_show(sorted(counters), ['IPEgressBytes', 'IPIngressBytes']) if counters else {}
+
+    latest = {}
+    with stream_resource_lock:
+        for service_name, (cpu_usec, rss_bytes, read_bytes) in counters.items():
+            sanitized_id = service_name[len('stream-'):-len('.service')]
+            props = network.get(service_name, {})
+            egress, ingress = ip_accounting_bytes(props.get('IPEgressBytes')), ip_accounting_bytes(props.get('IPIngressBytes'))
+            previous = stream_resource_counters.get(sanitized_id)
+            stream_resource_counters[sanitized_id] = (now, cpu_usec, read_bytes, egress, ingress)
+            if not previous or cpu_usec < previous[1]: continue # Sampel pertama / unit di-restart (counter mulai dari nol)
+            elapsed = now - previous[0]
+            rate_kbps = lambda current, before: round((current - before) * 8 / 1000 / elapsed, 1) if current is not None and before is not None and current >= before else None
+            row = (now_epoch, round((cpu_usec - previous[1]) / 1e4 / elapsed, 1), round(rss_bytes / 1048576, 1),
+                   round((read_bytes - previous[2]) / 1024 / elapsed, 1), rate_kbps(egress, previous[3]), rate_kbps(ingress, previous[4]))
+            stream_resource_history.setdefault(sanitized_id, deque(maxlen=STREAM_SAMPLE_HISTORY)).append(row)
+            latest[sanitized_id] = dict(zip(STREAM_RESOURCE_FIELDS, row))
+        for sanitized_id in set(stream_resource_counters) - {name[len('stream-'):-len('.service')] for name in counters}:
+            stream_resource_counters.pop(sanitized_id, None)
+            stream_resource_history.pop(sanitized_id, None)
+    stream_resources_latest = latest
+
+def stream_resource_sampler():
+    while True:
+        time.sleep(STREAM_SAMPLE_INTERVAL_SECONDS)
+        try: sample_stream_resources()
+        except Exception as e: log_systemd.warning(f"RESOURCE: Gagal sampling cgroup stream: {e}")
+
+def start_stream_resource_sampler():
+    threading.Thread(target=stream_resource_sampler, name="stream-resource-sampler", daemon=True).start()
+
+def attach_stream_resources(view):
+    """Entri sesi aktif + sampel resource terakhir; di-cache selama view dan sampel tidak berubah."""
+    global active_sessions_with_resources
+    resources = stream_resources_latest
+    if not resources: return view['active']
+    cached = active_sessions_with_resources
+    if cached['view_key'] == view['key'] and cached['resources'] is resources: return cached['value']
+    value = [dict(entry, resources=resources.get(entry['sanitized_service_id'])) for entry in view['active']]
+    active_sessions_with_resources = {'view_key': view['key'], 'resources': resources, 'value': value}
+    return value
+
+def get_stream_resource_history(sanitized_id=None):
+    with stream_resource_lock:
+        history = {sid: list(rows) for sid, rows in stream_resource_history.items() if sanitized_id is None or sid == sanitized_id}
+    return {'fields': STREAM_RESOURCE_FIELDS, 'interval_seconds': STREAM_SAMPLE_INTERVAL_SECONDS, 'sessions': history}
+
+# ---- RESTART & FAILOVER ----
+# monitor_stream_health membaca status semua unit stream dengan satu "systemctl show". Kegagalan baru
+# dikenali dari ExecMainExitTimestamp yang berubah (restart yang disengaja panel keluar dengan sinyal 15
+# / kode 255 dan diabaikan). Setiap kegagalan membuka insiden yang ditutup thread pemantau saat koneksi
+# ingest kembali; time-to-recovery dihitung dari saat proses lama mati.
+stream_health_state = {} # sanitized_service_id -> {'last_exit_usec', 'consecutive_failures', 'permanent_hits', 'incident'}
+stream_health_lock = Lock()
+PERMANENT_FAILURE_RE = re.compile('|'.join(PERMANENT_FAILURE_PATTERNS), re.IGNORECASE)
+
+def systemctl_show(units, properties):
+    """{unit: {properti: nilai}} untuk banyak unit sekaligus dengan satu pemanggilan systemctl show."""
+    if not units: return {}
+    out = run_cmd(["systemctl", "show", *units, "-p", ",".join(['Id'] + list(properties))],
+                         capture_output=True, text=True, timeout=15).stdout
+    result = {}
+    for block in out.strip('\n').split('\n\n'):
+        props = dict(line.split('=', 1) for line in block.splitlines() if '=' in line)
+        if props.get('Id'): result[props['Id']] = props
+    return result
+
+def monotonic_usec_to_datetime(usec):
+    # Timestamp *Monotonic systemd memakai CLOCK_MONOTONIC yang sama dengan time.monotonic()
+    return datetime.now(jakarta_tz) - timedelta(seconds=time.monotonic() - int(usec) / 1e6)
+
+def session_ingest_port(sess):
+    url = destination_url(session_destinations(sess)[0])
+    return urllib.parse.urlparse(url).port or (443 if url.startswith('rtmps') else 1935)
+
+def track_incident_recovery(session_name_original, sanitized_service_id, service_name, remote_port):
+    deadline = time.monotonic() + STREAM_RECOVERY_TIMEOUT_SECONDS
+    recovered_dt, pid = None, 0
+    while time.monotonic() < deadline:
+        with stream_health_lock:
+            state = stream_health_state.get(sanitized_service_id)
+            if not state or not state.get('incident'): return # Sesi dihentikan/ditandai gagal
+        if CLUSTER_AGENTS:
+            if cluster_wait_ingest(service_name, remote_port, 5):
+                recovered_dt = datetime.now(jakarta_tz)
+                break
+            continue
+        try:
+            pid = int(run_cmd(["systemctl", "show", "-p", "MainPID", "--value", service_name],
+                                     capture_output=True, text=True, timeout=5).stdout.strip() or 0)
+        except (subprocess.SubprocessError, ValueError):
+            pid = 0
+        if pid and process_has_established_connection(pid, remote_port):
+            recovered_dt = datetime.now(jakarta_tz)
+            break
+        time.sleep(0.5)
+
+    with stream_health_lock:
+        state = stream_health_state.get(sanitized_service_id) or {}
+        incident, state['incident'] = state.get('incident'), None
+        if recovered_dt: state['consecutive_failures'] = 0
+    if not incident: return
+    publish_leader_state()
+    incident['recovered_at'] = recovered_dt.isoformat() if recovered_dt else None
+    incident['time_to_recovery_ms'] = int((recovered_dt - datetime.fromisoformat(incident['started_at'])).total_seconds() * 1000) if recovered_dt else None
+    if recovered_dt:
+        record_session_event(session_name_original, 'recovered', f"{incident['restarts']} restart, failover: {incident['failover']}")
+        log_systemd.info(f"RECOVERY: Sesi '{session_name_original}' pulih dalam {incident['time_to_recovery_ms']} ms setelah {incident['restarts']} restart (failover: {incident['failover']}).")
+    else:
+        log_systemd.warning(f"RECOVERY: Sesi '{session_name_original}' belum pulih setelah {STREAM_RECOVERY_TIMEOUT_SECONDS} detik.")
+    def apply(s_data):
+        # Sesi bisa sudah pindah ke inactive (ditandai gagal) selama menunggu pemulihan
+        entry = next((sess for sess in s_data.get('active_sessions', []) + s_data.get('inactive_sessions', []) if sess.get('id') == session_name_original), None)
+        if entry is None: return False
+        entry.setdefault('incidents', []).append(incident)
+        del entry['incidents'][:-STREAM_INCIDENT_HISTORY]
     try:
-        subprocess.run(["systemctl", "stop", service_name_to_stop], check=False, timeout=15)
-        service_path_to_stop = os.path.join(SERVICE_DIR, service_name_to_stop)
-        if os.path.exists(service_path_to_stop):
-            os.remove(service_path_to_stop)
-            subprocess.run(["systemctl", "daemon-reload"], check=False, timeout=10)
-
-        stop_time_iso = datetime.now(jakarta_tz).isoformat()
-        session_to_stop['status'] = 'inactive'
-        session_to_stop['stop_time'] = stop_time_iso
-        
-        s_data['inactive_sessions'] = add_or_update_session_in_list(
-    s_data.get('inactive_sessions', []), session_to_stop
-)
-        s_data['active_sessions'] = [s for s in s_data['active_sessions'] if s['id'] != session_name_original_or_active_id]
-        
-        write_sessions(s_data)
-        
+        modify_sessions(apply)
+    except Exception as e:
+        log_systemd.error(f"Gagal menyimpan insiden sesi '{session_name_original}': {e}")
+
+def update_active_session(session_id, apply):
+    """Terapkan apply(s_data, entry) hanya pada sesi ini, di atas isi sessions.json terbaru (lihat modify_sessions)."""
+    def apply_to_entry(s_data):
+        entry = next((sess for sess in s_data.get('active_sessions', []) if sess.get('id') == session_id), None)
+        if entry is None: return False
+        apply(s_data, entry)
+    return modify_sessions(apply_to_entry) is not None
+
+def failing_destination_indexes(sess, journal_tail):
+    """Indeks tujuan yang gagal pada proses yang baru keluar; tanpa tee hanya ada satu tujuan."""
+    if len(session_destinations(sess)) == 1: return {0}
+    # Proses yang keluar dan (bila systemd sudah me-restart) proses penggantinya
+    return set(failed_tee_slaves(journal_tail.splitlines(), runs=2))
+
+def can_failover(sess, failing_indexes):
+    return any(index in failing_indexes and dest['platform'] in PLATFORM_BACKUP_URLS and dest.get('ingest') != 'backup'
+               for index, dest in enumerate(session_destinations(sess)))
+
+def failover_to_backup_ingest(sess, failing_indexes):
+    destinations = [dict(dest, ingest='backup') if index in failing_indexes and dest['platform'] in PLATFORM_BACKUP_URLS else dest
+                    for index, dest in enumerate(session_destinations(sess))]
+    video_path = prepare_stream_input(sess['id'], sess.get('video_name', ''), sess.get('playlist'))
+    service_name, _ = create_service_file(sess['id'], video_path, destinations, sess.get('encoding_profile'), sess.get('x264_preset'))
+    run_cmd(["systemctl", "restart", service_name], check=True, timeout=30)
+
+    def apply(s_data, entry):
+        entry.pop('destinations', None)
+        entry.update(destination_fields(destinations))
+    update_active_session(sess['id'], apply)
+    moved = [f"#{index} {dest['platform']}" for index, (dest, old) in enumerate(zip(destinations, session_destinations(sess))) if dest != old]
+    log_systemd.warning(f"FAILOVER: Tujuan {', '.join(moved)} sesi '{sess['id']}' dipindah ke ingest cadangan.")
+
+def mark_session_failed(sess, reason):
+    service_name = f"stream-{sess['sanitized_service_id']}.service"
+    run_cmd(["systemctl", "stop", service_name], check=False, timeout=15)
+    service_path = os.path.join(SERVICE_DIR, service_name)
+    if os.path.exists(service_path):
+        os.remove(service_path)
+        run_cmd(["systemctl", "daemon-reload"], check=False, timeout=30)
+
+    def apply(s_data, entry):
+        entry.update(status='failed', failure_reason=reason, stop_time=datetime.now(jakarta_tz).isoformat())
+        s_data['active_sessions'] = [x for x in s_data.get('active_sessions', []) if x.get('id') != entry['id']]
+        s_data['inactive_sessions'] = add_or_update_session_in_list(s_data.get('inactive_sessions', []), entry)
+    update_active_session(sess['id'], apply)
+    log_systemd.error(f"RECOVERY: Sesi '{sess['id']}' ditandai gagal permanen dan tidak di-restart lagi: {reason}")
+    record_session_event(sess['id'], 'failed', reason[:300])
+
+@traced_job
+def monitor_stream_health():
+    s_data = read_sessions()
+    sessions_by_unit = {f"stream-{sess['sanitized_service_id']}.service": sess for sess in s_data.get('active_sessions', []) if sess.get('sanitized_service_id')}
+    unit_props = systemctl_show(list(sessions_by_unit), ['ActiveState', 'SubState', 'ExecMainExitTimestampMonotonic', 'ExecMainStatus'])
+    changed = False
+    for service_name, sess in sessions_by_unit.items():
+        props = unit_props.get(service_name)
+        if not props: continue
+        sanitized_id = sess['sanitized_service_id']
+        exit_usec = props.get('ExecMainExitTimestampMonotonic') or '0'
+        with stream_health_lock:
+            # '0': exit yang terjadi sebelum pemeriksaan pertama (misal crash tak lama setelah start) tetap terhitung
+            state = stream_health_state.setdefault(sanitized_id, {'last_exit_usec': '0', 'consecutive_failures': 0, 'permanent_hits': 0, 'incident': None})
+            new_exit = exit_usec not in ('0', state['last_exit_usec'])
+            state['last_exit_usec'] = exit_usec
+        try:
+            if props.get('ActiveState') == 'failed':
+                mark_session_failed(sess, f"unit berhenti setelah lebih dari {STREAM_START_LIMIT_BURST} restart dalam {STREAM_START_LIMIT_INTERVAL_SEC} detik")
+                changed = True
+                continue
+            if not new_exit or props.get('ExecMainStatus') in ('15', '255'): continue # Tidak ada kegagalan baru / stop-restart disengaja
+
+            journal_tail = run_cmd(["journalctl", "-u", service_name, "-n", "80", "-o", "cat", "--no-pager"],
+                                          capture_output=True, text=True, timeout=15).stdout
+            permanent_match = PERMANENT_FAILURE_RE.search(journal_tail)
+            error_lines = [line for line in journal_tail.splitlines() if 'error' in line.lower() or 'failed' in line.lower()]
+            with stream_health_lock:
+                state['permanent_hits'] = state['permanent_hits'] + 1 if permanent_match else 0
+                state['consecutive_failures'] += 1
+                open_tracker = state['incident'] is None
+                if open_tracker:
+                    state['incident'] = {'started_at': monotonic_usec_to_datetime(exit_usec).isoformat(), 'restarts': 0, 'failover': False,
+                                         'reason': (error_lines[-1] if error_lines else f"ffmpeg keluar dengan status {props.get('ExecMainStatus')}")[:300]}
+                state['incident']['restarts'] += 1
+                permanent = state['permanent_hits'] >= PERMANENT_FAILURE_CONFIRMATIONS
+                failing_indexes = failing_destination_indexes(sess, journal_tail)
+                do_failover = not permanent and state['consecutive_failures'] >= FAILOVER_AFTER_FAILURES and can_failover(sess, failing_indexes)
+                if do_failover: state['incident']['failover'] = True
+                if permanent: state['incident'] = None
+            if permanent:
+                mark_session_failed(sess, permanent_match.group(0))
+                changed = True
+                continue
+            if open_tracker:
+                record_session_event(sess['id'], 'crash', state['incident']['reason'])
+                threading.Thread(target=track_incident_recovery, args=(sess['id'], sanitized_id, service_name, session_ingest_port(sess)),
+                                 name=f"recovery-{sanitized_id}", daemon=True).start()
+            if do_failover:
+                failover_to_backup_ingest(sess, failing_indexes)
+                changed = True
+        except Exception as e:
+            log_systemd.error(f"RECOVERY: Gagal memeriksa sesi '{sess.get('id')}': {e}")
+
+    with stream_health_lock:
+        for sanitized_id in set(stream_health_state) - {sess['sanitized_service_id'] for sess in s_data.get('active_sessions', [])}:
+            stream_health_state.pop(sanitized_id, None)
+    publish_leader_state()
+    if changed: # Sudah ditulis per sesi (mark_session_failed / failover_to_backup_ingest)
+        sessions_data = get_active_sessions_data()
+        inactive_data = {"inactive_sessions": get_inactive_sessions_data()}
         with socketio_lock:
-            socketio.emit('sessions_update', get_active_sessions_data())
-            socketio.emit('inactive_sessions_update', {"inactive_sessions": get_inactive_sessions_data()})
-            socketio.emit('schedules_update', get_schedules_list_data())
-        logging.info(f"Sesi '{session_name_original_or_active_id}' dihentikan dan dipindah ke inactive.")
-
+            socketio.emit('sessions_update', sessions_data)
+            socketio.emit('inactive_sessions_update', inactive_data)
+
+# ---- STATE LEADER UNTUK WORKER FOLLOWER ----
+# Reconciler, monitor kesehatan stream, pre-warm dan pengukuran latensi start hanya berjalan di leader
+# scheduler, jadi hasilnya hanya ada di memori leader. Leader menulis salinannya ke LEADER_STATE_FILE setiap
+# kali berubah; API di worker follower membaca file itu agar tidak menyajikan data kosong.
+leader_state_lock = Lock()
+leader_state_cache = {'key': None, 'state': {}}
+
+def collect_leader_state():
+    with stream_health_lock:
+        open_incidents = {sid: dict(state['incident']) for sid, state in stream_health_state.items() if state.get('incident')}
+    with prewarmed_streams_lock:
+        prewarmed = {sid: entry['prepared_at'] for sid, entry in prewarmed_streams.items()}
+    return {'worker_id': WORKER_ID, 'pid': os.getpid(), 'published_at': datetime.now(jakarta_tz).isoformat(),
+            'destination_health': dict(destination_health_view), 'start_latency': list(start_latency_records),
+            'open_incidents': open_incidents, 'prewarmed': prewarmed}
+
+def publish_leader_state():
+    if not scheduler_is_leader: return
+    try:
+        with leader_state_lock:
+            tmp_path = LEADER_STATE_FILE + '.tmp'
+            with open(tmp_path, 'w') as f: json.dump(collect_leader_state(), f)
+            os.replace(tmp_path, LEADER_STATE_FILE)
     except Exception as e:
-        logging.error(f"Error stop_scheduled_streaming untuk '{session_name_original_or_active_id}': {e}", exc_info=True)
+        log_state.warning(f"LEADER: Gagal menulis {LEADER_STATE_FILE}: {e}")
 
+def read_leader_state():
+    """State leader untuk API: langsung dari memori di leader, dari LEADER_STATE_FILE (di-cache per versi file) di follower."""
+    if scheduler_is_leader: return collect_leader_state()
+    try:
+        st = os.stat(LEADER_STATE_FILE)
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if leader_state_cache['key'] != key:
+            with open(LEADER_STATE_FILE, 'r') as f: leader_state_cache.update(key=key, state=json.load(f))
+        return leader_state_cache['state']
+    except (OSError, ValueError):
+        return {} # Leader belum pernah menulis (baru mulai) atau file sedang diganti
+
+# ---- CLUSTER (CONTROLLER) ----
+# create_service_file tetap menulis unit ke SERVICE_DIR lokal sebagai isi yang diinginkan, lalu mengirimnya
+# ke agent yang dipilih (paling ringan menurut beban CPU yang sudah ditempatkan). run_cmd meneruskan
+# systemctl/journalctl ke agent penempat unit, sehingga alur start/stop/jadwal/monitor tidak berubah;
+# daemon-reload ikut menghapus di agent unit yang file lokalnya sudah dihapus. Agent yang tidak merespons
+# CLUSTER_AGENT_DEAD_SECONDS dianggap mati dan leader scheduler memindahkan unitnya ke agent lain.
+# Fencing: setiap request membawa lease. Agent yang lease-nya habis dan juga tidak menjangkau agent lain
+# (terisolasi) mematikan unitnya sendiri; pemindahan baru dilakukan setelah lease + margin lewat. Setiap
+# penempatan punya epoch; agent tujuan pemindahan meminta agent lama mematikan unit ber-epoch lebih lama
+# sebelum start. Dua ffmpeg tidak pernah mempublikasikan stream key yang sama, tetapi panel yang mati
+# tidak ikut menghentikan stream di agent yang masih saling terhubung.
+class AgentError(Exception):
+    def __init__(self, message, returncode=1):
+        super().__init__(message)
+        self.returncode = returncode
+
+cluster_agents = {agent_id: {'url': url, 'state': 'unknown', 'last_seen': None, 'last_seen_at': None, 'error': None, 'status': {},
+                             'synced': False, 'draining': False} for agent_id, url in CLUSTER_AGENTS.items()}
+cluster_lock = RLock()
+cluster_monitor_started = None # monotonic saat pemantauan dimulai (agent yang tidak pernah merespons juga bisa mati)
+stream_placements = {} # service_name -> {'agent', 'epoch', 'session', 'cpu_cores', 'memory_mb', 'placed_at'}
+stream_placements_mtime = None
+
+def agent_request(agent_id, method, path, payload=None, timeout=CLUSTER_HTTP_TIMEOUT):
+    req = urllib.request.Request(cluster_agents[agent_id]['url'].rstrip('/') + path, method=method,
+                                 data=json.dumps(payload).encode() if payload is not None else None,
+                                 headers={'Content-Type': 'application/json', 'X-StreamHib-Agent-Token': CLUSTER_AGENT_TOKEN,
+                                          'X-StreamHib-Lease-Seconds': str(CLUSTER_AGENT_LEASE_SECONDS)})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response: return json.load(response)
+    except urllib.error.HTTPError as e:
+        try: body = json.load(e)
+        except ValueError: body = {}
+        raise AgentError(f"agent {agent_id}: {body.get('message') or e}", body.get('returncode', 1))
+
+def placements_snapshot():
+    """Penempatan terbaru; dibaca ulang jika file diubah worker lain."""
+    global stream_placements, stream_placements_mtime
+    with cluster_lock:
+        try: mtime = os.stat(CLUSTER_PLACEMENTS_FILE).st_mtime_ns
+        except OSError: return stream_placements
+        if mtime != stream_placements_mtime:
+            try:
+                with open(CLUSTER_PLACEMENTS_FILE) as f: stream_placements = json.load(f)
+            except (OSError, ValueError) as e:
+                log_systemd.error(f"CLUSTER: Gagal membaca {CLUSTER_PLACEMENTS_FILE}: {e}")
+            stream_placements_mtime = mtime
+        return stream_placements
+
+@contextmanager
+def placements_update():
+    global stream_placements, stream_placements_mtime
+    with cluster_lock, FileLock(CLUSTER_PLACEMENTS_FILE + '.lock', timeout=10): # Urutan sama dengan place_stream_unit
+        placements = dict(placements_snapshot())
+        yield placements
+        tmp_path = CLUSTER_PLACEMENTS_FILE + '.tmp'
+        with open(tmp_path, 'w') as f: json.dump(placements, f, indent=2)
+        os.replace(tmp_path, CLUSTER_PLACEMENTS_FILE)
+        stream_placements, stream_placements_mtime = placements, os.stat(CLUSTER_PLACEMENTS_FILE).st_mtime_ns
+
+def placement_agent(service_name):
+    return (placements_snapshot().get(service_name) or {}).get('agent')
+
+def choose_agent(cpu_cores, memory_mb, exclude=()):
+    """Agent sehat dengan beban CPU tertempatkan paling kecil yang masih muat, atau None."""
+    best = None
+    with cluster_lock:
+        placements = placements_snapshot()
+        for agent_id, agent in cluster_agents.items():
+            if agent['state'] != 'healthy' or agent['draining'] or agent_id in exclude: continue
+            status = agent['status']
+            cores = status.get('cpu_cores') or 1
+            placed = [p for p in placements.values() if p['agent'] == agent_id]
+            committed = sum(p['cpu_cores'] for p in placed)
+            if status.get('max_streams') and len(placed) >= status['max_streams']: continue
+            if ADMISSION_ENABLED:
+                if committed + cpu_cores > cores * (1 - ADMISSION_MIN_CPU_HEADROOM): continue
+                idle = status.get('cpu_idle_fraction')
+                if idle is not None and idle * cores - cpu_cores < cores * ADMISSION_MIN_CPU_HEADROOM: continue
+                mem_available_mb = status.get('mem_available_mb')
+                if mem_available_mb is not None and mem_available_mb - memory_mb < ADMISSION_MIN_MEM_AVAILABLE_MB: continue
+            score = ((committed + cpu_cores) / cores, len(placed))
+            if best is None or score < best[0]: best = (score, agent_id)
+    return best[1] if best else None
+
+def place_stream_unit(service_name, session_name_original, service_content, encoding_profile=None, reload=True):
+    """Kirim unit ke agent: agent yang sama bila masih sehat (restart/edit), selain itu agent paling ringan."""
+    cpu_cores, memory_mb = stream_resource_estimate(encoding_profile)
+    with cluster_lock:
+        previous = placements_snapshot().get(service_name) or {}
+        current = previous.get('agent')
+        agent_id = current if current and cluster_agents.get(current, {}).get('state') == 'healthy' else choose_agent(cpu_cores, memory_mb)
+        if not agent_id: raise AgentError("tidak ada agent cluster yang sehat dengan sisa CPU/memori cukup")
+        epoch = previous.get('epoch', 0) + (agent_id != current)
+        with placements_update() as placements:
+            placements[service_name] = {'agent': agent_id, 'epoch': epoch, 'session': session_name_original, 'cpu_cores': cpu_cores, 'memory_mb': memory_mb,
+                                        'placed_at': datetime.now(jakarta_tz).isoformat()}
+    try:
+        agent_request(agent_id, 'PUT', f"/units/{service_name}?reload={'1' if reload else '0'}&epoch={epoch}", {'content': service_content})
+    except Exception:
+        with placements_update() as placements:
+            if (placements.get(service_name) or {}).get('agent') == agent_id: placements.pop(service_name)
+        raise
+    if current and current != agent_id: log_systemd.warning(f"CLUSTER: {service_name} dipindah dari agent '{current}' (tidak sehat) ke '{agent_id}'.")
+    log_systemd.info(f"CLUSTER: {service_name} ditempatkan di agent '{agent_id}'.")
+    return agent_id
+
+def move_stream_unit(service_name, start, exclude=()):
+    """Pindahkan unit ke agent lain (agent lama mati atau di-drain). None jika tidak ada agent yang muat."""
+    placement = placements_snapshot().get(service_name)
+    if not placement: return None
+    service_path = os.path.join(SERVICE_DIR, service_name)
+    if not os.path.exists(service_path):
+        with placements_update() as placements: placements.pop(service_name, None)
+        return None
+    with open(service_path) as f: service_content = f.read()
+    old_agent = placement['agent']
+    with cluster_lock:
+        agent_id = choose_agent(placement['cpu_cores'], placement['memory_mb'], exclude={old_agent, *exclude})
+        if not agent_id: return None
+        epoch = placement.get('epoch', 0) + 1
+        with placements_update() as placements: placements[service_name] = dict(placement, agent=agent_id, epoch=epoch, placed_at=datetime.now(jakarta_tz).isoformat())
+    if cluster_agents[old_agent]['state'] == 'healthy':
+        # Drain: hentikan dulu di agent lama (satu stream key tidak bisa dipublikasikan dua proses)
+        try: agent_request(old_agent, 'DELETE', f"/units/{service_name}")
+        except Exception as e: log_systemd.warning(f"CLUSTER: Gagal menghapus {service_name} di agent '{old_agent}': {e}")
+    try:
+        agent_request(agent_id, 'PUT', f"/units/{service_name}?epoch={epoch}", {'content': service_content})
+        # Agent tujuan meminta agent lama (yang mungkin hanya terputus dari controller) mematikan unit sebelum start
+        if start: agent_request(agent_id, 'POST', f"/units/{service_name}/start?{urllib.parse.urlencode({'epoch': epoch, 'previous': old_agent})}", timeout=30)
+    except Exception:
+        with placements_update() as placements: placements[service_name] = placement # Dicoba lagi putaran berikutnya
+        raise
+    log_systemd.warning(f"CLUSTER: {service_name} dipindah dari agent '{old_agent}' ke '{agent_id}'{' dan dijalankan' if start else ''}.")
+    return agent_id
 
-def recover_schedules():
+def move_agent_streams(agent_id, reason):
     s_data = read_sessions()
-    now_jkt = datetime.now(jakarta_tz)
-    valid_schedules_in_json = [] 
-
-    logging.info("Memulai pemulihan jadwal...")
-    for sched_def in s_data.get('scheduled_sessions', []):
+    active_units = {f"stream-{sess['sanitized_service_id']}.service": sess['id'] for sess in s_data.get('active_sessions', []) if sess.get('sanitized_service_id')}
+    transitions, stranded = [], 0
+    for service_name, placement in list(placements_snapshot().items()):
+        if placement['agent'] != agent_id: continue
         try:
-            session_name_original = sched_def.get('session_name_original')
-            # ID definisi jadwal (misal "daily-XYZ" atau "onetime-XYZ")
-            schedule_definition_id = sched_def.get('id') 
-            # sanitized_service_id digunakan untuk membuat ID job APScheduler yang unik
-            sanitized_service_id = sched_def.get('sanitized_service_id') 
-
-            platform = sched_def.get('platform')
-            stream_key = sched_def.get('stream_key')
-            video_file = sched_def.get('video_file')
-            recurrence = sched_def.get('recurrence_type', 'one_time')
-
-            if not all([session_name_original, sanitized_service_id, platform, stream_key, video_file, schedule_definition_id]):
-                logging.warning(f"Recover: Skip jadwal '{session_name_original}' karena field dasar (termasuk ID definisi atau sanitized_service_id) kurang.")
+            new_agent = move_stream_unit(service_name, start=service_name in active_units)
+        except Exception as e:
+            log_systemd.error(f"CLUSTER: Gagal memindahkan {service_name} dari agent '{agent_id}': {e}")
+            new_agent = None
+        if not new_agent:
+            stranded += 1
+        elif service_name in active_units:
+            transitions += [(active_units[service_name], 'crash', reason), (active_units[service_name], 'recovered', f"dipindah ke agent {new_agent}")]
+    if stranded: log_systemd.error(f"CLUSTER: {stranded} unit di agent '{agent_id}' belum bisa dipindah (tidak ada agent dengan kapasitas cukup).")
+    if transitions:
+        record_session_events(transitions)
+        sessions_data = get_active_sessions_data()
+        with socketio_lock: socketio.emit('sessions_update', sessions_data)
+    return len(transitions) // 2, stranded
+
+def sync_joined_agent(agent_id):
+    """Agent baru/kembali: tulis slice sesuai jumlah core-nya, hentikan unit yang kini ditempatkan di agent lain,
+    dan jalankan lagi unit yang sempat di-fence tetapi masih milik agent ini (partisi lebih pendek dari batas mati)."""
+    status = cluster_agents[agent_id]['status']
+    agent_request(agent_id, 'PUT', '/peers', {'peers': {peer_id: agent['url'] for peer_id, agent in cluster_agents.items() if peer_id != agent_id}})
+    agent_request(agent_id, 'PUT', f"/units/{STREAM_SLICE}", {'content': build_slice_content(status.get('cpu_cores'))})
+    placements = placements_snapshot()
+    active_units = {f"stream-{sess['sanitized_service_id']}.service" for sess in read_sessions().get('active_sessions', []) if sess.get('sanitized_service_id')}
+    for service_name in status.get('fenced', []):
+        if (placements.get(service_name) or {}).get('agent') != agent_id:
+            agent_request(agent_id, 'DELETE', f"/units/{service_name}") # Sudah dipindah: buang file unit lama di agent ini
+            continue
+        if service_name not in active_units: continue
+        log_systemd.warning(f"CLUSTER: {service_name} di-fence agent '{agent_id}' saat terputus, dijalankan lagi.")
+        agent_request(agent_id, 'POST', f"/units/{service_name}/start", timeout=30)
+    for service_name in status.get('units', []):
+        owner = (placements.get(service_name) or {}).get('agent')
+        if owner == agent_id: continue
+        if owner is None and os.path.exists(os.path.join(SERVICE_DIR, service_name)):
+            with placements_update() as updated: # Penempatan hilang (misal file placement dipulihkan dari backup): adopsi
+                updated[service_name] = {'agent': agent_id, 'session': None, 'cpu_cores': STREAM_COPY_CPU_CORES, 'memory_mb': STREAM_COPY_MEMORY_MB,
+                                         'placed_at': datetime.now(jakarta_tz).isoformat()}
+            continue
+        # Sudah dipindah ke agent lain selama agent ini terputus, atau sesinya sudah dihentikan
+        log_systemd.warning(f"CLUSTER: {service_name} masih berjalan di agent '{agent_id}' padahal " + (f"kini ditempatkan di '{owner}'." if owner else "sudah tidak dipakai.") + " Dihentikan.")
+        agent_request(agent_id, 'DELETE', f"/units/{service_name}")
+    cluster_agents[agent_id]['synced'] = True
+
+def poll_cluster_agent(agent_id):
+    try: return agent_id, agent_request(agent_id, 'GET', '/status', timeout=min(CLUSTER_HTTP_TIMEOUT, CLUSTER_HEALTH_INTERVAL_SECONDS)), None
+    except Exception as e: return agent_id, None, str(e)
+
+def cluster_health_check():
+    with ThreadPoolExecutor(max_workers=len(cluster_agents), thread_name_prefix='cluster-poll') as pool:
+        results = list(pool.map(poll_cluster_agent, cluster_agents))
+    now, died = time.monotonic(), []
+    with cluster_lock:
+        for agent_id, status, error in results:
+            agent = cluster_agents[agent_id]
+            if status is not None:
+                if agent['state'] != 'healthy': log_systemd.info(f"CLUSTER: Agent '{agent_id}' sehat ({len(status.get('units', []))} unit berjalan).")
+                agent.update(state='healthy', last_seen=now, last_seen_at=datetime.now(jakarta_tz).isoformat(), error=None, status=status)
                 continue
+            agent['error'], agent['synced'] = error, False
+            if agent['state'] == 'dead': continue
+            # Tidak pernah lebih cepat dari lease agent + margin: unit di agent lama pasti sudah dimatikan
+            dead_after = max(CLUSTER_AGENT_DEAD_SECONDS, CLUSTER_AGENT_LEASE_SECONDS + CLUSTER_FENCE_MARGIN_SECONDS)
+            if now - (agent['last_seen'] or cluster_monitor_started) >= dead_after:
+                agent['state'] = 'dead'
+                died.append(agent_id)
+                log_systemd.error(f"CLUSTER: Agent '{agent_id}' tidak merespons selama {dead_after} detik, dianggap mati: {error}")
+            elif agent['state'] != 'unreachable':
+                agent['state'] = 'unreachable'
+                log_systemd.warning(f"CLUSTER: Agent '{agent_id}' tidak dapat dihubungi: {error}")
+    if not scheduler_is_leader: return # Pemindahan dan pembersihan hanya oleh satu worker
+    for agent_id, agent in cluster_agents.items():
+        try:
+            if agent['state'] == 'healthy' and not agent['synced']: sync_joined_agent(agent_id)
+            # Agent mati: unit yang belum terpindah (kapasitas penuh) dicoba lagi setiap putaran
+            if agent['state'] == 'dead' and any(p['agent'] == agent_id for p in placements_snapshot().values()):
+                move_agent_streams(agent_id, f"agent {agent_id} mati")
+        except Exception as e:
+            log_systemd.error(f"CLUSTER: Error menangani agent '{agent_id}': {e}", exc_info=True)
+
+def cluster_monitor():
+    while True:
+        time.sleep(CLUSTER_HEALTH_INTERVAL_SECONDS)
+        try: cluster_health_check()
+        except Exception as e: log_systemd.error(f"CLUSTER: Error pemantauan agent: {e}", exc_info=True)
+
+def start_cluster_monitor():
+    global cluster_monitor_started
+    cluster_monitor_started = time.monotonic()
+    cluster_health_check() # Status agent sudah terisi sebelum scheduler memulihkan jadwal
+    threading.Thread(target=cluster_monitor, name="cluster-monitor", daemon=True).start()
+
+def cluster_running_units():
+    """Unit yang dilaporkan berjalan oleh agent yang menjawab. Unit di agent yang tidak terjangkau tidak dilaporkan
+    sama sekali (bukan dianggap berjalan); reconcile memutuskan liveness sesi dari systemctl show per agent."""
+    def running_on(agent_id):
+        try: return agent_request(agent_id, 'GET', '/status')['units']
+        except Exception as e:
+            log_systemd.warning(f"CLUSTER: Daftar unit agent '{agent_id}' tidak tersedia: {e}")
+            return []
+    agent_ids = [agent_id for agent_id, agent in cluster_agents.items() if agent['state'] != 'dead']
+    if not agent_ids: return set()
+    with ThreadPoolExecutor(max_workers=len(agent_ids), thread_name_prefix='cluster-list') as pool:
+        return set(itertools.chain.from_iterable(pool.map(running_on, agent_ids)))
+
+def sync_cluster_units():
+    orphaned = [service for service in placements_snapshot() if not os.path.exists(os.path.join(SERVICE_DIR, service))]
+    for service_name in orphaned:
+        try: agent_request(placement_agent(service_name), 'DELETE', f"/units/{service_name}")
+        except Exception as e: log_systemd.debug("CLUSTER: Hapus %s di agent ditunda sampai agent kembali: %s", service_name, e)
+    if orphaned:
+        with placements_update() as placements:
+            for service_name in orphaned: placements.pop(service_name, None)
+    for agent_id, agent in cluster_agents.items():
+        if agent['state'] != 'healthy': continue
+        try: agent_request(agent_id, 'POST', '/reload', timeout=30)
+        except Exception as e: log_systemd.warning(f"CLUSTER: daemon-reload di agent '{agent_id}' gagal: {e}")
+
+def cluster_unit_command(cmd):
+    """Hasil setara subprocess.run untuk perintah systemctl/journalctl unit stream di mode cluster."""
+    done = lambda stdout='', returncode=0, stderr='': subprocess.CompletedProcess(cmd, returncode, stdout, stderr)
+    if cmd[0] == 'journalctl':
+        unit = cmd[cmd.index('-u') + 1]
+        agent_id = placement_agent(unit)
+        if not agent_id: return done()
+        query = {'lines': cmd[cmd.index('-n') + 1] if '-n' in cmd else 1000}
+        if '--since' in cmd: query['since'] = cmd[cmd.index('--since') + 1]
+        return done(agent_request(agent_id, 'GET', f"/units/{unit}/journal?{urllib.parse.urlencode(query)}")['output'])
+    action = cmd[1]
+    if action == 'daemon-reload':
+        sync_cluster_units()
+        return done()
+    if action == 'list-units':
+        return done(''.join(f"{unit} loaded active running StreamHib\n" for unit in sorted(cluster_running_units())))
+    if action == 'show':
+        if '--value' in cmd: # systemctl show -p PROP --value UNIT: nilai dari agent penempat, bukan tebakan
+            unit, prop = cmd[-1], cmd[cmd.index('-p') + 1]
+            agent_id = placement_agent(unit)
+            if not agent_id: return done('\n') # Unit tidak ada di agent mana pun
+            try: output = agent_request(agent_id, 'POST', '/show', {'units': [unit], 'properties': [prop]})['output']
+            except Exception as e: return done('', 1, f"agent {agent_id} tidak dapat dihubungi: {e}")
+            return done(next((line.split('=', 1)[1] for line in output.splitlines() if line.startswith(f"{prop}=")), '') + '\n')
+        units, properties = cmd[2:cmd.index('-p')], [p for p in cmd[cmd.index('-p') + 1].split(',') if p != 'Id']
+        by_agent = {}
+        for unit in units:
+            agent_id = placement_agent(unit)
+            if agent_id and cluster_agents[agent_id]['state'] != 'dead': by_agent.setdefault(agent_id, []).append(unit)
+        blocks = []
+        for agent_id, agent_units in by_agent.items():
+            try: blocks.append(agent_request(agent_id, 'POST', '/show', {'units': agent_units, 'properties': properties})['output'].strip('\n'))
+            except Exception as e: log_systemd.warning(f"CLUSTER: systemctl show di agent '{agent_id}' gagal: {e}")
+        return done('\n\n'.join(block for block in blocks if block) + '\n')
+    if action in ('start', 'stop', 'restart'):
+        unit = cmd[2]
+        agent_id = placement_agent(unit)
+        if not agent_id: return done('', 5, f"Unit {unit} tidak ditempatkan di agent cluster mana pun.")
+        try:
+            agent_request(agent_id, 'POST', f"/units/{unit}/{action}", timeout=30)
+            return done()
+        except AgentError as e:
+            return done('', e.returncode, str(e))
+        except (urllib.error.URLError, OSError) as e:
+            return done('', 1, f"agent {agent_id} tidak dapat dihubungi: {e}")
+    return done('', 1, f"systemctl {action} tidak didukung di mode cluster")
+
+def run_cluster_unit_command(cmd, check=False):
+    result = cluster_unit_command(cmd)
+    if check and result.returncode != 0: raise subprocess.CalledProcessError(result.returncode, cmd, result.stdout, result.stderr)
+    return result
+
+def cluster_wait_ingest(service_name, remote_port, wait_seconds):
+    """Agent penempat menunggu (maks. wait_seconds) sampai ffmpeg unit punya koneksi ke port ingest."""
+    agent_id = placement_agent(service_name)
+    try:
+        if agent_id:
+            return agent_request(agent_id, 'GET', f"/units/{service_name}/ingest?port={remote_port}&wait={max(wait_seconds, 0):.1f}",
+                                 timeout=wait_seconds + CLUSTER_HTTP_TIMEOUT)['connected']
+    except Exception as e:
+        log_systemd.debug("CLUSTER: Cek koneksi ingest %s gagal: %s", service_name, e)
+    time.sleep(min(max(wait_seconds, 0), 1))
+    return False
+
+def get_cluster_status():
+    placements = placements_snapshot()
+    agents = []
+    with cluster_lock:
+        for agent_id, agent in cluster_agents.items():
+            placed = [p for p in placements.values() if p['agent'] == agent_id]
+            status = agent['status']
+            agents.append({'id': agent_id, 'url': agent['url'], 'state': agent['state'], 'draining': agent['draining'], 'last_seen_at': agent['last_seen_at'],
+                           'error': agent['error'], 'cpu_cores': status.get('cpu_cores'), 'cpu_idle_fraction': status.get('cpu_idle_fraction'),
+                           'mem_available_mb': status.get('mem_available_mb'), 'max_streams': status.get('max_streams'),
+                           'running_units': len(status.get('units', [])), 'placed_units': len(placed),
+                           'committed_cpu_cores': round(sum(p['cpu_cores'] for p in placed), 2)})
+    return {'enabled': bool(CLUSTER_AGENTS), 'agents': agents,
+            'placements': [dict(p, service=service) for service, p in sorted(placements.items())]}
+
+# ---- RIWAYAT SESI & ANALITIK UPTIME ----
+# Log event append-only (SQLite) untuk setiap transisi sesi. Event pembuka (start, scheduled, recovered)
+# memulai interval "up", event penutup (stop, crash, failed) mengakhirinya. 'failed' = gagal permanen; bila
+# didahului 'crash' dari insiden yang sama, crash-nya tidak dihitung dua kali. Interval yang tertutup langsung
+# dipecah per hari (zona Jakarta) ke tabel rollup session_uptime_daily, sehingga query berbulan-bulan
+# hanya menjumlahkan baris per hari; interval yang masih berjalan ditambahkan saat query.
+SESSION_OPEN_EVENTS = ('start', 'scheduled', 'recovered')
+SESSION_CLOSE_EVENTS = ('stop', 'crash', 'failed')
+session_events_db_ready = False
+session_events_lock = Lock()
+
+def session_events_db():
+    global session_events_db_ready
+    conn = sqlite3.connect(SESSION_EVENTS_DB, timeout=10)
+    if not session_events_db_ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS session_events (
+                id INTEGER PRIMARY KEY, ts_ms INTEGER NOT NULL, day TEXT NOT NULL,
+                session_id TEXT NOT NULL, event TEXT NOT NULL, detail TEXT);
+            CREATE INDEX IF NOT EXISTS session_events_by_session ON session_events (session_id, ts_ms);
+            CREATE INDEX IF NOT EXISTS session_events_by_day ON session_events (day);
+            CREATE TABLE IF NOT EXISTS session_uptime_daily (
+                session_id TEXT NOT NULL, day TEXT NOT NULL, uptime_ms INTEGER NOT NULL DEFAULT 0,
+                starts INTEGER NOT NULL DEFAULT 0, stops INTEGER NOT NULL DEFAULT 0, crashes INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (session_id, day));
+            CREATE INDEX IF NOT EXISTS session_uptime_daily_by_day ON session_uptime_daily (day);
+        """)
+        session_events_db_ready = True
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def ms_to_day(ts_ms):
+    return datetime.fromtimestamp(ts_ms / 1000, jakarta_tz).strftime('%Y-%m-%d')
+
+def split_interval_by_day(start_ms, end_ms):
+    """[(hari, durasi_ms)] untuk interval yang melewati tengah malam (zona Jakarta)."""
+    buckets, cursor = [], start_ms
+    while cursor < end_ms:
+        day_dt = datetime.fromtimestamp(cursor / 1000, jakarta_tz)
+        next_midnight = jakarta_tz.localize(datetime(day_dt.year, day_dt.month, day_dt.day) + timedelta(days=1))
+        boundary = min(end_ms, int(next_midnight.timestamp() * 1000))
+        buckets.append((day_dt.strftime('%Y-%m-%d'), boundary - cursor))
+        cursor = boundary
+    return buckets
+
+def insert_session_events(conn, events):
+    for session_id, event, detail, ts_ms in events:
+        last = conn.execute("SELECT ts_ms, event FROM session_events WHERE session_id = ? ORDER BY ts_ms DESC, id DESC LIMIT 1", (session_id,)).fetchone()
+        counter = {'start': 'starts', 'scheduled': 'starts', 'stop': 'stops', 'crash': 'crashes',
+                   'failed': None if last and last[1] == 'crash' else 'crashes'}.get(event)
+        if last and last[1] in SESSION_OPEN_EVENTS and ts_ms > last[0]:
+            # Interval up berakhir di event ini (event pembuka beruntun = sesi tetap up sampai sekarang)
+            for day, duration_ms in split_interval_by_day(last[0], ts_ms):
+                conn.execute("""INSERT INTO session_uptime_daily (session_id, day, uptime_ms) VALUES (?, ?, ?)
+                                ON CONFLICT(session_id, day) DO UPDATE SET uptime_ms = uptime_ms + excluded.uptime_ms""", (session_id, day, duration_ms))
+        day = ms_to_day(ts_ms)
+        conn.execute("INSERT INTO session_events (ts_ms, day, session_id, event, detail) VALUES (?, ?, ?, ?, ?)", (ts_ms, day, session_id, event, detail))
+        if counter:
+            conn.execute(f"""INSERT INTO session_uptime_daily (session_id, day, {counter}) VALUES (?, ?, 1)
+                             ON CONFLICT(session_id, day) DO UPDATE SET {counter} = {counter} + 1""", (session_id, day))
+
+def write_session_events(events):
+    with session_events_lock, closing(session_events_db()) as conn, conn:
+        conn.execute("BEGIN IMMEDIATE") # Konsisten juga antar worker
+        insert_session_events(conn, events)
+
+def backfill_session_events(active_sessions):
+    """Sesi yang sudah aktif sebelum riwayat ada (deploy pertama) belum punya event pembuka; catat 'start' dari start_time-nya."""
+    candidates = []
+    for sess in active_sessions:
+        try: ts_ms = int(datetime.fromisoformat(sess['start_time']).timestamp() * 1000)
+        except (KeyError, TypeError, ValueError): ts_ms = int(time.time() * 1000)
+        candidates.append((sess['id'], ts_ms))
+    if not candidates: return 0
+    with session_events_lock, closing(session_events_db()) as conn, conn:
+        conn.execute("BEGIN IMMEDIATE")
+        known = {row[0] for row in conn.execute("SELECT DISTINCT session_id FROM session_events")}
+        missing = [(session_id, 'start', 'backfill', ts_ms) for session_id, ts_ms in candidates if session_id not in known]
+        insert_session_events(conn, missing)
+    return len(missing)
+
+def record_session_events(events):
+    """Catat transisi sesi [(session_id, event, detail)] dalam satu transaksi; kegagalan menulis riwayat tidak boleh menggagalkan aksi stream."""
+    if not events: return
+    now_ms = int(time.time() * 1000)
+    try:
+        offload(write_session_events, [(session_id, event, detail, now_ms) for session_id, event, detail in events])
+    except Exception as e:
+        log_state.error(f"RIWAYAT: Gagal mencatat {len(events)} event sesi: {e}")
+
+def record_session_event(session_id, event, detail=None):
+    record_session_events([(session_id, event, detail)])
+
+def query_uptime(session_id=None, day_from=None, day_to=None):
+    now_ms = int(time.time() * 1000)
+    day_to = day_to or ms_to_day(now_ms)
+    day_from = day_from or (datetime.strptime(day_to, '%Y-%m-%d') - timedelta(days=29)).strftime('%Y-%m-%d')
+    where, params = "day BETWEEN ? AND ?", [day_from, day_to]
+    if session_id: where, params = where + " AND session_id = ?", params + [session_id]
+    conn = session_events_db()
+    try:
+        rows = conn.execute(f"SELECT session_id, day, uptime_ms, starts, stops, crashes FROM session_uptime_daily WHERE {where}", params).fetchall()
+        # Sesi yang sedang up: event terakhirnya event pembuka, intervalnya belum masuk rollup
+        open_sql = """SELECT e.session_id, e.ts_ms FROM session_events e
+                      JOIN (SELECT session_id, MAX(id) AS last_id FROM session_events {filter} GROUP BY session_id) l ON e.id = l.last_id
+                      WHERE e.event IN ({open})""".format(filter="WHERE session_id = ?" if session_id else "", open=','.join('?' * len(SESSION_OPEN_EVENTS)))
+        open_rows = conn.execute(open_sql, ([session_id] if session_id else []) + list(SESSION_OPEN_EVENTS)).fetchall()
+    finally:
+        conn.close()
+
+    daily = {}
+    for sid, day, uptime_ms, starts, stops, crashes in rows:
+        daily[(sid, day)] = {'session_id': sid, 'day': day, 'uptime_ms': uptime_ms, 'starts': starts, 'stops': stops, 'crashes': crashes}
+    for sid, opened_ms in open_rows:
+        for day, duration_ms in split_interval_by_day(opened_ms, now_ms):
+            if day_from <= day <= day_to:
+                daily.setdefault((sid, day), {'session_id': sid, 'day': day, 'uptime_ms': 0, 'starts': 0, 'stops': 0, 'crashes': 0})['uptime_ms'] += duration_ms
+
+    sessions = {}
+    for row in daily.values():
+        total = sessions.setdefault(row['session_id'], {'session_id': row['session_id'], 'uptime_ms': 0, 'starts': 0, 'stops': 0, 'crashes': 0})
+        for key in ('uptime_ms', 'starts', 'stops', 'crashes'): total[key] += row[key]
+    for total in sessions.values():
+        total['uptime_hours'] = round(total['uptime_ms'] / 3600000, 2)
+        total['restarts'] = total['crashes']
+        total['crashes_per_start'] = round(total['crashes'] / total['starts'], 3) if total['starts'] else None
+        total['crashes_per_uptime_hour'] = round(total['crashes'] / (total['uptime_ms'] / 3600000), 3) if total['uptime_ms'] else None
+    return {'from': day_from, 'to': day_to, 'sessions': sorted(sessions.values(), key=lambda x: x['uptime_ms'], reverse=True),
+            'daily': sorted(daily.values(), key=lambda x: (x['day'], x['session_id']))}
+
+def query_session_events(session_id=None, limit=200, before_ms=None):
+    where, params = [], []
+    if session_id: where.append("session_id = ?"); params.append(session_id)
+    if before_ms: where.append("ts_ms < ?"); params.append(before_ms)
+    sql = "SELECT ts_ms, session_id, event, detail FROM session_events" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY ts_ms DESC, id DESC LIMIT ?"
+    conn = session_events_db()
+    try:
+        rows = conn.execute(sql, params + [limit]).fetchall()
+    finally:
+        conn.close()
+    return [{'ts_ms': ts_ms, 'time': datetime.fromtimestamp(ts_ms / 1000, jakarta_tz).isoformat(), 'session_id': sid, 'event': event, 'detail': detail}
+            for ts_ms, sid, event, detail in rows]
+
+# ---- ADAPTIVE PRESET ----
+# Sesi transcode dengan profil 'adaptive' dinilai tiap ADAPTIVE_PRESET_INTERVAL_SECONDS dari baris
+# "speed=" output -progress ffmpeg di journal. Karena -re membatasi speed di ~1.0x, ruang lebih dinilai
+# dari load average server. Ganti preset = tulis ulang unit + systemctl restart (jeda singkat di stream).
+adaptive_preset_state = {} # sanitized_service_id -> {'relaxed_checks', 'changed_at'}
+FFMPEG_SPEED_RE = re.compile(r'^speed=\s*([\d.]+)x')
+
+def read_ffmpeg_speeds(service_name):
+    since = (datetime.now() - timedelta(seconds=ADAPTIVE_PRESET_INTERVAL_SECONDS)).strftime('%Y-%m-%d %H:%M:%S')
+    out = run_cmd(["journalctl", "-u", service_name, "-o", "cat", "--no-pager", "--since", since],
+                         capture_output=True, text=True, timeout=15).stdout
+    return [float(m.group(1)) for m in (FFMPEG_SPEED_RE.match(line.strip()) for line in out.splitlines()) if m]
+
+def next_adaptive_preset(sess, avg_speed, load_per_core, state):
+    """Preset baru untuk sesi, atau None jika tetap."""
+    profile = get_encoding_profile(sess.get('encoding_profile'))
+    current = sess.get('x264_preset') or profile['preset']
+    index = X264_PRESETS.index(current) if current in X264_PRESETS else X264_PRESETS.index(profile['preset'])
+    if avg_speed < ADAPTIVE_SPEED_LOW:
+        state['relaxed_checks'] = 0
+        return X264_PRESETS[index - 1] if index > 0 else None
+    if avg_speed >= 0.99 and load_per_core < ADAPTIVE_HEADROOM_LOAD and index < X264_PRESETS.index(profile['preset']):
+        state['relaxed_checks'] += 1
+        if state['relaxed_checks'] >= ADAPTIVE_STEP_UP_CHECKS:
+            state['relaxed_checks'] = 0
+            return X264_PRESETS[index + 1]
+        return None
+    state['relaxed_checks'] = 0
+    return None
+
+@traced_job
+def adjust_adaptive_presets():
+    s_data = read_sessions()
+    now = time.monotonic()
+    load_per_core = os.getloadavg()[0] / (os.cpu_count() or 1)
+    active_ids, changed = set(), False
+    for sess in s_data.get('active_sessions', []):
+        profile = get_encoding_profile(sess.get('encoding_profile'))
+        sanitized_id = sess.get('sanitized_service_id')
+        if profile['mode'] != 'transcode' or not profile.get('adaptive') or not sanitized_id: continue
+        active_ids.add(sanitized_id)
+        state = adaptive_preset_state.setdefault(sanitized_id, {'relaxed_checks': 0, 'changed_at': now})
+        if now - state['changed_at'] < ADAPTIVE_PRESET_COOLDOWN_SECONDS: continue
+        service_name = f"stream-{sanitized_id}.service"
+        try:
+            speeds = read_ffmpeg_speeds(service_name)
+            if not speeds: continue
+            avg_speed = sum(speeds) / len(speeds)
+            new_preset = next_adaptive_preset(sess, avg_speed, load_per_core, state)
+            if not new_preset: continue
+            video_path = prepare_stream_input(sess['id'], sess.get('video_name', ''), sess.get('playlist'))
+            create_service_file(sess['id'], video_path, session_destinations(sess), sess.get('encoding_profile'), new_preset)
+            run_cmd(["systemctl", "restart", service_name], check=True, timeout=30)
+            log_systemd.info(f"ADAPTIVE: Sesi '{sess['id']}' speed {avg_speed:.2f}x, load/core {load_per_core:.2f}: preset {sess.get('x264_preset') or profile['preset']} -> {new_preset}.")
+            update_active_session(sess['id'], lambda s_data, entry, preset=new_preset: entry.update(x264_preset=preset))
+            state['changed_at'] = now
+            changed = True
+        except Exception as e:
+            log_systemd.error(f"ADAPTIVE: Gagal menyesuaikan preset sesi '{sess.get('id')}': {e}")
+    for sanitized_id in set(adaptive_preset_state) - active_ids:
+        adaptive_preset_state.pop(sanitized_id, None)
+    if changed:
+        sessions_data = get_active_sessions_data()
+        with socketio_lock:
+            socketio.emit('sessions_update', sessions_data)
+
+# ---- BATCH JADWAL ----
+# Job APScheduler start/stop hanya memasukkan item ke batch. Item yang masuk dalam
+# SCHEDULE_BATCH_WINDOW_SECONDS dijalankan bersama: unit ditulis lalu satu daemon-reload, proses
+# dijalankan paralel (opsional bertahap), kemudian satu kali write_sessions dan satu kali broadcast.
+schedule_batch = {'starts': [], 'stops': [], 'timer': None}
+schedule_batch_lock = Lock()
+
+def scheduled_start_item(platform, stream_key, video_file, session_name_original,
+                         one_time_duration_minutes=0, recurrence_type='one_time',
+                         daily_start_time_str=None, daily_stop_time_str=None, destinations=None, encoding_profile=None,
+                         playlist=None):
+    return {
+        'platform': platform, 'stream_key': stream_key, 'video_file': video_file, 'destinations': destinations, 'playlist': playlist,
+        'encoding_profile': encoding_profile or DEFAULT_ENCODING_PROFILE,
+        'session_name_original': session_name_original, 'one_time_duration_minutes': one_time_duration_minutes,
+        'recurrence_type': recurrence_type, 'daily_start_time_str': daily_start_time_str,
+        'daily_stop_time_str': daily_stop_time_str, 'fire_dt': nominal_fire_time(recurrence_type, daily_start_time_str)
+    }
+
+def enqueue_schedule_batch(kind, item):
+    with schedule_batch_lock:
+        schedule_batch[kind].append(item)
+        if schedule_batch['timer'] is None:
+            timer = threading.Timer(SCHEDULE_BATCH_WINDOW_SECONDS, flush_schedule_batch)
+            timer.daemon = True
+            schedule_batch['timer'] = timer
+            timer.start()
+
+def flush_schedule_batch():
+    with schedule_batch_lock:
+        starts, stops = schedule_batch['starts'], schedule_batch['stops']
+        schedule_batch.update(starts=[], stops=[], timer=None)
+    try:
+        run_schedule_batch(starts, stops)
+    except Exception as e:
+        log_scheduler.error(f"BATCH: Error menjalankan batch jadwal: {e}", exc_info=True)
+
+@traced_job
+def queue_scheduled_start(platform, stream_key, video_file, session_name_original,
+                          one_time_duration_minutes=0, recurrence_type='one_time',
+                          daily_start_time_str=None, daily_stop_time_str=None, destinations=None, encoding_profile=None,
+                          playlist=None):
+    enqueue_schedule_batch('starts', scheduled_start_item(platform, stream_key, video_file, session_name_original,
+                                                          one_time_duration_minutes, recurrence_type,
+                                                          daily_start_time_str, daily_stop_time_str, destinations, encoding_profile,
+                                                          playlist))
+
+@traced_job
+def queue_scheduled_stop(session_name_original):
+    enqueue_schedule_batch('stops', session_name_original)
+
+def build_scheduled_active_entry(item, sanitized_service_id_part, launched_dt, prewarmed):
+    active_session_stop_time_iso = None
+    active_session_duration_minutes = 0
+    recurrence_type = item['recurrence_type']
+    daily_start_time_str, daily_stop_time_str = item['daily_start_time_str'], item['daily_stop_time_str']
+
+    if recurrence_type == 'daily' and daily_start_time_str and daily_stop_time_str:
+        active_schedule_type = "daily_recurring_instance"
+        start_h, start_m = map(int, daily_start_time_str.split(':'))
+        stop_h, stop_m = map(int, daily_stop_time_str.split(':'))
+        duration_for_this_instance = (stop_h * 60 + stop_m) - (start_h * 60 + start_m)
+        if duration_for_this_instance <= 0: 
+            duration_for_this_instance += 24 * 60
+        active_session_duration_minutes = duration_for_this_instance
+        active_session_stop_time_iso = (launched_dt + timedelta(minutes=duration_for_this_instance)).isoformat()
+    elif recurrence_type == 'one_time':
+        active_schedule_type = "scheduled"
+        active_session_duration_minutes = item['one_time_duration_minutes']
+        if active_session_duration_minutes > 0:
+            active_session_stop_time_iso = (launched_dt + timedelta(minutes=active_session_duration_minutes)).isoformat()
+    else:
+         active_schedule_type = "manual_from_schedule_error"
+
+    fire_dt = item['fire_dt']
+    return {
+        "id": item['session_name_original'], # Nama sesi asli
+        "sanitized_service_id": sanitized_service_id_part, # ID untuk service systemd
+        "video_name": item['video_file'], **destination_fields(item['destinations']),
+        "encoding_profile": item['encoding_profile'], **playlist_fields(item['playlist']),
+        "status": "active", "start_time": launched_dt.isoformat(),
+        "scheduleType": active_schedule_type,
+        "stopTime": active_session_stop_time_iso,
+        "duration_minutes": active_session_duration_minutes,
+        "start_latency": {
+            "fire_time": fire_dt.isoformat(), "prewarmed": prewarmed,
+            "fire_to_launch_ms": int((launched_dt - fire_dt).total_seconds() * 1000),
+            "fire_to_first_packet_ms": None
+        }
+    }
 
-            if recurrence == 'daily':
-                start_time_str = sched_def.get('start_time_of_day')
-                stop_time_str = sched_def.get('stop_time_of_day')
-                if not start_time_str or not stop_time_str:
-                    logging.warning(f"Recover: Skip jadwal harian '{session_name_original}' karena field waktu harian kurang.")
-                    continue
-                
-                start_h, start_m = map(int, start_time_str.split(':'))
-                stop_h, stop_m = map(int, stop_time_str.split(':'))
+@traced_job
+def run_schedule_batch(starts=(), stops=()):
+    starts, stops = list(starts), list(dict.fromkeys(stops))
+    if not starts and not stops: return
+    log_scheduler.info(f"BATCH: Menjalankan {len(starts)} start dan {len(stops)} stop terjadwal.")
+    s_data = read_sessions()
+    workers = max(1, min(SCHEDULE_BATCH_WORKERS, max(len(starts), len(stops))))
+
+    # --- Stop dulu, agar start/stop sesi yang sama di menit yang sama berakhir dengan sesi berjalan ---
+    stop_targets = []
+    for session_name in stops:
+        with admission_waiting_lock:
+            if admission_waiting.pop(session_name, None):
+                log_scheduler.info(f"ADMISSION: Start terjadwal '{session_name}' yang masih antre dibatalkan oleh job stop.")
+        session_to_stop = next((sess for sess in s_data.get('active_sessions', []) if sess['id'] == session_name), None)
+        if not session_to_stop:
+            log_scheduler.warning(f"Sesi '{session_name}' tidak ditemukan dalam daftar sesi aktif untuk dihentikan.")
+            continue
+        if not session_to_stop.get('sanitized_service_id'):
+            log_scheduler.error(f"Tidak dapat menghentikan service untuk sesi '{session_name}' karena sanitized_service_id tidak ditemukan.")
+            continue
+        stop_targets.append((session_name, session_to_stop, f"stream-{session_to_stop['sanitized_service_id']}.service"))
+
+    def stop_unit(target):
+        try: run_cmd(["systemctl", "stop", target[2]], check=False, timeout=15)
+        except Exception as e: log_scheduler.error(f"BATCH: Gagal menghentikan {target[2]}: {e}")
+
+    needs_daemon_reload = False
+    if stop_targets:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-stop') as pool:
+            list(pool.map(trace_lane(stop_unit), stop_targets))
+        stop_time_iso = datetime.now(jakarta_tz).isoformat()
+        for session_name, session_to_stop, service_name_to_stop in stop_targets:
+            service_path_to_stop = os.path.join(SERVICE_DIR, service_name_to_stop)
+            if os.path.exists(service_path_to_stop):
+                os.remove(service_path_to_stop)
+                needs_daemon_reload = True
+
+    # --- Siapkan unit untuk semua start (unit hasil pre-warm tidak ditulis ulang) ---
+    prepared = []
+    pending_cpu_cores, pending_memory_mb = 0, 0
+    for item in starts:
+        session_name_original = item['session_name_original']
+        admission_reason = check_admission(item['encoding_profile'], pending_cpu_cores, pending_memory_mb)
+        if admission_reason:
+            defer_scheduled_start(item, admission_reason)
+            continue
+        with admission_waiting_lock: admission_waiting.pop(session_name_original, None)
+        cpu_cores, memory_mb = stream_resource_estimate(item['encoding_profile'])
+        pending_cpu_cores += cpu_cores; pending_memory_mb += memory_mb
+        log_scheduler.debug("Mulai stream terjadwal: '%s', Tipe: %s, Durasi One-Time: %s menit, Jadwal Harian: %s-%s", session_name_original, item['recurrence_type'],
+                            item['one_time_duration_minutes'], item['daily_start_time_str'], item['daily_stop_time_str'])
+        try:
+            video_path = prepare_stream_input(session_name_original, item['video_file'], item['playlist'])
+        except ValueError as e:
+            log_scheduler.error(f"Video untuk jadwal '{session_name_original}' tidak ada ({e}). Jadwal mungkin perlu dibatalkan.")
+            continue
+        try:
+            item['destinations'] = parse_destinations(item)
+            platform_url = get_platform_url(item['destinations'][0]['platform'])
+            sanitized_service_id_part = sanitize_for_service_name(session_name_original)
+            service_content = build_service_content(session_name_original, video_path, item['destinations'], item['encoding_profile'])
+            prewarmed = consume_prewarmed_stream(sanitized_service_id_part, service_content)
+            if prewarmed:
+                service_name_systemd = f"stream-{sanitized_service_id_part}.service"
+            else:
+                service_name_systemd, sanitized_service_id_part = create_service_file(session_name_original, video_path, item['destinations'], item['encoding_profile'], reload=False)
+                needs_daemon_reload = True
+            prepared.append((item, sanitized_service_id_part, service_name_systemd, platform_url, prewarmed))
+        except Exception as e:
+            log_scheduler.error(f"Error start_scheduled_streaming untuk '{session_name_original}': {e}", exc_info=True)
 
-                # ID job APScheduler harus unik, gunakan sanitized_service_id
-                aps_start_job_id = f"daily-start-{sanitized_service_id}" 
-                aps_stop_job_id = f"daily-stop-{sanitized_service_id}"   
+    if needs_daemon_reload:
+        try: run_cmd(["systemctl", "daemon-reload"], check=True, timeout=30)
+        except Exception as e: log_scheduler.error(f"BATCH: daemon-reload gagal: {e}")
 
-                scheduler.add_job(start_scheduled_streaming, 'cron', hour=start_h, minute=start_m,
-                                  args=[platform, stream_key, video_file, session_name_original, 0, 'daily', start_time_str, stop_time_str],
-                                  id=aps_start_job_id, replace_existing=True, misfire_grace_time=3600)
-                logging.info(f"Recovered daily start job '{aps_start_job_id}' for '{session_name_original}' at {start_time_str}")
+    def launch(indexed):
+        index, (item, _, service_name_systemd, _, prewarmed) = indexed
+        if SCHEDULE_BATCH_STAGGER_SECONDS: time.sleep(index * SCHEDULE_BATCH_STAGGER_SECONDS)
+        try:
+            run_cmd(["systemctl", "start", service_name_systemd], check=True, capture_output=True, text=True, timeout=30)
+            log_scheduler.debug("Service %s untuk jadwal '%s' dimulai (%s).", service_name_systemd, item['session_name_original'], 'pre-warm' if prewarmed else 'tanpa pre-warm')
+            return datetime.now(jakarta_tz)
+        except subprocess.CalledProcessError as e:
+            log_scheduler.error(f"Gagal start service {service_name_systemd} untuk jadwal '{item['session_name_original']}': {e.stderr if e.stderr else e.stdout}")
+        except Exception as e:
+            log_scheduler.error(f"Error start_scheduled_streaming untuk '{item['session_name_original']}': {e}", exc_info=True)
+        return None
+
+    launched = []
+    if prepared:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-start') as pool:
+            launched = list(pool.map(trace_lane(launch), enumerate(prepared)))
+
+    started = [(prepared_item, launched_dt) for prepared_item, launched_dt in zip(prepared, launched) if launched_dt]
+    if not stop_targets and not started: return
+    one_time_started = any(item['recurrence_type'] == 'one_time' for (item, *_), _ in started)
+
+    def apply_batch(s_data):
+        # systemctl di atas bisa makan beberapa detik; hanya perubahan batch ini yang diterapkan ke isi file terbaru
+        for session_name, _, _ in stop_targets:
+            current = next((sess for sess in s_data.get('active_sessions', []) if sess['id'] == session_name), None)
+            if current is None: continue # Sudah dihentikan/dipindah oleh aksi lain selama batch berjalan
+            current.update(status='inactive', stop_time=stop_time_iso)
+            s_data['inactive_sessions'] = add_or_update_session_in_list(s_data.get('inactive_sessions', []), current)
+            s_data['active_sessions'] = [sess for sess in s_data['active_sessions'] if sess['id'] != session_name]
+            log_scheduler.debug("Sesi '%s' dihentikan dan dipindah ke inactive.", session_name)
+        for (item, sanitized_service_id_part, _, _, prewarmed), launched_dt in started:
+            session_name_original = item['session_name_original']
+            s_data['active_sessions'] = add_or_update_session_in_list(
+                s_data.get('active_sessions', []), build_scheduled_active_entry(item, sanitized_service_id_part, launched_dt, prewarmed))
+            if item['recurrence_type'] == 'one_time':
+                # Hapus definisi jadwal one-time dari scheduled_sessions berdasarkan session_name_original
+                s_data['scheduled_sessions'] = [sched for sched in s_data.get('scheduled_sessions', []) if not (sched.get('session_name_original') == session_name_original and sched.get('recurrence_type', 'one_time') == 'one_time')]
+    s_data = modify_sessions(apply_batch)
+    started = [prepared_item for prepared_item, _ in started]
+    if one_time_started: mark_schedule_jobs_synced(s_data)
+    record_session_events([(target[0], 'stop', 'scheduled') for target in stop_targets] +
+                          [(item['session_name_original'], 'scheduled', item['recurrence_type']) for item, *_ in started])
+
+    sessions_data = get_active_sessions_data()
+    inactive_data = {"inactive_sessions": get_inactive_sessions_data()} if stop_targets else None
+    schedules_data = get_schedules_list_data()
+    with socketio_lock:
+        socketio.emit('sessions_update', sessions_data)
+        if inactive_data: socketio.emit('inactive_sessions_update', inactive_data)
+        socketio.emit('schedules_update', schedules_data)
+    log_scheduler.info(f"BATCH: {len(started)} sesi dimulai dan {len(stop_targets)} sesi dihentikan, update dikirim.")
 
-                scheduler.add_job(stop_scheduled_streaming, 'cron', hour=stop_h, minute=stop_m,
-                                  args=[session_name_original],
-                                  id=aps_stop_job_id, replace_existing=True, misfire_grace_time=3600)
-                logging.info(f"Recovered daily stop job '{aps_stop_job_id}' for '{session_name_original}' at {stop_time_str}")
-                valid_schedules_in_json.append(sched_def)
+    for item, sanitized_service_id_part, service_name_systemd, platform_url, prewarmed in started:
+        threading.Thread(target=record_first_packet_latency, args=(item['session_name_original'], service_name_systemd, platform_url, item['fire_dt'], prewarmed),
+                         name=f"first-packet-{sanitized_service_id_part}", daemon=True).start()
 
-            elif recurrence == 'one_time':
-                start_time_iso = sched_def.get('start_time_iso')
-                duration_minutes = sched_def.get('duration_minutes')
-                is_manual = sched_def.get('is_manual_stop', duration_minutes == 0)
-                # ID job start APScheduler = ID definisi jadwal untuk one-time
-                aps_start_job_id = schedule_definition_id 
-
-                if not start_time_iso or duration_minutes is None:
-                    logging.warning(f"Recover: Skip jadwal one-time '{session_name_original}' karena field waktu/durasi kurang.")
-                    continue
+def start_scheduled_streaming(platform, stream_key, video_file, session_name_original, 
+                              one_time_duration_minutes=0, recurrence_type='one_time', 
+                              daily_start_time_str=None, daily_stop_time_str=None, destinations=None, encoding_profile=None,
+                              playlist=None):
+    # Versi langsung (tanpa jendela batch), untuk pemanggilan di luar job scheduler
+    run_schedule_batch(starts=[scheduled_start_item(platform, stream_key, video_file, session_name_original,
+                                                    one_time_duration_minutes, recurrence_type,
+                                                    daily_start_time_str, daily_stop_time_str, destinations, encoding_profile,
+                                                    playlist)])
 
-                start_dt = datetime.fromisoformat(start_time_iso).astimezone(now_jkt.tzinfo)
-
-                if start_dt > now_jkt:
-                    scheduler.add_job(start_scheduled_streaming, 'date', run_date=start_dt,
-                                      args=[platform, stream_key, video_file, session_name_original, duration_minutes, 'one_time', None, None],
-                                      id=aps_start_job_id, replace_existing=True)
-                    logging.info(f"Recovered one-time start job '{aps_start_job_id}' for '{session_name_original}' at {start_dt}")
-
-                    if not is_manual:
-                        stop_dt = start_dt + timedelta(minutes=duration_minutes)
-                        if stop_dt > now_jkt:
-                            # ID job stop APScheduler untuk one-time
-                            aps_stop_job_id = f"onetime-stop-{sanitized_service_id}" 
-                            scheduler.add_job(stop_scheduled_streaming, 'date', run_date=stop_dt,
-                                              args=[session_name_original],
-                                              id=aps_stop_job_id, replace_existing=True)
-                            logging.info(f"Recovered one-time stop job '{aps_stop_job_id}' for '{session_name_original}' at {stop_dt}")
-                    valid_schedules_in_json.append(sched_def)
-                else:
-                    logging.info(f"Recover: Skip jadwal one-time '{session_name_original}' karena waktu sudah lewat.")
-            else:
-                 logging.warning(f"Recover: Tipe recurrence '{recurrence}' tidak dikenal untuk '{session_name_original}'.")
 
+def stop_scheduled_streaming(session_name_original_or_active_id):
+    log_scheduler.info(f"Menghentikan stream (terjadwal/aktif): '{session_name_original_or_active_id}'")
+    run_schedule_batch(stops=[session_name_original_or_active_id])
+
+
+def schedule_job_specs(sched_def, now_jkt=None):
+    """Daftar job APScheduler (dict argumen add_job) untuk satu definisi jadwal.
+    Raise ValueError jika definisi tidak lengkap."""
+    now_jkt = now_jkt or datetime.now(jakarta_tz)
+    session_name_original = sched_def.get('session_name_original')
+    schedule_definition_id = sched_def.get('id')
+    sanitized_service_id = sched_def.get('sanitized_service_id')
+    platform = sched_def.get('platform')
+    stream_key = sched_def.get('stream_key')
+    video_file = sched_def.get('video_file')
+    destinations = sched_def.get('destinations')
+    encoding_profile = sched_def.get('encoding_profile', DEFAULT_ENCODING_PROFILE)
+    playlist = sched_def.get('playlist')
+    recurrence = sched_def.get('recurrence_type', 'one_time')
+
+    if not all([session_name_original, sanitized_service_id, platform, stream_key, video_file, schedule_definition_id]):
+        raise ValueError("field dasar (termasuk ID definisi atau sanitized_service_id) kurang")
+
+    if recurrence == 'daily':
+        start_time_str = sched_def.get('start_time_of_day')
+        stop_time_str = sched_def.get('stop_time_of_day')
+        if not start_time_str or not stop_time_str:
+            raise ValueError("field waktu harian kurang")
+        start_h, start_m = map(int, start_time_str.split(':'))
+        stop_h, stop_m = map(int, stop_time_str.split(':'))
+        prewarm_seconds_of_day = (start_h * 3600 + start_m * 60 - SCHEDULE_PREWARM_SECONDS) % 86400
+        return [
+            dict(func=prewarm_scheduled_streaming, trigger='cron', hour=prewarm_seconds_of_day // 3600,
+                 minute=prewarm_seconds_of_day % 3600 // 60, second=prewarm_seconds_of_day % 60,
+                 args=[platform, stream_key, video_file, session_name_original, destinations, encoding_profile, playlist],
+                 id=f"daily-prewarm-{sanitized_service_id}", misfire_grace_time=SCHEDULE_PREWARM_SECONDS),
+            dict(func=queue_scheduled_start, trigger='cron', hour=start_h, minute=start_m,
+                 args=[platform, stream_key, video_file, session_name_original, 0, 'daily', start_time_str, stop_time_str, destinations, encoding_profile, playlist],
+                 id=f"daily-start-{sanitized_service_id}"),
+            dict(func=queue_scheduled_stop, trigger='cron', hour=stop_h, minute=stop_m,
+                 args=[session_name_original], id=f"daily-stop-{sanitized_service_id}"),
+        ]
+
+    if recurrence == 'one_time':
+        start_time_iso = sched_def.get('start_time_iso')
+        duration_minutes = sched_def.get('duration_minutes')
+        if not start_time_iso or duration_minutes is None:
+            raise ValueError("field waktu/durasi kurang")
+        is_manual = sched_def.get('is_manual_stop', duration_minutes == 0)
+        start_dt = datetime.fromisoformat(start_time_iso).astimezone(jakarta_tz)
+        specs = []
+        # Job start yang sudah lewat tapi masih dalam misfire grace tetap didaftarkan (dijalankan segera)
+        prewarm_dt = start_dt - timedelta(seconds=SCHEDULE_PREWARM_SECONDS)
+        if prewarm_dt > now_jkt:
+            specs.append(dict(func=prewarm_scheduled_streaming, trigger='date', run_date=prewarm_dt,
+                              args=[platform, stream_key, video_file, session_name_original, destinations, encoding_profile, playlist],
+                              id=f"onetime-prewarm-{sanitized_service_id}", misfire_grace_time=SCHEDULE_PREWARM_SECONDS))
+        if start_dt + timedelta(seconds=SCHEDULE_MISFIRE_GRACE_SECONDS) > now_jkt:
+            specs.append(dict(func=queue_scheduled_start, trigger='date', run_date=start_dt,
+                              args=[platform, stream_key, video_file, session_name_original, duration_minutes, 'one_time', None, None, destinations, encoding_profile, playlist],
+                              id=schedule_definition_id))
+            if not is_manual:
+                stop_dt = start_dt + timedelta(minutes=duration_minutes)
+                if stop_dt > now_jkt:
+                    specs.append(dict(func=queue_scheduled_stop, trigger='date', run_date=stop_dt,
+                                      args=[session_name_original], id=f"onetime-stop-{sanitized_service_id}"))
+        return specs
+
+    raise ValueError(f"tipe recurrence '{recurrence}' tidak dikenal")
+
+def schedule_job_ids(sched_def):
+    # ID job yang mungkin dimiliki definisi jadwal (tanpa validasi waktu), dipakai untuk menghapus job
+    sanitized_id = sched_def.get('sanitized_service_id')
+    if sched_def.get('recurrence_type') == 'daily':
+        return [f"daily-prewarm-{sanitized_id}", f"daily-start-{sanitized_id}", f"daily-stop-{sanitized_id}"]
+    ids = [f"onetime-prewarm-{sanitized_id}", sched_def.get('id')]
+    if not sched_def.get('is_manual_stop', sched_def.get('duration_minutes', 0) == 0):
+        ids.append(f"onetime-stop-{sanitized_id}")
+    return [job_id for job_id in ids if job_id]
+
+def add_schedule_jobs(sched_def):
+    specs = schedule_job_specs(sched_def)
+    for spec in specs:
+        scheduler.add_job(replace_existing=True, **spec)
+        log_scheduler.debug("Job '%s' untuk '%s' didaftarkan (%s).", spec['id'], sched_def.get('session_name_original'), spec['trigger'])
+    return len(specs)
+
+def remove_schedule_jobs(sched_def):
+    removed = 0
+    for job_id in schedule_job_ids(sched_def):
+        try:
+            scheduler.remove_job(job_id)
+            removed += 1
+            log_scheduler.debug("Job '%s' dihapus dari scheduler.", job_id)
+        except JobLookupError:
+            log_scheduler.debug("Job '%s' tidak ditemukan di scheduler.", job_id)
+    discard_prewarmed_stream(sched_def.get('sanitized_service_id'))
+    return removed
+
+def schedule_definitions_fingerprint(scheduled_sessions):
+    payload = json.dumps({'version': SCHEDULE_JOBS_VERSION, 'schedules': scheduled_sessions}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def read_schedule_sync_fingerprint():
+    if not scheduler_jobstore_persistent or not os.path.exists(SCHEDULER_JOBSTORE_FILE): return None
+    try:
+        with sqlite3.connect(SCHEDULER_JOBSTORE_FILE) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS streamhib_sync (key TEXT PRIMARY KEY, value TEXT)")
+            row = conn.execute("SELECT value FROM streamhib_sync WHERE key = 'schedules_fingerprint'").fetchone()
+            return row[0] if row else None
+    except sqlite3.Error as e:
+        log_scheduler.warning(f"Gagal membaca fingerprint sinkronisasi jadwal: {e}")
+        return None
+
+def mark_schedule_jobs_synced(s_data):
+    # Dipanggil setelah definisi jadwal di sessions.json dan job di job store sama-sama diperbarui
+    if not scheduler_jobstore_persistent: return
+    try:
+        with sqlite3.connect(SCHEDULER_JOBSTORE_FILE) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS streamhib_sync (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("INSERT OR REPLACE INTO streamhib_sync (key, value) VALUES ('schedules_fingerprint', ?)",
+                         (schedule_definitions_fingerprint(s_data.get('scheduled_sessions', [])),))
+    except sqlite3.Error as e:
+        log_scheduler.warning(f"Gagal menyimpan fingerprint sinkronisasi jadwal: {e}")
+
+def recover_schedules():
+    s_data = read_sessions()
+    now_jkt = datetime.now(jakarta_tz)
+    valid_schedules_in_json = [] 
+    expected_specs = {}
+
+    log_scheduler.info("Memulai pemulihan jadwal...")
+    for sched_def in s_data.get('scheduled_sessions', []):
+        session_name_original = sched_def.get('session_name_original')
+        try:
+            specs = schedule_job_specs(sched_def, now_jkt)
         except Exception as e:
-            logging.error(f"Gagal memulihkan jadwal '{sched_def.get('session_name_original', 'UNKNOWN')}': {e}", exc_info=True)
+            log_scheduler.warning(f"Recover: Skip jadwal '{session_name_original}': {e}")
+            continue
+        if sched_def.get('recurrence_type', 'one_time') == 'one_time' and not specs:
+            log_scheduler.debug("Recover: Skip jadwal one-time '%s' karena waktu sudah lewat.", session_name_original)
+            continue
+        valid_schedules_in_json.append(sched_def)
+        expected_specs.update((spec['id'], spec) for spec in specs)
     
     if len(s_data.get('scheduled_sessions', [])) != len(valid_schedules_in_json):
         s_data['scheduled_sessions'] = valid_schedules_in_json
         write_sessions(s_data)
-        logging.info("File sessions.json diupdate dengan jadwal yang valid setelah pemulihan.")
-    logging.info("Pemulihan jadwal selesai.")
-
-scheduler = BackgroundScheduler(timezone=jakarta_tz)
-if not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
-    recover_schedules() 
-    scheduler.add_job(check_systemd_sessions, 'interval', minutes=1, id="check_systemd_job", replace_existing=True)
-    
-    # ---- TAMBAHKAN JOB UNTUK TRIAL RESET DI SINI ----
-    if TRIAL_MODE_ENABLED:
-        scheduler.add_job(trial_reset, 'interval', hours=TRIAL_RESET_HOURS, id="trial_reset_job", replace_existing=True)
-        logging.info(f"Mode Trial Aktif. Reset dijadwalkan setiap {TRIAL_RESET_HOURS} jam.")
-    # -------------------------------------------------
-    
+        log_scheduler.info("File sessions.json diupdate dengan jadwal yang valid setelah pemulihan.")
+
+    fingerprint = schedule_definitions_fingerprint(valid_schedules_in_json)
+    if scheduler_jobstore_persistent and read_schedule_sync_fingerprint() == fingerprint:
+        # Fingerprint cocok tetapi job store bisa kehilangan job (misal jobs.sqlite dihapus/dipulihkan terpisah)
+        missing_job_ids = [job_id for job_id in expected_specs if scheduler.get_job(job_id, jobstore='default') is None]
+        if not missing_job_ids:
+            log_scheduler.info(f"Pemulihan jadwal selesai: {len(expected_specs)} job dimuat dari job store tanpa dibangun ulang.")
+            return
+        log_scheduler.warning(f"Recover: {len(missing_job_ids)} job hilang dari job store walau fingerprint cocok, job dibangun ulang.")
+
+    # Job store tidak sinkron (pertama kali, sessions.json diubah manual, atau SCHEDULE_JOBS_VERSION naik)
+    stale_job_ids = {job.id for job in scheduler.get_jobs(jobstore='default')} - set(expected_specs)
+    for job_id in stale_job_ids:
+        try: scheduler.remove_job(job_id, jobstore='default')
+        except JobLookupError: pass
+    for spec in expected_specs.values():
+        scheduler.add_job(replace_existing=True, **spec)
+    mark_schedule_jobs_synced(s_data)
+    log_scheduler.info(f"Pemulihan jadwal selesai: {len(expected_specs)} job disinkronkan, {len(stale_job_ids)} job usang dihapus.")
+
+def build_scheduler():
+    jobstores = {'memory': MemoryJobStore()}
+    persistent = False
+    try:
+        from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+        jobstores['default'] = SQLAlchemyJobStore(url=f"sqlite:///{SCHEDULER_JOBSTORE_FILE}")
+        persistent = True
+    except ImportError:
+        log_scheduler.warning("SQLAlchemy tidak terinstal (pip install sqlalchemy). Job jadwal hanya disimpan di memori dan dibangun ulang setiap start.")
+        jobstores['default'] = MemoryJobStore()
+    return BackgroundScheduler(timezone=jakarta_tz, jobstores=jobstores,
+                               job_defaults={'misfire_grace_time': SCHEDULE_MISFIRE_GRACE_SECONDS, 'coalesce': True}), persistent
+
+scheduler = None # Dibuat oleh start_scheduler() saat create_app()
+scheduler_jobstore_persistent = False
+
+# ---- LEASE LEADER SCHEDULER ----
+scheduler_lease_fd = None # fd file lease, dipegang selama proses ini menjadi leader
+scheduler_is_leader = False
+
+def try_acquire_scheduler_lease():
+    global scheduler_lease_fd
+    fd = os.open(SCHEDULER_LEASE_FILE, os.O_RDWR | os.O_CREAT, 0o644)
     try:
-        scheduler.start()
-        logging.info("Scheduler dimulai. Jobs: %s", scheduler.get_jobs())
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return False
+    os.ftruncate(fd, 0)
+    os.write(fd, json.dumps({'pid': os.getpid(), 'worker_id': WORKER_ID, 'since': datetime.now(jakarta_tz).isoformat()}).encode())
+    os.fsync(fd)
+    scheduler_lease_fd = fd
+    return True
+
+def read_scheduler_lease():
+    try:
+        with open(SCHEDULER_LEASE_FILE, 'r') as f: return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def watch_scheduler_lease():
+    while not try_acquire_scheduler_lease():
+        time.sleep(SCHEDULER_LEASE_RETRY_SECONDS)
+    log_scheduler.warning(f"SCHEDULER: Worker '{WORKER_ID or os.getpid()}' mengambil alih lease scheduler.")
+    become_scheduler_leader()
+
+def poll_shared_jobstore():
+    """Sengaja kosong: membangunkan scheduler leader agar job yang ditambah worker lain terbaca."""
+
+def start_scheduler():
+    global scheduler, scheduler_jobstore_persistent
+    scheduler, scheduler_jobstore_persistent = build_scheduler()
+    try:
+        # Start dalam keadaan pause agar job store sudah terbuka saat pemulihan, lalu job terlewat diproses saat resume.
+        # Follower tetap memegang scheduler yang di-pause agar API jadwal bisa menulis ke job store bersama.
+        scheduler.start(paused=True)
+    except Exception as e:
+        log_scheduler.error(f"Gagal start scheduler: {e}")
+        return
+    if try_acquire_scheduler_lease():
+        become_scheduler_leader()
+        return
+    log_scheduler.info(f"SCHEDULER: Worker '{WORKER_ID or os.getpid()}' berjalan sebagai follower (leader: {read_scheduler_lease()}).")
+    if not scheduler_jobstore_persistent:
+        log_scheduler.warning("SCHEDULER: Job store persisten tidak tersedia; jadwal yang dibuat di worker follower tidak akan dijalankan leader.")
+    threading.Thread(target=watch_scheduler_lease, name="scheduler-lease", daemon=True).start()
+
+def become_scheduler_leader():
+    global scheduler_is_leader
+    scheduler_is_leader = True
+    try:
+        recover_schedules()
+        resume_video_preflight()
+        try:
+            backfilled = offload(backfill_session_events, read_sessions().get('active_sessions', []))
+            if backfilled: log_scheduler.info(f"RIWAYAT: Event 'start' ditambahkan untuk {backfilled} sesi aktif yang belum punya riwayat.")
+        except Exception as e:
+            log_scheduler.error(f"RIWAYAT: Gagal melengkapi riwayat sesi aktif: {e}")
+        scheduler.add_job(reconcile_sessions, 'interval', seconds=RECONCILE_INTERVAL_SECONDS, id="reconcile_job", replace_existing=True, jobstore='memory')
+        scheduler.add_job(monitor_stream_health, 'interval', seconds=STREAM_HEALTH_INTERVAL_SECONDS, id="stream_health_job", replace_existing=True, jobstore='memory')
+        scheduler.add_job(adjust_adaptive_presets, 'interval', seconds=ADAPTIVE_PRESET_INTERVAL_SECONDS, id="adaptive_preset_job", replace_existing=True, jobstore='memory')
+        scheduler.add_job(write_state_snapshot, 'interval', minutes=STATE_SNAPSHOT_INTERVAL_MINUTES, id="state_snapshot_job", replace_existing=True, jobstore='memory')
+        if SOCKETIO_MESSAGE_QUEUE:
+            scheduler.add_job(poll_shared_jobstore, 'interval', seconds=SHARED_JOBSTORE_POLL_SECONDS, id="shared_jobstore_poll_job", replace_existing=True, jobstore='memory')
+        
+        # ---- TAMBAHKAN JOB UNTUK TRIAL RESET DI SINI ----
+        if TRIAL_MODE_ENABLED:
+            scheduler.add_job(trial_reset, 'interval', hours=TRIAL_RESET_HOURS, id="trial_reset_job", replace_existing=True, jobstore='memory')
+            log_scheduler.info(f"Mode Trial Aktif. Reset dijadwalkan setiap {TRIAL_RESET_HOURS} jam.")
+        # -------------------------------------------------
+        scheduler.resume()
+        publish_leader_state() # Ganti state leader sebelumnya yang sudah mati
+        atexit.register(write_state_snapshot) # Snapshot hanya ditulis leader agar cache worker lain tidak menimpanya
+        log_scheduler.info(f"Scheduler dimulai dengan {len(scheduler.get_jobs())} job.")
     except Exception as e:
-        logging.error(f"Gagal start scheduler: {e}")
+        log_scheduler.error(f"Gagal start scheduler: {e}")
         
 @socketio.on('connect')
 def handle_connect():
-    logging.info("Klien terhubung")
+    with root_trace('socketio connect', 'socketio'): return accept_dashboard_client()
+
+def accept_dashboard_client():
+    log_socket.info("Klien terhubung")
     if 'user' not in session: 
-        logging.warning("Klien tanpa sesi login aktif ditolak.")
+        log_socket.warning("Klien tanpa sesi login aktif ditolak.")
         return False 
+    videos_data = get_videos_list_data()
+    sessions_data = get_active_sessions_data()
+    inactive_data = {"inactive_sessions": get_inactive_sessions_data()}
+    schedules_data = get_schedules_list_data()
     with socketio_lock:
-        socketio.emit('videos_update', get_videos_list_data())
-        socketio.emit('sessions_update', get_active_sessions_data())
-        socketio.emit('inactive_sessions_update', {"inactive_sessions": get_inactive_sessions_data()})
-        socketio.emit('schedules_update', get_schedules_list_data())
+        socketio.emit('videos_update', videos_data)
+        socketio.emit('sessions_update', sessions_data)
+        socketio.emit('inactive_sessions_update', inactive_data)
+        socketio.emit('schedules_update', schedules_data)
         
         # ---- TAMBAHKAN EMIT STATUS TRIAL DI SINI ----
         if TRIAL_MODE_ENABLED:
@@ -820,6 +3112,144 @@ def handle_connect():
             socketio.emit('trial_status_update', {'is_trial': False, 'message': ''})
         # ---------------------------------------------
 
+# ---- LOG LIVE ----
+# Penonton (sid Socket.IO) berlangganan log unit lewat event 'log_subscribe'. Setiap unit punya satu
+# thread reader yang membaca "journalctl -f", menyimpan baris terakhir di ring buffer, dan mengisi antrean
+# per penonton, plus satu task Socket.IO yang mengirim batch 'log_lines' (emit harus dari hub eventlet).
+# Batch berikutnya baru dikirim setelah klien meng-ack batch sebelumnya; selama itu baris menumpuk di
+# antrean terbatas dan yang tertua dibuang, sehingga klien lambat tidak menahan reader maupun penonton
+# lain. Reader dihentikan LOG_TAIL_IDLE_SECONDS setelah penonton terakhir pergi.
+log_tails = {} # service_name -> {'session_id', 'buffer', 'subscribers': {sid: state}, 'idle_since', 'proc', 'lines_read', 'closed'}
+log_tails_lock = Lock()
+
+def new_log_subscriber():
+    return {'queue': deque(maxlen=LOG_TAIL_CLIENT_QUEUE_LINES), 'dropped': 0, 'in_flight_since': None}
+
+def log_tail_append(tail, lines):
+    with log_tails_lock:
+        tail['buffer'].extend(lines)
+        tail['lines_read'] += len(lines)
+        for subscriber in tail['subscribers'].values():
+            overflow = len(subscriber['queue']) + len(lines) - LOG_TAIL_CLIENT_QUEUE_LINES
+            if overflow > 0: subscriber['dropped'] += overflow
+            subscriber['queue'].extend(lines)
+
+def flush_log_subscribers(service_name, tail):
+    now = time.monotonic()
+    batches = []
+    with log_tails_lock:
+        for sid, subscriber in tail['subscribers'].items():
+            if subscriber['in_flight_since'] and now - subscriber['in_flight_since'] < LOG_TAIL_ACK_TIMEOUT_SECONDS: continue
+            if not subscriber['queue']: continue
+            batches.append((sid, {'session_id': tail['session_id'], 'lines': list(subscriber['queue']), 'dropped': subscriber['dropped']}))
+            subscriber['queue'].clear()
+            subscriber['dropped'] = 0
+            subscriber['in_flight_since'] = now
+    for sid, payload in batches:
+        def acked(*_, sid=sid):
+            with log_tails_lock:
+                subscriber = tail['subscribers'].get(sid)
+                if subscriber: subscriber['in_flight_since'] = None
+        with socketio_lock:
+            socketio.emit('log_lines', payload, to=sid, callback=acked)
+
+def run_log_tail(service_name, tail):
+    """Thread OS reader satu unit (pembacaan pipe blocking tidak boleh berjalan di hub eventlet)."""
+    pending = b''
+    try:
+        proc = subprocess.Popen(["journalctl", "-u", service_name, "-f", "-n", str(LOG_TAIL_BUFFER_LINES), "-o", "short-iso", "--no-pager"],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+    except Exception as e:
+        log_systemd.error(f"LOG LIVE: Reader {service_name} gagal dimulai: {e}")
+        tail['closed'] = True
+        return
+    with log_tails_lock:
+        tail['proc'] = proc
+        closed = tail['closed']
+    log_systemd.info(f"LOG LIVE: Reader {service_name} dimulai (pid {proc.pid}).")
+    try:
+        while not closed:
+            chunk = os.read(proc.stdout.fileno(), 65536)
+            if not chunk: break # journalctl keluar atau dihentikan saat idle
+            *complete, pending = (pending + chunk).split(b'\n')
+            # ffmpeg menulis statistik dengan \r; cukup tampilkan pembaruan terakhir di baris itu
+            if complete: log_tail_append(tail, [line.decode('utf-8', 'replace').rsplit('\r', 1)[-1][:LOG_TAIL_MAX_LINE_CHARS] for line in complete])
+            closed = tail['closed']
+    except Exception as e:
+        log_systemd.error(f"LOG LIVE: Reader {service_name} gagal: {e}")
+    finally:
+        tail['closed'] = True
+        proc.terminate()
+        try: proc.wait(timeout=5)
+        except subprocess.TimeoutExpired: proc.kill()
+        log_systemd.info(f"LOG LIVE: Reader {service_name} dihentikan ({tail['lines_read']} baris dibaca).")
+
+def run_log_tail_flusher(service_name, tail):
+    """Task Socket.IO (greenlet di hub) yang mengirim batch ke penonton dan menghentikan reader saat idle."""
+    while not tail['closed']:
+        socketio.sleep(LOG_TAIL_BATCH_SECONDS)
+        flush_log_subscribers(service_name, tail)
+        now = time.monotonic()
+        with log_tails_lock:
+            if tail['subscribers']:
+                tail['idle_since'] = None
+            elif tail['idle_since'] is None:
+                tail['idle_since'] = now
+            elif now - tail['idle_since'] >= LOG_TAIL_IDLE_SECONDS:
+                tail['closed'] = True
+    with log_tails_lock:
+        if log_tails.get(service_name) is tail: log_tails.pop(service_name)
+        proc = tail['proc']
+    if proc and proc.poll() is None: proc.terminate() # Reader keluar setelah pipe EOF
+
+def subscribe_log_tail(sid, session_id, service_name):
+    """Daftarkan penonton; mengembalikan isi ring buffer untuk ditampilkan lebih dulu."""
+    with log_tails_lock:
+        for other_name, other in log_tails.items():
+            if other_name != service_name: other['subscribers'].pop(sid, None) # Satu sesi per tab
+        tail = log_tails.get(service_name)
+        if tail is None or tail['closed']:
+            # Tail yang sudah ditandai closed sedang dibongkar flusher-nya; jangan menempel ke reader yang sekarat
+            tail = log_tails[service_name] = {'session_id': session_id, 'buffer': deque(maxlen=LOG_TAIL_BUFFER_LINES), 'subscribers': {},
+                                              'idle_since': None, 'proc': None, 'lines_read': 0, 'closed': False}
+            threading.Thread(target=run_log_tail, args=(service_name, tail), name=f"log-tail-{service_name}", daemon=True).start()
+            socketio.start_background_task(run_log_tail_flusher, service_name, tail)
+        tail['subscribers'][sid] = new_log_subscriber()
+        tail['idle_since'] = None
+        return list(tail['buffer'])
+
+def unsubscribe_log_tail(sid):
+    with log_tails_lock:
+        for tail in log_tails.values():
+            if tail['subscribers'].pop(sid, None) is not None and not tail['subscribers']:
+                tail['idle_since'] = time.monotonic()
+
+@socketio.on('log_subscribe')
+def handle_log_subscribe(data):
+    if 'user' not in session: return {'status': 'error', 'message': 'Login diperlukan.'}
+    session_id = (data or {}).get('session_id')
+    s_data = read_sessions()
+    sess = next((x for x in s_data.get('active_sessions', []) + s_data.get('inactive_sessions', []) if x.get('id') == session_id), None)
+    if not sess or not sess.get('sanitized_service_id'):
+        return {'status': 'error', 'message': f"Sesi '{session_id}' tidak ditemukan."}
+    lines = subscribe_log_tail(request.sid, session_id, f"stream-{sess['sanitized_service_id']}.service")
+    return {'status': 'success', 'session_id': session_id, 'lines': lines}
+
+@socketio.on('log_unsubscribe')
+def handle_log_unsubscribe(data=None):
+    unsubscribe_log_tail(request.sid)
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    unsubscribe_log_tail(request.sid)
+
+def get_log_tails_status():
+    with log_tails_lock:
+        return [{'service': name, 'session_id': tail['session_id'], 'subscribers': len(tail['subscribers']),
+                 'buffered_lines': len(tail['buffer']), 'lines_read': tail['lines_read'], 'reader_pid': tail['proc'].pid if tail['proc'] else None,
+                 'idle_seconds': round(time.monotonic() - tail['idle_since'], 1) if tail['idle_since'] else 0}
+                for name, tail in log_tails.items()]
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -898,7 +3328,7 @@ def index():
     try:
         return render_template('index.html')
     except Exception as e:
-        logging.error(f"Error rendering index.html: {e}", exc_info=True)
+        log_api.error(f"Error rendering index.html: {e}", exc_info=True)
         return "Internal Server Error: Gagal memuat halaman utama.", 500
 
 def extract_drive_id(val):
@@ -911,6 +3341,636 @@ def extract_drive_id(val):
             if len(p)>20 and '.' not in p and '=' not in p: return p 
     return val if re.match(r'^[a-zA-Z0-9_-]{20,}$',val) else None 
 
+# ---- DOWNLOADER GOOGLE DRIVE (NATIVE) ----
+# Pengganti subprocess gdown: menangani alur konfirmasi Drive (halaman peringatan virus scan /
+# cookie download_warning), lalu mengambil file dalam beberapa segmen byte-range secara paralel.
+# Setiap segmen ditulis dengan os.pwrite ke file yang sudah dialokasikan penuh, progres segmen
+# disimpan di file .state agar download bisa dilanjutkan, dan ukuran akhir diverifikasi.
+class DownloadError(Exception):
+    pass
+
+class DownloadCancelled(Exception):
+    pass
+
+class _DriveConfirmFormParser(HTMLParser):
+    # Mengambil action + input hidden dari form konfirmasi "Download anyway" milik Drive
+    def __init__(self):
+        super().__init__()
+        self.action = None
+        self.fields = {}
+        self._in_form = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'form' and (attrs.get('id') == 'download-form' or 'download' in (attrs.get('action') or '')):
+            self._in_form = True
+            self.action = attrs.get('action')
+        elif tag == 'input' and self._in_form and attrs.get('name'):
+            self.fields[attrs['name']] = attrs.get('value', '')
+
+    def handle_endtag(self, tag):
+        if tag == 'form': self._in_form = False
+
+def build_download_opener():
+    return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+def parse_content_disposition_filename(header_value):
+    if not header_value: return None
+    m = re.search(r"filename\*=(?:UTF-8|utf-8)''([^;]+)", header_value)
+    if m: return urllib.parse.unquote(m.group(1).strip())
+    m = re.search(r'filename="?([^";]+)"?', header_value)
+    return m.group(1).strip() if m else None
+
+def parse_content_range_total(header_value):
+    m = re.match(r'bytes \d+-\d+/(\d+)', header_value or '')
+    return int(m.group(1)) if m else None
+
+def drive_error_from_html(html):
+    lowered = html.lower()
+    if 'quota exceeded' in lowered or 'too many users have viewed or downloaded' in lowered:
+        return "Kuota download file ini di Google Drive sudah habis, coba lagi nanti."
+    if 'you need access' in lowered or 'request access' in lowered or 'servicelogin' in lowered:
+        return "Pastikan file publik atau Anda punya izin."
+    if 'not found' in lowered or 'does not exist' in lowered:
+        return "File tidak ditemukan atau tidak dapat diakses."
+    return None
+
+def merge_query_params(url, params):
+    # Action form bisa sudah membawa query string sendiri; field form menimpa parameter bernama sama
+    parts = urllib.parse.urlsplit(url)
+    query = [(k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True) if k not in params]
+    return urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(query + list(params.items()))))
+
+def resolve_drive_download(opener, drive_id):
+    """Ikuti alur konfirmasi Drive sampai mendapat URL yang langsung mengirim isi file.
+    Mengembalikan (url, nama_file, total_bytes, mendukung_range)."""
+    url = f"{GDRIVE_DOWNLOAD_URL}?{urllib.parse.urlencode({'id': drive_id, 'export': 'download'})}"
+    for _ in range(3): # Maksimal dua kali halaman konfirmasi
+        req = urllib.request.Request(url, headers={'Range': 'bytes=0-0'})
+        try:
+            resp = opener.open(req, timeout=DOWNLOAD_HTTP_TIMEOUT)
+        except urllib.error.HTTPError as e:
+            if e.code in (401, 403): raise DownloadError("Pastikan file publik atau Anda punya izin.")
+            if e.code == 404: raise DownloadError("File tidak ditemukan atau tidak dapat diakses.")
+            raise DownloadError(f"HTTP {e.code} dari server download.")
+        except (urllib.error.URLError, OSError) as e:
+            raise DownloadError(f"Tidak dapat menghubungi server download: {e}")
+
+        with resp:
+            content_type = resp.headers.get('Content-Type', '')
+            disposition = resp.headers.get('Content-Disposition')
+            if 'text/html' in content_type and not disposition:
+                html = resp.read(2 * 1024 * 1024).decode('utf-8', errors='replace')
+                parser = _DriveConfirmFormParser()
+                parser.feed(html)
+                if parser.action:
+                    url = merge_query_params(urllib.parse.urljoin(resp.geturl(), parser.action), parser.fields)
+                    continue
+                m = re.search(r'href="([^"]*confirm=[^"]+)"', html)
+                if m:
+                    url = urllib.parse.urljoin(resp.geturl(), m.group(1).replace('&amp;', '&'))
+                    continue
+                raise DownloadError(drive_error_from_html(html) or "Google Drive mengembalikan halaman yang tidak dikenali.")
+
+            filename = parse_content_disposition_filename(disposition) or drive_id
+            if resp.status == 206:
+                return resp.geturl(), filename, parse_content_range_total(resp.headers.get('Content-Range')), True
+            length = resp.headers.get('Content-Length')
+            return resp.geturl(), filename, int(length) if length else None, False
+    raise DownloadError("Terlalu banyak halaman konfirmasi dari Google Drive.")
+
+def plan_download_segments(total, segments=None):
+    segments = segments or DOWNLOAD_SEGMENTS
+    count = max(1, min(segments, total // DOWNLOAD_MIN_SEGMENT_BYTES))
+    size = total // count
+    # [start, end(inklusif), byte_selesai]
+    return [[i * size, (total - 1) if i == count - 1 else (i + 1) * size - 1, 0] for i in range(count)]
+
+def download_segmented(opener, url, dest_path, total, progress_cb=None, should_cancel=None, segments=None):
+    state_path = dest_path + '.state'
+    plan = None
+    if os.path.exists(state_path) and os.path.exists(dest_path):
+        try:
+            with open(state_path, 'r') as f: saved = json.load(f)
+            if saved.get('total') == total: plan = saved['segments']
+        except Exception as e:
+            log_download.warning(f"DOWNLOAD: State resume {state_path} tidak bisa dibaca, mulai dari awal: {e}")
+    if plan is None:
+        plan = plan_download_segments(total, segments)
+
+    fd = os.open(dest_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if os.fstat(fd).st_size != total:
+            try: os.posix_fallocate(fd, 0, total)
+            except (AttributeError, OSError): os.ftruncate(fd, total)
+
+        plan_lock = Lock()
+        stop_event = threading.Event()
+
+        def save_state():
+            with plan_lock: snapshot = [list(seg) for seg in plan]
+            tmp_path = state_path + '.tmp'
+            with open(tmp_path, 'w') as f: json.dump({'total': total, 'segments': snapshot}, f)
+            os.replace(tmp_path, state_path)
+
+        def fetch_segment(seg):
+            attempts = 0
+            while not stop_event.is_set():
+                with plan_lock: offset = seg[0] + seg[2]
+                if offset > seg[1]: return
+                req = urllib.request.Request(url, headers={'Range': f'bytes={offset}-{seg[1]}'})
+                try:
+                    with opener.open(req, timeout=DOWNLOAD_HTTP_TIMEOUT) as resp:
+                        if resp.status != 206:
+                            raise DownloadError(f"Server tidak mengirim byte-range (HTTP {resp.status}).")
+                        while not stop_event.is_set():
+                            chunk = resp.read(min(DOWNLOAD_CHUNK_BYTES, seg[1] - offset + 1))
+                            if not chunk: raise ConnectionError("koneksi ditutup sebelum segmen selesai")
+                            os.pwrite(fd, chunk, offset)
+                            offset += len(chunk)
+                            with plan_lock: seg[2] = offset - seg[0]
+                            attempts = 0
+                            if offset > seg[1]: return
+                except DownloadError:
+                    raise
+                except (urllib.error.URLError, OSError, ValueError) as e:
+                    attempts += 1
+                    if attempts > DOWNLOAD_SEGMENT_RETRIES:
+                        raise DownloadError(f"Segmen {seg[0]}-{seg[1]} gagal setelah {DOWNLOAD_SEGMENT_RETRIES} percobaan: {e}")
+                    log_download.warning(f"DOWNLOAD: Segmen {seg[0]}-{seg[1]} terputus ({e}), percobaan ulang {attempts}/{DOWNLOAD_SEGMENT_RETRIES}")
+                    time.sleep(min(2 ** attempts, 30))
+
+        with ThreadPoolExecutor(max_workers=len(plan), thread_name_prefix='download-segment') as pool:
+            futures = [pool.submit(fetch_segment, seg) for seg in plan]
+            last_saved = time.monotonic()
+            while not all(fut.done() for fut in futures):
+                time.sleep(DOWNLOAD_PROGRESS_INTERVAL)
+                if should_cancel and should_cancel():
+                    stop_event.set()
+                if any(fut.done() and fut.exception() for fut in futures):
+                    stop_event.set()
+                with plan_lock: downloaded = sum(seg[2] for seg in plan)
+                if progress_cb: progress_cb(downloaded, total)
+                if time.monotonic() - last_saved >= 5:
+                    save_state(); last_saved = time.monotonic()
+            save_state()
+            for fut in futures:
+                if fut.exception(): raise fut.exception()
+            if stop_event.is_set(): raise DownloadCancelled()
+
+        incomplete = [seg for seg in plan if seg[0] + seg[2] <= seg[1]]
+        if incomplete:
+            raise DownloadError(f"{len(incomplete)} segmen belum lengkap.")
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    actual_size = os.path.getsize(dest_path)
+    if actual_size != total:
+        raise DownloadError(f"Ukuran file tidak sesuai (diharapkan {total} byte, didapat {actual_size} byte).")
+    os.remove(state_path)
+    if progress_cb: progress_cb(total, total)
+
+def download_streaming(opener, url, dest_path, progress_cb=None, should_cancel=None):
+    # Fallback untuk server tanpa dukungan Range / tanpa Content-Length
+    downloaded, last_report = 0, time.monotonic()
+    try:
+        with opener.open(url, timeout=DOWNLOAD_HTTP_TIMEOUT) as resp, open(dest_path, 'wb') as f:
+            total = int(resp.headers['Content-Length']) if resp.headers.get('Content-Length') else None
+            while True:
+                if should_cancel and should_cancel(): raise DownloadCancelled()
+                chunk = resp.read(DOWNLOAD_CHUNK_BYTES)
+                if not chunk: break
+                f.write(chunk)
+                downloaded += len(chunk)
+                if progress_cb and time.monotonic() - last_report >= DOWNLOAD_PROGRESS_INTERVAL:
+                    progress_cb(downloaded, total); last_report = time.monotonic()
+    except (urllib.error.URLError, OSError) as e:
+        raise DownloadError(f"Koneksi download terputus: {e}")
+    if total is not None and downloaded != total:
+        raise DownloadError(f"Ukuran file tidak sesuai (diharapkan {total} byte, didapat {downloaded} byte).")
+    if progress_cb: progress_cb(downloaded, total)
+
+def download_drive_file(drive_id, dest_dir, progress_cb=None, should_cancel=None, segments=None):
+    """Download file Google Drive ke dest_dir dan kembalikan path file hasil download.
+    Jika dest_dir berisi sisa download sebelumnya (file + .state) download dilanjutkan."""
+    opener = build_download_opener()
+    url, filename, total, supports_range = resolve_drive_download(opener, drive_id)
+    filename = os.path.basename(filename.replace('\\', '/')).strip() or drive_id
+    dest_path = os.path.join(dest_dir, filename)
+    log_download.info(f"DOWNLOAD: {drive_id} -> {filename} ({total if total is not None else '?'} byte, range={'ya' if supports_range else 'tidak'})")
+    if supports_range and total:
+        download_segmented(opener, url, dest_path, total, progress_cb, should_cancel, segments)
+    else:
+        download_streaming(opener, url, dest_path, progress_cb, should_cancel)
+    return dest_path
+
+# ---- DOWNLOAD MANAGER ----
+# Download berjalan di thread worker (maksimal DOWNLOAD_MAX_CONCURRENT) sehingga request HTTP
+# langsung kembali dengan job_id. Setiap job memakai folder kerjanya sendiri di DOWNLOAD_TMP_DIR
+# (tidak ada lagi diff listdir VIDEO_DIR yang bisa bentrok antar download), progres dikirim lewat
+# event Socket.IO 'download_progress', dan state antrean disimpan ke DOWNLOAD_JOBS_FILE agar job
+# yang belum selesai dilanjutkan setelah panel restart.
+download_jobs = {}       # job_id -> dict job
+download_cache = {}      # drive_id -> nama file di VIDEO_DIR
+download_jobs_lock = Lock()
+download_queue = queue.Queue()
+download_workers = []
+
+def read_download_state():
+    if not os.path.exists(DOWNLOAD_JOBS_FILE):
+        return {"jobs": [], "cache": {}}
+    try:
+        with open(DOWNLOAD_JOBS_FILE, 'r') as f:
+            content = json.load(f)
+            content.setdefault('jobs', [])
+            content.setdefault('cache', {})
+            return content
+    except Exception as e:
+        log_download.error(f"Error reading {DOWNLOAD_JOBS_FILE}: {e}")
+        return {"jobs": [], "cache": {}}
+
+def write_download_state():
+    # Dipanggil dengan download_jobs_lock dipegang
+    finished = [j for j in download_jobs.values() if j['status'] in ('completed', 'failed', 'cancelled')]
+    finished_keep = {j['id'] for j in sorted(finished, key=lambda j: j['created_at'])[-DOWNLOAD_HISTORY_LIMIT:]}
+    jobs = [j for j in download_jobs.values() if j['status'] not in ('completed', 'failed', 'cancelled') or j['id'] in finished_keep]
+    try:
+        tmp_path = DOWNLOAD_JOBS_FILE + '.tmp'
+        with open(tmp_path, 'w') as f: json.dump({"jobs": jobs, "cache": download_cache}, f, indent=4)
+        os.replace(tmp_path, DOWNLOAD_JOBS_FILE)
+    except Exception as e:
+        log_download.error(f"Error writing to {DOWNLOAD_JOBS_FILE}: {e}")
+
+def get_download_jobs_data():
+    with download_jobs_lock:
+        return sorted((dict(j) for j in download_jobs.values()), key=lambda j: j['created_at'], reverse=True)
+
+def emit_download_progress(job):
+    with socketio_lock:
+        socketio.emit('download_progress', dict(job))
+
+def update_download_job(job_id, persist=False, **fields):
+    with download_jobs_lock:
+        job = download_jobs.get(job_id)
+        if not job: return None
+        job.update(fields)
+        job['updated_at'] = datetime.now(jakarta_tz).isoformat()
+        if persist: write_download_state()
+        snapshot = dict(job)
+    emit_download_progress(snapshot)
+    return snapshot
+
+def ensure_download_workers():
+    with download_jobs_lock:
+        download_workers[:] = [t for t in download_workers if t.is_alive()]
+        while len(download_workers) < DOWNLOAD_MAX_CONCURRENT:
+            worker = threading.Thread(target=download_worker, name=f"download-worker-{len(download_workers)}", daemon=True)
+            worker.start()
+            download_workers.append(worker)
+
+def download_worker():
+    while True:
+        job_id = download_queue.get()
+        try:
+            with download_jobs_lock:
+                job = download_jobs.get(job_id)
+                runnable = job is not None and job['status'] == 'queued'
+            if runnable:
+                run_download_job(job_id)
+        except Exception as e:
+            log_download.error(f"DOWNLOAD: Error tidak terduga pada job {job_id}: {e}", exc_info=True)
+            update_download_job(job_id, persist=True, status='failed', message=f'Kesalahan Server: {str(e)}')
+        finally:
+            download_queue.task_done()
+
+def unique_video_filename(filename):
+    name_part, ext_part = os.path.splitext(filename)
+    candidate, counter = filename, 1
+    while os.path.exists(os.path.join(VIDEO_DIR, candidate)):
+        candidate = f"{name_part} ({counter}){ext_part}"
+        counter += 1
+    return candidate
+
+def run_download_job(job_id):
+    with download_jobs_lock:
+        job = download_jobs[job_id]
+        vid_id = job['drive_id']
+    job_dir = os.path.join(DOWNLOAD_TMP_DIR, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    update_download_job(job_id, persist=True, status='downloading', message='Sedang mengunduh...')
+
+    started = time.monotonic()
+    def should_cancel():
+        with download_jobs_lock: cancel_requested = download_jobs[job_id].get('cancel_requested')
+        return cancel_requested or time.monotonic() - started > DOWNLOAD_TIMEOUT_SECONDS
+    def on_progress(downloaded, total):
+        update_download_job(job_id, bytes_downloaded=downloaded, total_bytes=total)
+
+    try:
+        downloaded_path = download_drive_file(vid_id, job_dir, progress_cb=on_progress, should_cancel=should_cancel)
+    except DownloadCancelled:
+        with download_jobs_lock: cancel_requested = download_jobs[job_id].get('cancel_requested')
+        if cancel_requested:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            update_download_job(job_id, persist=True, status='cancelled', message='Download dibatalkan.')
+        else:
+            log_download.error(f"DOWNLOAD: Job {job_id} timeout.")
+            update_download_job(job_id, persist=True, status='failed', message=f'Download timeout ({DOWNLOAD_TIMEOUT_SECONDS // 60} menit).')
+        return
+    except DownloadError as e:
+        log_download.error(f"DOWNLOAD: Job {job_id} gagal: {e}")
+        update_download_job(job_id, persist=True, status='failed', message=f'Download Gagal: {e}')
+        return
+
+    downloaded_filename = os.path.basename(downloaded_path)
+    name_part, ext_part = os.path.splitext(downloaded_filename)
+    final_filename = f"{downloaded_filename}.mp4" if not ext_part and name_part == vid_id else downloaded_filename
+    final_filename = unique_video_filename(final_filename)
+    shutil.move(downloaded_path, os.path.join(VIDEO_DIR, final_filename))
+    shutil.rmtree(job_dir, ignore_errors=True)
+    log_download.info(f"DOWNLOAD: Job {job_id} selesai, file disimpan sebagai {final_filename}")
+
+    with download_jobs_lock: download_cache[vid_id] = final_filename
+    update_download_job(job_id, persist=True, status='completed', filename=final_filename,
+                        bytes_downloaded=os.path.getsize(os.path.join(VIDEO_DIR, final_filename)),
+                        message='Download video berhasil.')
+    videos_data = get_videos_list_data()
+    with socketio_lock: socketio.emit('videos_update', videos_data)
+    enqueue_video_preflight(final_filename)
+
+def enqueue_download(vid_id):
+    now_iso = datetime.now(jakarta_tz).isoformat()
+    job = {
+        'id': uuid.uuid4().hex[:12], 'drive_id': vid_id, 'status': 'queued', 'filename': None,
+        'bytes_downloaded': 0, 'message': 'Menunggu giliran download...',
+        'created_at': now_iso, 'updated_at': now_iso
+    }
+    with download_jobs_lock:
+        # Download yang sama sedang berjalan/antre: kembalikan job yang sudah ada
+        existing = next((j for j in download_jobs.values() if j['drive_id'] == vid_id and j['status'] in ('queued', 'downloading')), None)
+        if existing: return dict(existing)
+
+        cached_filename = download_cache.get(vid_id)
+        if cached_filename and os.path.isfile(os.path.join(VIDEO_DIR, cached_filename)):
+            job.update({'status': 'completed', 'filename': cached_filename, 'cached': True,
+                        'bytes_downloaded': os.path.getsize(os.path.join(VIDEO_DIR, cached_filename)),
+                        'message': f'Video sudah ada sebagai "{cached_filename}".'})
+        elif cached_filename:
+            download_cache.pop(vid_id, None) # File sudah dihapus/diganti nama, cache tidak berlaku lagi
+        download_jobs[job['id']] = job
+        write_download_state()
+        snapshot = dict(job)
+
+    if snapshot['status'] == 'queued':
+        ensure_download_workers()
+        download_queue.put(snapshot['id'])
+    emit_download_progress(snapshot)
+    return snapshot
+
+def cancel_download(job_id):
+    with download_jobs_lock:
+        job = download_jobs.get(job_id)
+        if not job: return None
+        if job['status'] not in ('queued', 'downloading'): return dict(job)
+        job['cancel_requested'] = True
+        was_queued = job['status'] == 'queued'
+    if was_queued:
+        shutil.rmtree(os.path.join(DOWNLOAD_TMP_DIR, job_id), ignore_errors=True)
+        return update_download_job(job_id, persist=True, status='cancelled', message='Download dibatalkan.')
+    # Job yang sedang berjalan dihentikan oleh worker-nya sendiri pada interval progres berikutnya
+    return update_download_job(job_id, message='Membatalkan download...')
+
+def resume_download_jobs():
+    state = read_download_state()
+    resumed = []
+    with download_jobs_lock:
+        download_cache.update(state.get('cache', {}))
+        for job in state.get('jobs', []):
+            if job.get('status') in ('queued', 'downloading') and not job.get('cancel_requested'):
+                job['status'] = 'queued'
+                job['message'] = 'Melanjutkan download setelah restart...'
+                resumed.append(job['id'])
+            download_jobs[job['id']] = job
+    if resumed:
+        log_download.info(f"DOWNLOAD: Melanjutkan {len(resumed)} job download yang belum selesai.")
+        ensure_download_workers()
+        for job_id in resumed: download_queue.put(job_id)
+
+# ---- PREFLIGHT VIDEO (FASTSTART) ----
+# Analisis murah dulu: posisi moov/mdat dibaca dari header atom level atas (tanpa fork), lalu satu
+# ffprobe untuk rentang byte paket VIDEO_PREFLIGHT_PROBE_SECONDS pertama. File yang bermasalah
+# di-remux ke file sementara lalu os.replace (stream yang sedang membaca file lama tidak terganggu).
+# Waktu buka input sampai paket pertama diukur sebelum dan sesudah remux dan disimpan per file.
+video_preflight = {}  # nama file -> hasil preflight terakhir
+video_preflight_lock = Lock()
+video_preflight_queue = queue.Queue()
+video_preflight_worker = None
+
+def read_video_preflight_state():
+    if not os.path.exists(VIDEO_PREFLIGHT_FILE): return {}
+    try:
+        with open(VIDEO_PREFLIGHT_FILE, 'r') as f: return json.load(f)
+    except Exception as e:
+        log_api.error(f"Error reading {VIDEO_PREFLIGHT_FILE}: {e}")
+        return {}
+
+def write_video_preflight_state(changes):
+    """Gabungkan {nama file: record, atau None = hapus} ke file bersama. Setiap worker hanya menulis record yang
+    diubahnya, di atas isi file terbaru, sehingga hasil worker lain untuk file video lain tidak tertimpa."""
+    # Dipanggil dengan video_preflight_lock dipegang
+    try:
+        with FileLock(VIDEO_PREFLIGHT_FILE + '.lock', timeout=10):
+            state = read_video_preflight_state()
+            for filename, record in changes.items():
+                if record is None: state.pop(filename, None)
+                else: state[filename] = record
+            tmp_path = VIDEO_PREFLIGHT_FILE + '.tmp'
+            with open(tmp_path, 'w') as f: json.dump(state, f, indent=4)
+            os.replace(tmp_path, VIDEO_PREFLIGHT_FILE)
+    except Exception as e:
+        log_api.error(f"Error writing to {VIDEO_PREFLIGHT_FILE}: {e}")
+
+def is_plain_video_name(filename):
+    """Nama file langsung di VIDEO_DIR: tanpa komponen path dan bukan file tersembunyi (misal sisa .remux.tmp)."""
+    return bool(filename) and filename == os.path.basename(filename) and not filename.startswith('.')
+
+def video_file_signature(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+def mp4_top_level_atoms(path):
+    """[(tipe, offset, ukuran)] atom level atas; cukup membaca header tiap atom."""
+    atoms = []
+    with open(path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        pos = 0
+        while pos + 8 <= file_size and len(atoms) < 256:
+            f.seek(pos)
+            header = f.read(16)
+            size, kind = struct.unpack('>I4s', header[:8])
+            if size == 1 and len(header) == 16: size = struct.unpack('>Q', header[8:16])[0]
+            elif size == 0: size = file_size - pos
+            if size < 8: break
+            atoms.append((kind.decode('latin-1'), pos, size))
+            pos += size
+    return atoms
+
+def probe_packet_spread(path):
+    """Rasio rentang byte paket awal terhadap total ukurannya (1.0 = audio/video teranyam rapat)."""
+    out = run_cmd(["ffprobe", "-v", "error", "-read_intervals", f"%+{VIDEO_PREFLIGHT_PROBE_SECONDS}",
+                   "-show_entries", "packet=pos,size", "-of", "csv=p=0", path], capture_output=True, text=True, timeout=60).stdout
+    positions = [tuple(int(v) for v in line.split(',')[:2]) for line in out.splitlines() if line.count(',') >= 1 and 'N/A' not in line]
+    if not positions: return None, 0
+    span = max(pos + size for pos, size in positions) - min(pos for pos, _ in positions)
+    return round(span / max(1, sum(size for _, size in positions)), 2), span
+
+def evict_page_cache(path):
+    """Buang halaman file dari page cache agar pengukuran sebelum/sesudah remux sama-sama dari disk."""
+    if not hasattr(os, 'posix_fadvise'): return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd) # Hasil remux masih dirty; DONTNEED hanya membuang halaman yang sudah bersih
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+def measure_input_first_packet_ms(path):
+    """Waktu ffmpeg (-re, seperti unit stream) dari start sampai paket video pertama keluar, dengan cache dingin."""
+    try: evict_page_cache(path)
+    except OSError as e: log_systemd.debug("PREFLIGHT: Gagal membuang page cache %s: %s", path, e)
+    started = time.monotonic()
+    result = run_cmd(["ffmpeg", "-hide_banner", "-nostdin", "-v", "error", "-re", "-i", path, "-map", "0:v:0", "-c", "copy",
+                      "-frames:v", "1", "-f", "null", "-"], capture_output=True, text=True, timeout=120)
+    return int((time.monotonic() - started) * 1000) if result.returncode == 0 else None
+
+def analyze_video_layout(path):
+    atoms = {kind: offset for kind, offset, _ in reversed(mp4_top_level_atoms(path))} # Offset kemunculan pertama
+    if 'moov' not in atoms or 'mdat' not in atoms:
+        return {'moov_at_end': None, 'interleave_ratio': None, 'needs_remux': False, 'message': 'Struktur MP4 tidak dikenali.'}
+    moov_at_end = atoms['moov'] > atoms['mdat']
+    ratio, span = probe_packet_spread(path)
+    poorly_interleaved = ratio is not None and ratio > VIDEO_INTERLEAVE_MAX_RATIO and span > VIDEO_INTERLEAVE_MIN_SPAN_BYTES
+    return {'moov_at_end': moov_at_end, 'interleave_ratio': ratio, 'needs_remux': moov_at_end or poorly_interleaved}
+
+def remux_faststart(path):
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.remux.tmp")
+    free_bytes = shutil.disk_usage(os.path.dirname(path)).free
+    if free_bytes < os.path.getsize(path) * 1.1:
+        raise RuntimeError(f"ruang disk tidak cukup untuk remux ({free_bytes // 1048576} MB tersisa)")
+    try:
+        result = run_cmd(["ffmpeg", "-hide_banner", "-nostdin", "-v", "error", "-y", "-i", path, "-map", "0:v", "-map", "0:a?",
+                          "-map_metadata", "0", "-c", "copy", "-movflags", "+faststart", "-f", "mp4", tmp_path],
+                         capture_output=True, text=True, timeout=VIDEO_REMUX_TIMEOUT_SECONDS)
+        if result.returncode != 0: raise RuntimeError((result.stderr or 'ffmpeg gagal').strip()[-300:])
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+
+def update_video_preflight(filename, **fields):
+    with video_preflight_lock:
+        record = video_preflight.setdefault(filename, {'filename': filename})
+        record.update(fields, updated_at=datetime.now(jakarta_tz).isoformat())
+        write_video_preflight_state({filename: record})
+        snapshot = dict(record)
+    with socketio_lock: socketio.emit('video_preflight_update', snapshot)
+    return snapshot
+
+def run_video_preflight(filename):
+    if not is_plain_video_name(filename): return
+    path = os.path.join(VIDEO_DIR, filename)
+    if not os.path.isfile(path): return
+    with video_preflight_lock: queued_at = (video_preflight.get(filename) or {}).get('updated_at')
+    os.makedirs(VIDEO_PREFLIGHT_LOCK_DIR, exist_ok=True)
+    # Worker lain bisa mendapat file yang sama (download/API di worker berbeda); dua remux bersamaan saling menimpa
+    with FileLock(os.path.join(VIDEO_PREFLIGHT_LOCK_DIR, f"{filename}.lock"), timeout=VIDEO_REMUX_TIMEOUT_SECONDS):
+        if not os.path.isfile(path): return
+        done = read_video_preflight_state().get(filename) or {}
+        finished_later = done.get('updated_at') and (not queued_at or datetime.fromisoformat(done['updated_at']) > datetime.fromisoformat(queued_at))
+        if finished_later and done.get('status') in ('ok', 'remuxed', 'skipped', 'failed') and done.get('signature') == video_file_signature(path):
+            # Sudah diproses worker lain setelah job ini masuk antrean
+            update_video_preflight(filename, **{k: v for k, v in done.items() if k not in ('filename', 'updated_at')})
+            return
+        run_video_preflight_locked(filename, path)
+
+def run_video_preflight_locked(filename, path):
+    if not filename.lower().endswith(VIDEO_PREFLIGHT_EXTENSIONS):
+        update_video_preflight(filename, status='skipped', signature=video_file_signature(path), message='Bukan file MP4/MOV.')
+        return
+    update_video_preflight(filename, status='analyzing', message='Memeriksa struktur video...')
+    layout = analyze_video_layout(path)
+    first_packet_ms = measure_input_first_packet_ms(path)
+    if not layout['needs_remux']:
+        update_video_preflight(filename, status='ok', signature=video_file_signature(path), first_packet_ms_before=first_packet_ms,
+                               first_packet_ms_after=None, message=layout.pop('message', 'Struktur video sudah optimal.'), **layout)
+        return
+    update_video_preflight(filename, status='remuxing', first_packet_ms_before=first_packet_ms, message='Remux faststart di background...', **layout)
+    started = time.monotonic()
+    try:
+        remux_faststart(path)
+    except Exception as e:
+        log_systemd.warning(f"PREFLIGHT: Remux '{filename}' gagal: {e}")
+        update_video_preflight(filename, status='failed', signature=video_file_signature(path), message=f'Remux gagal: {e}')
+        return
+    first_packet_after_ms = measure_input_first_packet_ms(path)
+    after = analyze_video_layout(path)
+    log_systemd.info(f"PREFLIGHT: '{filename}' di-remux dalam {int(time.monotonic() - started)} detik, paket pertama {first_packet_ms} -> {first_packet_after_ms} ms.")
+    update_video_preflight(filename, status='remuxed', signature=video_file_signature(path), first_packet_ms_after=first_packet_after_ms,
+                           moov_at_end_before=layout['moov_at_end'], interleave_ratio_before=layout['interleave_ratio'],
+                           moov_at_end=after['moov_at_end'], interleave_ratio=after['interleave_ratio'],
+                           remux_seconds=round(time.monotonic() - started, 1), message='Video di-remux (faststart).')
+
+def video_preflight_loop():
+    while True:
+        filename = video_preflight_queue.get()
+        try: run_video_preflight(filename)
+        except Exception as e:
+            log_systemd.error(f"PREFLIGHT: Error tidak terduga untuk '{filename}': {e}", exc_info=True)
+            update_video_preflight(filename, status='failed', message=f'Kesalahan Server: {str(e)}')
+        finally: video_preflight_queue.task_done()
+
+def enqueue_video_preflight(filename):
+    global video_preflight_worker
+    with video_preflight_lock:
+        record = video_preflight.get(filename)
+        if record and record.get('status') in ('queued', 'analyzing', 'remuxing'): return dict(record)
+        if video_preflight_worker is None or not video_preflight_worker.is_alive():
+            # Satu worker: remux membaca dan menulis seluruh file, jangan bersaing I/O dengan stream
+            video_preflight_worker = threading.Thread(target=video_preflight_loop, name="video-preflight", daemon=True)
+            video_preflight_worker.start()
+    video_preflight_queue.put(filename)
+    return update_video_preflight(filename, status='queued', message='Menunggu giliran preflight...')
+
+def get_video_preflight_data():
+    """Hasil preflight untuk file yang masih ada dan belum berubah sejak diperiksa."""
+    with video_preflight_lock: records = [dict(r) for r in video_preflight.values()]
+    result = []
+    for record in records:
+        path = os.path.join(VIDEO_DIR, record['filename'])
+        if not os.path.isfile(path): continue
+        if record.get('signature') and record['signature'] != video_file_signature(path): record['status'] = 'stale'
+        result.append(record)
+    return sorted(result, key=lambda r: r['filename'])
+
+def rename_video_preflight(old_filename, new_filename=None):
+    with video_preflight_lock:
+        record = video_preflight.pop(old_filename, None)
+        if record and new_filename: video_preflight[new_filename] = dict(record, filename=new_filename)
+        if record: write_video_preflight_state({old_filename: None, **({new_filename: video_preflight[new_filename]} if new_filename else {})})
+
+def restore_video_preflight():
+    state = read_video_preflight_state()
+    with video_preflight_lock:
+        video_preflight.update(state)
+        for record in video_preflight.values():
+            if record.get('status') in ('queued', 'analyzing', 'remuxing'): record['status'] = 'interrupted'
+
+def resume_video_preflight():
+    """Antrekan ulang preflight yang terputus restart; hanya leader, agar setiap worker tidak me-remux file yang sama."""
+    with video_preflight_lock:
+        interrupted = [name for name, record in video_preflight.items() if record.get('status') == 'interrupted']
+    for name in interrupted: enqueue_video_preflight(name)
+
 @app.route('/api/download', methods=['POST'])
 @login_required
 def download_video_api():
@@ -920,48 +3980,36 @@ def download_video_api():
         if not input_val: return jsonify({'status':'error','message':'ID/URL Video diperlukan'}),400
         vid_id = extract_drive_id(input_val)
         if not vid_id: return jsonify({'status':'error','message':'Format ID/URL GDrive tidak valid atau tidak ditemukan.'}),400
-        
-        output_dir_param = VIDEO_DIR + os.sep 
-        cmd = ["/usr/local/bin/gdown", f"https://drive.google.com/uc?id={vid_id.strip()}&export=download", "-O", output_dir_param, "--no-cookies", "--quiet", "--continue"]
-        
-        logging.debug(f"Download cmd: {shlex.join(cmd)}")
-        files_before = set(os.listdir(VIDEO_DIR))
-        res = subprocess.run(cmd,capture_output=True,text=True,timeout=1800) 
-        files_after = set(os.listdir(VIDEO_DIR))
-        new_files = files_after - files_before
-
-        if res.returncode==0:
-            downloaded_filename_to_check = None
-            if new_files:
-                downloaded_filename_to_check = new_files.pop() 
-                name_part, ext_part = os.path.splitext(downloaded_filename_to_check)
-                if not ext_part and name_part == vid_id: 
-                    new_filename_with_ext = f"{downloaded_filename_to_check}.mp4" 
-                    try:
-                        os.rename(os.path.join(VIDEO_DIR, downloaded_filename_to_check), os.path.join(VIDEO_DIR, new_filename_with_ext))
-                        logging.info(f"File download {downloaded_filename_to_check} di-rename menjadi {new_filename_with_ext}")
-                    except Exception as e_rename_gdown:
-                        logging.error(f"Gagal me-rename file download {downloaded_filename_to_check} setelah gdown: {e_rename_gdown}")
-            elif "already exists" in res.stderr.lower() or "already exists" in res.stdout.lower():
-                 logging.info(f"File untuk ID {vid_id} kemungkinan sudah ada. Tidak ada file baru terdeteksi.")
-            else:
-                logging.warning(f"gdown berhasil (code 0) tapi tidak ada file baru terdeteksi di {VIDEO_DIR}. Output: {res.stdout} Err: {res.stderr}")
 
-            with socketio_lock: socketio.emit('videos_update',get_videos_list_data())
-            return jsonify({'status':'success','message':'Download video berhasil. Cek daftar video.'})
-        else:
-            logging.error(f"Gdown error (code {res.returncode}): {res.stderr} | stdout: {res.stdout}")
-            err_msg = f'Download Gagal: {res.stderr[:250]}' 
-            if "Permission denied" in res.stderr or "Zugriff verweigert" in res.stderr: err_msg="Download Gagal: Pastikan file publik atau Anda punya izin."
-            elif "File not found" in res.stderr or "No such file" in res.stderr or "Cannot retrieve BFC cookies" in res.stderr: err_msg="Download Gagal: File tidak ditemukan atau tidak dapat diakses."
-            elif "ERROR:" in res.stderr: err_msg = f"Download Gagal: {res.stderr.split('ERROR:')[1].strip()[:200]}"
-            return jsonify({'status':'error','message':err_msg}),500
-    except subprocess.TimeoutExpired: 
-        logging.error("Proses download video timeout.")
-        return jsonify({'status':'error','message':'Download timeout (30 menit).'}),500
+        job = enqueue_download(vid_id.strip())
+        if job['status'] == 'completed':
+            return jsonify({'status':'success','message':job['message'],'job_id':job['id'],'job':job})
+        return jsonify({'status':'success','message':'Download dimasukkan ke antrean. Pantau progres di daftar download.','job_id':job['id'],'job':job}),202
     except Exception as e: 
-        logging.exception("Error tidak terduga saat download video")
+        log_api.exception("Error tidak terduga saat download video")
         return jsonify({'status':'error','message':f'Kesalahan Server: {str(e)}'}),500
+
+@app.route('/api/downloads', methods=['GET'])
+@login_required
+def list_downloads_api():
+    try: return jsonify(get_download_jobs_data())
+    except Exception as e:
+        log_api.error(f"Error API /api/downloads: {str(e)}",exc_info=True)
+        return jsonify({'status':'error','message':'Gagal ambil daftar download.'}),500
+
+@app.route('/api/downloads/cancel', methods=['POST'])
+@login_required
+def cancel_download_api():
+    try:
+        job_id = (request.get_json(silent=True) or {}).get('job_id')
+        if not job_id: return jsonify({'status':'error','message':'job_id diperlukan'}),400
+        job = cancel_download(job_id)
+        if not job: return jsonify({'status':'error','message':f"Job download '{job_id}' tidak ditemukan."}),404
+        return jsonify({'status':'success','message':job['message'],'job':job})
+    except Exception as e:
+        log_api.exception("Error membatalkan download")
+        return jsonify({'status':'error','message':f'Kesalahan Server: {str(e)}'}),500
+
         
 @app.route('/api/videos/delete-all', methods=['POST'])
 @login_required
@@ -970,11 +4018,12 @@ def delete_all_videos_api():
         count=0
         for vid in get_videos_list_data(): 
             try: os.remove(os.path.join(VIDEO_DIR,vid)); count+=1
-            except Exception as e: logging.error(f"Error hapus video {vid}: {str(e)}")
-        with socketio_lock: socketio.emit('videos_update',get_videos_list_data())
+            except Exception as e: log_api.error(f"Error hapus video {vid}: {str(e)}")
+        videos_data = get_videos_list_data()
+        with socketio_lock: socketio.emit('videos_update', videos_data)
         return jsonify({'status':'success','message':f'Berhasil menghapus {count} video.','deleted_count':count})
     except Exception as e: 
-        logging.exception("Error di API delete_all_videos")
+        log_api.exception("Error di API delete_all_videos")
         return jsonify({'status':'error','message':f'Kesalahan Server: {str(e)}'}),500
 
 @app.route('/videos/<filename>')
@@ -987,32 +4036,36 @@ def serve_video(filename):
 def start_streaming_api(): 
     try:
         data = request.json
-        platform = data.get('platform')
-        stream_key = data.get('stream_key')
-        video_file = data.get('video_file')
+        video_file = data.get('video_file') or (data.get('playlist') or [None])[0]
         session_name_original = data.get('session_name') # Nama sesi asli dari frontend
         
-        if not all([platform, stream_key, video_file, session_name_original, session_name_original.strip()]):
+        if not all([video_file, session_name_original, session_name_original.strip()]):
             return jsonify({'status': 'error', 'message': 'Semua field wajib diisi dan nama sesi tidak boleh kosong.'}), 400
+        try:
+            destinations = parse_destinations(data)
+            encoding_profile = parse_encoding_profile(data)
+            playlist = parse_playlist(data, encoding_profile)
+        except ValueError as ve:
+            return jsonify({'status': 'error', 'message': str(ve)}), 400
         
-        video_path = os.path.abspath(os.path.join(VIDEO_DIR, video_file))
-        if not os.path.isfile(video_path):
+        try:
+            video_path = prepare_stream_input(session_name_original, video_file, playlist)
+        except ValueError:
             return jsonify({'status': 'error', 'message': f'File video {video_file} tidak ditemukan'}), 404
-        if platform not in ["YouTube", "Facebook"]:
-            return jsonify({'status': 'error', 'message': 'Platform tidak valid. Pilih YouTube atau Facebook.'}), 400
-        
-        platform_url = "rtmp://a.rtmp.youtube.com/live2" if platform == "YouTube" else "rtmps://live-api-s.facebook.com:443/rtmp"
+        admission_reason = check_admission(encoding_profile)
+        if admission_reason:
+            return jsonify({'status': 'error', 'message': f'Resource server tidak cukup untuk stream baru: {admission_reason}'}), 503
         
         # create_service_file menggunakan session_name_original, mengembalikan sanitized_service_id_part
-        service_name_systemd, sanitized_service_id_part = create_service_file(session_name_original, video_path, platform_url, stream_key)
-        subprocess.run(["systemctl", "start", service_name_systemd], check=True)
+        service_name_systemd, sanitized_service_id_part = create_service_file(session_name_original, video_path, destinations, encoding_profile)
+        run_cmd(["systemctl", "start", service_name_systemd], check=True)
         
         start_time_iso = datetime.now(jakarta_tz).isoformat()
         new_session_entry = {
             "id": session_name_original, # Simpan nama sesi asli
             "sanitized_service_id": sanitized_service_id_part, # ID untuk service systemd
-            "video_name": video_file,
-            "stream_key": stream_key, "platform": platform, "status": "active",
+            "video_name": video_file, "encoding_profile": encoding_profile, **playlist_fields(playlist),
+            **destination_fields(destinations), "status": "active",
             "start_time": start_time_iso, "scheduleType": "manual", "stopTime": None, 
             "duration_minutes": 0 
         }
@@ -1023,19 +4076,22 @@ def start_streaming_api():
 )
         s_data['inactive_sessions'] = [s for s in s_data.get('inactive_sessions', []) if s.get('id') != session_name_original]
         write_sessions(s_data)
+        record_session_event(session_name_original, 'start')
         
+        sessions_data = get_active_sessions_data()
+        inactive_data = {"inactive_sessions": get_inactive_sessions_data()}
         with socketio_lock:
-            socketio.emit('sessions_update', get_active_sessions_data())
-            socketio.emit('inactive_sessions_update', {"inactive_sessions": get_inactive_sessions_data()})
+            socketio.emit('sessions_update', sessions_data)
+            socketio.emit('inactive_sessions_update', inactive_data)
         return jsonify({'status': 'success', 'message': f'Berhasil memulai Live Stream untuk sesi "{session_name_original}"'}), 200
         
     except subprocess.CalledProcessError as e: 
         session_name_req = data.get('session_name', 'N/A') if isinstance(data, dict) else 'N/A'
-        logging.error(f"Gagal start service untuk sesi '{session_name_req}': {e.stderr if e.stderr else e.stdout}")
+        log_api.error(f"Gagal start service untuk sesi '{session_name_req}': {e.stderr if e.stderr else e.stdout}")
         return jsonify({'status': 'error', 'message': f"Gagal memulai layanan systemd: {e.stderr if e.stderr else e.stdout}"}), 500
     except Exception as e: 
         session_name_req = data.get('session_name', 'N/A') if isinstance(data, dict) else 'N/A'
-        logging.exception(f"Error tidak terduga saat start streaming untuk sesi '{session_name_req}'")
+        log_api.exception(f"Error tidak terduga saat start streaming untuk sesi '{session_name_req}'")
         return jsonify({'status': 'error', 'message': f'Kesalahan Server: {str(e)}'}), 500
 
 @app.route('/api/stop', methods=['POST'])
@@ -1057,18 +4113,18 @@ def stop_streaming_api():
             # Jika tidak ada di sesi aktif atau tidak ada sanitized_service_id, coba buat dari session_id_to_stop
             # Ini adalah fallback, idealnya sanitized_service_id selalu ada di sesi aktif
             sanitized_service_id_for_stop = sanitize_for_service_name(session_id_to_stop)
-            logging.warning(f"Menggunakan fallback sanitized_service_id '{sanitized_service_id_for_stop}' untuk menghentikan sesi '{session_id_to_stop}'.")
+            log_api.warning(f"Menggunakan fallback sanitized_service_id '{sanitized_service_id_for_stop}' untuk menghentikan sesi '{session_id_to_stop}'.")
 
         service_name_systemd = f"stream-{sanitized_service_id_for_stop}.service"
         
         try:
-            subprocess.run(["systemctl","stop",service_name_systemd],check=False, timeout=15)
+            run_cmd(["systemctl","stop",service_name_systemd],check=False, timeout=15)
             service_path = os.path.join(SERVICE_DIR,service_name_systemd)
             if os.path.exists(service_path): 
                 os.remove(service_path)
-                subprocess.run(["systemctl","daemon-reload"],check=True,timeout=10)
+                run_cmd(["systemctl","daemon-reload"],check=True,timeout=10)
         except Exception as e_service_stop:
-             logging.warning(f"Peringatan saat menghentikan/menghapus service {service_name_systemd}: {e_service_stop}")
+             log_api.warning(f"Peringatan saat menghentikan/menghapus service {service_name_systemd}: {e_service_stop}")
             
         stop_time_iso = datetime.now(jakarta_tz).isoformat()
         session_updated_or_added_to_inactive = False
@@ -1093,15 +4149,18 @@ def stop_streaming_api():
             
         if session_updated_or_added_to_inactive:
             write_sessions(s_data)
+        if active_session_data: record_session_event(session_id_to_stop, 'stop')
         
+        sessions_data = get_active_sessions_data()
+        inactive_data = {"inactive_sessions":get_inactive_sessions_data()}
         with socketio_lock:
-            socketio.emit('sessions_update',get_active_sessions_data())
-            socketio.emit('inactive_sessions_update',{"inactive_sessions":get_inactive_sessions_data()})
+            socketio.emit('sessions_update', sessions_data)
+            socketio.emit('inactive_sessions_update', inactive_data)
         return jsonify({'status':'success','message':f'Sesi "{session_id_to_stop}" berhasil dihentikan atau sudah tidak aktif.'})
     except Exception as e: 
         req_data = request.get_json(silent=True) or {}
         session_id_err = req_data.get('session_id','N/A')
-        logging.exception(f"Error stop sesi '{session_id_err}'")
+        log_api.exception(f"Error stop sesi '{session_id_err}'")
         return jsonify({'status':'error','message':f'Kesalahan Server: {str(e)}'}),500
 
 @app.route('/api/videos', methods=['GET'])
@@ -1109,7 +4168,7 @@ def stop_streaming_api():
 def list_videos_api():
     try: return jsonify(get_videos_list_data())
     except Exception as e: 
-        logging.error(f"Error API /api/videos: {str(e)}",exc_info=True)
+        log_api.error(f"Error API /api/videos: {str(e)}",exc_info=True)
         return jsonify({'status':'error','message':'Gagal ambil daftar video.'}),500
 
 @app.route('/api/videos/rename', methods=['POST'])
@@ -1127,10 +4186,12 @@ def rename_video_api():
         if old_p==new_p: return jsonify({'status':'success','message':'Nama video tidak berubah.'})
         if os.path.isfile(new_p): return jsonify({'status':'error','message':f'Nama "{os.path.basename(new_p)}" sudah ada.'}),400
         os.rename(old_p,new_p)
-        with socketio_lock: socketio.emit('videos_update',get_videos_list_data())
+        rename_video_preflight(old, os.path.basename(new_p))
+        videos_data = get_videos_list_data()
+        with socketio_lock: socketio.emit('videos_update', videos_data)
         return jsonify({'status':'success','message':f'Video diubah ke "{os.path.basename(new_p)}"'})
     except Exception as e: 
-        logging.exception("Error rename video")
+        log_api.exception("Error rename video")
         return jsonify({'status':'error','message':f'Kesalahan Server: {str(e)}'}),500
 
 @app.route('/api/videos/delete', methods=['POST'])
@@ -1142,12 +4203,41 @@ def delete_video_api():
         fpath = os.path.join(VIDEO_DIR,fname)
         if not os.path.isfile(fpath): return jsonify({'status':'error','message':f'File "{fname}" tidak ada'}),404
         os.remove(fpath)
-        with socketio_lock: socketio.emit('videos_update',get_videos_list_data())
+        rename_video_preflight(fname)
+        videos_data = get_videos_list_data()
+        with socketio_lock: socketio.emit('videos_update', videos_data)
         return jsonify({'status':'success','message':f'Video "{fname}" dihapus'})
     except Exception as e: 
-        logging.exception(f"Error delete video {request.json.get('file_name','N/A')}")
+        log_api.exception(f"Error delete video {request.json.get('file_name','N/A')}")
         return jsonify({'status':'error','message':f'Kesalahan Server: {str(e)}'}),500
         
+@app.route('/api/videos/preflight', methods=['GET'])
+@login_required
+def video_preflight_api():
+    try: return jsonify(get_video_preflight_data())
+    except Exception as e:
+        log_api.error(f"Error API /api/videos/preflight: {str(e)}",exc_info=True)
+        return jsonify({'status':'error','message':'Gagal ambil hasil preflight video.'}),500
+
+@app.route('/api/videos/preflight', methods=['POST'])
+@login_required
+def run_video_preflight_api():
+    try:
+        data = request.get_json(silent=True) or {}
+        if data.get('all'):
+            filenames = [f for f in os.listdir(VIDEO_DIR) if is_plain_video_name(f) and os.path.isfile(os.path.join(VIDEO_DIR, f)) and f.lower().endswith(VIDEO_PREFLIGHT_EXTENSIONS)]
+        else:
+            fname = data.get('file_name')
+            if not fname: return jsonify({'status':'error','message':'Nama file diperlukan'}),400
+            # Remux menulis ulang file lewat os.replace; jangan sampai keluar dari VIDEO_DIR
+            if not is_plain_video_name(fname): return jsonify({'status':'error','message':'Nama file tidak valid.'}),400
+            if not os.path.isfile(os.path.join(VIDEO_DIR, fname)): return jsonify({'status':'error','message':f'File "{fname}" tidak ada'}),404
+            filenames = [fname]
+        return jsonify({'status':'success','queued':[enqueue_video_preflight(f) for f in sorted(filenames)]})
+    except Exception as e:
+        log_api.exception("Error preflight video")
+        return jsonify({'status':'error','message':f'Kesalahan Server: {str(e)}'}),500
+
 @app.route('/api/disk-usage', methods=['GET'])
 @login_required
 def disk_usage_api(): 
@@ -1157,7 +4247,35 @@ def disk_usage_api():
         stat = 'full' if pu>95 else 'almost_full' if pu>80 else 'normal'
         return jsonify({'status':stat,'total':round(tg,2),'used':round(ug,2),'free':round(fg,2),'percent_used':round(pu,2)})
     except Exception as e: 
-        logging.error(f"Error disk usage: {str(e)}",exc_info=True)
+        log_api.error(f"Error disk usage: {str(e)}",exc_info=True)
+        return jsonify({'status':'error','message':f'Kesalahan Server: {str(e)}'}),500
+
+@app.route('/api/sessions/destinations', methods=['GET'])
+@login_required
+def session_destinations_api():
+    try:
+        session_id = request.args.get('session_id')
+        if not session_id: return jsonify({'status':'error','message':'session_id diperlukan'}),400
+        active_session = next((s for s in get_active_sessions_data() if s.get('id') == session_id), None)
+        if not active_session: return jsonify({'status':'error','message':f"Sesi aktif '{session_id}' tidak ditemukan."}),404
+        # Diisi reconciler; sesi yang baru dimulai belum punya hasil pemeriksaan
+        health = read_leader_state().get('destination_health', {}).get(session_id) or [dict(dest, status='unknown', error=None) for dest in active_session['destinations']]
+        return jsonify({'session_id': session_id, 'destinations': health})
+    except Exception as e:
+        log_api.error(f"Error API /api/sessions/destinations: {str(e)}",exc_info=True)
+        return jsonify({'status':'error','message':f'Kesalahan Server: {str(e)}'}),500
+
+@app.route('/api/sessions/resources', methods=['GET'])
+@login_required
+def session_resources_api():
+    try:
+        session_id = request.args.get('session_id')
+        if not session_id: return jsonify(get_stream_resource_history())
+        active_session = next((s for s in get_active_sessions_data() if s.get('id') == session_id), None)
+        if not active_session: return jsonify({'status':'error','message':f"Sesi aktif '{session_id}' tidak ditemukan."}),404
+        return jsonify(dict(get_stream_resource_history(active_session['sanitized_service_id']), session_id=session_id))
+    except Exception as e:
+        log_api.error(f"Error API /api/sessions/resources: {str(e)}",exc_info=True)
         return jsonify({'status':'error','message':f'Kesalahan Server: {str(e)}'}),500
 
 @app.route('/api/sessions', methods=['GET'])
@@ -1165,7 +4283,7 @@ def disk_usage_api():
 def list_sessions_api():
     try: return jsonify(get_active_sessions_data())
     except Exception as e: 
-        logging.error(f"Error API /api/sessions: {str(e)}",exc_info=True)
+        log_api.error(f"Error API /api/sessions: {str(e)}",exc_info=True)
         return jsonify({'status':'error','message':'Gagal ambil sesi aktif.'}),500
 
 @app.route('/api/schedule', methods=['POST'])
@@ -1173,18 +4291,17 @@ def list_sessions_api():
 def schedule_streaming_api():
     try:
         data = request.json
-        logging.info(f"Menerima data penjadwalan: {data}")
+        log_api.debug("Menerima data penjadwalan untuk '%s' (%s).", data.get('session_name_original'), data.get('recurrence_type', 'one_time')) # Payload lengkap berisi stream key
 
         recurrence_type = data.get('recurrence_type', 'one_time')
         session_name_original = data.get('session_name_original', '').strip() # Nama sesi asli
-        platform = data.get('platform', 'YouTube')
-        stream_key = data.get('stream_key', '').strip()
-        video_file = data.get('video_file')
+        video_file = data.get('video_file') or (data.get('playlist') or [None])[0]
 
-        if not all([session_name_original, platform, stream_key, video_file]):
+        if not all([session_name_original, video_file]) or not (data.get('destinations') or (data.get('stream_key') or '').strip()):
             return jsonify({'status': 'error', 'message': 'Nama sesi, platform, stream key, dan video file wajib diisi.'}), 400
-        if platform not in ["YouTube", "Facebook"]:
-             return jsonify({'status': 'error', 'message': 'Platform tidak valid.'}), 400
+        destinations = parse_destinations(data, default_platform='YouTube')
+        encoding_profile = parse_encoding_profile(data)
+        playlist = parse_playlist(data, encoding_profile)
         if not os.path.isfile(os.path.join(VIDEO_DIR, video_file)):
             return jsonify({'status': 'error', 'message': f"File video '{video_file}' tidak ditemukan."}), 404
 
@@ -1195,28 +4312,11 @@ def schedule_streaming_api():
 
 
         s_data = read_sessions()
-        idx_to_remove = -1
-        for i, sched in enumerate(s_data.get('scheduled_sessions', [])):
-            # Hapus jadwal lama jika nama sesi ASLI sama
-            if sched.get('session_name_original') == session_name_original:
-                logging.info(f"Menemukan jadwal yang sudah ada dengan nama sesi asli '{session_name_original}', akan menggantinya.")
-                old_sanitized_service_id = sched.get('sanitized_service_id')
-                old_schedule_def_id = sched.get('id')
-                try:
-                    if sched.get('recurrence_type') == 'daily':
-                        scheduler.remove_job(f"daily-start-{old_sanitized_service_id}")
-                        scheduler.remove_job(f"daily-stop-{old_sanitized_service_id}")
-                    else: # one_time
-                        scheduler.remove_job(old_schedule_def_id) 
-                        if not sched.get('is_manual_stop', sched.get('duration_minutes', 0) == 0):
-                            scheduler.remove_job(f"onetime-stop-{old_sanitized_service_id}")
-                    logging.info(f"Job scheduler lama untuk '{session_name_original}' berhasil dihapus.")
-                except Exception as e_remove_old_job:
-                    logging.info(f"Tidak ada job scheduler lama untuk '{session_name_original}' atau error saat menghapus: {e_remove_old_job}")
-                idx_to_remove = i
-                break
-        if idx_to_remove != -1:
-            del s_data['scheduled_sessions'][idx_to_remove]
+        # Jadwal lama dengan nama sesi ASLI yang sama akan diganti; job-nya baru dihapus setelah jadwal baru lolos validasi
+        old_sched_to_replace = next((sched for sched in s_data.get('scheduled_sessions', []) if sched.get('session_name_original') == session_name_original), None)
+        if old_sched_to_replace:
+            log_api.info(f"Menemukan jadwal yang sudah ada dengan nama sesi asli '{session_name_original}', akan menggantinya.")
+            s_data['scheduled_sessions'] = [sched for sched in s_data['scheduled_sessions'] if sched is not old_sched_to_replace]
         
         s_data['inactive_sessions'] = [s for s in s_data.get('inactive_sessions', []) if s.get('id') != session_name_original]
 
@@ -1225,8 +4325,8 @@ def schedule_streaming_api():
         sched_entry = {
             'session_name_original': session_name_original,
             'sanitized_service_id': sanitized_service_id_part,
-            'platform': platform, 'stream_key': stream_key, 'video_file': video_file,
-            'recurrence_type': recurrence_type
+            **destination_fields(destinations), 'video_file': video_file,
+            'encoding_profile': encoding_profile, **playlist_fields(playlist), 'recurrence_type': recurrence_type
         }
 
         if recurrence_type == 'daily':
@@ -1250,19 +4350,6 @@ def schedule_streaming_api():
                 'stop_time_of_day': stop_time_of_day
             })
             
-            aps_start_job_id = f"daily-start-{sanitized_service_id_part}"
-            aps_stop_job_id = f"daily-stop-{sanitized_service_id_part}"
-
-            scheduler.add_job(start_scheduled_streaming, 'cron', hour=start_hour, minute=start_minute,
-                              args=[platform, stream_key, video_file, session_name_original, 0, 'daily', start_time_of_day, stop_time_of_day],
-                              id=aps_start_job_id, replace_existing=True, misfire_grace_time=3600)
-            logging.info(f"Jadwal harian START '{aps_start_job_id}' untuk '{session_name_original}' ditambahkan: {start_time_of_day}")
-
-            scheduler.add_job(stop_scheduled_streaming, 'cron', hour=stop_hour, minute=stop_minute,
-                              args=[session_name_original],
-                              id=aps_stop_job_id, replace_existing=True, misfire_grace_time=3600)
-            logging.info(f"Jadwal harian STOP '{aps_stop_job_id}' untuk '{session_name_original}' ditambahkan: {stop_time_of_day}")
-            
             msg = f"Sesi harian '{session_name_original}' dijadwalkan setiap hari dari {start_time_of_day} sampai {stop_time_of_day}."
 
         elif recurrence_type == 'one_time':
@@ -1290,42 +4377,47 @@ def schedule_streaming_api():
                 'is_manual_stop': is_manual_stop
             })
             
-            # ID job start APScheduler = ID definisi jadwal
-            aps_start_job_id = schedule_definition_id
-            scheduler.add_job(start_scheduled_streaming, 'date', run_date=start_dt,
-                              args=[platform, stream_key, video_file, session_name_original, duration_minutes, 'one_time', None, None],
-                              id=aps_start_job_id, replace_existing=True)
-            logging.info(f"Jadwal sekali jalan START '{aps_start_job_id}' untuk '{session_name_original}' ditambahkan pada {start_dt}")
-
-            if not is_manual_stop:
-                stop_dt = start_dt + timedelta(minutes=duration_minutes)
-                aps_stop_job_id = f"onetime-stop-{sanitized_service_id_part}"
-                scheduler.add_job(stop_scheduled_streaming, 'date', run_date=stop_dt,
-                                  args=[session_name_original], id=aps_stop_job_id, replace_existing=True)
-                logging.info(f"Jadwal sekali jalan STOP '{aps_stop_job_id}' untuk '{session_name_original}' ditambahkan pada {stop_dt}")
-            
             msg = f'Sesi "{session_name_original}" dijadwalkan sekali pada {start_dt.strftime("%d-%m-%Y %H:%M:%S")}'
             msg += f' selama {duration_minutes} menit.' if not is_manual_stop else ' hingga dihentikan manual.'
         
         else:
             return jsonify({'status':'error','message':f"Tipe recurrence '{recurrence_type}' tidak dikenal."}),400
 
+        capacity_warnings = check_schedule_capacity(s_data, sched_entry)
+        if capacity_warnings and CAPACITY_POLICY == 'reject':
+            log_api.warning(f"Jadwal '{session_name_original}' ditolak capacity planner: {capacity_warnings}")
+            return jsonify({'status': 'error', 'message': 'Jadwal ditolak karena melebihi kapasitas server: ' + '; '.join(capacity_warnings),
+                            'capacity_warnings': capacity_warnings}), 409
+
+        if old_sched_to_replace:
+            try:
+                remove_schedule_jobs(old_sched_to_replace)
+                log_api.info(f"Job scheduler lama untuk '{session_name_original}' berhasil dihapus.")
+            except Exception as e_remove_old_job:
+                log_api.info(f"Tidak ada job scheduler lama untuk '{session_name_original}' atau error saat menghapus: {e_remove_old_job}")
+        add_schedule_jobs(sched_entry)
+
         s_data.setdefault('scheduled_sessions', []).append(sched_entry)
         write_sessions(s_data)
+        mark_schedule_jobs_synced(s_data)
         
+        schedules_data = get_schedules_list_data()
+        inactive_data = {"inactive_sessions": get_inactive_sessions_data()}
         with socketio_lock:
-            socketio.emit('schedules_update', get_schedules_list_data())
-            socketio.emit('inactive_sessions_update', {"inactive_sessions": get_inactive_sessions_data()})
+            socketio.emit('schedules_update', schedules_data)
+            socketio.emit('inactive_sessions_update', inactive_data)
         
-        return jsonify({'status': 'success', 'message': msg})
+        if capacity_warnings:
+            msg += ' Peringatan kapasitas: ' + '; '.join(capacity_warnings)
+        return jsonify({'status': 'success', 'message': msg, 'capacity_warnings': capacity_warnings})
 
     except (KeyError, ValueError) as e:
-        logging.error(f"Input tidak valid untuk penjadwalan: {str(e)}", exc_info=True)
+        log_api.error(f"Input tidak valid untuk penjadwalan: {str(e)}", exc_info=True)
         return jsonify({'status': 'error', 'message': f"Input tidak valid: {str(e)}"}), 400
     except Exception as e:
         req_data_sched = request.get_json(silent=True) or {}
         session_name_err_sched = req_data_sched.get('session_name_original', 'N/A')
-        logging.exception(f"Error server saat menjadwalkan sesi '{session_name_err_sched}'")
+        log_api.exception(f"Error server saat menjadwalkan sesi '{session_name_err_sched}'")
         return jsonify({'status': 'error', 'message': f'Kesalahan Server Internal: {str(e)}'}), 500
 
 
@@ -1334,10 +4426,124 @@ def schedule_streaming_api():
 def get_schedules_api():
     try: return jsonify(get_schedules_list_data())
     except Exception as e: 
-        logging.error(f"Error API /api/schedule-list: {str(e)}",exc_info=True)
+        log_api.error(f"Error API /api/schedule-list: {str(e)}",exc_info=True)
         return jsonify({'status':'error','message':'Gagal ambil daftar jadwal.'}),500
 
 
+@app.route('/api/worker', methods=['GET'])
+@login_required
+def worker_status_api():
+    return jsonify({'worker_id': WORKER_ID, 'pid': os.getpid(), 'is_scheduler_leader': scheduler_is_leader,
+                    'leader': read_scheduler_lease(), 'message_queue': bool(SOCKETIO_MESSAGE_QUEUE),
+                    'leader_state_published_at': read_leader_state().get('published_at')})
+
+@app.route('/api/incidents', methods=['GET'])
+@login_required
+def incidents_api():
+    try:
+        session_id = request.args.get('session_id')
+        s_data = read_sessions()
+        incidents = [dict(incident, session=sess.get('id'))
+                     for sess in s_data.get('active_sessions', []) + s_data.get('inactive_sessions', [])
+                     if not session_id or sess.get('id') == session_id
+                     for incident in sess.get('incidents', [])]
+        # Insiden yang masih berjalan baru ditulis ke sessions.json saat pulih; ambil dari state leader
+        sessions_by_sid = {sess.get('sanitized_service_id'): sess.get('id') for sess in s_data.get('active_sessions', [])}
+        incidents += [dict(incident, session=sessions_by_sid[sid], recovered_at=None, time_to_recovery_ms=None)
+                      for sid, incident in read_leader_state().get('open_incidents', {}).items()
+                      if sid in sessions_by_sid and (not session_id or sessions_by_sid[sid] == session_id)]
+        return jsonify(sorted(incidents, key=lambda x: x.get('started_at', ''), reverse=True))
+    except Exception as e:
+        log_api.error(f"Error API /api/incidents: {str(e)}",exc_info=True)
+        return jsonify({'status':'error','message':'Gagal ambil data insiden.'}),500
+
+@app.route('/api/analytics/uptime', methods=['GET'])
+@login_required
+def uptime_analytics_api():
+    try:
+        day_from, day_to = request.args.get('from'), request.args.get('to')
+        for day in (day_from, day_to):
+            if day: datetime.strptime(day, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'status':'error','message':'Format tanggal harus YYYY-MM-DD.'}),400
+    try: return jsonify(offload(query_uptime, request.args.get('session_id'), day_from, day_to))
+    except Exception as e:
+        log_api.error(f"Error API /api/analytics/uptime: {str(e)}",exc_info=True)
+        return jsonify({'status':'error','message':'Gagal ambil analitik uptime.'}),500
+
+@app.route('/api/analytics/events', methods=['GET'])
+@login_required
+def session_events_api():
+    try:
+        limit = min(max(int(request.args.get('limit', 200)), 1), 5000)
+        before_ms = int(request.args['before_ms']) if request.args.get('before_ms') else None
+    except ValueError:
+        return jsonify({'status':'error','message':'limit dan before_ms harus angka.'}),400
+    try: return jsonify(offload(query_session_events, request.args.get('session_id'), limit, before_ms))
+    except Exception as e:
+        log_api.error(f"Error API /api/analytics/events: {str(e)}",exc_info=True)
+        return jsonify({'status':'error','message':'Gagal ambil riwayat sesi.'}),500
+
+@app.route('/api/log-tails', methods=['GET'])
+@login_required
+def log_tails_api():
+    try: return jsonify(get_log_tails_status())
+    except Exception as e:
+        log_api.error(f"Error API /api/log-tails: {str(e)}",exc_info=True)
+        return jsonify({'status':'error','message':'Gagal ambil status log live.'}),500
+
+@app.route('/api/admission', methods=['GET'])
+@login_required
+def admission_api():
+    try: return jsonify(get_admission_status())
+    except Exception as e:
+        log_api.error(f"Error API /api/admission: {str(e)}",exc_info=True)
+        return jsonify({'status':'error','message':'Gagal ambil status admission.'}),500
+
+@app.route('/api/cluster', methods=['GET'])
+@login_required
+def cluster_status_api():
+    return jsonify(get_cluster_status())
+
+@app.route('/api/cluster/drain', methods=['POST'])
+@login_required
+def cluster_drain_api():
+    data = request.get_json(silent=True) or {}
+    agent_id = data.get('agent_id')
+    if agent_id not in cluster_agents: return jsonify({'status':'error','message':'Agent tidak ditemukan.'}),404
+    drain = data.get('drain', True)
+    cluster_agents[agent_id]['draining'] = bool(drain)
+    if not drain: return jsonify({'status':'success','message':f"Agent '{agent_id}' kembali menerima stream baru."})
+    try:
+        moved, stranded = offload(move_agent_streams, agent_id, f"agent {agent_id} di-drain")
+    except Exception as e:
+        log_api.error(f"Error API /api/cluster/drain: {str(e)}",exc_info=True)
+        return jsonify({'status':'error','message':f'Kesalahan Server: {str(e)}'}),500
+    return jsonify({'status':'success','moved':moved,'stranded':stranded,
+                    'message':f"{moved} stream dipindah dari agent '{agent_id}'" + (f", {stranded} unit belum bisa dipindah." if stranded else ".")})
+
+@app.route('/api/encoding-profiles', methods=['GET'])
+@login_required
+def encoding_profiles_api():
+    return jsonify({'default': DEFAULT_ENCODING_PROFILE, 'profiles': ENCODING_PROFILES, 'x264_presets': X264_PRESETS})
+
+@app.route('/api/start-latency', methods=['GET'])
+@login_required
+def start_latency_api():
+    try: return jsonify(list(reversed(read_leader_state().get('start_latency', []))))
+    except Exception as e:
+        log_api.error(f"Error API /api/start-latency: {str(e)}",exc_info=True)
+        return jsonify({'status':'error','message':'Gagal ambil data latensi start.'}),500
+
+@app.route('/api/capacity', methods=['GET'])
+@login_required
+def capacity_api():
+    try: return jsonify(get_capacity_report(top_n=request.args.get('top', 5, type=int)))
+    except Exception as e:
+        log_api.error(f"Error API /api/capacity: {str(e)}",exc_info=True)
+        return jsonify({'status':'error','message':'Gagal menghitung kapasitas.'}),500
+
+
 @app.route('/api/cancel-schedule', methods=['POST'])
 @login_required
 def cancel_schedule_api():
@@ -1366,35 +4572,20 @@ def cancel_schedule_api():
         session_display_name = schedule_to_cancel_obj.get('session_name_original', schedule_definition_id_to_cancel)
 
         if not sanitized_service_id_from_def:
-            logging.error(f"Tidak dapat membatalkan job scheduler untuk def ID '{schedule_definition_id_to_cancel}' karena sanitized_service_id tidak ada.")
+            log_api.error(f"Tidak dapat membatalkan job scheduler untuk def ID '{schedule_definition_id_to_cancel}' karena sanitized_service_id tidak ada.")
             # Tetap lanjutkan untuk menghapus dari JSON
         else:
-            if schedule_to_cancel_obj.get('recurrence_type') == 'daily':
-                aps_start_job_id = f"daily-start-{sanitized_service_id_from_def}"
-                aps_stop_job_id = f"daily-stop-{sanitized_service_id_from_def}"
-                try: scheduler.remove_job(aps_start_job_id); removed_scheduler_jobs_count += 1; logging.info(f"Job harian START '{aps_start_job_id}' dihapus.")
-                except Exception as e: logging.info(f"Gagal hapus job harian START '{aps_start_job_id}': {e}")
-                try: scheduler.remove_job(aps_stop_job_id); removed_scheduler_jobs_count += 1; logging.info(f"Job harian STOP '{aps_stop_job_id}' dihapus.")
-                except Exception as e: logging.info(f"Gagal hapus job harian STOP '{aps_stop_job_id}': {e}")
-            
-            elif schedule_to_cancel_obj.get('recurrence_type', 'one_time') == 'one_time':
-                # ID job start APScheduler = ID definisi jadwal
-                aps_start_job_id = schedule_definition_id_to_cancel 
-                try: scheduler.remove_job(aps_start_job_id); removed_scheduler_jobs_count += 1; logging.info(f"Job sekali jalan START '{aps_start_job_id}' dihapus.")
-                except Exception as e: logging.info(f"Gagal hapus job sekali jalan START '{aps_start_job_id}': {e}")
-
-                if not schedule_to_cancel_obj.get('is_manual_stop', schedule_to_cancel_obj.get('duration_minutes', 0) == 0):
-                    aps_stop_job_id = f"onetime-stop-{sanitized_service_id_from_def}"
-                    try: scheduler.remove_job(aps_stop_job_id); removed_scheduler_jobs_count += 1; logging.info(f"Job sekali jalan STOP '{aps_stop_job_id}' dihapus.")
-                    except Exception as e: logging.info(f"Gagal hapus job sekali jalan STOP '{aps_stop_job_id}': {e}")
+            removed_scheduler_jobs_count = remove_schedule_jobs(schedule_to_cancel_obj)
         
         if idx_to_remove_json != -1:
             del s_data['scheduled_sessions'][idx_to_remove_json]
             write_sessions(s_data)
-            logging.info(f"Definisi jadwal '{session_display_name}' (ID: {schedule_definition_id_to_cancel}) dihapus dari sessions.json.")
+            mark_schedule_jobs_synced(s_data)
+            log_api.info(f"Definisi jadwal '{session_display_name}' (ID: {schedule_definition_id_to_cancel}) dihapus dari sessions.json.")
         
+        schedules_data = get_schedules_list_data()
         with socketio_lock:
-            socketio.emit('schedules_update', get_schedules_list_data())
+            socketio.emit('schedules_update', schedules_data)
         
         return jsonify({
             'status': 'success',
@@ -1403,7 +4594,7 @@ def cancel_schedule_api():
     except Exception as e:
         req_data_cancel = request.get_json(silent=True) or {}
         def_id_err = req_data_cancel.get('id', 'N/A')
-        logging.exception(f"Error saat membatalkan jadwal, ID definisi dari request: {def_id_err}")
+        log_api.exception(f"Error saat membatalkan jadwal, ID definisi dari request: {def_id_err}")
         return jsonify({'status': 'error', 'message': f'Kesalahan Server Internal: {str(e)}'}), 500
 
 
@@ -1412,7 +4603,7 @@ def cancel_schedule_api():
 def list_inactive_sessions_api():
     try: return jsonify({"inactive_sessions":get_inactive_sessions_data()})
     except Exception as e: 
-        logging.error(f"Error API /api/inactive-sessions: {str(e)}",exc_info=True)
+        log_api.error(f"Error API /api/inactive-sessions: {str(e)}",exc_info=True)
         return jsonify({'status':'error','message':'Gagal ambil sesi tidak aktif.'}),500
 
 @app.route('/api/reactivate', methods=['POST'])
@@ -1439,16 +4630,30 @@ def reactivate_session_api():
             return jsonify({"status":"error","message":f"File video '{video_file}' tidak ditemukan untuk reaktivasi."}),404
         if platform not in ["YouTube", "Facebook"]: platform="YouTube" 
         
-        platform_url = "rtmp://a.rtmp.youtube.com/live2" if platform == "YouTube" else "rtmps://live-api-s.facebook.com:443/rtmp"
+        # Reaktivasi kembali ke ingest utama
+        destinations = [{'platform': dest['platform'], 'stream_key': dest['stream_key']} for dest in session_destinations(session_obj_to_reactivate)]
+        if len(destinations) == 1: destinations = [{'platform': platform, 'stream_key': stream_key}]
+        try:
+            video_path = prepare_stream_input(session_id_to_reactivate, video_file, session_obj_to_reactivate.get('playlist'))
+        except ValueError as ve:
+            return jsonify({"status":"error","message":f"Video untuk reaktivasi tidak ditemukan: {ve}"}),404
         
         # Gunakan nama sesi asli untuk service, create_service_file akan sanitasi untuk nama service
-        service_name_systemd, new_sanitized_service_id_part = create_service_file(session_id_to_reactivate, video_path, platform_url, stream_key) 
-        subprocess.run(["systemctl", "start", service_name_systemd], check=True) 
+        encoding_profile = session_obj_to_reactivate.get('encoding_profile', DEFAULT_ENCODING_PROFILE)
+        admission_reason = check_admission(encoding_profile)
+        if admission_reason:
+            return jsonify({"status":"error","message":f"Resource server tidak cukup untuk stream baru: {admission_reason}"}),503
+        service_name_systemd, new_sanitized_service_id_part = create_service_file(session_id_to_reactivate, video_path, destinations, encoding_profile) 
+        run_cmd(["systemctl", "start", service_name_systemd], check=True) 
         
         session_obj_to_reactivate['status'] = 'active'
         session_obj_to_reactivate['start_time'] = datetime.now(jakarta_tz).isoformat()
-        session_obj_to_reactivate['platform'] = platform 
+        session_obj_to_reactivate['platform'] = destinations[0]['platform']
         session_obj_to_reactivate['sanitized_service_id'] = new_sanitized_service_id_part # Update jika berbeda
+        session_obj_to_reactivate.pop('x264_preset', None) # Preset adaptif mulai lagi dari preset profil
+        session_obj_to_reactivate.pop('failure_reason', None)
+        session_obj_to_reactivate.pop('destinations', None)
+        session_obj_to_reactivate.update(destination_fields(destinations))
         if 'stop_time' in session_obj_to_reactivate: del session_obj_to_reactivate['stop_time'] 
         session_obj_to_reactivate['scheduleType'] = 'manual_reactivated'
         session_obj_to_reactivate['stopTime'] = None 
@@ -1459,21 +4664,24 @@ def reactivate_session_api():
     s_data.get('active_sessions', []), session_obj_to_reactivate
 )
         write_sessions(s_data)
+        record_session_event(session_id_to_reactivate, 'start', 'reactivate')
         
+        sessions_data = get_active_sessions_data()
+        inactive_data = {"inactive_sessions": get_inactive_sessions_data()}
         with socketio_lock:
-            socketio.emit('sessions_update', get_active_sessions_data())
-            socketio.emit('inactive_sessions_update', {"inactive_sessions": get_inactive_sessions_data()})
+            socketio.emit('sessions_update', sessions_data)
+            socketio.emit('inactive_sessions_update', inactive_data)
         return jsonify({"status":"success","message":f"Sesi '{session_id_to_reactivate}' berhasil diaktifkan kembali (Live Sekarang).","platform":platform})
 
     except subprocess.CalledProcessError as e: 
         req_data_reactivate = request.get_json(silent=True) or {}
         session_id_err_reactivate = req_data_reactivate.get('session_id','N/A')
-        logging.error(f"Gagal start service untuk reaktivasi sesi '{session_id_err_reactivate}': {e.stderr if e.stderr else e.stdout}")
+        log_api.error(f"Gagal start service untuk reaktivasi sesi '{session_id_err_reactivate}': {e.stderr if e.stderr else e.stdout}")
         return jsonify({"status":"error","message":f"Gagal memulai layanan systemd: {e.stderr if e.stderr else e.stdout}"}),500
     except Exception as e: 
         req_data_reactivate_exc = request.get_json(silent=True) or {}
         session_id_err_reactivate_exc = req_data_reactivate_exc.get('session_id','N/A')
-        logging.exception(f"Error saat reaktivasi sesi '{session_id_err_reactivate_exc}'")
+        log_api.exception(f"Error saat reaktivasi sesi '{session_id_err_reactivate_exc}'")
         return jsonify({"status":"error","message":f'Kesalahan Server Internal: {str(e)}'}),500
 
 @app.route('/api/delete-session', methods=['POST'])
@@ -1485,30 +4693,38 @@ def delete_session_api():
         s_data = read_sessions()
         if not any(s['id']==session_id_to_delete for s in s_data.get('inactive_sessions',[])): 
             return jsonify({'status':'error','message':f"Sesi '{session_id_to_delete}' tidak ditemukan di daftar tidak aktif."}),404
+        deleted_session = next(s for s in s_data['inactive_sessions'] if s['id']==session_id_to_delete)
         s_data['inactive_sessions']=[s for s in s_data['inactive_sessions'] if s['id']!=session_id_to_delete]
         write_sessions(s_data)
-        with socketio_lock: socketio.emit('inactive_sessions_update',{"inactive_sessions":get_inactive_sessions_data()})
+        if deleted_session.get('playlist'): remove_playlist_file(deleted_session.get('sanitized_service_id'))
+        inactive_data = {"inactive_sessions":get_inactive_sessions_data()}
+        with socketio_lock: socketio.emit('inactive_sessions_update', inactive_data)
         return jsonify({'status':'success','message':f"Sesi '{session_id_to_delete}' berhasil dihapus dari daftar tidak aktif."})
     except Exception as e: 
         req_data_del_sess = request.get_json(silent=True) or {}
         session_id_err_del_sess = req_data_del_sess.get('session_id','N/A')
-        logging.exception(f"Error delete sesi '{session_id_err_del_sess}'")
+        log_api.exception(f"Error delete sesi '{session_id_err_del_sess}'")
         return jsonify({'status':'error','message':f'Kesalahan Server: {str(e)}'}),500
 
-@app.route('/api/edit-session', methods=['POST']) # Hanya untuk edit detail sesi tidak aktif
+@app.route('/api/edit-session', methods=['POST']) # Edit detail sesi tidak aktif, atau sesi aktif (di-restart kecuali hanya playlist yang berubah)
 @login_required
-def edit_inactive_session_api(): 
+def edit_session_api(): 
     try:
         data = request.json
         session_id_to_edit = data.get('session_name_original', data.get('id')) # Terima nama sesi asli
-        new_stream_key = data.get('stream_key')
-        new_video_name = data.get('video_file') # Sesuai dengan frontend
-        new_platform = data.get('platform', 'YouTube')
-        
         if not session_id_to_edit: return jsonify({"status":"error","message":"ID sesi (nama sesi asli) diperlukan untuk edit."}),400
         s_data = read_sessions()
         session_found = next((s for s in s_data.get('inactive_sessions',[]) if s['id']==session_id_to_edit),None)
-        if not session_found: return jsonify({"status":"error","message":f"Sesi '{session_id_to_edit}' tidak ditemukan di daftar tidak aktif."}),404
+        is_active = False
+        if not session_found:
+            session_found = next((s for s in s_data.get('active_sessions',[]) if s['id']==session_id_to_edit),None)
+            is_active = session_found is not None
+        if not session_found: return jsonify({"status":"error","message":f"Sesi '{session_id_to_edit}' tidak ditemukan."}),404
+        
+        # Sesi aktif boleh mengirim sebagian field saja; sisanya memakai nilai sekarang
+        new_stream_key = data.get('stream_key') or (session_found.get('stream_key') if is_active else None)
+        new_video_name = data.get('video_file') or (data.get('playlist') or [None])[0] or (session_found.get('video_name') if is_active else None) # Sesuai dengan frontend
+        new_platform = data.get('platform', session_found.get('platform', 'YouTube') if is_active else 'YouTube')
         
         if not new_stream_key or not new_video_name:
             return jsonify({"status":"error","message":"Stream key dan nama video baru diperlukan untuk update."}),400
@@ -1518,17 +4734,57 @@ def edit_inactive_session_api():
             return jsonify({"status":"error","message":f"File video baru '{new_video_name}' tidak ditemukan."}),404
         if new_platform not in ["YouTube", "Facebook"]: new_platform="YouTube" 
         
-        session_found['stream_key'] = new_stream_key.strip()
+        try:
+            encoding_profile = parse_encoding_profile(data, default=session_found.get('encoding_profile', DEFAULT_ENCODING_PROFILE))
+            destinations = parse_destinations(data) if data.get('destinations') else None
+            if data.get('playlist'):
+                playlist = parse_playlist(data, encoding_profile)
+            elif new_video_name != session_found.get('video_name'):
+                playlist = None # Ganti ke satu video
+            else:
+                playlist = parse_playlist({'playlist': session_found.get('playlist')}, encoding_profile)
+        except ValueError as ve:
+            return jsonify({"status":"error","message":str(ve)}),400
+        if not destinations:
+            # Edit lama (satu platform + stream key) hanya mengganti tujuan pertama sesi simulcast
+            destinations = [{'platform': new_platform, 'stream_key': new_stream_key.strip()}] + session_destinations(session_found)[1:]
+        
+        message = f"Detail sesi tidak aktif '{session_id_to_edit}' berhasil diperbarui."
+        if is_active:
+            # Daftar playlist ditulis ulang lebih dulu: jika isi unit tetap sama (hanya item playlist yang berubah),
+            # pengumpan memakai daftar baru di batas item berikutnya tanpa restart. Perubahan lain butuh restart unit.
+            video_path = prepare_stream_input(session_id_to_edit, new_video_name, playlist)
+            service_name_systemd = f"stream-{sanitize_for_service_name(session_id_to_edit)}.service"
+            try:
+                with open(os.path.join(SERVICE_DIR, service_name_systemd)) as f: current_content = f.read()
+            except OSError:
+                current_content = None
+            if current_content == build_service_content(session_id_to_edit, video_path, destinations, encoding_profile, session_found.get('x264_preset')):
+                message = f"Playlist sesi aktif '{session_id_to_edit}' diganti mulai item berikutnya tanpa restart stream."
+            else:
+                service_name_systemd, _ = create_service_file(session_id_to_edit, video_path, destinations, encoding_profile)
+                run_cmd(["systemctl", "restart", service_name_systemd], check=True, timeout=30)
+                session_found.pop('x264_preset', None)
+                message = f"Sesi aktif '{session_id_to_edit}' diperbarui dan stream di-restart."
+        
+        for key in ('destinations', 'playlist'): session_found.pop(key, None)
+        session_found.update(destination_fields(destinations))
+        session_found.update(playlist_fields(playlist))
         session_found['video_name'] = new_video_name
-        session_found['platform'] = new_platform
+        session_found['encoding_profile'] = encoding_profile
         
         write_sessions(s_data)
-        with socketio_lock: socketio.emit('inactive_sessions_update',{"inactive_sessions":get_inactive_sessions_data()})
-        return jsonify({"status":"success","message":f"Detail sesi tidak aktif '{session_id_to_edit}' berhasil diperbarui."})
+        if is_active: event, payload = 'sessions_update', get_active_sessions_data()
+        else: event, payload = 'inactive_sessions_update', {"inactive_sessions": get_inactive_sessions_data()}
+        with socketio_lock: socketio.emit(event, payload)
+        return jsonify({"status":"success","message":message})
+    except subprocess.CalledProcessError as e:
+        log_api.error(f"Gagal restart service saat edit sesi: {e.stderr if e.stderr else e.stdout}")
+        return jsonify({"status":"error","message":f"Gagal me-restart layanan systemd: {e.stderr if e.stderr else e.stdout}"}),500
     except Exception as e: 
         req_data_edit_sess = request.get_json(silent=True) or {}
         session_id_err_edit_sess = req_data_edit_sess.get('session_name_original', req_data_edit_sess.get('id', 'N/A'))
-        logging.exception(f"Error edit sesi tidak aktif '{session_id_err_edit_sess}'")
+        log_api.exception(f"Error edit sesi '{session_id_err_edit_sess}'")
         return jsonify({'status':'error','message':f'Kesalahan Server Internal: {str(e)}'}),500
         
 # Tambahkan ini di dalam app.py, di bagian API endpoint Anda
@@ -1549,13 +4805,14 @@ def delete_all_inactive_sessions_api():
         s_data['inactive_sessions'] = []
         write_sessions(s_data)
         
+        inactive_data = {"inactive_sessions": get_inactive_sessions_data()}
         with socketio_lock:
-            socketio.emit('inactive_sessions_update', {"inactive_sessions": get_inactive_sessions_data()})
+            socketio.emit('inactive_sessions_update', inactive_data)
             
-        logging.info(f"Berhasil menghapus semua ({deleted_count}) sesi tidak aktif.")
+        log_api.info(f"Berhasil menghapus semua ({deleted_count}) sesi tidak aktif.")
         return jsonify({'status': 'success', 'message': f'Berhasil menghapus {deleted_count} sesi tidak aktif.', 'deleted_count': deleted_count}), 200
     except Exception as e:
-        logging.exception("Error di API delete_all_inactive_sessions")
+        log_api.exception("Error di API delete_all_inactive_sessions")
         return jsonify({'status': 'error', 'message': f'Kesalahan Server: {str(e)}'}), 500
         
 @app.route('/api/check-session', methods=['GET'])
@@ -1563,5 +4820,579 @@ def delete_all_inactive_sessions_api():
 def check_session_api(): 
     return jsonify({'logged_in':True,'user':session.get('user')})
 
+# ---- SINKRONISASI DELTA ----
+# Alur tarik (panel/folder tujuan yang aktif):
+#   1. manifest sumber: path logis ('videos/<nama>', 'state/sessions.json'), ukuran, sha256 (di-cache);
+#   2. tujuan menghitung tanda tangan blok file lama hanya untuk file yang berbeda, plus panjang .syncpart
+#      (prefiks hasil transfer sebelumnya yang terputus untuk sha256 yang sama) sebagai resume_from;
+#   3. sumber men-stream delta mulai dari resume_from: salin blok dari file lama penerima atau kirim data literal;
+#   4. tujuan menambahkan ke .syncpart, memverifikasi sha256 seluruh file, lalu os.replace.
+# Format stream yang sama dipakai untuk arsip (tanpa basis = arsip penuh), lewat HTTP maupun file/stdin.
+SYNC_MAGIC = b'SHSYNC1\n'
+SYNC_ANCHOR_BYTES = 16
+ADLER_MOD = 65521
+sync_hash_cache = None
+sync_hash_cache_lock = Lock()
+sync_job = {'status': 'idle'}
+sync_job_lock = Lock()
+
+def local_sync_library():
+    return {'videos': VIDEO_DIR, 'state': {'sessions.json': SESSION_FILE, 'users.json': USERS_FILE}}
+
+def directory_sync_library(video_dir):
+    return {'videos': video_dir, 'state': {}}
+
+def sync_path(library, logical_path):
+    kind, _, name = logical_path.partition('/')
+    if name and '/' not in name and not name.startswith('.'):
+        if kind == 'videos': return os.path.join(library['videos'], name)
+        if kind == 'state' and name in library['state']: return library['state'][name]
+    raise ValueError(f"Path sinkronisasi tidak valid: {logical_path}")
+
+def sync_part_path(path):
+    return os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.syncpart")
+
+def sync_resume_offset(path, sha256):
+    """Panjang .syncpart yang bisa dilanjutkan untuk target sha256 ini; sisa target lain dibuang."""
+    part = sync_part_path(path)
+    try:
+        with open(part + '.sha256') as f: target = f.read().strip()
+        if target == sha256 and os.path.isfile(part): return os.path.getsize(part)
+    except OSError:
+        pass
+    for leftover in (part, part + '.sha256', part + '.new'):
+        if os.path.exists(leftover): os.remove(leftover)
+    return 0
+
+def file_sha256(path):
+    global sync_hash_cache
+    stat = os.stat(path)
+    key = f"{stat.st_size}:{stat.st_mtime_ns}:{stat.st_ino}"
+    with sync_hash_cache_lock:
+        if sync_hash_cache is None:
+            try:
+                with open(SYNC_HASH_CACHE_FILE) as f: sync_hash_cache = json.load(f)
+            except (OSError, ValueError):
+                sync_hash_cache = {}
+        cached = sync_hash_cache.get(path)
+        if cached and cached[0] == key: return cached[1]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(SYNC_CHUNK_BYTES), b''): digest.update(chunk)
+    with sync_hash_cache_lock: sync_hash_cache[path] = [key, digest.hexdigest()]
+    return digest.hexdigest()
+
+def save_sync_hash_cache():
+    with sync_hash_cache_lock:
+        if sync_hash_cache is None: return
+        try:
+            os.makedirs(os.path.dirname(SYNC_HASH_CACHE_FILE), exist_ok=True)
+            tmp_path = SYNC_HASH_CACHE_FILE + '.tmp'
+            with open(tmp_path, 'w') as f: json.dump({p: v for p, v in sync_hash_cache.items() if os.path.exists(p)}, f)
+            os.replace(tmp_path, SYNC_HASH_CACHE_FILE)
+        except Exception as e:
+            log_sync.warning(f"SYNC: Gagal menyimpan cache hash: {e}")
+
+def build_sync_manifest(library, include_state=False):
+    video_dir = library['videos']
+    names = sorted(n for n in os.listdir(video_dir) if not n.startswith('.') and os.path.isfile(os.path.join(video_dir, n))) if os.path.isdir(video_dir) else []
+    logical_paths = [f"videos/{n}" for n in names]
+    if include_state: logical_paths += [f"state/{n}" for n, p in library['state'].items() if os.path.isfile(p)]
+    files = []
+    for logical_path in logical_paths:
+        path = sync_path(library, logical_path)
+        stat = os.stat(path)
+        files.append({'path': logical_path, 'size': stat.st_size, 'mtime': int(stat.st_mtime), 'sha256': file_sha256(path)})
+    save_sync_hash_cache()
+    return files
+
+def block_signatures(path, block_size=SYNC_BLOCK_SIZE):
+    blocks = []
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            blocks.append([zlib.adler32(block), hashlib.blake2b(block, digest_size=16).hexdigest(), block[:SYNC_ANCHOR_BYTES].hex()])
+    return {'block_size': block_size, 'size': os.path.getsize(path), 'blocks': blocks}
+
+def build_sync_signatures(library, manifest):
+    """Tanda tangan blok basis lokal untuk setiap file manifest yang belum identik ({} = kirim penuh)."""
+    signatures = {}
+    for entry in manifest:
+        path = sync_path(library, entry['path'])
+        if os.path.isfile(path) and os.path.getsize(path) == entry['size'] and file_sha256(path) == entry['sha256']: continue
+        # File lama tetap jadi basis walau transfer dilanjutkan dari .syncpart
+        signature = block_signatures(path) if os.path.isfile(path) else {}
+        resume_from = sync_resume_offset(path, entry['sha256'])
+        if resume_from: signature.update(resume_from=resume_from, resume_sha256=entry['sha256'])
+        signatures[entry['path']] = signature
+    save_sync_hash_cache()
+    return signatures
+
+def sync_file_delta(data, signature, start=0):
+    """Operasi ('copy', offset_basis, panjang) / ('data', start, end) yang membangun data[start:] dari basis penerima."""
+    block_size = signature.get('block_size') or SYNC_BLOCK_SIZE
+    blocks = signature.get('blocks') or []
+    full_blocks = len(blocks) if not blocks or signature.get('size', 0) % block_size == 0 else len(blocks) - 1
+    weak_index = {}
+    for index in range(full_blocks): weak_index.setdefault(blocks[index][0], []).append(index)
+    size = len(data)
+
+    def match_at(pos, weak=None):
+        window = data[pos:pos + block_size]
+        candidates = weak_index.get(zlib.adler32(window) if weak is None else weak)
+        if not candidates: return None
+        strong = hashlib.blake2b(window, digest_size=16).hexdigest()
+        return next((index for index in candidates if blocks[index][1] == strong), None)
+
+    def search_anchor(pos, expected):
+        # Data bergeser (sisipan/penghapusan): cari awal blok basis berikutnya dengan find() berkecepatan C
+        for index in (expected, expected + 1):
+            if index >= full_blocks: continue
+            anchor, found = bytes.fromhex(blocks[index][2]), pos
+            limit = min(size - block_size, pos + SYNC_SEARCH_WINDOW_BYTES)
+            for _ in range(8):
+                found = data.find(anchor, found + 1, limit + len(anchor))
+                if found < 0: break
+                if match_at(found) == index: return found
+        return None
+
+    def search_rolling(pos):
+        # Perubahan di tengah blok: geser jendela per byte (adler32 bergulir) sejauh satu blok
+        value = zlib.adler32(data[pos:pos + block_size])
+        a, b = value & 0xffff, value >> 16
+        for k in range(pos, min(pos + block_size, size - block_size)):
+            out_byte, in_byte = data[k], data[k + block_size]
+            a = (a - out_byte + in_byte) % ADLER_MOD
+            b = (b - block_size * out_byte + a - 1) % ADLER_MOD
+            weak = (b << 16) | a
+            if weak in weak_index and match_at(k + 1, weak) is not None: return k + 1
+        return None
+
+    pos, literal_start, expected, misses = start, start, 0, 0
+    copy_start = copy_length = None
+    while weak_index and pos + block_size <= size:
+        index = match_at(pos)
+        if index is None:
+            found = search_anchor(pos, expected)
+            if found is None and misses < SYNC_ROLL_MAX_MISSES: found = search_rolling(pos)
+            if found is None:
+                misses += 1
+                pos += block_size
+                continue
+            pos = found
+            continue
+        if literal_start < pos:
+            if copy_length: yield ('copy', copy_start, copy_length); copy_length = None
+            yield ('data', literal_start, pos)
+        if copy_length and copy_start + copy_length == index * block_size:
+            copy_length += block_size
+        else:
+            if copy_length: yield ('copy', copy_start, copy_length)
+            copy_start, copy_length = index * block_size, block_size
+        pos += block_size
+        literal_start, expected, misses = pos, index + 1, 0
+    if copy_length: yield ('copy', copy_start, copy_length)
+    # Blok terakhir basis yang tidak penuh
+    if blocks and full_blocks < len(blocks) and size - pos == signature['size'] - full_blocks * block_size and \
+            literal_start == pos and hashlib.blake2b(data[pos:], digest_size=16).hexdigest() == blocks[-1][1]:
+        yield ('copy', full_blocks * block_size, size - pos)
+    elif literal_start < size:
+        yield ('data', literal_start, size)
+
+def encode_sync_stream(library, signatures):
+    """Generator byte stream delta untuk path di signatures (dibuffer per ~SYNC_CHUNK_BYTES)."""
+    buffer = bytearray(SYNC_MAGIC)
+    for logical_path, signature in signatures.items():
+        path = sync_path(library, logical_path)
+        if not os.path.isfile(path): continue
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b''
+            try:
+                sha256 = file_sha256(path)
+                # Lanjutkan dari prefiks .syncpart penerima hanya jika targetnya masih file yang sama
+                signature = signature or {}
+                offset = min(signature.get('resume_from', 0), stat.st_size) if signature.get('resume_sha256') == sha256 else 0
+                header = json.dumps({'path': logical_path, 'size': stat.st_size, 'mtime': int(stat.st_mtime), 'sha256': sha256, 'offset': offset}).encode()
+                buffer += b'F' + struct.pack('>I', len(header)) + header
+                for op in sync_file_delta(data, signature, offset):
+                    if op[0] == 'copy':
+                        buffer += b'C' + struct.pack('>QQ', op[1], op[2])
+                    else:
+                        for start in range(op[1], op[2], SYNC_CHUNK_BYTES):
+                            chunk = data[start:min(op[2], start + SYNC_CHUNK_BYTES)]
+                            buffer += b'D' + struct.pack('>I', len(chunk)) + chunk
+                            if len(buffer) >= SYNC_CHUNK_BYTES: yield bytes(buffer); buffer.clear()
+                    if len(buffer) >= SYNC_CHUNK_BYTES: yield bytes(buffer); buffer.clear()
+                buffer += b'E'
+            finally:
+                if stat.st_size: data.close()
+    buffer += b'Z'
+    yield bytes(buffer)
+
+class SyncStreamReader:
+    """Adaptor read(n) di atas generator encode_sync_stream (sinkronisasi lokal tanpa HTTP)."""
+    def __init__(self, chunks):
+        self.chunks, self.buffer = iter(chunks), b''
+
+    def read(self, n):
+        while len(self.buffer) < n:
+            chunk = next(self.chunks, None)
+            if chunk is None: break
+            self.buffer += chunk
+        data, self.buffer = self.buffer[:n], self.buffer[n:]
+        return data
+
+def read_exact(stream, n):
+    data = b''
+    while len(data) < n:
+        chunk = stream.read(n - len(data))
+        if not chunk: raise EOFError("Stream sinkronisasi terputus")
+        data += chunk
+    return data
+
+def finalize_synced_file(library, logical_path, path, tmp_path, header):
+    if library is not None and library['state'].get('sessions.json') == SESSION_FILE and logical_path == 'state/sessions.json':
+        with open(tmp_path) as f: write_sessions(json.load(f)) # Lewat lock + materialized view
+        os.remove(tmp_path)
+    elif library is not None and library['state'].get('users.json') == USERS_FILE and logical_path == 'state/users.json':
+        with open(tmp_path) as f: write_users(json.load(f))
+        os.remove(tmp_path)
+    else:
+        os.utime(tmp_path, (header['mtime'], header['mtime']))
+        os.replace(tmp_path, path)
+        stat = os.stat(path)
+        with sync_hash_cache_lock:
+            if sync_hash_cache is not None: sync_hash_cache[path] = [f"{stat.st_size}:{stat.st_mtime_ns}:{stat.st_ino}", header['sha256']]
+
+def apply_sync_stream(stream, library, progress=None):
+    if read_exact(stream, len(SYNC_MAGIC)) != SYNC_MAGIC: raise ValueError("Bukan stream sinkronisasi StreamHib")
+    stats = {'files': 0, 'copied_bytes': 0, 'received_bytes': 0, 'synced': []}
+    while True:
+        kind = read_exact(stream, 1)
+        if kind == b'Z': break
+        if kind != b'F': raise ValueError(f"Record sinkronisasi tidak dikenal: {kind!r}")
+        header = json.loads(read_exact(stream, struct.unpack('>I', read_exact(stream, 4))[0]))
+        path = sync_path(library, header['path'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        basis_path = path if os.path.isfile(path) else None
+        tmp_path = sync_part_path(path)
+        offset = header.get('offset', 0)
+        digest, basis = hashlib.sha256(), None
+        if offset:
+            # Prefiks dari transfer yang terputus: cukup di-hash ulang, delta ditambahkan setelahnya
+            if not os.path.isfile(tmp_path) or os.path.getsize(tmp_path) < offset:
+                raise ValueError(f"File .syncpart '{header['path']}' tidak cocok dengan offset lanjutan")
+            with open(tmp_path, 'rb') as f:
+                for start in range(0, offset, SYNC_CHUNK_BYTES): digest.update(f.read(min(SYNC_CHUNK_BYTES, offset - start)))
+            stats['copied_bytes'] += offset
+        with open(tmp_path + '.sha256', 'w') as f: f.write(header['sha256'])
+        try:
+            with open(tmp_path, 'r+b' if offset else 'wb') as out:
+                out.truncate(offset)
+                out.seek(offset)
+                while True:
+                    kind = read_exact(stream, 1)
+                    if kind == b'E': break
+                    if kind == b'C':
+                        basis_offset, length = struct.unpack('>QQ', read_exact(stream, 16))
+                        if basis is None: basis = open(basis_path, 'rb')
+                        basis.seek(basis_offset)
+                        for start in range(0, length, SYNC_CHUNK_BYTES):
+                            chunk = basis.read(min(SYNC_CHUNK_BYTES, length - start))
+                            out.write(chunk); digest.update(chunk)
+                        stats['copied_bytes'] += length
+                    elif kind == b'D':
+                        chunk = read_exact(stream, struct.unpack('>I', read_exact(stream, 4))[0])
+                        out.write(chunk); digest.update(chunk)
+                        stats['received_bytes'] += len(chunk)
+                    else:
+                        raise ValueError(f"Operasi sinkronisasi tidak dikenal: {kind!r}")
+                    if progress: progress(header['path'], out.tell(), header['size'])
+        finally:
+            if basis: basis.close()
+        os.remove(tmp_path + '.sha256')
+        if digest.hexdigest() != header['sha256']:
+            os.remove(tmp_path)
+            raise ValueError(f"Checksum '{header['path']}' tidak cocok setelah sinkronisasi")
+        finalize_synced_file(library, header['path'], path, tmp_path, header)
+        stats['files'] += 1
+        stats['synced'].append(header['path'])
+    save_sync_hash_cache()
+    return stats
+
+def sync_libraries(source, dest, include_state=False, progress=None):
+    signatures = build_sync_signatures(dest, build_sync_manifest(source, include_state))
+    if not signatures: return {'files': 0, 'copied_bytes': 0, 'received_bytes': 0, 'synced': []}
+    return apply_sync_stream(SyncStreamReader(encode_sync_stream(source, signatures)), dest, progress)
+
+def sync_directories(source_dir, dest_dir, progress=None):
+    """Sinkronisasi delta antar dua folder video lokal."""
+    return sync_libraries(directory_sync_library(source_dir), directory_sync_library(dest_dir), progress=progress)
+
+def open_panel_session(base_url, username, password):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    opener.open(f"{base_url}/login", data=urllib.parse.urlencode({'username': username, 'password': password}).encode(), timeout=SYNC_HTTP_TIMEOUT)
+    return opener
+
+def pull_from_panel(base_url, library, username, password, include_state=False, progress=None):
+    """Tarik delta dari panel lain; koneksi yang putus diulang dan dilanjutkan dari file .syncpart."""
+    base_url = base_url.rstrip('/')
+    for attempt in range(1, SYNC_MAX_RETRIES + 1):
+        try:
+            opener = open_panel_session(base_url, username, password)
+            with opener.open(f"{base_url}/api/sync/manifest?state={'1' if include_state else '0'}", timeout=SYNC_HTTP_TIMEOUT) as response:
+                manifest = json.load(response)['files']
+            signatures = build_sync_signatures(library, manifest)
+            if not signatures: return {'files': 0, 'copied_bytes': 0, 'received_bytes': 0, 'synced': []}
+            delta_request = urllib.request.Request(f"{base_url}/api/sync/delta", data=json.dumps({'files': signatures}).encode(),
+                                                   headers={'Content-Type': 'application/json'})
+            with opener.open(delta_request, timeout=SYNC_HTTP_TIMEOUT) as response:
+                return apply_sync_stream(response, library, progress)
+        except urllib.error.HTTPError:
+            raise # Login/izin ditolak: mengulang tidak akan membantu
+        except (urllib.error.URLError, OSError, EOFError, http.client.HTTPException) as e:
+            if attempt == SYNC_MAX_RETRIES: raise
+            log_sync.warning(f"SYNC: Transfer dari {base_url} terputus ({e}), percobaan ulang {attempt}/{SYNC_MAX_RETRIES}")
+            time.sleep(min(30, 2 ** attempt))
+
+def run_sync_pull_job(source_url, username, password, include_state):
+    def on_progress(path, written, total):
+        with sync_job_lock: sync_job.update(current=path, current_bytes=written, current_total=total)
+    try:
+        stats = pull_from_panel(source_url, local_sync_library(), username, password, include_state, on_progress)
+        with sync_job_lock: sync_job.update(status='completed', finished_at=datetime.now(jakarta_tz).isoformat(), current=None, **stats)
+        log_sync.info(f"SYNC: {stats['files']} file disinkronkan dari {source_url} ({stats['received_bytes']} byte dikirim, {stats['copied_bytes']} byte dari basis lokal).")
+        if any(path.startswith('state/') for path in stats['synced']) and scheduler_is_leader: recover_schedules()
+        videos_data = get_videos_list_data()
+        sessions_data = get_active_sessions_data()
+        schedules_data = get_schedules_list_data()
+        with socketio_lock:
+            socketio.emit('videos_update', videos_data)
+            socketio.emit('sessions_update', sessions_data)
+            socketio.emit('schedules_update', schedules_data)
+    except Exception as e:
+        log_sync.error(f"SYNC: Gagal sinkronisasi dari {source_url}: {e}", exc_info=True)
+        with sync_job_lock: sync_job.update(status='failed', finished_at=datetime.now(jakarta_tz).isoformat(), message=str(e))
+
+def iter_offloaded(chunks):
+    # Hashing/pembacaan file untuk response streaming dijalankan di tpool, bukan di hub eventlet
+    while True:
+        chunk = offload(next, chunks, None)
+        if chunk is None: return
+        yield chunk
+
+def run_sync_cli(argv):
+    import argparse
+    parser = argparse.ArgumentParser(prog='app.py sync', description='Sinkronisasi delta library video dan state StreamHib.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    pull = sub.add_parser('pull', help='Impor ke panel ini dari URL panel, folder video, file arsip, atau - (stdin)')
+    pull.add_argument('source')
+    pull.add_argument('--state', action='store_true', help='Ikut sinkronkan sessions.json dan users.json')
+    pull.add_argument('--user'); pull.add_argument('--password')
+    export = sub.add_parser('export', help='Tulis arsip stream dari panel ini ke file atau - (stdout)')
+    export.add_argument('target')
+    export.add_argument('--state', action='store_true')
+    export.add_argument('--against', help='File tanda tangan dari "sync signatures" di tujuan (arsip delta)')
+    signatures = sub.add_parser('signatures', help='Tulis tanda tangan panel ini untuk manifest sumber (JSON)')
+    signatures.add_argument('manifest', help='Manifest sumber (GET /api/sync/manifest) atau -')
+    signatures.add_argument('target')
+    args = parser.parse_args(argv)
+    library = local_sync_library()
+
+    if args.command == 'pull':
+        if args.source.startswith(('http://', 'https://')):
+            stats = pull_from_panel(args.source, library, args.user, args.password, args.state)
+        elif os.path.isdir(args.source):
+            stats = sync_libraries(directory_sync_library(args.source), library)
+        else:
+            with (sys.stdin.buffer if args.source == '-' else open(args.source, 'rb')) as stream: stats = apply_sync_stream(stream, library)
+        print(json.dumps({k: v for k, v in stats.items() if k != 'synced'}))
+    elif args.command == 'export':
+        if args.against:
+            with open(args.against) as f: wanted = json.load(f)
+        else:
+            wanted = {entry['path']: {} for entry in build_sync_manifest(library, args.state)}
+        with (sys.stdout.buffer if args.target == '-' else open(args.target, 'wb')) as out:
+            for chunk in encode_sync_stream(library, wanted): out.write(chunk)
+    else:
+        with (sys.stdin if args.manifest == '-' else open(args.manifest)) as f: manifest = json.load(f)
+        with (sys.stdout if args.target == '-' else open(args.target, 'w')) as out:
+            json.dump(build_sync_signatures(library, manifest.get('files', manifest)), out)
+
+@app.route('/api/sync/manifest', methods=['GET'])
+@login_required
+def sync_manifest_api():
+    try: return jsonify({'files': offload(build_sync_manifest, local_sync_library(), request.args.get('state') == '1')})
+    except Exception as e:
+        log_api.error(f"Error API /api/sync/manifest: {str(e)}",exc_info=True)
+        return jsonify({'status':'error','message':f'Kesalahan Server: {str(e)}'}),500
+
+@app.route('/api/sync/delta', methods=['POST'])
+@login_required
+def sync_delta_api():
+    signatures = (request.get_json(silent=True) or {}).get('files')
+    if not isinstance(signatures, dict): return jsonify({'status':'error','message':'Daftar tanda tangan file diperlukan.'}),400
+    try:
+        for logical_path in signatures: sync_path(local_sync_library(), logical_path)
+    except ValueError as e:
+        return jsonify({'status':'error','message':str(e)}),400
+    return Response(iter_offloaded(encode_sync_stream(local_sync_library(), signatures)), mimetype='application/octet-stream')
+
+@app.route('/api/sync/archive', methods=['GET'])
+@login_required
+def sync_archive_api():
+    try: manifest = offload(build_sync_manifest, local_sync_library(), request.args.get('state') == '1')
+    except Exception as e:
+        log_api.error(f"Error API /api/sync/archive: {str(e)}",exc_info=True)
+        return jsonify({'status':'error','message':f'Kesalahan Server: {str(e)}'}),500
+    filename = f"streamhib-{datetime.now(jakarta_tz).strftime('%Y%m%d-%H%M')}.shsync"
+    return Response(iter_offloaded(encode_sync_stream(local_sync_library(), {entry['path']: {} for entry in manifest})), mimetype='application/octet-stream',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@app.route('/api/sync/pull', methods=['POST'])
+@login_required
+def sync_pull_api():
+    data = request.get_json(silent=True) or {}
+    source_url = (data.get('source_url') or '').strip()
+    if not source_url.startswith(('http://', 'https://')): return jsonify({'status':'error','message':'URL panel sumber (http/https) diperlukan.'}),400
+    with sync_job_lock:
+        if sync_job.get('status') == 'running': return jsonify({'status':'error','message':'Sinkronisasi lain masih berjalan.'}),409
+        sync_job.clear()
+        sync_job.update(status='running', source_url=source_url, include_state=bool(data.get('state')), started_at=datetime.now(jakarta_tz).isoformat())
+    threading.Thread(target=run_sync_pull_job, args=(source_url, data.get('username'), data.get('password'), bool(data.get('state'))),
+                     name="sync-pull", daemon=True).start()
+    return jsonify({'status':'success','message':f'Sinkronisasi dari {source_url} dimulai.'})
+
+@app.route('/api/sync/status', methods=['GET'])
+@login_required
+def sync_status_api():
+    with sync_job_lock: return jsonify(dict(sync_job))
+
+# ---- EMIT STATS ----
+# Wrapper emit dipasang bila STREAMHIB_EMIT_STATS=1 atau STREAMHIB_TRACE=1 (span "emit <event>"). Statistik
+# (hanya STREAMHIB_EMIT_STATS=1) dicatat per (event, fungsi pemanggil): jumlah emit, waktu di dalam
+# socketio.emit (serialisasi + kirim ke semua klien), ukuran payload dan jumlah penerima.
+emit_stats = {}
+emit_stats_lock = Lock()
+
+def connected_client_count():
+    try: return sum(1 for _ in socketio.server.manager.get_participants('/', None))
+    except Exception: return 0
+
+def instrument_socketio_emit():
+    original_emit = socketio.emit
+
+    def timed_emit(event, *args, **kwargs):
+        caller = sys._getframe(1).f_code.co_name
+        if not EMIT_STATS_ENABLED: # Hanya tracing
+            with trace_span(f"emit {event}", caller=caller): return original_emit(event, *args, **kwargs)
+        recipients = connected_client_count() if kwargs.get('to') is None and kwargs.get('room') is None else 1
+        started = time.perf_counter()
+        try:
+            with trace_span(f"emit {event}", caller=caller): return original_emit(event, *args, **kwargs)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            payload_bytes = len(json.dumps(args[0], default=str)) if args else 0
+            with emit_stats_lock:
+                stat = emit_stats.setdefault(f"{event}@{caller}", {'event': event, 'caller': caller, 'count': 0, 'total_ms': 0.0,
+                                                                   'max_ms': 0.0, 'payload_bytes': 0, 'recipients': 0, 'bytes_fanout': 0})
+                stat['count'] += 1
+                stat['total_ms'] += elapsed_ms
+                stat['max_ms'] = max(stat['max_ms'], elapsed_ms)
+                stat['payload_bytes'] += payload_bytes
+                stat['recipients'] += recipients
+                stat['bytes_fanout'] += payload_bytes * recipients
+    socketio.emit = timed_emit
+
+@app.route('/api/emit-stats', methods=['GET'])
+@login_required
+def emit_stats_api():
+    if not EMIT_STATS_ENABLED:
+        return jsonify({'status':'error','message':'Instrumentasi emit tidak aktif (STREAMHIB_EMIT_STATS=1).'}),404
+    with emit_stats_lock:
+        stats = [dict(stat, avg_ms=round(stat['total_ms'] / stat['count'], 3)) for stat in emit_stats.values()]
+    return jsonify(sorted(stats, key=lambda x: x['total_ms'], reverse=True))
+
+@app.route('/api/emit-stats/reset', methods=['POST'])
+@login_required
+def emit_stats_reset_api():
+    with emit_stats_lock: emit_stats.clear()
+    return jsonify({'status':'success'})
+
+# ---- APP FACTORY & WARM RESTORE ----
+app_initialized = False
+app_init_lock = Lock()
+boot_timing = {'init_ms': None, 'first_request_ms': None}
+
+def read_state_snapshot():
+    if not os.path.exists(STATE_SNAPSHOT_FILE): return
+    try:
+        with open(STATE_SNAPSHOT_FILE) as f: snapshot = json.load(f)
+        restored = 0
+        for path, mtime, size, kbps in snapshot.get('video_bitrates', []):
+            try: st = os.stat(path)
+            except OSError: continue
+            if st.st_mtime == mtime and st.st_size == size:
+                video_bitrate_cache[(path, mtime, size)] = kbps
+                restored += 1
+        start_latency_records[:] = snapshot.get('start_latency', [])[-START_LATENCY_HISTORY:]
+        log_state.info(f"SNAPSHOT: {restored} bitrate video dan {len(start_latency_records)} catatan latensi dipulihkan dari {STATE_SNAPSHOT_FILE}.")
+    except Exception as e:
+        log_state.warning(f"SNAPSHOT: Gagal membaca {STATE_SNAPSHOT_FILE}, mulai tanpa cache: {e}")
+
+@traced_job
+def write_state_snapshot():
+    snapshot = {
+        'saved_at': datetime.now(jakarta_tz).isoformat(),
+        'video_bitrates': [[path, mtime, size, kbps] for (path, mtime, size), kbps in list(video_bitrate_cache.items())],
+        'start_latency': list(start_latency_records)
+    }
+    try:
+        tmp_path = STATE_SNAPSHOT_FILE + '.tmp'
+        with open(tmp_path, 'w') as f: json.dump(snapshot, f)
+        os.replace(tmp_path, STATE_SNAPSHOT_FILE)
+    except Exception as e:
+        log_state.warning(f"SNAPSHOT: Gagal menulis {STATE_SNAPSHOT_FILE}: {e}")
+
+@app.before_request
+def record_first_request():
+    if boot_timing['first_request_ms'] is None:
+        boot_timing['first_request_ms'] = int((time.monotonic() - BOOT_STARTED_MONOTONIC) * 1000)
+        log_api.info(f"BOOT: Request pertama ({request.path}) dilayani {boot_timing['first_request_ms']} ms setelah proses mulai (inisialisasi {boot_timing['init_ms']} ms).")
+
+def create_app(debug=False):
+    global app_initialized
+    app.debug = debug
+    with app_init_lock:
+        if app_initialized: return app
+        app_initialized = True
+        CORS(app, resources={r"/api/*": {"origins": "http://localhost:5000", "supports_credentials": True}})
+        socketio.init_app(app, async_mode='eventlet', message_queue=SOCKETIO_MESSAGE_QUEUE)
+        if EMIT_STATS_ENABLED or TRACE_ENABLED: instrument_socketio_emit()
+        # Dengan reloader, proses induk hanya memantau file; scheduler/worker hanya jalan di proses anak
+        if debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true': return app
+
+        setup_logging()
+        init_started = time.monotonic()
+        for directory in (os.path.dirname(SESSION_FILE), VIDEO_DIR, DOWNLOAD_TMP_DIR, PLAYLIST_DIR, SERVICE_DIR):
+            os.makedirs(directory, exist_ok=True)
+        read_state_snapshot()
+        restore_video_preflight() # Sebelum start_scheduler: leader melanjutkan preflight yang terputus
+        ensure_stream_slice()
+        if CLUSTER_AGENTS: start_cluster_monitor()
+        start_host_cpu_sampler()
+        start_stream_resource_sampler()
+        start_scheduler()
+        resume_download_jobs()
+        boot_timing['init_ms'] = int((time.monotonic() - init_started) * 1000)
+        log_state.info(f"BOOT: Inisialisasi selesai dalam {boot_timing['init_ms']} ms ({int((time.monotonic() - BOOT_STARTED_MONOTONIC) * 1000)} ms sejak import).")
+    return app
+
 if __name__ == '__main__':
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True, use_reloader=True)
+    setup_logging()
+    if sys.argv[1:2] == ['sync']: sys.exit(run_sync_cli(sys.argv[2:])) # python app.py sync pull|export|signatures ...
+    # Produksi: tanpa reloader agar tidak ada proses ganda. STREAMHIB_DEBUG=1 untuk debug + reloader.
+    debug_mode = os.environ.get('STREAMHIB_DEBUG') == '1'
+    create_app(debug=debug_mode)
+    socketio.run(app, host=os.environ.get('STREAMHIB_HOST', '0.0.0.0'), port=int(os.environ.get('STREAMHIB_PORT', '5000')),
+                 debug=debug_mode, use_reloader=debug_mode)
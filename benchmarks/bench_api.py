@@ -0,0 +1,54 @@
+"""Benchmark endpoint API dan lapisan state (sessions.json, job store) pada 10 / 1k / 50k sesi."""
+import itertools
+from datetime import datetime, timedelta
+
+from conftest import BENCH_VIDEO, rounds_for, streamhib
+
+counter = itertools.count()
+
+
+def bench_api_start(benchmark, client, restore_state, sessions_fixture):
+    def start():
+        response = client.post('/api/start', json={'session_name': f'bench-{next(counter)}', 'video_file': BENCH_VIDEO,
+                                                   'platform': 'YouTube', 'stream_key': 'bench-key'})
+        assert response.status_code == 200, response.json
+    benchmark.pedantic(start, setup=restore_state, rounds=rounds_for(sessions_fixture))
+
+
+def bench_api_stop(benchmark, client, restore_state, sessions_fixture):
+    def stop():
+        response = client.post('/api/stop', json={'session_id': 'active-0'})
+        assert response.status_code == 200, response.json
+    benchmark.pedantic(stop, setup=restore_state, rounds=rounds_for(sessions_fixture))
+
+
+def bench_api_sessions(benchmark, client, restore_state, sessions_fixture):
+    benchmark.pedantic(lambda: client.get('/api/sessions'), setup=restore_state, rounds=rounds_for(sessions_fixture))
+
+
+def bench_api_inactive_sessions(benchmark, client, restore_state, sessions_fixture):
+    benchmark.pedantic(lambda: client.get('/api/inactive-sessions'), setup=restore_state, rounds=rounds_for(sessions_fixture))
+
+
+def bench_api_schedule(benchmark, client, restore_state, sessions_fixture):
+    start_time = (datetime.now(streamhib.jakarta_tz) + timedelta(days=2)).strftime('%Y-%m-%dT%H:%M')
+
+    def schedule():
+        response = client.post('/api/schedule', json={'session_name_original': f'bench-sched-{next(counter)}', 'video_file': BENCH_VIDEO,
+                                                      'platform': 'YouTube', 'stream_key': 'bench-key', 'recurrence_type': 'one_time',
+                                                      'start_time': start_time, 'duration': 1})
+        assert response.status_code == 200, response.json
+    benchmark.pedantic(schedule, setup=restore_state, rounds=rounds_for(sessions_fixture))
+
+
+def bench_reconcile_sessions(benchmark, restore_state, sessions_fixture):
+    benchmark.pedantic(streamhib.reconcile_sessions, setup=restore_state, rounds=rounds_for(sessions_fixture))
+
+
+def bench_recover_schedules(benchmark, restore_state, sessions_fixture):
+    def cold_store():
+        # Job store dikosongkan agar yang diukur adalah pembangunan ulang penuh, bukan jalur fingerprint cepat
+        restore_state()
+        streamhib.scheduler.remove_all_jobs(jobstore='default')
+        streamhib.mark_schedule_jobs_synced({'scheduled_sessions': None})
+    benchmark.pedantic(streamhib.recover_schedules, setup=cold_store, rounds=rounds_for(sessions_fixture))
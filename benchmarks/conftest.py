@@ -0,0 +1,105 @@
+"""Fixture benchmark: app.py dengan systemctl palsu, SESSION_FILE/VIDEO_DIR sementara dan sessions.json berukuran tertentu."""
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+from fake_systemd import FakeSystemd
+
+BENCH_DIR = tempfile.mkdtemp(prefix='streamhib-bench-')
+os.environ['STREAMHIB_DATA_DIR'] = os.path.join(BENCH_DIR, 'data')
+os.environ['STREAMHIB_VIDEO_DIR'] = os.path.join(BENCH_DIR, 'videos')
+os.environ['STREAMHIB_SERVICE_DIR'] = os.path.join(BENCH_DIR, 'units')
+for directory in ('data', 'videos', 'units', 'fixtures'):
+    os.makedirs(os.path.join(BENCH_DIR, directory), exist_ok=True)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as streamhib  # noqa: E402  (path harus diset sebelum import)
+
+BENCH_SIZES = [int(size) for size in os.environ.get('STREAMHIB_BENCH_SIZES', '10,1000,50000').split(',')]
+BENCH_VIDEO = 'bench.mp4'
+
+fake_systemd = FakeSystemd()
+
+
+def build_sessions(total):
+    """sessions.json dengan `total` sesi: separuh aktif, separuh tidak aktif, ditambah jadwal sebanyak 10%."""
+    now = datetime.now(streamhib.jakarta_tz)
+    n_active = total // 2
+    active = [{
+        'id': f'active-{i}', 'sanitized_service_id': f'active-{i}', 'video_name': BENCH_VIDEO, 'encoding_profile': 'copy',
+        'platform': 'YouTube', 'stream_key': f'key-{i}', 'status': 'active', 'start_time': now.isoformat(),
+        'scheduleType': 'manual', 'stopTime': None, 'duration_minutes': 0,
+    } for i in range(n_active)]
+    inactive = [{
+        'id': f'inactive-{i}', 'sanitized_service_id': f'inactive-{i}', 'video_name': BENCH_VIDEO, 'encoding_profile': 'copy',
+        'platform': 'Facebook', 'stream_key': f'key-{i}', 'status': 'inactive', 'start_time': (now - timedelta(hours=2)).isoformat(),
+        'stop_time': (now - timedelta(hours=1)).isoformat(), 'duration_minutes': 60,
+    } for i in range(total - n_active)]
+    scheduled = []
+    for i in range(max(1, total // 10)):
+        entry = {'session_name_original': f'sched-{i}', 'sanitized_service_id': f'sched-{i}', 'platform': 'YouTube',
+                 'stream_key': f'key-{i}', 'video_file': BENCH_VIDEO, 'encoding_profile': 'copy'}
+        if i % 2:
+            entry.update(id=f'daily-sched-{i}', recurrence_type='daily', start_time_of_day=f'{i % 24:02d}:00', stop_time_of_day=f'{(i + 1) % 24:02d}:00')
+        else:
+            start = now + timedelta(days=1, minutes=i % 1440)
+            entry.update(id=f'onetime-sched-{i}', recurrence_type='one_time', start_time_iso=start.isoformat(), duration_minutes=60, is_manual_stop=False)
+        scheduled.append(entry)
+    return {'active_sessions': active, 'inactive_sessions': inactive, 'scheduled_sessions': scheduled}
+
+
+@pytest.fixture(scope='session', autouse=True)
+def bench_app():
+    logging.getLogger().setLevel(logging.WARNING)
+    with open(os.path.join(streamhib.VIDEO_DIR, BENCH_VIDEO), 'wb') as f: f.write(b'\0' * 1024)
+    streamhib.run_cmd = fake_systemd
+    streamhib.record_first_packet_latency = lambda *args, **kwargs: None
+    streamhib.check_admission = lambda *args, **kwargs: None
+    streamhib.socketio.init_app(streamhib.app, async_mode='threading')
+    # Scheduler di-pause: job tersimpan di job store seperti produksi tetapi tidak pernah dijalankan
+    streamhib.scheduler, streamhib.scheduler_jobstore_persistent = streamhib.build_scheduler()
+    streamhib.scheduler.start(paused=True)
+    yield streamhib
+    streamhib.scheduler.shutdown(wait=False)
+    shutil.rmtree(BENCH_DIR, ignore_errors=True)
+
+
+@pytest.fixture(params=BENCH_SIZES, ids=lambda size: f'{size}-sessions')
+def sessions_fixture(request):
+    """Path sessions.json template untuk ukuran ini (dibuat sekali, disalin ulang sebelum tiap ronde)."""
+    path = os.path.join(BENCH_DIR, 'fixtures', f'sessions-{request.param}.json')
+    if not os.path.exists(path):
+        with open(path, 'w') as f: json.dump(build_sessions(request.param), f, indent=4)
+    return path
+
+
+@pytest.fixture
+def restore_state(sessions_fixture):
+    """Kembalikan sessions.json dan status unit palsu ke isi fixture; dipakai sebagai setup tiap ronde."""
+    with open(sessions_fixture) as f:
+        active_units = {f"stream-{sess['sanitized_service_id']}.service" for sess in json.load(f)['active_sessions']}
+
+    def restore():
+        shutil.copyfile(sessions_fixture, streamhib.SESSION_FILE)
+        fake_systemd.running = set(active_units)
+    restore()
+    return restore
+
+
+@pytest.fixture
+def client():
+    test_client = streamhib.app.test_client()
+    with test_client.session_transaction() as sess: sess['user'] = 'bench'
+    return test_client
+
+
+def rounds_for(sessions_fixture):
+    # Fixture 50k butuh detik per ronde; jumlah ronde dikurangi agar suite tetap selesai dalam hitungan menit
+    size = int(os.path.basename(sessions_fixture).split('-')[1].split('.')[0])
+    return 20 if size <= 1000 else 3
@@ -0,0 +1,28 @@
+"""systemctl/journalctl/ffprobe palsu untuk benchmark dan load test (tanpa systemd maupun ffmpeg)."""
+import subprocess
+
+
+class FakeSystemd:
+    """Pengganti run_cmd: menyimpan status unit di memori dan menjawab systemctl/journalctl/ffprobe."""
+
+    def __init__(self):
+        self.running = set()
+        self.calls = 0
+
+    def __call__(self, cmd, *args, **kwargs):
+        self.calls += 1
+        stdout = ''
+        if cmd[0] == 'systemctl':
+            action, units = cmd[1], [arg for arg in cmd[2:] if arg.endswith('.service')]
+            if action in ('start', 'restart'): self.running.update(units)
+            elif action == 'stop': self.running.difference_update(units)
+            elif action == 'is-active':
+                return subprocess.CompletedProcess(cmd, 0 if set(units) <= self.running else 3, '', '')
+            elif action == 'list-units':
+                stdout = ''.join(f"{unit} loaded active running StreamHib\n" for unit in sorted(self.running))
+            elif action == 'show':
+                stdout = '\n\n'.join(f"Id={unit}\nActiveState={'active' if unit in self.running else 'inactive'}\nSubState=running\n"
+                                     f"ExecMainExitTimestampMonotonic=0\nExecMainStatus=0\nMainPID=0" for unit in units) + '\n'
+        elif cmd[0] == 'ffprobe':
+            stdout = '{"format": {"bit_rate": "4500000", "duration": "3600"}}' if 'json' in cmd else 'h264,video,1920,1080\naac,audio,44100,2\n'
+        return subprocess.CompletedProcess(cmd, 0, stdout, '')
@@ -0,0 +1,211 @@
+"""Load test fan-out Socket.IO: N tab dashboard yang login, M aksi start/stop/jadwal bersamaan per gelombang.
+
+Instance app.py lokal dijalankan sebagai proses terpisah dengan backend systemd palsu (fake_systemd.py) dan
+STREAMHIB_EMIT_STATS=1. Laporan berisi: durasi badai connect (handle_connect mem-broadcast ke semua klien),
+latensi pengiriman event sampai setiap dashboard menerima update terakhir gelombang, byte payload per klien,
+CPU server per fase, dan biaya tiap jalur socketio.emit dari /api/emit-stats.
+
+    python benchmarks/loadtest_socketio.py --clients 200 --actions 20 --waves 5 --json hasil.json
+
+Butuh python-socketio client (pip install "python-socketio[client]").
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+BENCH_USER, BENCH_PASSWORD, BENCH_VIDEO = 'bench', 'bench', 'bench.mp4'
+
+
+def serve(port):
+    """Mode proses server: app.py dengan run_cmd palsu, dipanggil oleh main() lewat --serve."""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import app as streamhib
+    from fake_systemd import FakeSystemd
+
+    logging.getLogger().setLevel(logging.WARNING)
+    streamhib.run_cmd = FakeSystemd()
+    streamhib.check_admission = lambda *args, **kwargs: None
+    streamhib.record_first_packet_latency = lambda *args, **kwargs: None
+    os.makedirs(streamhib.VIDEO_DIR, exist_ok=True)
+    with open(os.path.join(streamhib.VIDEO_DIR, BENCH_VIDEO), 'wb') as f: f.write(b'\0' * 1024)
+    streamhib.write_users({BENCH_USER: BENCH_PASSWORD})
+    streamhib.create_app()
+    streamhib.socketio.run(streamhib.app, host='127.0.0.1', port=port, log_output=False)
+
+
+def process_cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as f: fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def percentiles(values):
+    if not values: return {'count': 0}
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {'count': len(ordered), 'p50_ms': round(pick(0.5), 1), 'p95_ms': round(pick(0.95), 1),
+            'max_ms': round(ordered[-1], 1), 'mean_ms': round(statistics.fmean(ordered), 1)}
+
+
+def login(base_url):
+    import requests
+    http = requests.Session()
+    response = http.post(f'{base_url}/login', data={'username': BENCH_USER, 'password': BENCH_PASSWORD}, allow_redirects=False)
+    if response.status_code != 302: raise RuntimeError(f'Login gagal: {response.status_code}')
+    return http
+
+
+class DashboardClient:
+    """Satu tab dashboard: sesi login sendiri dan pencatat semua event yang diterima."""
+
+    def __init__(self, base_url, transport):
+        import socketio
+        self.base_url, self.transport = base_url, transport
+        self.http = login(base_url)
+        self.sio = socketio.Client(http_session=self.http, reconnection=False)
+        self.lock = threading.Lock()
+        self.events = [] # (event, waktu terima monotonic, byte payload)
+        self.sio.on('*', self.on_event)
+
+    def on_event(self, event, data=None):
+        size = len(json.dumps(data, default=str))
+        with self.lock: self.events.append((event, time.monotonic(), size))
+
+    def connect(self):
+        self.sio.connect(self.base_url, transports=[self.transport], wait_timeout=30)
+
+    def events_since(self, since):
+        with self.lock: return [event for event in self.events if event[1] >= since]
+
+
+def wait_quiet(clients, since, quiet_seconds, timeout):
+    """Tunggu sampai tidak ada event baru di semua klien selama quiet_seconds (atau timeout)."""
+    deadline = time.monotonic() + timeout
+    last_total = -1
+    while time.monotonic() < deadline:
+        total = sum(len(client.events_since(since)) for client in clients)
+        if total == last_total: return
+        last_total = total
+        time.sleep(quiet_seconds)
+
+
+def run_action(admin, base_url, kind, name):
+    start_time = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M')
+    payloads = {
+        'start': ('/api/start', {'session_name': name, 'video_file': BENCH_VIDEO, 'platform': 'YouTube', 'stream_key': name}),
+        'stop': ('/api/stop', {'session_id': name}),
+        'schedule': ('/api/schedule', {'session_name_original': name, 'video_file': BENCH_VIDEO, 'platform': 'YouTube',
+                                       'stream_key': name, 'recurrence_type': 'one_time', 'start_time': start_time, 'duration': 1}),
+    }
+    path, payload = payloads[kind]
+    started = time.monotonic()
+    response = admin.post(f'{base_url}{path}', json=payload)
+    return kind, (time.monotonic() - started) * 1000, response.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--clients', type=int, default=50, help='Jumlah klien Socket.IO (tab dashboard)')
+    parser.add_argument('--actions', type=int, default=10, help='Aksi start/stop/jadwal bersamaan per gelombang')
+    parser.add_argument('--waves', type=int, default=3, help='Jumlah gelombang aksi')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--transport', choices=['websocket', 'polling'], default='websocket')
+    parser.add_argument('--settle', type=float, default=0.5, help='Detik tanpa event sebelum gelombang dianggap selesai')
+    parser.add_argument('--json', help='Simpan hasil lengkap sebagai JSON')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve: return serve(args.port)
+
+    import requests
+    workdir = tempfile.mkdtemp(prefix='streamhib-loadtest-')
+    env = dict(os.environ, STREAMHIB_EMIT_STATS='1', STREAMHIB_DATA_DIR=os.path.join(workdir, 'data'),
+               STREAMHIB_VIDEO_DIR=os.path.join(workdir, 'videos'), STREAMHIB_SERVICE_DIR=os.path.join(workdir, 'units'))
+    for directory in ('data', 'videos', 'units'): os.makedirs(os.path.join(workdir, directory))
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', '--port', str(args.port)], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__)))
+    base_url = f'http://127.0.0.1:{args.port}'
+    report = {'config': {k: v for k, v in vars(args).items() if k != 'serve'}, 'phases': {}}
+    clients = []
+    try:
+        for _ in range(100):
+            try:
+                if requests.get(f'{base_url}/login', timeout=1).status_code == 200: break
+            except requests.ConnectionError:
+                time.sleep(0.2)
+        else:
+            raise RuntimeError('Server load test tidak merespons.')
+        admin = login(base_url)
+        admin.post(f'{base_url}/api/emit-stats/reset')
+
+        # Fase 1: badai connect (semua tab dibuka bersamaan)
+        clients = [DashboardClient(base_url, args.transport) for _ in range(args.clients)]
+        cpu_before, started = process_cpu_seconds(server.pid), time.monotonic()
+        with ThreadPoolExecutor(max_workers=min(args.clients, 64)) as pool: list(pool.map(lambda client: client.connect(), clients))
+        connected_at = time.monotonic()
+        wait_quiet(clients, started, args.settle, timeout=120)
+        storm_bytes = [sum(event[2] for event in client.events_since(started)) for client in clients]
+        report['phases']['connect_storm'] = {
+            'connect_wall_ms': round((connected_at - started) * 1000, 1),
+            'settle_wall_ms': round((time.monotonic() - started) * 1000, 1),
+            'server_cpu_seconds': round(process_cpu_seconds(server.pid) - cpu_before, 2),
+            'events_per_client': round(statistics.fmean(len(client.events_since(started)) for client in clients), 1),
+            'payload_bytes_per_client': round(statistics.fmean(storm_bytes)),
+        }
+
+        # Fase 2: gelombang aksi bersamaan
+        started_sessions, action_latencies, first_event, last_event, wave_bytes = [], [], [], [], []
+        cpu_before, phase_started = process_cpu_seconds(server.pid), time.monotonic()
+        for wave in range(args.waves):
+            actions = []
+            for i in range(args.actions):
+                kind = ('start', 'stop', 'schedule')[i % 3]
+                if kind == 'stop' and not started_sessions: kind = 'start'
+                name = started_sessions.pop(0) if kind == 'stop' else f'lt-{wave}-{i}'
+                if kind == 'start': started_sessions.append(name)
+                actions.append((kind, name))
+            wave_started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=args.actions) as pool:
+                results = list(pool.map(lambda action: run_action(admin, base_url, *action), actions))
+            action_latencies.extend(results)
+            wait_quiet(clients, wave_started, args.settle, timeout=120)
+            for client in clients:
+                events = client.events_since(wave_started)
+                if not events: continue
+                first_event.append((events[0][1] - wave_started) * 1000)
+                last_event.append((events[-1][1] - wave_started) * 1000)
+                wave_bytes.append(sum(event[2] for event in events))
+        report['phases']['actions'] = {
+            'wall_ms': round((time.monotonic() - phase_started) * 1000, 1),
+            'server_cpu_seconds': round(process_cpu_seconds(server.pid) - cpu_before, 2),
+            'http_latency': {kind: percentiles([ms for k, ms, _ in action_latencies if k == kind]) for kind in ('start', 'stop', 'schedule')},
+            'http_errors': sum(1 for _, _, status in action_latencies if status >= 400),
+            'first_event_latency': percentiles(first_event),
+            'last_event_latency': percentiles(last_event),
+            'payload_bytes_per_client_per_wave': round(statistics.fmean(wave_bytes)) if wave_bytes else 0,
+        }
+        report['emit_paths'] = admin.get(f'{base_url}/api/emit-stats').json()
+    finally:
+        for client in clients:
+            try: client.sio.disconnect()
+            except Exception: pass
+        server.terminate()
+        server.wait(timeout=10)
+
+    print(json.dumps(report['phases'], indent=2))
+    print(f"\n{'event@pemanggil':<60} {'emit':>6} {'total ms':>10} {'avg ms':>8} {'max ms':>8} {'byte fan-out':>14}")
+    for stat in report['emit_paths']:
+        print(f"{stat['event'] + '@' + stat['caller']:<60} {stat['count']:>6} {stat['total_ms']:>10.1f} {stat['avg_ms']:>8.2f} {stat['max_ms']:>8.1f} {stat['bytes_fanout']:>14}")
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Pengumpan playlist untuk unit stream sesi playlist StreamHib.
+
+    playlist_feeder.py /root/StreamHibV2/playlists/<id>/playlist.ffconcat /usr/bin/ffmpeg -f mpegts -i pipe:0 ... rtmp://...
+
+Argumen pertama adalah daftar item (format ffconcat yang ditulis app.py), sisanya perintah ffmpeg
+pengirim. Proses ini memisahkan anak pengumpan lalu exec ke ffmpeg pengirim, sehingga MainPID unit tetap
+ffmpeg yang memegang koneksi ke ingest. Pengumpan memutar item satu per satu (-re, -c copy) sebagai
+MPEG-TS ke stdin pengirim dan membaca ulang daftar di setiap batas item: menulis ulang daftar mengganti
+playlist sesi aktif mulai item berikutnya tanpa memutus koneksi RTMP. Timestamp yang mulai ulang di
+setiap item dikoreksi ffmpeg pengirim (input MPEG-TS boleh berisi diskontinuitas timestamp).
+Hanya butuh library standar Python.
+"""
+import os
+import re
+import select
+import subprocess
+import sys
+import time
+
+FFCONCAT_FILE_RE = re.compile(r"^file '(.*)'$")
+# -hide_banner: baris 'ffmpeg version' di journal menandai start ffmpeg pengirim (lihat failed_tee_slaves di app.py)
+ITEM_COMMAND = ['/usr/bin/ffmpeg', '-hide_banner', '-nostdin', '-loglevel', 'error', '-re', '-i', '{path}',
+                '-map', '0:v', '-map', '0:a?', '-c', 'copy', '-f', 'mpegts', 'pipe:1']
+FAILED_PASS_DELAY_SECONDS = 1
+
+
+def log(message):
+    print(f"playlist_feeder: {message}", file=sys.stderr, flush=True)
+
+
+def read_queue(queue_path):
+    """Path item dari daftar ffconcat (relatif terhadap folder daftar). Kosong jika daftar tidak terbaca."""
+    base_dir = os.path.dirname(os.path.abspath(queue_path))
+    try:
+        with open(queue_path) as f: lines = f.read().splitlines()
+    except OSError:
+        return []
+    return [os.path.join(base_dir, match.group(1)) for match in map(FFCONCAT_FILE_RE.match, lines) if match]
+
+
+def pipe_closed(fd):
+    # Ujung tulis pipe melaporkan POLLERR setelah pembacanya (ffmpeg pengirim) keluar
+    poller = select.poll()
+    poller.register(fd, select.POLLERR)
+    return bool(poller.poll(0))
+
+
+def feed(queue_path, out_fd, item_command=ITEM_COMMAND):
+    """Putar item daftar berulang-ulang ke out_fd sampai pembacanya menutup pipe. Return kode keluar proses."""
+    index, failures = 0, 0
+    while not pipe_closed(out_fd):
+        items = read_queue(queue_path)
+        if not items:
+            log(f"daftar {queue_path} kosong atau tidak terbaca")
+            return 1
+        if failures >= len(items):
+            # Semua item gagal berturut-turut: keluar agar ffmpeg pengirim selesai dan systemd me-restart unit
+            log(f"semua {len(items)} item gagal diputar")
+            time.sleep(FAILED_PASS_DELAY_SECONDS)
+            return 1
+        path = items[index % len(items)]
+        result = subprocess.run([arg.replace('{path}', path) for arg in item_command], stdin=subprocess.DEVNULL, stdout=out_fd)
+        if result.returncode != 0 and not pipe_closed(out_fd): log(f"item {os.path.basename(path)} keluar dengan status {result.returncode}")
+        failures = 0 if result.returncode == 0 else failures + 1
+        index = index % len(items) + 1
+    return 0
+
+
+def main(argv):
+    if len(argv) < 3:
+        log("pemakaian: playlist_feeder.py DAFTAR.ffconcat FFMPEG_PENGIRIM [ARG...]")
+        return 2
+    queue_path, sender_command = argv[1], argv[2:]
+    read_fd, write_fd = os.pipe()
+    if os.fork() == 0:
+        os.close(read_fd)
+        exit_code = 1
+        try: exit_code = feed(queue_path, write_fd)
+        finally: os._exit(exit_code)
+    os.close(write_fd)
+    os.dup2(read_fd, 0)
+    os.close(read_fd)
+    os.execv(sender_command[0], sender_command)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,33 @@
+"""Fixture test: app.py dengan DATA_DIR/VIDEO_DIR/SERVICE_DIR sementara."""
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+TEST_DIR = tempfile.mkdtemp(prefix='streamhib-test-')
+os.environ['STREAMHIB_DATA_DIR'] = os.path.join(TEST_DIR, 'data')
+os.environ['STREAMHIB_VIDEO_DIR'] = os.path.join(TEST_DIR, 'videos')
+os.environ['STREAMHIB_SERVICE_DIR'] = os.path.join(TEST_DIR, 'units')
+for directory in ('data', 'videos', 'units'):
+    os.makedirs(os.path.join(TEST_DIR, directory), exist_ok=True)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as streamhib  # noqa: E402  (path harus diset sebelum import)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def test_app():
+    logging.getLogger().setLevel(logging.WARNING)
+    streamhib.socketio.init_app(streamhib.app, async_mode='threading')
+    yield streamhib
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def client():
+    test_client = streamhib.app.test_client()
+    with test_client.session_transaction() as sess: sess['user'] = 'test'
+    return test_client
@@ -0,0 +1,48 @@
+"""Preset x264 adaptif: keputusan turun/naik preset dan penyimpanannya tanpa menimpa perubahan lain."""
+import json
+import subprocess
+
+import pytest
+
+from conftest import streamhib
+
+
+@pytest.fixture
+def adaptive_session(monkeypatch):
+    sess = {'id': 'adaptif', 'sanitized_service_id': 'adaptif', 'video_name': 'video.mp4', 'status': 'active', 'encoding_profile': '720p',
+            **streamhib.destination_fields([{'platform': 'YouTube', 'stream_key': 'key'}])}
+    with open(streamhib.SESSION_FILE, 'w') as f:
+        json.dump({'active_sessions': [sess], 'inactive_sessions': [], 'scheduled_sessions': []}, f)
+    monkeypatch.setattr(streamhib, 'prepare_stream_input', lambda *args: '/videos/video.mp4')
+    monkeypatch.setattr(streamhib, 'create_service_file', lambda *args, **kwargs: ('stream-adaptif.service', 'adaptif'))
+    streamhib.adaptive_preset_state.clear()
+    yield sess
+    streamhib.adaptive_preset_state.clear()
+
+
+def test_next_preset_steps_down_when_encoder_lags_and_up_after_headroom():
+    profile = streamhib.ENCODING_PROFILES['720p']
+    state = {'relaxed_checks': 0}
+    assert streamhib.next_adaptive_preset({'encoding_profile': '720p'}, 0.9, 0.5, state) == 'superfast'
+    sess = {'encoding_profile': '720p', 'x264_preset': 'superfast'}
+    steps = [streamhib.next_adaptive_preset(sess, 1.0, 0.2, state) for _ in range(streamhib.ADAPTIVE_STEP_UP_CHECKS)]
+    assert steps == [None] * (streamhib.ADAPTIVE_STEP_UP_CHECKS - 1) + [profile['preset']]
+    # Tidak pernah melewati preset terbaik profil
+    assert streamhib.next_adaptive_preset({'encoding_profile': '720p'}, 1.0, 0.2, state) is None
+
+
+def test_preset_change_keeps_concurrent_session_writes(adaptive_session, monkeypatch):
+    monkeypatch.setattr(streamhib, 'read_ffmpeg_speeds', lambda service_name: [0.8, 0.85])
+    monkeypatch.setattr(streamhib, 'ADAPTIVE_PRESET_COOLDOWN_SECONDS', 0)
+
+    def run_cmd(cmd, **kwargs):
+        if cmd[:2] == ['systemctl', 'restart']:
+            streamhib.modify_sessions(lambda s_data: s_data['active_sessions'].append({'id': 'lain', 'status': 'active'}))
+        return subprocess.CompletedProcess(cmd, 0, '', '')
+    monkeypatch.setattr(streamhib, 'run_cmd', run_cmd)
+
+    streamhib.adjust_adaptive_presets()
+
+    sessions = {sess['id']: sess for sess in streamhib.read_sessions()['active_sessions']}
+    assert set(sessions) == {'adaptif', 'lain'}
+    assert sessions['adaptif']['x264_preset'] == 'superfast'
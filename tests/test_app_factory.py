@@ -0,0 +1,69 @@
+"""create_app: import app.py tanpa efek samping, inisialisasi sekali, dan snapshot cache hangat dipulihkan saat start."""
+import json
+import os
+import subprocess
+import sys
+
+from conftest import streamhib
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_app_script(tmp_path, script):
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, STREAMHIB_DATA_DIR=str(tmp_path / 'data'),
+               STREAMHIB_VIDEO_DIR=str(tmp_path / 'videos'), STREAMHIB_SERVICE_DIR=str(tmp_path / 'units'))
+    result = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_import_has_no_side_effects(tmp_path):
+    (tmp_path / 'data').mkdir()
+    state = run_app_script(tmp_path, """
+import json, os, threading
+import app
+print(json.dumps({'threads': threading.active_count(), 'scheduler': app.scheduler is None, 'initialized': app.app_initialized,
+                  'data': os.listdir(app.DATA_DIR), 'videos': os.path.exists(app.VIDEO_DIR)}))
+""")
+    assert state == {'threads': 1, 'scheduler': True, 'initialized': False, 'data': [], 'videos': False}
+
+
+def test_create_app_initializes_once_and_restores_snapshot(tmp_path):
+    (tmp_path / 'data').mkdir(); (tmp_path / 'videos').mkdir()
+    for name in ('sama.mp4', 'berubah.mp4'):
+        (tmp_path / 'videos' / name).write_bytes(b'\0' * 1024)
+    same, changed = os.stat(tmp_path / 'videos' / 'sama.mp4'), os.stat(tmp_path / 'videos' / 'berubah.mp4')
+    (tmp_path / 'data' / 'state_snapshot.json').write_text(json.dumps({
+        'video_bitrates': [[str(tmp_path / 'videos' / 'sama.mp4'), same.st_mtime, same.st_size, 2500],
+                           [str(tmp_path / 'videos' / 'berubah.mp4'), changed.st_mtime, changed.st_size + 1, 6000]],
+        'start_latency': [{'session': 'pagi', 'fire_to_first_packet_ms': 900}]}))
+
+    state = run_app_script(tmp_path, """
+import json, subprocess
+import app
+app.run_cmd = lambda cmd, **kwargs: subprocess.CompletedProcess(cmd, 0, '', '') # Tanpa systemctl host
+first = app.create_app()
+scheduler = app.scheduler
+second = app.create_app()
+print(json.dumps({'same_app': first is second, 'same_scheduler': app.scheduler is scheduler, 'running': app.scheduler.running,
+                  'init_ms': app.boot_timing['init_ms'] is not None, 'bitrates': sorted(kbps for kbps in app.video_bitrate_cache.values()),
+                  'latency': app.start_latency_records}))
+""")
+    assert state == {'same_app': True, 'same_scheduler': True, 'running': True, 'init_ms': True,
+                     'bitrates': [2500], 'latency': [{'session': 'pagi', 'fire_to_first_packet_ms': 900}]}
+
+
+def test_snapshot_round_trip(monkeypatch, tmp_path):
+    video_path = tmp_path / 'video.mp4'
+    video_path.write_bytes(b'\0' * 2048)
+    st = os.stat(video_path)
+    monkeypatch.setattr(streamhib, 'STATE_SNAPSHOT_FILE', str(tmp_path / 'state_snapshot.json'))
+    monkeypatch.setattr(streamhib, 'video_bitrate_cache', {(str(video_path), st.st_mtime, st.st_size): 4200})
+    monkeypatch.setattr(streamhib, 'start_latency_records', [{'session': 'malam', 'fire_to_first_packet_ms': 1100}])
+
+    streamhib.write_state_snapshot()
+    streamhib.video_bitrate_cache.clear(); streamhib.start_latency_records.clear()
+    streamhib.read_state_snapshot()
+
+    assert streamhib.video_bitrate_cache == {(str(video_path), st.st_mtime, st.st_size): 4200}
+    assert streamhib.start_latency_records == [{'session': 'malam', 'fire_to_first_packet_ms': 1100}]
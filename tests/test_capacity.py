@@ -0,0 +1,31 @@
+"""Peringatan kapasitas jadwal baru hanya untuk window yang bersinggungan dengan jadwal itu."""
+from datetime import timedelta
+
+import pytest
+
+from conftest import streamhib
+
+
+@pytest.fixture
+def fixed_load(monkeypatch):
+    # Beban per stream dari field test_mbps (tanpa ffprobe); budget egress 10 Mbps
+    monkeypatch.setattr(streamhib, 'stream_load', lambda entry: (entry.get('test_mbps', 0.0), 0.0))
+    monkeypatch.setattr(streamhib, 'HOST_EGRESS_MBPS', 10)
+
+
+def one_time(name, start_dt, minutes, mbps):
+    return {'session_name_original': name, 'sanitized_service_id': name, 'recurrence_type': 'one_time',
+            'start_time_iso': start_dt.isoformat(), 'duration_minutes': minutes, 'test_mbps': mbps}
+
+
+def test_capacity_warnings_only_cover_candidate_minutes(fixed_load):
+    tomorrow = (streamhib.datetime.now(streamhib.jakarta_tz) + timedelta(days=1)).replace(hour=12, minute=0, second=0, microsecond=0)
+    # Jadwal lama sudah overload sendiri keesokan hari pukul 12:00-13:00
+    s_data = {'active_sessions': [], 'inactive_sessions': [], 'scheduled_sessions': [one_time('besar', tomorrow, 60, 12)]}
+
+    assert streamhib.check_schedule_capacity(s_data, one_time('pagi', tomorrow - timedelta(hours=6), 60, 2)) == []
+
+    warnings = streamhib.check_schedule_capacity(s_data, one_time('siang', tomorrow + timedelta(minutes=30), 60, 2))
+    assert len(warnings) == 1
+    # Hanya bagian yang tumpang tindih (12:30-13:00), bukan seluruh window overload jadwal lama
+    assert tomorrow.strftime('%d-%m-%Y') + ' 12:30 s/d ' + tomorrow.strftime('%d-%m-%Y') + ' 13:00' in warnings[0]
@@ -0,0 +1,181 @@
+"""Mode cluster dengan beberapa agent.py in-process (SimulatedBackend): penempatan, pemindahan saat agent mati,
+fencing berbasis lease + peer, dan agent yang bergabung kembali."""
+import json
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import agent as streamhib_agent
+from conftest import streamhib
+
+LEASE = 0.3
+CLOSED_URL = 'http://127.0.0.1:9' # Port discard: koneksi ditolak = tidak terjangkau
+
+
+class LocalAgent:
+    """Satu agent.py di thread sendiri; partition() memutus arah masuk dan keluar seperti partisi jaringan."""
+    def __init__(self, agent_id, unit_dir, max_streams=0):
+        os.makedirs(unit_dir, exist_ok=True)
+        self.agent = streamhib_agent.Agent(agent_id, streamhib_agent.SimulatedBackend(unit_dir), cpu_cores=4, max_streams=max_streams,
+                                           allow_anonymous=True, lease_seconds=LEASE)
+        self.port, self.server, self.saved_peers = 0, None, None
+        self.start()
+
+    def start(self):
+        handler = type('Handler', (streamhib_agent.AgentHandler,), {'agent': self.agent})
+        self.server = ThreadingHTTPServer(('127.0.0.1', self.port), handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self): return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def running(self): return set(self.agent.backend.running)
+
+    def partition(self):
+        self.server.shutdown(); self.server.server_close()
+        self.saved_peers, self.agent.peers = self.agent.peers, {peer_id: CLOSED_URL for peer_id in self.agent.peers}
+
+    def heal(self):
+        self.agent.peers = self.saved_peers
+        self.start()
+
+    def close(self):
+        if self.server: self.server.shutdown(); self.server.server_close()
+
+
+@pytest.fixture
+def cluster(monkeypatch, tmp_path):
+    agents = {}
+
+    def start(**max_streams):
+        for agent_id in ('a', 'b'):
+            agents[agent_id] = LocalAgent(agent_id, str(tmp_path / agent_id), max_streams.get(agent_id, 0))
+        monkeypatch.setattr(streamhib, 'CLUSTER_AGENTS', {agent_id: local.url for agent_id, local in agents.items()})
+        monkeypatch.setattr(streamhib, 'cluster_agents', {agent_id: {'url': local.url, 'state': 'unknown', 'last_seen': None, 'last_seen_at': None, 'error': None,
+                                                                     'status': {}, 'synced': False, 'draining': False} for agent_id, local in agents.items()})
+        streamhib.cluster_health_check()
+        assert all(agent['state'] == 'healthy' and agent['synced'] for agent in streamhib.cluster_agents.values())
+        return agents
+
+    monkeypatch.setattr(streamhib, 'CLUSTER_PLACEMENTS_FILE', str(tmp_path / 'placements.json'))
+    monkeypatch.setattr(streamhib, 'stream_placements', {})
+    monkeypatch.setattr(streamhib, 'stream_placements_mtime', None)
+    monkeypatch.setattr(streamhib, 'scheduler_is_leader', True)
+    monkeypatch.setattr(streamhib, 'cluster_monitor_started', time.monotonic())
+    monkeypatch.setattr(streamhib, 'CLUSTER_AGENT_LEASE_SECONDS', LEASE)
+    monkeypatch.setattr(streamhib, 'CLUSTER_FENCE_MARGIN_SECONDS', 0.2)
+    monkeypatch.setattr(streamhib, 'CLUSTER_AGENT_DEAD_SECONDS', 0.5)
+    monkeypatch.setattr(streamhib, 'record_session_events', lambda events: None)
+    with open(streamhib.SESSION_FILE, 'w') as f:
+        json.dump({'active_sessions': [{'id': name, 'sanitized_service_id': name, 'status': 'active'} for name in ('satu', 'dua')],
+                   'inactive_sessions': [], 'scheduled_sessions': []}, f)
+    yield start
+    for local in agents.values(): local.close()
+
+
+def place_and_start(name, only=None):
+    for agent_id, agent in streamhib.cluster_agents.items(): agent['draining'] = bool(only) and agent_id != only
+    service_name = f"stream-{name}.service"
+    content = f"[Service]\nExecStart=/usr/bin/ffmpeg {name}\n"
+    with open(os.path.join(streamhib.SERVICE_DIR, service_name), 'w') as f: f.write(content)
+    agent_id = streamhib.place_stream_unit(service_name, name, content, '720p')
+    streamhib.run_cmd(["systemctl", "start", service_name], check=True)
+    for agent in streamhib.cluster_agents.values(): agent['draining'] = False
+    return service_name, agent_id
+
+
+def wait_until_dead(agent_id):
+    deadline = time.monotonic() + 5
+    while streamhib.cluster_agents[agent_id]['state'] != 'dead':
+        assert time.monotonic() < deadline, streamhib.cluster_agents[agent_id]
+        time.sleep(0.1)
+        streamhib.cluster_health_check()
+
+
+def test_placement_spreads_load_and_routes_systemctl(cluster):
+    agents = cluster()
+    first, first_agent = place_and_start('satu')
+    second, second_agent = place_and_start('dua')
+
+    assert {first_agent, second_agent} == {'a', 'b'}
+    assert first in agents[first_agent].running and second in agents[second_agent].running
+    assert agents['a'].agent.peers == {'b': agents['b'].url} # Dikirim controller saat agent bergabung
+    props = streamhib.systemctl_show([first, second], ['ActiveState'])
+    assert props[first]['ActiveState'] == props[second]['ActiveState'] == 'active'
+    assert streamhib.run_cmd(["systemctl", "show", "-p", "MainPID", "--value", first]).stdout == '0\n' # Nilai dari agent
+    assert streamhib.cluster_running_units() == {first, second}
+
+
+def test_controller_outage_does_not_fence_connected_agents(cluster):
+    agents = cluster()
+    service_name, agent_id = place_and_start('satu')
+    time.sleep(LEASE * 2) # Panel mati/restart: tidak ada kontak controller lebih lama dari lease
+
+    agents[agent_id].agent.check_lease()
+
+    assert service_name in agents[agent_id].running
+    assert agents[agent_id].agent.controller_lost and not agents[agent_id].agent.fenced
+
+
+def test_isolated_agent_fences_and_its_streams_move(cluster):
+    agents = cluster()
+    service_name, _ = place_and_start('satu', only='a')
+    agents['a'].partition()
+
+    assert streamhib.cluster_running_units() == set() # Agent tak terjangkau tidak dianggap masih menjalankan unitnya
+    assert streamhib.run_cmd(["systemctl", "show", "-p", "MainPID", "--value", service_name]).returncode != 0
+    time.sleep(LEASE * 2)
+    agents['a'].agent.check_lease() # Lease habis dan peer tidak terjangkau: terisolasi
+    assert service_name not in agents['a'].running and service_name in agents['a'].agent.fenced
+
+    wait_until_dead('a')
+
+    placement = streamhib.placements_snapshot()[service_name]
+    assert placement['agent'] == 'b' and placement['epoch'] == 2
+    assert service_name in agents['b'].running
+
+
+def test_reassigned_unit_is_fenced_by_new_owner(cluster, monkeypatch):
+    agents = cluster()
+    service_name, _ = place_and_start('satu', only='a')
+    # Hanya jalur controller -> a yang putus; a dan b masih saling terhubung sehingga a tidak mem-fence sendiri
+    streamhib.cluster_agents['a']['url'] = CLOSED_URL
+    time.sleep(LEASE * 2)
+    agents['a'].agent.check_lease()
+    assert service_name in agents['a'].running
+
+    wait_until_dead('a')
+
+    assert streamhib.placement_agent(service_name) == 'b'
+    assert service_name in agents['b'].running
+    assert service_name not in agents['a'].running and service_name in agents['a'].agent.fenced
+
+
+def test_rejoined_agent_restarts_unmoved_units_and_drops_moved_ones(cluster):
+    agents = cluster(b=1) # b hanya muat satu stream: satu unit a tidak bisa dipindah
+    units = {place_and_start('satu', only='a')[0], place_and_start('dua', only='a')[0]}
+    assert agents['a'].running == units
+    agents['a'].partition()
+    time.sleep(LEASE * 2)
+    agents['a'].agent.check_lease()
+    assert agents['a'].running == set()
+
+    wait_until_dead('a')
+    [moved] = agents['b'].running
+    [stranded] = units - {moved}
+    assert streamhib.placement_agent(stranded) == 'a'
+    assert os.path.exists(os.path.join(agents['a'].agent.backend.unit_dir, moved)) # File unit lama masih ada di agent terisolasi
+
+    agents['a'].heal()
+    streamhib.cluster_health_check()
+
+    assert streamhib.cluster_agents['a']['state'] == 'healthy' and streamhib.cluster_agents['a']['synced']
+    assert agents['a'].running == {stranded}
+    assert not os.path.exists(os.path.join(agents['a'].agent.backend.unit_dir, moved))
+    assert agents['b'].running == {moved}
@@ -0,0 +1,111 @@
+"""Download manager: antrean worker, progres lewat event, pembatalan, cache per Drive ID dan lanjut setelah restart."""
+import json
+import os
+import queue
+import threading
+import time
+
+import pytest
+
+from conftest import streamhib
+
+DRIVE_ID = 'drive-id-berjalan-0123456789'
+
+
+class FakeDrive:
+    """download_drive_file palsu: tulis file kecil, atau tahan job sampai dilepas/dibatalkan."""
+    def __init__(self):
+        self.started, self.calls = threading.Event(), []
+        self.hold = set()
+        self.release = threading.Event()
+
+    def __call__(self, drive_id, dest_dir, progress_cb=None, should_cancel=None, segments=None):
+        self.calls.append(drive_id)
+        if drive_id in self.hold:
+            self.started.set()
+            while not self.release.wait(0.01):
+                if should_cancel(): raise streamhib.DownloadCancelled()
+        progress_cb(512, 1024)
+        path = os.path.join(dest_dir, f'{drive_id}.mp4')
+        with open(path, 'wb') as f: f.write(b'\0' * 1024)
+        progress_cb(1024, 1024)
+        return path
+
+
+@pytest.fixture
+def downloads(monkeypatch, tmp_path):
+    drive = FakeDrive()
+    events = []
+    monkeypatch.setattr(streamhib, 'download_drive_file', drive)
+    monkeypatch.setattr(streamhib, 'DOWNLOAD_JOBS_FILE', str(tmp_path / 'downloads.json'))
+    monkeypatch.setattr(streamhib, 'DOWNLOAD_TMP_DIR', str(tmp_path / 'kerja'))
+    monkeypatch.setattr(streamhib, 'download_jobs', {})
+    monkeypatch.setattr(streamhib, 'download_cache', {})
+    monkeypatch.setattr(streamhib, 'download_queue', queue.Queue())
+    monkeypatch.setattr(streamhib, 'download_workers', [])
+    monkeypatch.setattr(streamhib, 'emit_download_progress', lambda job: events.append(dict(job)))
+    monkeypatch.setattr(streamhib, 'enqueue_video_preflight', lambda name: None)
+    yield drive, events
+    drive.release.set()
+
+
+def wait_status(job_id, *statuses):
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        job = streamhib.download_jobs[job_id]
+        if job['status'] in statuses: return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} tetap {streamhib.download_jobs[job_id]['status']}")
+
+
+def test_download_runs_in_background_and_reports_progress(downloads, client):
+    _, events = downloads
+
+    response = client.post('/api/download', json={'file_id': f'https://drive.google.com/file/d/{DRIVE_ID}/view'})
+
+    assert response.status_code == 202
+    job = wait_status(response.get_json()['job_id'], 'completed')
+    assert os.path.isfile(os.path.join(streamhib.VIDEO_DIR, job['filename']))
+    progress = [event['bytes_downloaded'] for event in events if event['id'] == job['id'] and event['status'] == 'downloading']
+    assert progress == [0, 512, 1024]
+    # Drive ID yang sama tidak diunduh ulang selama filenya masih ada
+    cached = client.post('/api/download', json={'file_id': DRIVE_ID})
+    assert cached.status_code == 200 and cached.get_json()['job']['cached'] is True
+    os.remove(os.path.join(streamhib.VIDEO_DIR, job['filename']))
+
+
+def test_cancel_running_and_queued_jobs(downloads, client, monkeypatch):
+    drive, _ = downloads
+    monkeypatch.setattr(streamhib, 'DOWNLOAD_MAX_CONCURRENT', 1)
+    drive.hold.add(DRIVE_ID)
+    running = streamhib.enqueue_download(DRIVE_ID)
+    assert drive.started.wait(5)
+    waiting = streamhib.enqueue_download('drive-id-mengantre-0123456789')
+    # Permintaan ulang untuk download yang sedang berjalan memakai job yang sama
+    assert streamhib.enqueue_download(DRIVE_ID)['id'] == running['id']
+
+    assert client.post('/api/downloads/cancel', json={'job_id': waiting['id']}).get_json()['job']['status'] == 'cancelled'
+    client.post('/api/downloads/cancel', json={'job_id': running['id']})
+
+    wait_status(running['id'], 'cancelled')
+    assert not os.path.exists(os.path.join(streamhib.DOWNLOAD_TMP_DIR, running['id']))
+    streamhib.download_queue.join() # Job yang dibatalkan saat masih antre tidak pernah dijalankan
+    assert drive.calls == [DRIVE_ID]
+    with open(streamhib.DOWNLOAD_JOBS_FILE) as f:
+        assert {job['id']: job['status'] for job in json.load(f)['jobs']} == {running['id']: 'cancelled', waiting['id']: 'cancelled'}
+
+
+def test_unfinished_jobs_resume_after_restart(downloads):
+    drive, _ = downloads
+    with open(streamhib.DOWNLOAD_JOBS_FILE, 'w') as f:
+        json.dump({'cache': {}, 'jobs': [
+            {'id': 'terputus', 'drive_id': 'drive-id-terputus-0123456789', 'status': 'downloading', 'filename': None,
+             'bytes_downloaded': 100, 'created_at': '2026-10-19T08:00:00+07:00', 'updated_at': '2026-10-19T08:00:00+07:00'},
+            {'id': 'batal', 'drive_id': 'drive-id-dibatalkan-012345678', 'status': 'downloading', 'cancel_requested': True, 'filename': None,
+             'bytes_downloaded': 0, 'created_at': '2026-10-19T08:00:00+07:00', 'updated_at': '2026-10-19T08:00:00+07:00'}]}, f)
+
+    streamhib.resume_download_jobs()
+
+    job = wait_status('terputus', 'completed')
+    assert drive.calls == ['drive-id-terputus-0123456789']
+    os.remove(os.path.join(streamhib.VIDEO_DIR, job['filename']))
@@ -0,0 +1,140 @@
+"""Downloader Google Drive native terhadap server http.server lokal yang meniru alur konfirmasi Drive."""
+import json
+import os
+import re
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import streamhib
+
+DRIVE_ID = 'abcdefghijklmnopqrstuvwxyz012345'
+FILE_NAME = 'video test.mp4'
+CONFIRM_PAGE = """<html><body>Google Drive can't scan this file for viruses.
+<form id="download-form" action="/download?authuser=0" method="get">
+<input type="hidden" name="id" value="{drive_id}"><input type="hidden" name="export" value="download">
+<input type="hidden" name="confirm" value="t"><input type="hidden" name="uuid" value="1234">
+<input type="submit" value="Download anyway"></form></body></html>"""
+
+
+class FakeDrive:
+    """Server Drive palsu: /uc mengirim halaman konfirmasi, /download mengirim isi file (dengan atau tanpa Range)."""
+    def __init__(self, content, supports_range=True, truncate_to=None):
+        self.content, self.supports_range, self.truncate_to = content, supports_range, truncate_to
+        self.ranges, self.lock = [], threading.Lock()
+        drive = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args): pass
+
+            def do_GET(self):
+                path, _, query = self.path.partition('?')
+                params = urllib.parse.parse_qs(query)
+                if path == '/uc':
+                    body = CONFIRM_PAGE.format(drive_id=params['id'][0]).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/html; charset=utf-8')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif path == '/download' and params.get('authuser') == ['0'] and params.get('confirm') == ['t'] and params.get('id') == [DRIVE_ID]:
+                    drive.serve_file(self)
+                else:
+                    self.send_error(404)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/uc"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def serve_file(self, handler):
+        content = self.content
+        match = re.match(r'bytes=(\d+)-(\d+)', handler.headers.get('Range') or '')
+        if match and self.supports_range:
+            start, end = int(match.group(1)), min(int(match.group(2)), len(content) - 1)
+            with self.lock: self.ranges.append((start, end))
+            handler.send_response(206)
+            handler.send_header('Content-Range', f'bytes {start}-{end}/{len(content)}')
+            body = content[start:end + 1]
+        else:
+            handler.send_response(200)
+            body = content
+        handler.send_header('Content-Type', 'video/mp4')
+        handler.send_header('Content-Disposition', f"attachment; filename=\"video.mp4\"; filename*=UTF-8''{urllib.parse.quote(FILE_NAME)}")
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body[:self.truncate_to] if self.truncate_to is not None else body)
+
+    def segment_ranges(self):
+        # Probe 'bytes=0-0' dari resolve_drive_download bukan bagian dari download segmen
+        return sorted(r for r in self.ranges if r != (0, 0))
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fast_downloads(monkeypatch):
+    monkeypatch.setattr(streamhib, 'DOWNLOAD_MIN_SEGMENT_BYTES', 64 * 1024)
+    monkeypatch.setattr(streamhib, 'DOWNLOAD_CHUNK_BYTES', 16 * 1024)
+    monkeypatch.setattr(streamhib, 'DOWNLOAD_PROGRESS_INTERVAL', 0.02)
+
+
+@pytest.fixture
+def drive_server(monkeypatch):
+    servers = []
+
+    def start(content, **kwargs):
+        server = FakeDrive(content, **kwargs)
+        monkeypatch.setattr(streamhib, 'GDRIVE_DOWNLOAD_URL', server.url)
+        servers.append(server)
+        return server
+    yield start
+    for server in servers: server.close()
+
+
+def test_confirm_page_and_ranged_segments(fast_downloads, drive_server, tmp_path):
+    content = os.urandom(1024 * 1024 + 123)
+    server = drive_server(content)
+    progress = []
+
+    path = streamhib.download_drive_file(DRIVE_ID, str(tmp_path), progress_cb=lambda done, total: progress.append((done, total)), segments=4)
+
+    assert os.path.basename(path) == FILE_NAME
+    with open(path, 'rb') as f: assert f.read() == content
+    ranges = server.segment_ranges()
+    assert len(ranges) == 4 and ranges[0][0] == 0 and ranges[-1][1] == len(content) - 1
+    assert all(prev[1] + 1 == cur[0] for prev, cur in zip(ranges, ranges[1:]))
+    assert progress[-1] == (len(content), len(content))
+    assert not os.path.exists(path + '.state')
+
+
+def test_resume_from_state(fast_downloads, drive_server, tmp_path):
+    content = os.urandom(1024 * 1024)
+    server = drive_server(content)
+    dest_path = os.path.join(str(tmp_path), FILE_NAME)
+    # Sisa job sebelumnya: segmen 0 selesai, segmen 1 baru separuh, sisanya belum mulai
+    plan = streamhib.plan_download_segments(len(content), 4)
+    plan[0][2] = plan[0][1] - plan[0][0] + 1
+    plan[1][2] = (plan[1][1] - plan[1][0] + 1) // 2
+    with open(dest_path, 'wb') as f:
+        f.write(b'\0' * len(content))
+        for start, _, done in plan:
+            f.seek(start); f.write(content[start:start + done])
+    with open(dest_path + '.state', 'w') as f: json.dump({'total': len(content), 'segments': plan}, f)
+
+    path = streamhib.download_drive_file(DRIVE_ID, str(tmp_path), segments=4)
+
+    with open(path, 'rb') as f: assert f.read() == content
+    assert server.segment_ranges() == [(start + done, end) for start, end, done in plan[1:]]
+    assert not os.path.exists(dest_path + '.state')
+
+
+def test_size_mismatch_is_rejected(fast_downloads, drive_server, tmp_path):
+    content = os.urandom(256 * 1024)
+    drive_server(content, supports_range=False, truncate_to=100 * 1024) # Koneksi ditutup sebelum Content-Length terpenuhi
+
+    with pytest.raises(streamhib.DownloadError, match='Ukuran file tidak sesuai'):
+        streamhib.download_drive_file(DRIVE_ID, str(tmp_path))
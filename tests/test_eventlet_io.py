@@ -0,0 +1,64 @@
+"""I/O blocking (systemctl, sessions.json) lewat tpool: hub eventlet tetap melayani request lain."""
+import json
+import subprocess
+import time
+
+import eventlet
+import pytest
+
+from conftest import streamhib
+
+HANG_SECONDS = 3
+CONCURRENT_REQUESTS = 20
+
+
+@pytest.fixture
+def eventlet_mode(monkeypatch):
+    # offload() hanya memakai tpool bila async_mode eventlet dan dipanggil dari main thread
+    monkeypatch.setattr(streamhib.socketio, 'async_mode', 'eventlet', raising=False)
+
+
+@pytest.fixture
+def hanging_systemctl(monkeypatch):
+    original_run = subprocess.run
+    calls = []
+
+    def fake_run(cmd, *args, **kwargs):
+        if cmd[0] != 'systemctl': return original_run(cmd, *args, **kwargs)
+        calls.append(cmd)
+        time.sleep(HANG_SECONDS) # systemctl yang macet (misal dbus sibuk) memblokir thread pemanggil
+        return subprocess.CompletedProcess(cmd, 0, stdout='active\n', stderr='')
+    monkeypatch.setattr(streamhib.subprocess, 'run', fake_run)
+    return calls
+
+
+@pytest.fixture
+def active_sessions():
+    now = streamhib.datetime.now(streamhib.jakarta_tz).isoformat()
+    data = {'active_sessions': [{'id': f'sesi-{i}', 'sanitized_service_id': f'sesi-{i}', 'video_name': 'video.mp4', 'platform': 'YouTube',
+                                 'stream_key': f'key-{i}', 'status': 'active', 'start_time': now, 'scheduleType': 'manual'} for i in range(5)],
+            'inactive_sessions': [], 'scheduled_sessions': []}
+    with open(streamhib.SESSION_FILE, 'w') as f: json.dump(data, f)
+    return data
+
+
+def test_sessions_latency_bounded_while_systemctl_hangs(eventlet_mode, hanging_systemctl, active_sessions, client):
+    started = time.monotonic()
+    latencies = []
+    hung = eventlet.spawn(streamhib.run_cmd, ['systemctl', 'is-active', 'stream-sesi-0.service'], capture_output=True, text=True)
+
+    def get_sessions():
+        response = client.get('/api/sessions')
+        assert response.status_code == 200
+        assert len(response.get_json()) == len(active_sessions['active_sessions'])
+        latencies.append(time.monotonic() - started)
+
+    pool = eventlet.GreenPool()
+    for _ in range(CONCURRENT_REQUESTS): pool.spawn(get_sessions)
+    pool.waitall()
+
+    assert len(latencies) == CONCURRENT_REQUESTS
+    # Greenlet systemctl dijalankan hub lebih dulu; bila ia memblokir hub, setiap request menunggu HANG_SECONDS
+    assert max(latencies) < HANG_SECONDS / 3
+    assert hung.wait().stdout == 'active\n'
+    assert len(hanging_systemctl) == 1
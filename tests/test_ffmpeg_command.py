@@ -0,0 +1,15 @@
+"""Perintah ffmpeg per kombinasi tujuan/profil encoding."""
+from conftest import streamhib
+
+DESTINATIONS = [{'platform': 'YouTube', 'stream_key': 'utama'}, {'platform': 'Facebook', 'stream_key': 'kedua'}]
+
+
+def test_tee_transcode_sets_global_header():
+    command = streamhib.build_ffmpeg_command('/videos/a.mp4', DESTINATIONS, '720p')
+    assert '-flags +global_header -f tee' in command
+
+
+def test_global_header_only_when_needed():
+    # -c copy membawa extradata dari input; output flv tunggal sudah meminta global header sendiri
+    assert 'global_header' not in streamhib.build_ffmpeg_command('/videos/a.mp4', DESTINATIONS, 'copy')
+    assert 'global_header' not in streamhib.build_ffmpeg_command('/videos/a.mp4', DESTINATIONS[:1], '720p')
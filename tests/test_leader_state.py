@@ -0,0 +1,81 @@
+"""State yang hanya dihitung leader scheduler (kesehatan tujuan, latensi start, insiden berjalan) tetap terbaca di worker follower."""
+import json
+import subprocess
+
+import pytest
+
+from conftest import streamhib
+
+
+def active_session(name):
+    return {'id': name, 'sanitized_service_id': name, 'video_name': 'video.mp4', 'status': 'active', 'scheduleType': 'manual',
+            'platform': 'YouTube', 'stream_key': 'key', 'start_time': streamhib.datetime.now(streamhib.jakarta_tz).isoformat()}
+
+
+def running_units(cmd, **kwargs):
+    stdout = ''
+    if cmd[:2] == ['systemctl', 'list-units']:
+        stdout = "stream-jalan.service loaded active running StreamHib\n"
+    elif cmd[:2] == ['systemctl', 'show']:
+        stdout = "Id=stream-jalan.service\nActiveState=active\nSubState=running\n"
+    return subprocess.CompletedProcess(cmd, 0, stdout, '')
+
+
+@pytest.fixture
+def leader(monkeypatch, tmp_path):
+    monkeypatch.setattr(streamhib, 'LEADER_STATE_FILE', str(tmp_path / 'leader_state.json'))
+    monkeypatch.setattr(streamhib, 'scheduler_is_leader', True)
+    monkeypatch.setattr(streamhib, 'run_cmd', running_units)
+    monkeypatch.setattr(streamhib, 'destination_health_view', {})
+    monkeypatch.setattr(streamhib, 'start_latency_records', [])
+    monkeypatch.setattr(streamhib, 'stream_health_state', {})
+    monkeypatch.setattr(streamhib, 'leader_state_cache', {'key': None, 'state': {}})
+    with open(streamhib.SESSION_FILE, 'w') as f:
+        json.dump({'active_sessions': [active_session('jalan')], 'inactive_sessions': [], 'scheduled_sessions': []}, f)
+
+
+def become_follower(monkeypatch):
+    # Proses lain: memori kosong, bukan leader
+    monkeypatch.setattr(streamhib, 'scheduler_is_leader', False)
+    monkeypatch.setattr(streamhib, 'destination_health_view', {})
+    monkeypatch.setattr(streamhib, 'start_latency_records', [])
+    monkeypatch.setattr(streamhib, 'stream_health_state', {})
+
+
+def test_follower_serves_leader_state(leader, client, monkeypatch):
+    streamhib.reconcile_sessions()
+    streamhib.start_latency_records.append({'session': 'jalan', 'fire_time': '2026-10-19T08:00:00+07:00', 'prewarmed': True, 'fire_to_first_packet_ms': 850})
+    streamhib.stream_health_state['jalan'] = {'last_exit_usec': '5', 'consecutive_failures': 1, 'permanent_hits': 0,
+                                              'incident': {'started_at': '2026-10-19T09:00:00+07:00', 'restarts': 1, 'failover': False, 'reason': 'Connection reset'}}
+    streamhib.publish_leader_state()
+    become_follower(monkeypatch)
+
+    destinations = client.get('/api/sessions/destinations?session_id=jalan').get_json()
+    assert destinations['destinations'][0]['status'] == 'ok'
+    assert client.get('/api/start-latency').get_json()[0]['fire_to_first_packet_ms'] == 850
+    [incident] = client.get('/api/incidents?session_id=jalan').get_json()
+    assert incident['session'] == 'jalan' and incident['reason'] == 'Connection reset' and incident['recovered_at'] is None
+    assert client.get('/api/worker').get_json()['is_scheduler_leader'] is False
+
+
+def test_follower_sees_republished_state(leader, client, monkeypatch):
+    streamhib.reconcile_sessions()
+    become_follower(monkeypatch)
+    assert client.get('/api/start-latency').get_json() == []
+
+    # Leader mencatat latensi start baru dan menerbitkan ulang state-nya
+    streamhib.start_latency_records.append({'session': 'jalan', 'fire_time': '2026-10-19T08:00:00+07:00', 'prewarmed': False, 'fire_to_first_packet_ms': 1200})
+    monkeypatch.setattr(streamhib, 'scheduler_is_leader', True)
+    streamhib.publish_leader_state()
+    monkeypatch.setattr(streamhib, 'scheduler_is_leader', False)
+
+    assert client.get('/api/start-latency').get_json()[0]['fire_to_first_packet_ms'] == 1200
+
+
+def test_follower_without_leader_state_reports_unknown(leader, client, monkeypatch):
+    become_follower(monkeypatch)
+    streamhib.reconcile_sessions() # Follower tidak menerbitkan state
+
+    destinations = client.get('/api/sessions/destinations?session_id=jalan').get_json()
+    assert destinations['destinations'][0]['status'] == 'unknown'
+    assert client.get('/api/incidents').get_json() == []
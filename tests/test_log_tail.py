@@ -0,0 +1,49 @@
+"""Tail log live bersama: antrean per penonton terbatas dan tail yang sedang ditutup tidak dipakai ulang."""
+import pytest
+
+from conftest import streamhib
+
+SERVICE = 'stream-test.service'
+
+
+@pytest.fixture
+def no_readers(monkeypatch):
+    started = []
+    monkeypatch.setattr(streamhib, 'run_log_tail', lambda name, tail: started.append(('reader', tail)))
+    monkeypatch.setattr(streamhib, 'run_log_tail_flusher', lambda name, tail: started.append(('flusher', tail)))
+    yield started
+    streamhib.log_tails.clear()
+
+
+def test_subscribers_share_one_reader(no_readers):
+    streamhib.subscribe_log_tail('sid-a', 's1', SERVICE)
+    tail = streamhib.log_tails[SERVICE]
+    streamhib.log_tail_append(tail, ['satu', 'dua'])
+
+    assert streamhib.subscribe_log_tail('sid-b', 's1', SERVICE) == ['satu', 'dua']
+    assert streamhib.log_tails[SERVICE] is tail
+    assert [kind for kind, _ in no_readers].count('reader') == 1
+    assert list(tail['subscribers']['sid-a']['queue']) == ['satu', 'dua']
+
+
+def test_slow_subscriber_drops_oldest_lines(no_readers, monkeypatch):
+    monkeypatch.setattr(streamhib, 'LOG_TAIL_CLIENT_QUEUE_LINES', 3)
+    streamhib.subscribe_log_tail('sid-a', 's1', SERVICE)
+    tail = streamhib.log_tails[SERVICE]
+    streamhib.log_tail_append(tail, ['1', '2', '3', '4', '5'])
+
+    subscriber = tail['subscribers']['sid-a']
+    assert list(subscriber['queue']) == ['3', '4', '5'] and subscriber['dropped'] == 2
+
+
+def test_closed_tail_is_replaced(no_readers):
+    streamhib.subscribe_log_tail('sid-a', 's1', SERVICE)
+    dying = streamhib.log_tails[SERVICE]
+    streamhib.unsubscribe_log_tail('sid-a')
+    dying['closed'] = True # Flusher sudah menandai idle tetapi belum membuang tail dari log_tails
+
+    streamhib.subscribe_log_tail('sid-b', 's1', SERVICE)
+
+    fresh = streamhib.log_tails[SERVICE]
+    assert fresh is not dying and not fresh['closed'] and 'sid-b' in fresh['subscribers']
+    assert [tail for kind, tail in no_readers if kind == 'reader'] == [dying, fresh]
@@ -0,0 +1,41 @@
+"""Konfigurasi logging: tanpa efek samping saat import, idempoten, dan level per subsistem."""
+import os
+import subprocess
+import sys
+import textwrap
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_app_snippet(tmp_path, code, **env):
+    environment = dict(os.environ, STREAMHIB_DATA_DIR=str(tmp_path / 'data'), STREAMHIB_VIDEO_DIR=str(tmp_path / 'videos'),
+                       STREAMHIB_SERVICE_DIR=str(tmp_path / 'units'), **env)
+    result = subprocess.run([sys.executable, '-c', textwrap.dedent(code)], cwd=APP_DIR, env=environment, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def test_import_has_no_logging_side_effects(tmp_path):
+    out = run_app_snippet(tmp_path, """
+        import logging, app
+        print(app.logging_listener is None, any(isinstance(h, logging.handlers.QueueHandler) for h in logging.getLogger().handlers))
+    """)
+    assert out.split() == ['True', 'False']
+    assert not os.path.exists(tmp_path / 'data' / 'logs')
+
+
+def test_setup_is_idempotent_and_honours_subsystem_levels(tmp_path):
+    out = run_app_snippet(tmp_path, """
+        import logging, app
+        app.setup_logging()
+        listener = app.logging_listener
+        app.setup_logging()
+        print(app.logging_listener is listener, len(logging.getLogger().handlers))
+        app.log_download.info('download-info')
+        app.log_download.warning('download-warning')
+        app.log_sync.info('sync-info')
+    """, STREAMHIB_LOG_LEVELS='download=WARNING', STREAMHIB_LOG_CONSOLE_LEVEL='CRITICAL')
+    assert out.split() == ['True', '1']
+    with open(tmp_path / 'data' / 'logs' / 'streamhib.log') as f: written = f.read()
+    assert 'download-warning' in written and 'streamhib.sync: sync-info' in written
+    assert 'download-info' not in written
@@ -0,0 +1,109 @@
+"""Sesi playlist: pengumpan membaca ulang daftar di batas item, sehingga edit playlist sesi aktif tidak me-restart ffmpeg pengirim."""
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import playlist_feeder
+from conftest import streamhib
+
+# Item palsu: tulis nama file item sebagai satu baris, bukan MPEG-TS
+ECHO_ITEM = [sys.executable, '-c', 'import os, sys; sys.stdout.write(os.path.basename(sys.argv[1]) + "\\n")', '{path}']
+
+
+def write_queue(path, names):
+    with open(path, 'w') as f: f.write("ffconcat version 1.0\n" + ''.join(f"file '{name}'\n" for name in names))
+
+
+def test_feeder_switches_queue_at_item_boundary(tmp_path):
+    queue_path = str(tmp_path / 'playlist.ffconcat')
+    write_queue(queue_path, ['a.mp4', 'b.mp4'])
+    read_fd, write_fd = os.pipe()
+    result = {}
+    feeder = threading.Thread(target=lambda: result.update(code=playlist_feeder.feed(queue_path, write_fd, ECHO_ITEM)))
+    feeder.start()
+
+    played = []
+    with os.fdopen(read_fd) as reader:
+        played.append(reader.readline().strip())
+        write_queue(queue_path, ['c.mp4', 'd.mp4'])
+        while len(played) < 6: played.append(reader.readline().strip())
+    feeder.join(timeout=10)
+    os.close(write_fd)
+
+    assert played[0] == 'a.mp4'
+    # Item yang sudah dimulai sebelum daftar ditulis ulang boleh selesai; setelah itu hanya daftar baru
+    first_new = next(i for i, name in enumerate(played) if name in ('c.mp4', 'd.mp4'))
+    assert first_new <= 2 and set(played[first_new:]) <= {'c.mp4', 'd.mp4'}
+    assert not feeder.is_alive() and result['code'] == 0 # Berhenti sendiri saat pembaca (ffmpeg pengirim) menutup pipe
+
+
+def test_feeder_exits_when_every_item_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(playlist_feeder, 'FAILED_PASS_DELAY_SECONDS', 0)
+    queue_path = str(tmp_path / 'playlist.ffconcat')
+    write_queue(queue_path, ['a.mp4', 'b.mp4'])
+    read_fd, write_fd = os.pipe()
+    try:
+        assert playlist_feeder.feed(queue_path, write_fd, [sys.executable, '-c', 'raise SystemExit(1)', '{path}']) == 1
+    finally:
+        os.close(read_fd); os.close(write_fd)
+
+
+def test_playlist_unit_runs_persistent_sender():
+    command = streamhib.build_ffmpeg_command('/data/playlists/pl/playlist.ffconcat', [{'platform': 'YouTube', 'stream_key': 'kunci'}], 'copy')
+    assert command.startswith(f'/usr/bin/python3 {streamhib.PLAYLIST_FEEDER} "/data/playlists/pl/playlist.ffconcat" /usr/bin/ffmpeg -f mpegts -i pipe:0')
+    assert '-stream_loop' not in command
+
+
+class FakeSystemd:
+    def __init__(self): self.commands = []
+
+    def __call__(self, cmd, **kwargs):
+        self.commands.append(cmd)
+        stdout = 'video,h264,1280,720\naudio,aac,44100,2\n' if cmd[0] == 'ffprobe' else ''
+        return subprocess.CompletedProcess(cmd, 0, stdout, '')
+
+
+@pytest.fixture
+def active_playlist_session(monkeypatch):
+    for name in ('a.mp4', 'b.mp4', 'c.mp4'):
+        with open(os.path.join(streamhib.VIDEO_DIR, name), 'wb') as f: f.write(b'\0')
+    systemd = FakeSystemd()
+    monkeypatch.setattr(streamhib, 'run_cmd', systemd)
+    destinations = [{'platform': 'YouTube', 'stream_key': 'kunci'}]
+    video_path = streamhib.prepare_stream_input('pl', 'a.mp4', ['a.mp4', 'b.mp4'])
+    streamhib.create_service_file('pl', video_path, destinations, 'copy')
+    with open(streamhib.SESSION_FILE, 'w') as f:
+        json.dump({'active_sessions': [{'id': 'pl', 'sanitized_service_id': 'pl', 'video_name': 'a.mp4', 'playlist': ['a.mp4', 'b.mp4'],
+                                        'status': 'active', 'platform': 'YouTube', 'stream_key': 'kunci', 'encoding_profile': 'copy',
+                                        'scheduleType': 'manual', 'start_time': streamhib.datetime.now(streamhib.jakarta_tz).isoformat()}],
+                   'inactive_sessions': [], 'scheduled_sessions': []}, f)
+    with open(os.path.join(streamhib.SERVICE_DIR, 'stream-pl.service')) as f: unit = f.read()
+    systemd.commands.clear()
+    yield systemd, video_path, unit
+    streamhib.remove_playlist_file('pl')
+
+
+def test_edit_active_playlist_does_not_restart_sender(client, active_playlist_session):
+    systemd, queue_path, unit = active_playlist_session
+
+    response = client.post('/api/edit-session', json={'session_name_original': 'pl', 'playlist': ['c.mp4', 'a.mp4']})
+
+    assert response.status_code == 200, response.get_json()
+    assert [cmd for cmd in systemd.commands if cmd[0] == 'systemctl'] == []
+    with open(os.path.join(streamhib.SERVICE_DIR, 'stream-pl.service')) as f: assert f.read() == unit
+    assert [os.path.basename(os.path.realpath(path)) for path in playlist_feeder.read_queue(queue_path)] == ['c.mp4', 'a.mp4']
+    assert streamhib.read_sessions()['active_sessions'][0]['playlist'] == ['c.mp4', 'a.mp4']
+
+
+def test_edit_active_destination_restarts_unit(client, active_playlist_session):
+    systemd, _, unit = active_playlist_session
+
+    response = client.post('/api/edit-session', json={'session_name_original': 'pl', 'stream_key': 'kunci-baru'})
+
+    assert response.status_code == 200, response.get_json()
+    assert ['systemctl', 'restart', 'stream-pl.service'] in systemd.commands
+    with open(os.path.join(streamhib.SERVICE_DIR, 'stream-pl.service')) as f: assert 'kunci-baru' in f.read()
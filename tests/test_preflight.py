@@ -0,0 +1,140 @@
+"""Preflight video di banyak worker: hanya leader yang melanjutkan, file yang sama tidak diproses dua kali."""
+import json
+import os
+
+import pytest
+
+from conftest import streamhib
+
+
+@pytest.fixture
+def preflight_state(monkeypatch):
+    monkeypatch.setattr(streamhib, 'run_cmd', lambda cmd, **kwargs: pytest.fail(f"preflight tidak boleh menjalankan {cmd[0]}"))
+    queued = []
+    monkeypatch.setattr(streamhib.video_preflight_queue, 'put', queued.append)
+    streamhib.video_preflight.clear()
+    yield queued
+    streamhib.video_preflight.clear()
+    if os.path.exists(streamhib.VIDEO_PREFLIGHT_FILE): os.remove(streamhib.VIDEO_PREFLIGHT_FILE)
+
+
+def write_video(name):
+    path = os.path.join(streamhib.VIDEO_DIR, name)
+    with open(path, 'wb') as f: f.write(b'\0' * 1024)
+    return path
+
+
+def test_only_leader_requeues_interrupted_preflight(preflight_state):
+    with open(streamhib.VIDEO_PREFLIGHT_FILE, 'w') as f:
+        json.dump({'a.mp4': {'filename': 'a.mp4', 'status': 'remuxing'}, 'b.mp4': {'filename': 'b.mp4', 'status': 'ok'}}, f)
+
+    streamhib.restore_video_preflight() # Semua worker
+    assert streamhib.video_preflight['a.mp4']['status'] == 'interrupted'
+    assert preflight_state == []
+
+    streamhib.resume_video_preflight() # Hanya dipanggil saat menjadi leader
+    assert preflight_state == ['a.mp4']
+
+
+def test_preflight_done_by_other_worker_is_adopted(preflight_state):
+    path = write_video('c.mp4')
+    streamhib.enqueue_video_preflight('c.mp4')
+    # Worker lain menyelesaikan file yang sama setelah job ini masuk antrean
+    finished = {'filename': 'c.mp4', 'status': 'remuxed', 'signature': streamhib.video_file_signature(path), 'first_packet_ms_after': 80,
+                'updated_at': streamhib.datetime.now(streamhib.jakarta_tz).isoformat()}
+    with open(streamhib.VIDEO_PREFLIGHT_FILE, 'w') as f: json.dump({'c.mp4': finished}, f)
+
+    streamhib.run_video_preflight('c.mp4')
+
+    record = streamhib.video_preflight['c.mp4']
+    assert record['status'] == 'remuxed' and record['first_packet_ms_after'] == 80
+
+
+def atom(kind, payload_size):
+    return streamhib.struct.pack('>I4s', 8 + payload_size, kind.encode()) + b'\0' * payload_size
+
+
+def write_mp4(name, order):
+    path = os.path.join(streamhib.VIDEO_DIR, name)
+    sizes = {'ftyp': 16, 'moov': 512, 'mdat': 4096}
+    with open(path, 'wb') as f: f.write(b''.join(atom(kind, sizes[kind]) for kind in order))
+    return path
+
+
+def test_moov_at_end_detected_from_top_level_atoms(preflight_state, monkeypatch):
+    monkeypatch.setattr(streamhib, 'probe_packet_spread', lambda path: (1.0, 4096))
+    end = write_mp4('akhir.mp4', ['ftyp', 'mdat', 'moov'])
+    start = write_mp4('awal.mp4', ['ftyp', 'moov', 'mdat'])
+
+    assert [kind for kind, _, _ in streamhib.mp4_top_level_atoms(end)] == ['ftyp', 'mdat', 'moov']
+    assert streamhib.analyze_video_layout(end) == {'moov_at_end': True, 'interleave_ratio': 1.0, 'needs_remux': True}
+    assert streamhib.analyze_video_layout(start) == {'moov_at_end': False, 'interleave_ratio': 1.0, 'needs_remux': False}
+
+
+def test_needs_remux_for_poor_interleave_only_above_min_span(preflight_state, monkeypatch):
+    path = write_mp4('anyam.mp4', ['ftyp', 'moov', 'mdat'])
+    ratio = streamhib.VIDEO_INTERLEAVE_MAX_RATIO + 1
+    monkeypatch.setattr(streamhib, 'probe_packet_spread', lambda path: (ratio, streamhib.VIDEO_INTERLEAVE_MIN_SPAN_BYTES + 1))
+    assert streamhib.analyze_video_layout(path)['needs_remux'] is True
+    monkeypatch.setattr(streamhib, 'probe_packet_spread', lambda path: (ratio, streamhib.VIDEO_INTERLEAVE_MIN_SPAN_BYTES - 1))
+    assert streamhib.analyze_video_layout(path)['needs_remux'] is False
+    assert streamhib.analyze_video_layout(write_video('bukan-mp4.mp4'))['needs_remux'] is False
+
+
+def test_remux_replaces_file_and_records_cold_cache_timings(preflight_state, monkeypatch):
+    path = write_mp4('remux.mp4', ['ftyp', 'mdat', 'moov'])
+    evicted = []
+    monkeypatch.setattr(streamhib, 'evict_page_cache', evicted.append)
+    monkeypatch.setattr(streamhib, 'probe_packet_spread', lambda path: (1.0, 4096))
+
+    def run_cmd(cmd, **kwargs):
+        if '-movflags' in cmd: # Remux: tulis file faststart ke path sementara
+            with open(cmd[-1], 'wb') as f: f.write(atom('ftyp', 16) + atom('moov', 512) + atom('mdat', 4096))
+        return streamhib.subprocess.CompletedProcess(cmd, 0, '', '')
+    monkeypatch.setattr(streamhib, 'run_cmd', run_cmd)
+
+    streamhib.run_video_preflight('remux.mp4')
+
+    record = streamhib.video_preflight['remux.mp4']
+    assert record['status'] == 'remuxed' and record['moov_at_end_before'] is True and record['moov_at_end'] is False
+    assert [kind for kind, _, _ in streamhib.mp4_top_level_atoms(path)] == ['ftyp', 'moov', 'mdat']
+    assert evicted == [path, path] # Sebelum dan sesudah remux sama-sama tanpa page cache
+    assert not [f for f in os.listdir(streamhib.VIDEO_DIR) if f.endswith('.remux.tmp')]
+
+
+def test_failed_remux_keeps_original(preflight_state, monkeypatch):
+    path = write_mp4('gagal.mp4', ['ftyp', 'mdat', 'moov'])
+    with open(path, 'rb') as f: original = f.read()
+    monkeypatch.setattr(streamhib, 'evict_page_cache', lambda path: None)
+    monkeypatch.setattr(streamhib, 'probe_packet_spread', lambda path: (1.0, 4096))
+
+    def run_cmd(cmd, **kwargs):
+        if '-movflags' in cmd:
+            with open(cmd[-1], 'wb') as f: f.write(b'separuh')
+            return streamhib.subprocess.CompletedProcess(cmd, 1, '', 'moov atom not found')
+        return streamhib.subprocess.CompletedProcess(cmd, 0, '', '')
+    monkeypatch.setattr(streamhib, 'run_cmd', run_cmd)
+
+    streamhib.run_video_preflight('gagal.mp4')
+
+    assert streamhib.video_preflight['gagal.mp4']['status'] == 'failed'
+    with open(path, 'rb') as f: assert f.read() == original
+    assert not [f for f in os.listdir(streamhib.VIDEO_DIR) if f.endswith('.remux.tmp')]
+
+
+def test_state_file_merges_records_from_other_workers(preflight_state):
+    write_video('milik-saya.mp4')
+    with open(streamhib.VIDEO_PREFLIGHT_FILE, 'w') as f:
+        json.dump({'worker-lain.mp4': {'filename': 'worker-lain.mp4', 'status': 'remuxed'}}, f)
+
+    streamhib.update_video_preflight('milik-saya.mp4', status='ok')
+    streamhib.rename_video_preflight('milik-saya.mp4', 'baru.mp4')
+
+    with open(streamhib.VIDEO_PREFLIGHT_FILE) as f: state = json.load(f)
+    assert sorted(state) == ['baru.mp4', 'worker-lain.mp4'] and state['baru.mp4']['status'] == 'ok'
+
+
+@pytest.mark.parametrize('file_name', ['../data/sessions.json', '/etc/passwd', '.remux.mp4.remux.tmp'])
+def test_preflight_api_rejects_paths_outside_video_dir(preflight_state, client, file_name):
+    response = client.post('/api/videos/preflight', json={'file_name': file_name})
+    assert response.status_code == 400 and preflight_state == []
@@ -0,0 +1,90 @@
+"""Pre-warm jadwal: unit yang sudah disiapkan tinggal di-start, dan latensi jadwal ke paket pertama tercatat."""
+import json
+import os
+import socket
+import subprocess
+import sys
+from datetime import timedelta
+
+import pytest
+
+from conftest import streamhib
+
+
+class FakeSystemd:
+    def __init__(self, main_pid=0):
+        self.commands, self.main_pid = [], main_pid
+
+    def __call__(self, cmd, **kwargs):
+        self.commands.append(cmd)
+        stdout = ''
+        if cmd[0] == 'ffprobe': stdout = 'video\naudio\n'
+        elif cmd[:2] == ['systemctl', 'show']: stdout = f'{self.main_pid}\n'
+        return subprocess.CompletedProcess(cmd, 0, stdout, '')
+
+
+@pytest.fixture
+def schedule_env(monkeypatch):
+    with open(os.path.join(streamhib.VIDEO_DIR, 'pagi.mp4'), 'wb') as f: f.write(os.urandom(64 * 1024))
+    with open(streamhib.SESSION_FILE, 'w') as f:
+        json.dump({'active_sessions': [], 'inactive_sessions': [], 'scheduled_sessions': []}, f)
+    systemd = FakeSystemd()
+    latency_calls = []
+    monkeypatch.setattr(streamhib, 'run_cmd', systemd)
+    monkeypatch.setattr(streamhib, 'check_admission', lambda *args: None)
+    monkeypatch.setattr(streamhib, 'record_session_events', lambda events: None)
+    monkeypatch.setattr(streamhib, 'record_first_packet_latency', lambda *args: latency_calls.append(args))
+    monkeypatch.setattr(streamhib, 'prewarmed_streams', {})
+    yield systemd, latency_calls
+    service_path = os.path.join(streamhib.SERVICE_DIR, 'stream-pagi.service')
+    if os.path.exists(service_path): os.remove(service_path)
+
+
+def test_prewarmed_unit_only_needs_start(schedule_env):
+    systemd, latency_calls = schedule_env
+    streamhib.prewarm_scheduled_streaming('YouTube', 'kunci', 'pagi.mp4', 'pagi', encoding_profile='copy')
+    assert 'pagi' in streamhib.prewarmed_streams
+    systemd.commands.clear()
+
+    streamhib.start_scheduled_streaming('YouTube', 'kunci', 'pagi.mp4', 'pagi', one_time_duration_minutes=30, encoding_profile='copy')
+
+    assert [cmd for cmd in systemd.commands if cmd[0] == 'systemctl'] == [['systemctl', 'start', 'stream-pagi.service']]
+    [active] = streamhib.read_sessions()['active_sessions']
+    assert active['start_latency']['prewarmed'] is True and active['start_latency']['fire_to_launch_ms'] >= 0
+    assert latency_calls[0][4] is True and streamhib.prewarmed_streams == {}
+
+
+def test_changed_schedule_is_not_started_from_stale_prewarm(schedule_env):
+    systemd, _ = schedule_env
+    streamhib.prewarm_scheduled_streaming('YouTube', 'kunci', 'pagi.mp4', 'pagi', encoding_profile='copy')
+    systemd.commands.clear()
+
+    # Stream key diganti setelah pre-warm: unit harus ditulis ulang, bukan start isi lama
+    streamhib.start_scheduled_streaming('YouTube', 'kunci-baru', 'pagi.mp4', 'pagi', one_time_duration_minutes=30, encoding_profile='copy')
+
+    assert ['systemctl', 'daemon-reload'] in systemd.commands
+    with open(os.path.join(streamhib.SERVICE_DIR, 'stream-pagi.service')) as f: assert 'kunci-baru' in f.read()
+    assert streamhib.read_sessions()['active_sessions'][0]['start_latency']['prewarmed'] is False
+
+
+def test_first_packet_latency_is_measured_from_fire_time(monkeypatch):
+    ingest = socket.socket()
+    ingest.bind(('127.0.0.1', 0)); ingest.listen()
+    port = ingest.getsockname()[1]
+    # "ffmpeg": proses yang membuka koneksi ke ingest dan menahannya
+    sender = subprocess.Popen([sys.executable, '-c', f'import socket, time; s = socket.create_connection(("127.0.0.1", {port})); time.sleep(30)'])
+    fire_dt = streamhib.datetime.now(streamhib.jakarta_tz) - timedelta(seconds=2)
+    with open(streamhib.SESSION_FILE, 'w') as f:
+        json.dump({'active_sessions': [{'id': 'pagi', 'sanitized_service_id': 'pagi', 'status': 'active',
+                                        'start_latency': {'fire_time': fire_dt.isoformat(), 'prewarmed': True, 'fire_to_first_packet_ms': None}}],
+                   'inactive_sessions': [], 'scheduled_sessions': []}, f)
+    monkeypatch.setattr(streamhib, 'run_cmd', FakeSystemd(main_pid=sender.pid))
+    monkeypatch.setattr(streamhib, 'start_latency_records', [])
+    try:
+        streamhib.record_first_packet_latency('pagi', 'stream-pagi.service', f'rtmp://127.0.0.1:{port}/live', fire_dt, True)
+    finally:
+        sender.kill(); sender.wait(); ingest.close()
+
+    [record] = streamhib.start_latency_records
+    assert 2000 <= record['fire_to_first_packet_ms'] < 2000 + streamhib.FIRST_PACKET_TIMEOUT_SECONDS * 1000
+    assert streamhib.read_sessions()['active_sessions'][0]['start_latency']['fire_to_first_packet_ms'] == record['fire_to_first_packet_ms']
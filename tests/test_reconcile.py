@@ -0,0 +1,75 @@
+"""Reconciler: liveness unit dari ActiveState, sehingga unit yang sedang backoff auto-restart tidak dianggap crash."""
+import json
+import subprocess
+
+import pytest
+
+from conftest import streamhib
+
+
+class FakeUnits:
+    """run_cmd palsu dengan ActiveState/SubState per unit; unit tanpa status tidak dijawab (misal agent tidak terjangkau)."""
+    def __init__(self, states):
+        self.states, self.commands = states, []
+
+    def __call__(self, cmd, **kwargs):
+        self.commands.append(cmd)
+        stdout = ''
+        if cmd[:2] == ['systemctl', 'list-units']:
+            running_only = '--state=running' in cmd
+            stdout = ''.join(f"{unit} loaded {active} {sub} StreamHib\n" for unit, (active, sub) in sorted(self.states.items())
+                             if active != 'inactive' and (sub == 'running' or not running_only))
+        elif cmd[:2] == ['systemctl', 'show']:
+            units = cmd[2:cmd.index('-p')]
+            stdout = '\n\n'.join(f"Id={unit}\nActiveState={self.states[unit][0]}\nSubState={self.states[unit][1]}" for unit in units if unit in self.states) + '\n'
+        return subprocess.CompletedProcess(cmd, 0, stdout, '')
+
+
+def active_session(name):
+    return {'id': name, 'sanitized_service_id': name, 'video_name': 'video.mp4', 'status': 'active', 'scheduleType': 'manual',
+            'platform': 'YouTube', 'stream_key': 'key', 'start_time': streamhib.datetime.now(streamhib.jakarta_tz).isoformat()}
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    events = []
+    monkeypatch.setattr(streamhib, 'record_session_events', events.extend)
+    with open(streamhib.SESSION_FILE, 'w') as f:
+        json.dump({'active_sessions': [active_session(name) for name in ('backoff', 'berhenti', 'tak-terjawab', 'jalan')],
+                   'inactive_sessions': [], 'scheduled_sessions': []}, f)
+    return events
+
+
+def test_auto_restart_backoff_is_alive(sessions, monkeypatch):
+    monkeypatch.setattr(streamhib, 'run_cmd', FakeUnits({
+        'stream-backoff.service': ('activating', 'auto-restart'),
+        'stream-berhenti.service': ('inactive', 'dead'),
+        'stream-jalan.service': ('active', 'running'),
+    }))
+
+    streamhib.reconcile_sessions()
+
+    s_data = streamhib.read_sessions()
+    assert sorted(sess['id'] for sess in s_data['active_sessions']) == ['backoff', 'jalan', 'tak-terjawab']
+    assert [sess['id'] for sess in s_data['inactive_sessions']] == ['berhenti']
+    assert sessions == [('berhenti', 'crash', 'unit tidak berjalan')]
+    assert streamhib.destination_health_view['backoff'][0]['status'] == 'down'
+    assert streamhib.destination_health_view['jalan'][0]['status'] == 'ok'
+
+
+def test_failed_unit_is_left_to_health_monitor(sessions, monkeypatch):
+    monkeypatch.setattr(streamhib, 'run_cmd', FakeUnits({f"stream-{name}.service": ('failed', 'failed') for name in ('backoff', 'berhenti', 'tak-terjawab', 'jalan')}))
+
+    streamhib.reconcile_sessions()
+
+    assert len(streamhib.read_sessions()['active_sessions']) == 4 and sessions == []
+
+
+def test_untracked_backoff_unit_is_adopted(sessions, monkeypatch):
+    states = {f"stream-{name}.service": ('active', 'running') for name in ('backoff', 'berhenti', 'tak-terjawab', 'jalan')}
+    states['stream-liar.service'] = ('activating', 'auto-restart')
+    monkeypatch.setattr(streamhib, 'run_cmd', FakeUnits(states))
+
+    streamhib.reconcile_sessions()
+
+    assert 'recovered-liar' in {sess['id'] for sess in streamhib.read_sessions()['active_sessions']}
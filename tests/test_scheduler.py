@@ -0,0 +1,73 @@
+"""Pemulihan jadwal dari job store persisten."""
+import json
+
+import pytest
+
+from conftest import streamhib
+
+
+@pytest.fixture
+def paused_scheduler(monkeypatch):
+    scheduler, persistent = streamhib.build_scheduler()
+    assert persistent, "SQLAlchemy dibutuhkan untuk job store persisten"
+    monkeypatch.setattr(streamhib, 'scheduler', scheduler)
+    monkeypatch.setattr(streamhib, 'scheduler_jobstore_persistent', persistent)
+    # Job tersimpan di job store seperti produksi tetapi tidak pernah dijalankan
+    scheduler.start(paused=True)
+    yield scheduler
+    scheduler.remove_all_jobs()
+    scheduler.shutdown(wait=False)
+
+
+@pytest.fixture
+def daily_schedule():
+    schedule = {'id': 'daily-pagi', 'session_name_original': 'pagi', 'sanitized_service_id': 'pagi', 'platform': 'YouTube',
+                'stream_key': 'key', 'video_file': 'video.mp4', 'encoding_profile': 'copy',
+                'recurrence_type': 'daily', 'start_time_of_day': '07:00', 'stop_time_of_day': '08:00'}
+    with open(streamhib.SESSION_FILE, 'w') as f:
+        json.dump({'active_sessions': [], 'inactive_sessions': [], 'scheduled_sessions': [schedule]}, f)
+    return schedule
+
+
+def test_recover_rebuilds_jobs_missing_despite_matching_fingerprint(paused_scheduler, daily_schedule):
+    streamhib.recover_schedules()
+    job_ids = {job.id for job in paused_scheduler.get_jobs(jobstore='default')}
+    assert job_ids
+    fingerprint = streamhib.read_schedule_sync_fingerprint()
+
+    # Job hilang dari job store tanpa perubahan sessions.json (fingerprint tetap cocok)
+    lost_job_id = sorted(job_ids)[0]
+    paused_scheduler.remove_job(lost_job_id, jobstore='default')
+    assert streamhib.read_schedule_sync_fingerprint() == fingerprint
+
+    streamhib.recover_schedules()
+    assert {job.id for job in paused_scheduler.get_jobs(jobstore='default')} == job_ids
+
+
+def test_batch_applies_only_its_own_changes(monkeypatch):
+    with open(streamhib.SESSION_FILE, 'w') as f:
+        json.dump({'active_sessions': [{'id': 'lama', 'sanitized_service_id': 'lama', 'status': 'active'}], 'inactive_sessions': [],
+                   'scheduled_sessions': [{'id': 'baru', 'session_name_original': 'baru', 'recurrence_type': 'one_time'}]}, f)
+
+    def run_cmd(cmd, **kwargs):
+        if cmd[:2] == ['systemctl', 'start']:
+            # Penulis lain (misal API start manual) mengubah sessions.json selama systemctl batch berjalan
+            streamhib.modify_sessions(lambda s_data: s_data['active_sessions'].append({'id': 'manual', 'status': 'active'}))
+        return streamhib.subprocess.CompletedProcess(cmd, 0, '', '')
+
+    monkeypatch.setattr(streamhib, 'run_cmd', run_cmd)
+    monkeypatch.setattr(streamhib, 'check_admission', lambda *args: None)
+    monkeypatch.setattr(streamhib, 'prepare_stream_input', lambda *args: '/videos/video.mp4')
+    monkeypatch.setattr(streamhib, 'build_service_content', lambda *args: '')
+    monkeypatch.setattr(streamhib, 'consume_prewarmed_stream', lambda *args: False)
+    monkeypatch.setattr(streamhib, 'create_service_file', lambda *args, **kwargs: ('stream-baru.service', 'baru'))
+    monkeypatch.setattr(streamhib, 'record_first_packet_latency', lambda *args: None)
+    monkeypatch.setattr(streamhib, 'record_session_events', lambda events: None)
+
+    item = streamhib.scheduled_start_item('YouTube', 'key', 'video.mp4', 'baru', one_time_duration_minutes=30)
+    streamhib.run_schedule_batch(starts=[item], stops=['lama'])
+
+    s_data = streamhib.read_sessions()
+    assert sorted(sess['id'] for sess in s_data['active_sessions']) == ['baru', 'manual']
+    assert [sess['id'] for sess in s_data['inactive_sessions']] == ['lama'] and s_data['inactive_sessions'][0]['status'] == 'inactive'
+    assert s_data['scheduled_sessions'] == []
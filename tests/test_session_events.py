@@ -0,0 +1,80 @@
+"""Riwayat sesi append-only dan rollup uptime per hari."""
+from datetime import datetime
+
+import pytest
+
+from conftest import streamhib
+
+HOUR_MS = 3600 * 1000
+
+
+@pytest.fixture
+def events_db(monkeypatch, tmp_path):
+    monkeypatch.setattr(streamhib, 'SESSION_EVENTS_DB', str(tmp_path / 'events.sqlite'))
+    monkeypatch.setattr(streamhib, 'session_events_db_ready', False)
+
+
+def at(hour, day=10):
+    return int(streamhib.jakarta_tz.localize(datetime(2026, 3, day, hour)).timestamp() * 1000)
+
+
+def totals(session_id):
+    report = streamhib.query_uptime(session_id, '2026-03-01', '2026-03-31')
+    return next(x for x in report['sessions'] if x['session_id'] == session_id), report['daily']
+
+
+def test_uptime_rollup_splits_across_midnight(events_db):
+    streamhib.write_session_events([('s1', 'start', None, at(22)), ('s1', 'stop', None, at(2, day=11))])
+
+    total, daily = totals('s1')
+    assert total['uptime_ms'] == 4 * HOUR_MS and total['starts'] == 1 and total['stops'] == 1
+    assert [(row['day'], row['uptime_ms']) for row in daily] == [('2026-03-10', 2 * HOUR_MS), ('2026-03-11', 2 * HOUR_MS)]
+
+
+def test_permanent_failure_after_crash_counts_once(events_db):
+    streamhib.write_session_events([('s1', 'start', None, at(8)), ('s1', 'crash', 'Connection refused', at(9)),
+                                    ('s1', 'failed', 'Connection refused', at(10))])
+    streamhib.write_session_events([('s2', 'start', None, at(8)), ('s2', 'failed', 'unit failed', at(9))])
+
+    assert totals('s1')[0]['crashes'] == 1 and totals('s1')[0]['uptime_ms'] == HOUR_MS
+    assert totals('s2')[0]['crashes'] == 1 and totals('s2')[0]['uptime_ms'] == HOUR_MS
+    assert [e['event'] for e in streamhib.query_session_events('s1')] == ['failed', 'crash', 'start']
+
+
+def test_mark_session_failed_records_failed_event(events_db, monkeypatch):
+    events = []
+    monkeypatch.setattr(streamhib, 'run_cmd', lambda *a, **k: None)
+    monkeypatch.setattr(streamhib, 'update_active_session', lambda session_id, apply: None)
+    monkeypatch.setattr(streamhib, 'record_session_event', lambda *args: events.append(args))
+
+    streamhib.mark_session_failed({'id': 's1', 'sanitized_service_id': 's1'}, 'Invalid stream key')
+
+    assert events == [('s1', 'failed', 'Invalid stream key')]
+
+
+def test_backfill_opens_sessions_without_history(events_db):
+    streamhib.write_session_events([('known', 'start', None, at(8))])
+    active = [{'id': 'known', 'start_time': '2026-03-10T07:00:00+07:00'}, {'id': 'legacy', 'start_time': '2026-03-10T06:00:00+07:00'}]
+
+    assert streamhib.backfill_session_events(active) == 1
+    assert streamhib.backfill_session_events(active) == 0
+    events = streamhib.query_session_events('legacy')
+    assert [(e['event'], e['detail'], e['ts_ms']) for e in events] == [('start', 'backfill', at(6))]
+    assert [e['event'] for e in streamhib.query_session_events('known')] == ['start']
+
+
+def test_connection_closed_when_write_fails(events_db, monkeypatch):
+    closed = []
+    real_db = streamhib.session_events_db
+
+    class TrackedConnection:
+        def __init__(self): self.conn = real_db()
+        def __getattr__(self, name): return getattr(self.conn, name)
+        def __enter__(self): return self.conn.__enter__()
+        def __exit__(self, *exc): return self.conn.__exit__(*exc)
+        def close(self): closed.append(True); self.conn.close()
+
+    monkeypatch.setattr(streamhib, 'session_events_db', TrackedConnection)
+    with pytest.raises(TypeError):
+        streamhib.write_session_events([('s1', 'start', None, 'bukan-angka')])
+    assert closed == [True]
@@ -0,0 +1,55 @@
+"""Simulcast: satu proses ffmpeg dengan tee muxer untuk semua tujuan, dan status per tujuan dari journal."""
+import subprocess
+
+import pytest
+
+from conftest import streamhib
+
+DESTINATIONS = [{'platform': 'YouTube', 'stream_key': 'utama'}, {'platform': 'Facebook', 'stream_key': 'kedua'}]
+
+
+def test_multiple_destinations_share_one_tee_process():
+    command = streamhib.build_ffmpeg_command('/videos/a.mp4', DESTINATIONS, 'copy')
+
+    assert command.count('/usr/bin/ffmpeg') == 1 and command.count(' -i ') == 1
+    assert '-map 0:v -map 0:a?' in command and '-f tee' in command
+    slaves = command.split('-f tee ', 1)[1].strip('"').split('|')
+    assert slaves == [f"[f=flv:onfail=ignore]{streamhib.destination_url(dest)}" for dest in DESTINATIONS]
+
+
+def test_single_destination_is_plain_flv():
+    command = streamhib.build_ffmpeg_command('/videos/a.mp4', DESTINATIONS[:1], 'copy')
+    assert 'tee' not in command and command.endswith(f"-f flv -c:v copy -c:a copy {streamhib.destination_url(DESTINATIONS[0])}")
+
+
+def test_tee_special_characters_are_escaped():
+    # '|' dan '[' memisahkan slave/opsi tee; backslash digandakan lagi untuk ExecStart systemd
+    command = streamhib.build_ffmpeg_command('/videos/a.mp4', [{'platform': 'YouTube', 'stream_key': 'a|b[c'}, DESTINATIONS[1]], 'copy')
+    assert 'a\\\\|b\\\\[c' in command
+    assert command.count('[f=flv:onfail=ignore]') == 2
+
+
+def test_parse_destinations_rejects_duplicates_and_keeps_legacy_fields():
+    with pytest.raises(ValueError, match='dua kali'):
+        streamhib.parse_destinations({'destinations': [DESTINATIONS[0], dict(DESTINATIONS[0])]})
+    with pytest.raises(ValueError, match='maksimal'):
+        streamhib.parse_destinations({'destinations': [{'platform': 'YouTube', 'stream_key': f'k{i}'} for i in range(streamhib.SIMULCAST_MAX_DESTINATIONS + 1)]})
+    assert streamhib.parse_destinations({'platform': 'Facebook', 'stream_key': ' kunci '}) == [{'platform': 'Facebook', 'stream_key': 'kunci'}]
+    assert streamhib.destination_fields(DESTINATIONS)['stream_key'] == 'utama'
+
+
+def test_failed_slaves_only_count_the_current_process():
+    journal = ['ffmpeg version 6.1', '[tee @ 0x1] Slave muxer #1 failed: Broken pipe, continuing with 1/2 slaves.',
+               'ffmpeg version 6.1', '[tee @ 0x2] Slave muxer #0 failed: Connection refused, continuing with 1/2 slaves.']
+    assert streamhib.failed_tee_slaves(journal) == {0: 'Connection refused'}
+    assert streamhib.failed_tee_slaves(journal, runs=2) == {0: 'Connection refused', 1: 'Broken pipe'}
+
+
+def test_destination_health_per_output(monkeypatch):
+    journal = 'ffmpeg version 6.1\n[tee @ 0x1] Slave muxer #1 failed: Connection reset by peer, continuing with 1/2 slaves.\n'
+    monkeypatch.setattr(streamhib, 'run_cmd', lambda cmd, **kwargs: subprocess.CompletedProcess(cmd, 0, journal, ''))
+    session = {'sanitized_service_id': 'simulcast', 'destinations': DESTINATIONS}
+
+    health = streamhib.get_destination_health(session, {'stream-simulcast.service'})
+    assert [(dest['status'], dest['error']) for dest in health] == [('ok', None), ('failed', 'Connection reset by peer')]
+    assert {dest['status'] for dest in streamhib.get_destination_health(session, set())} == {'down'}
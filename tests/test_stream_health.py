@@ -0,0 +1,97 @@
+"""Pemantauan crash unit stream: failover per tujuan dan penulisan sessions.json yang tidak menimpa perubahan lain."""
+import json
+import subprocess
+
+import pytest
+
+from conftest import streamhib
+
+SERVICE_NAME = 'stream-simulcast.service'
+
+
+class FakeUnit:
+    """run_cmd palsu: unit ffmpeg yang terus crash dengan tujuan tee #1 gagal."""
+    def __init__(self):
+        self.exit_usec, self.commands, self.on_journal = 0, [], None
+
+    def __call__(self, cmd, timeout=None, **kwargs):
+        self.commands.append(cmd)
+        stdout = ''
+        if cmd[:2] == ['systemctl', 'show']:
+            stdout = (f"Id={SERVICE_NAME}\nActiveState=active\nSubState=running\n"
+                      f"ExecMainExitTimestampMonotonic={self.exit_usec}\nExecMainStatus=1\n")
+        elif cmd[0] == 'journalctl':
+            if self.on_journal: self.on_journal()
+            stdout = ("ffmpeg version 6.1\n[tee @ 0x1] Slave muxer #1 failed: Connection reset by peer, continuing with 1/2 slaves.\n"
+                      "[out#0/tee @ 0x2] Error writing trailer: Connection reset by peer\n")
+        return subprocess.CompletedProcess(cmd, 0, stdout=stdout, stderr='')
+
+
+@pytest.fixture
+def fake_unit(monkeypatch):
+    unit = FakeUnit()
+    monkeypatch.setattr(streamhib, 'run_cmd', unit)
+    monkeypatch.setattr(streamhib, 'track_incident_recovery', lambda *args: None)
+    streamhib.stream_health_state.clear()
+    yield unit
+    streamhib.stream_health_state.clear()
+
+
+@pytest.fixture
+def simulcast_session():
+    with open(f"{streamhib.VIDEO_DIR}/video.mp4", 'wb') as f: f.write(b'\0' * 1024)
+    destinations = [{'platform': 'YouTube', 'stream_key': 'utama'}, {'platform': 'YouTube', 'stream_key': 'kedua'}]
+    sess = {'id': 'simulcast', 'sanitized_service_id': 'simulcast', 'video_name': 'video.mp4', 'status': 'active',
+            'start_time': streamhib.datetime.now(streamhib.jakarta_tz).isoformat(), 'scheduleType': 'manual',
+            **streamhib.destination_fields(destinations)}
+    with open(streamhib.SESSION_FILE, 'w') as f:
+        json.dump({'active_sessions': [sess], 'inactive_sessions': [], 'scheduled_sessions': []}, f)
+    return sess
+
+
+def crash(unit):
+    unit.exit_usec += 1_000_000
+    streamhib.monitor_stream_health()
+
+
+def test_failover_moves_only_failing_destination(fake_unit, simulcast_session):
+    def start_other_session():
+        # Sesi lain dimulai lewat API selagi monitor memeriksa journal
+        s_data = streamhib.read_sessions()
+        s_data['active_sessions'].append({'id': 'lain', 'sanitized_service_id': 'lain', 'video_name': 'video.mp4', 'status': 'active'})
+        streamhib.write_sessions(s_data)
+        fake_unit.on_journal = None
+
+    for failure in range(streamhib.FAILOVER_AFTER_FAILURES):
+        if failure == streamhib.FAILOVER_AFTER_FAILURES - 1: fake_unit.on_journal = start_other_session
+        crash(fake_unit)
+
+    # Crash pertama (sebelum pemeriksaan pertama) ikut terhitung, jadi failover terjadi tepat di crash ke-N
+    assert ['systemctl', 'restart', SERVICE_NAME] in [cmd[:3] for cmd in fake_unit.commands]
+    s_data = streamhib.read_sessions()
+    assert [sess['id'] for sess in s_data['active_sessions']] == ['simulcast', 'lain']
+    destinations = streamhib.session_destinations(s_data['active_sessions'][0])
+    assert [dest.get('ingest') for dest in destinations] == [None, 'backup']
+    with open(f"{streamhib.SERVICE_DIR}/{SERVICE_NAME}") as f: unit_content = f.read()
+    assert 'a.rtmp.youtube.com/live2/utama' in unit_content and 'b.rtmp.youtube.com/live2/kedua' in unit_content
+
+
+def test_incident_recorded_on_fresh_sessions_file(simulcast_session, monkeypatch):
+    def run_cmd(cmd, **kwargs):
+        # Selama menunggu pemulihan, sesi lain dimulai lewat API
+        streamhib.modify_sessions(lambda s_data: s_data['active_sessions'].append({'id': 'lain', 'status': 'active'}))
+        return subprocess.CompletedProcess(cmd, 0, stdout='4242\n', stderr='')
+    monkeypatch.setattr(streamhib, 'run_cmd', run_cmd)
+    monkeypatch.setattr(streamhib, 'process_has_established_connection', lambda pid, port: pid == 4242)
+    monkeypatch.setattr(streamhib, 'record_session_event', lambda *args: None)
+    started_at = streamhib.datetime.now(streamhib.jakarta_tz).isoformat()
+    streamhib.stream_health_state['simulcast'] = {'consecutive_failures': 2, 'incident': {'started_at': started_at, 'restarts': 2, 'failover': False, 'reason': 'x'}}
+
+    streamhib.track_incident_recovery('simulcast', 'simulcast', SERVICE_NAME, 1935)
+
+    sessions = {sess['id']: sess for sess in streamhib.read_sessions()['active_sessions']}
+    assert set(sessions) == {'simulcast', 'lain'}
+    [incident] = sessions['simulcast']['incidents']
+    assert incident['restarts'] == 2 and incident['time_to_recovery_ms'] is not None
+    assert streamhib.stream_health_state['simulcast']['consecutive_failures'] == 0
+    streamhib.stream_health_state.clear()
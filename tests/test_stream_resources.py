@@ -0,0 +1,105 @@
+"""Sampling resource per stream dari counter kumulatif cgroup (cpu/memori/io) dan IP accounting systemd."""
+import json
+import subprocess
+import time
+import types
+
+import pytest
+
+from conftest import streamhib
+
+
+class FakeHost:
+    """Pohon cgroup palsu di bawah CGROUP_ROOT, jam monotonic yang diatur test, dan systemctl show IPAccounting."""
+    def __init__(self, root):
+        self.slice_dir = root / streamhib.STREAM_SLICE
+        self.slice_dir.mkdir(parents=True)
+        (self.slice_dir / 'run-u42.scope').mkdir() # Bukan unit stream, diabaikan
+        self.clock, self.network = 1000.0, {}
+
+    def set_unit(self, unit, cpu_usec, anon_bytes, read_bytes=None):
+        unit_dir = self.slice_dir / unit
+        unit_dir.mkdir(exist_ok=True)
+        (unit_dir / 'cpu.stat').write_text(f"usage_usec {cpu_usec}\nuser_usec 0\nsystem_usec 0\n")
+        (unit_dir / 'memory.stat').write_text(f"file 4096\nanon {anon_bytes}\n")
+        if read_bytes is not None:
+            # Dua device: rbytes dijumlahkan
+            (unit_dir / 'io.stat').write_text(f"8:0 rbytes={read_bytes - 1024} wbytes=0 rios=1\n253:0 rbytes=1024 wbytes=0 rios=1\n")
+
+    def run_cmd(self, cmd, **kwargs):
+        units = cmd[2:cmd.index('-p')]
+        stdout = '\n\n'.join(f"Id={unit}\nIPEgressBytes={self.network.get(unit, ('[not set]', '[not set]'))[0]}\n"
+                             f"IPIngressBytes={self.network.get(unit, ('[not set]', '[not set]'))[1]}" for unit in units)
+        return subprocess.CompletedProcess(cmd, 0, stdout + '\n', '')
+
+
+@pytest.fixture
+def host(monkeypatch, tmp_path):
+    fake = FakeHost(tmp_path)
+    monkeypatch.setattr(streamhib, 'CGROUP_ROOT', str(tmp_path))
+    monkeypatch.setattr(streamhib, 'run_cmd', fake.run_cmd)
+    monkeypatch.setattr(streamhib, 'time', types.SimpleNamespace(monotonic=lambda: fake.clock, time=lambda: 1760850000,
+                                                                  monotonic_ns=time.monotonic_ns))
+    monkeypatch.setattr(streamhib, 'stream_resource_counters', {})
+    monkeypatch.setattr(streamhib, 'stream_resource_history', {})
+    monkeypatch.setattr(streamhib, 'stream_resources_latest', {})
+    return fake
+
+
+def test_rates_from_counter_deltas(host):
+    host.set_unit('stream-a.service', cpu_usec=1_000_000, anon_bytes=50 * 1048576, read_bytes=2048)
+    host.network['stream-a.service'] = (1_000_000, 20_000)
+    host.set_unit('stream-b.service', cpu_usec=0, anon_bytes=1048576)
+    streamhib.sample_stream_resources()
+    assert streamhib.stream_resources_latest == {} # Sampel pertama hanya menyimpan counter
+
+    host.clock += 10
+    host.set_unit('stream-a.service', cpu_usec=6_000_000, anon_bytes=100 * 1048576, read_bytes=2048 + 1024 * 1024)
+    host.network['stream-a.service'] = (13_500_000, 45_000)
+    host.set_unit('stream-b.service', cpu_usec=100_000, anon_bytes=1048576)
+    streamhib.sample_stream_resources()
+
+    assert streamhib.stream_resources_latest['a'] == {'ts': 1760850000, 'cpu_percent': 50.0, 'rss_mb': 100.0, 'disk_read_kbps': 102.4,
+                                                     'net_out_kbps': 10000.0, 'net_in_kbps': 20.0}
+    # Tanpa io.stat dan IPAccounting belum aktif: disk 0, jaringan tidak diketahui
+    assert streamhib.stream_resources_latest['b'] == {'ts': 1760850000, 'cpu_percent': 1.0, 'rss_mb': 1.0, 'disk_read_kbps': 0.0,
+                                                     'net_out_kbps': None, 'net_in_kbps': None}
+    assert set(streamhib.stream_resources_latest) == {'a', 'b'}
+
+
+def test_restart_and_stop_reset_history(host):
+    host.set_unit('stream-a.service', cpu_usec=5_000_000, anon_bytes=1048576)
+    streamhib.sample_stream_resources()
+    host.clock += 10
+    host.set_unit('stream-a.service', cpu_usec=6_000_000, anon_bytes=1048576)
+    streamhib.sample_stream_resources()
+    assert len(streamhib.get_stream_resource_history('a')['sessions']['a']) == 1
+
+    # Unit di-restart: counter cgroup mulai dari nol, putaran ini tidak menghasilkan laju negatif
+    host.clock += 10
+    host.set_unit('stream-a.service', cpu_usec=10_000, anon_bytes=1048576)
+    streamhib.sample_stream_resources()
+    assert 'a' not in streamhib.stream_resources_latest and len(streamhib.stream_resource_history['a']) == 1
+
+    # Unit berhenti: cgroup-nya hilang, riwayat ikut dibuang
+    for path in (host.slice_dir / 'stream-a.service').iterdir(): path.unlink()
+    (host.slice_dir / 'stream-a.service').rmdir()
+    host.clock += 10
+    streamhib.sample_stream_resources()
+    assert streamhib.get_stream_resource_history()['sessions'] == {}
+
+
+def test_resources_attached_to_active_sessions(host, client):
+    with open(streamhib.SESSION_FILE, 'w') as f:
+        json.dump({'active_sessions': [{'id': 'A', 'sanitized_service_id': 'a', 'status': 'active', 'platform': 'YouTube', 'stream_key': 'k'}],
+                   'inactive_sessions': [], 'scheduled_sessions': []}, f)
+    host.set_unit('stream-a.service', cpu_usec=0, anon_bytes=1048576)
+    streamhib.sample_stream_resources()
+    host.clock += 10
+    host.set_unit('stream-a.service', cpu_usec=2_000_000, anon_bytes=1048576)
+    streamhib.sample_stream_resources()
+
+    [active] = streamhib.get_active_sessions_data()
+    assert active['resources']['cpu_percent'] == 20.0
+    history = client.get('/api/sessions/resources?session_id=A').get_json()
+    assert history['session_id'] == 'A' and history['fields'][1] == 'cpu_percent' and history['sessions']['a'][0][1] == 20.0
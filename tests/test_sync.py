@@ -0,0 +1,75 @@
+"""Sinkronisasi delta yang terputus lalu dilanjutkan dari .syncpart."""
+import os
+
+import pytest
+
+from conftest import streamhib
+
+MB = 1024 * 1024
+
+
+class InterruptedStream:
+    """Stream yang putus setelah `limit` byte, seperti koneksi HTTP yang terputus di tengah transfer."""
+    def __init__(self, stream, limit):
+        self.stream, self.remaining = stream, limit
+
+    def read(self, n):
+        if self.remaining <= 0: raise EOFError("koneksi terputus")
+        data = self.stream.read(min(n, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+
+def write_file(path, data):
+    with open(path, 'wb') as f: f.write(data)
+
+
+def interrupt_sync(source_dir, dest_dir, limit):
+    source, dest = streamhib.directory_sync_library(source_dir), streamhib.directory_sync_library(dest_dir)
+    signatures = streamhib.build_sync_signatures(dest, streamhib.build_sync_manifest(source))
+    stream = InterruptedStream(streamhib.SyncStreamReader(streamhib.encode_sync_stream(source, signatures)), limit)
+    with pytest.raises(EOFError):
+        streamhib.apply_sync_stream(stream, dest)
+
+
+@pytest.fixture
+def library_dirs(tmp_path):
+    source_dir, dest_dir = tmp_path / 'source', tmp_path / 'dest'
+    source_dir.mkdir(); dest_dir.mkdir()
+    return str(source_dir), str(dest_dir)
+
+
+def test_resume_uses_old_file_as_basis(library_dirs):
+    source_dir, dest_dir = library_dirs
+    old = os.urandom(7 * MB)
+    new = os.urandom(3 * MB) + old[3 * MB:] # 3 MB awal berubah, 4 MB sisanya sama dengan salinan lama
+    write_file(os.path.join(source_dir, 'video.mp4'), new)
+    write_file(os.path.join(dest_dir, 'video.mp4'), old)
+
+    interrupt_sync(source_dir, dest_dir, int(2.5 * MB))
+    part = streamhib.sync_part_path(os.path.join(dest_dir, 'video.mp4'))
+    assert os.path.getsize(part) == 2 * MB
+    with open(os.path.join(dest_dir, 'video.mp4'), 'rb') as f: assert f.read() == old
+
+    stats = streamhib.sync_directories(source_dir, dest_dir)
+    assert stats['synced'] == ['videos/video.mp4']
+    # Hanya sisa bagian yang berubah yang dikirim; 4 MB yang sama tetap disalin dari file lama
+    assert stats['received_bytes'] == 1 * MB
+    assert stats['copied_bytes'] == 6 * MB
+    with open(os.path.join(dest_dir, 'video.mp4'), 'rb') as f: assert f.read() == new
+    assert sorted(os.listdir(dest_dir)) == ['video.mp4']
+
+
+def test_partial_for_changed_source_is_discarded(library_dirs):
+    source_dir, dest_dir = library_dirs
+    write_file(os.path.join(source_dir, 'video.mp4'), os.urandom(3 * MB))
+    interrupt_sync(source_dir, dest_dir, int(1.5 * MB))
+    assert os.path.getsize(streamhib.sync_part_path(os.path.join(dest_dir, 'video.mp4'))) == 1 * MB
+
+    # Sumber berubah sebelum transfer dilanjutkan: prefiks .syncpart tidak boleh dipakai
+    replacement = os.urandom(2 * MB)
+    write_file(os.path.join(source_dir, 'video.mp4'), replacement)
+    stats = streamhib.sync_directories(source_dir, dest_dir)
+    assert stats['received_bytes'] == 2 * MB
+    with open(os.path.join(dest_dir, 'video.mp4'), 'rb') as f: assert f.read() == replacement
+    assert sorted(os.listdir(dest_dir)) == ['video.mp4']
@@ -0,0 +1,91 @@
+"""Tracing request/job: span subprocess dan tunggu FileLock masuk trace induknya, ditulis dalam format Chrome Trace Event."""
+import json
+import queue
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import streamhib
+
+
+@pytest.fixture
+def traces(monkeypatch, tmp_path):
+    collected = queue.Queue()
+    monkeypatch.setattr(streamhib, 'TRACE_ENABLED', True)
+    monkeypatch.setattr(streamhib, 'TRACE_SLOW_MS', 0)
+    monkeypatch.setattr(streamhib, 'TRACE_FILE', str(tmp_path / 'traces' / 'trace.json'))
+    monkeypatch.setattr(streamhib, 'trace_queue', collected)
+    monkeypatch.setattr(streamhib, 'ensure_trace_writer', lambda: None)
+    monkeypatch.setattr(streamhib.subprocess, 'run', lambda cmd, **kwargs: subprocess.CompletedProcess(cmd, 0, '', ''))
+    with open(streamhib.SESSION_FILE, 'w') as f:
+        json.dump({'active_sessions': [], 'inactive_sessions': [], 'scheduled_sessions': []}, f)
+    return collected
+
+
+def spans(events):
+    return {event['name']: event for event in events if event['ph'] == 'X'}
+
+
+def test_request_trace_contains_lock_and_subprocess_spans(traces):
+    @streamhib.traced
+    def handler_work():
+        streamhib.read_sessions()
+        streamhib.run_cmd(['systemctl', 'show', 'stream-a.service'])
+
+    with streamhib.app.test_request_context('/api/trace-test'):
+        streamhib.begin_request_trace()
+        handler_work()
+        streamhib.end_request_trace(None)
+
+    by_name = spans(traces.get_nowait())
+    root = by_name['GET /api/trace-test']
+    assert root['cat'] == 'request' and root['args']['path'] == '/api/trace-test'
+    for child in ('handler_work', 'filelock.wait', 'json.decode', 'systemctl show'):
+        span = by_name[child]
+        assert span['tid'] == root['tid'] and root['ts'] <= span['ts'] and span['ts'] + span['dur'] <= root['ts'] + root['dur'] + 1
+    assert by_name['systemctl show']['args']['cmd'] == 'systemctl show stream-a.service'
+
+
+def test_real_request_records_status(traces, client):
+    assert client.get('/api/incidents').status_code == 200
+    by_name = spans(traces.get_nowait())
+    assert by_name['GET /api/incidents']['args']['status'] == 200 and 'filelock.wait' in by_name
+
+
+def test_job_lanes_and_slow_sampling(traces, monkeypatch):
+    @streamhib.traced_job
+    def batch():
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(streamhib.trace_lane(lambda unit: streamhib.run_cmd(['systemctl', 'start', unit])), ['a', 'b']))
+
+    batch()
+    events = traces.get_nowait()
+    root = next(event for event in events if event['name'] == 'batch' and event['ph'] == 'X')
+    lanes = {event['tid'] for event in events if event['name'] == 'systemctl start'}
+    assert root['cat'] == 'job' and len(lanes) == 2 and root['tid'] not in lanes
+
+    # Sampling: trace yang lebih cepat dari TRACE_SLOW_MS dibuang
+    monkeypatch.setattr(streamhib, 'TRACE_SLOW_MS', 60_000)
+    batch()
+    assert traces.empty()
+
+
+def test_writer_output_is_trace_event_json(traces, monkeypatch):
+    monkeypatch.setattr(streamhib, 'trace_queue', queue.Queue())
+    threading.Thread(target=streamhib.trace_writer, daemon=True).start()
+    streamhib.trace_queue.put([{'name': 'GET /', 'ph': 'X', 'ts': 1, 'dur': 2, 'pid': 1, 'tid': 1, 'args': {}}])
+    streamhib.trace_queue.put([{'name': 'job', 'ph': 'X', 'ts': 3, 'dur': 4, 'pid': 1, 'tid': 2, 'args': {}}])
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            with open(streamhib.TRACE_FILE) as f: content = f.read()
+        except OSError:
+            content = ''
+        if content.count('\n') == 3: break
+        time.sleep(0.01)
+    # Format JSON Array boleh tanpa penutup; dengan penutup harus JSON valid
+    assert [event['name'] for event in json.loads(content.rstrip(',\n') + ']')] == ['GET /', 'job']